@@ -547,7 +547,7 @@ class Geometry:
             Energy of the current atomic configuration.
         """
         if self._energy is None:
-            results = self.calculator.get_energy(self.atoms, self._coords)
+            results = self.calculate("get_energy", self._coords)
             self.set_results(results)
         return self._energy
 
@@ -564,7 +564,7 @@ class Geometry:
     @property
     def cart_forces(self):
         if self._forces is None:
-            results = self.calculator.get_forces(self.atoms, self._coords)
+            results = self.calculate("get_forces", self._coords)
             self.set_results(results)
         return self._forces
 
@@ -640,7 +640,7 @@ class Geometry:
     @property
     def cart_hessian(self):
         if self._hessian is None:
-            results = self.calculator.get_hessian(self.atoms, self._coords)
+            results = self.calculate("get_hessian", self._coords)
             self.set_results(results)
         return self._hessian
 
@@ -727,9 +727,34 @@ class Geometry:
         P = get_trans_rot_projector(self.cart_coords, masses=self.masses)
         return P.T.dot(mw_hessian).dot(P)
 
+    def calculate(self, kind, coords):
+        """Call a calculator method, using the calculators result cache if present.
+
+        Parameters
+        ----------
+        kind : str
+            Calculator method, e.g. 'get_energy', 'get_forces' or 'get_hessian'.
+        coords : np.array
+            Cartesian coordinates.
+
+        Returns
+        -------
+        results : dict
+            Results of the calculation.
+        """
+        if (kind == "get_hessian") and (
+            getattr(self.calculator, "num_hess", None) is not None
+        ):
+            kind = "get_num_hessian"
+        cache = getattr(self.calculator, "result_cache", None)
+        # Root tracking depends on the history of the calculator
+        if (cache is None) or getattr(self.calculator, "track", False):
+            return getattr(self.calculator, kind)(self.atoms, coords)
+        return cache.get_or_calculate(self.calculator, kind, self.atoms, coords)
+
     def calc_energy_and_forces(self):
         """Force a calculation of the current energy and forces."""
-        results = self.calculator.get_forces(self.atoms, self.cart_coords)
+        results = self.calculate("get_forces", self.cart_coords)
         self.set_results(results)
 
     def assert_cart_coords(self, coords):
@@ -739,7 +764,7 @@ class Geometry:
 
     def get_energy_at(self, coords):
         self.assert_cart_coords(coords)
-        return self.calculator.get_energy(self.atoms, coords)["energy"]
+        return self.calculate("get_energy", coords)["energy"]
 
     def get_energy_and_forces_at(self, coords):
         """Calculate forces and energies at the given coordinates.
@@ -750,7 +775,7 @@ class Geometry:
             cart_step = self.internal.transform_int_step(int_step, pure=True)
             coords = self.cart_coords + cart_step
         self.assert_cart_coords(coords)
-        results = self.calculator.get_forces(self.atoms, coords)
+        results = self.calculate("get_forces", coords)
 
         if self.coord_type != "cart":
             results["forces"] = self.internal.transform_forces(results["forces"])
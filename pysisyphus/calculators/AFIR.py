@@ -4,16 +4,17 @@
 
 import itertools as it
 
-import autograd
 import autograd.numpy as anp
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
 
 from pysisyphus.calculators.Calculator import Calculator
 from pysisyphus.constants import AU2KJPERMOL
 from pysisyphus.elem_data import COVALENT_RADII
 from pysisyphus.Geometry import Geometry
 from pysisyphus.helpers import complete_fragments
-from pysisyphus.io.hdf5 import get_h5_group, resize_h5_group
+from pysisyphus.io.hdf5 import H5Writer
 
 
 def get_data_model(atoms, max_cycles):
@@ -32,16 +33,7 @@ def get_data_model(atoms, max_cycles):
     return data_model
 
 
-def afir_closure(fragment_indices, cov_radii, gamma, rho=1, p=6):
-    """rho=1 pushes fragments together, rho=-1 pulls fragments apart."""
-
-    # See https://onlinelibrary.wiley.com/doi/full/10.1002/qua.24757
-    # Eq. (9) for extension to 3 fragments.
-    assert len(fragment_indices) == 2
-
-    inds = np.array(list(it.product(*fragment_indices)))
-    cov_rad_sums = cov_radii[inds].sum(axis=1)
-
+def get_alpha(gamma):
     # 3.8164 Angstrom in Bohr
     R0 = 7.21195
     # 1.0061 kJ/mol to Hartree
@@ -49,43 +41,227 @@ def afir_closure(fragment_indices, cov_radii, gamma, rho=1, p=6):
 
     # Avoid division by zero for gamma = 0.
     if gamma == 0.:
-        alpha = 0.
-    else:
-        alpha = gamma / ((2**(-1/6) - (1 + (1 + gamma/epsilon)**0.5)**(-1/6)) * R0)
-    
+        return 0.
+    return gamma / ((2**(-1/6) - (1 + (1 + gamma/epsilon)**0.5)**(-1/6)) * R0)
+
+
+def afir_closure(fragment_indices, cov_radii, gamma, rho=1, p=6):
+    """rho=1 pushes fragments together, rho=-1 pulls fragments apart.
+
+    Differentiable with autograd. Kept as reference for analytic_afir_closure().
+    """
+
+    # See https://onlinelibrary.wiley.com/doi/full/10.1002/qua.24757
+    # Eq. (9) for extension to 3 fragments.
+    frag_pairs = list(it.combinations(fragment_indices, 2))
+    inds = [np.array(list(it.product(*frag_pair))) for frag_pair in frag_pairs]
+    cov_rad_sums = [cov_radii[inds_].sum(axis=1) for inds_ in inds]
+    alpha = get_alpha(gamma)
+
     def afir_func(coords3d):
-        diffs = anp.diff(coords3d[inds], axis=1).reshape(-1, 3)
-        rs = anp.linalg.norm(diffs, axis=1)
+        f = 0.
+        for inds_, cov_rad_sums_ in zip(inds, cov_rad_sums):
+            diffs = anp.diff(coords3d[inds_], axis=1).reshape(-1, 3)
+            rs = anp.linalg.norm(diffs, axis=1)
 
-        omegas = (cov_rad_sums / rs)**p
+            omegas = (cov_rad_sums_ / rs)**p
 
-        f = alpha * rho * (omegas*rs).sum() / omegas.sum()
+            f = f + alpha * rho * (omegas*rs).sum() / omegas.sum()
         return f
     return afir_func
 
 
+def weighted_distance(rs, cov_rad_sums, p):
+    """Weighted mean distance of atom pairs and its derivatives.
+
+    Parameters
+    ----------
+    rs : np.array
+        Distances of all atom pairs.
+    cov_rad_sums : np.array
+        Sums of the covalent radii of all atom pairs, same shape as rs.
+    p : int
+        Exponent of the weights omega = ((R_i + R_j) / r_ij)**p.
+
+    Returns
+    -------
+    mean : float
+        sum(omega*r) / sum(omega)
+    weights : np.array
+        (d mean / d r) / r for all pairs, so the gradient w.r.t. the
+        distance vector r_i - r_j of a pair is weight * (r_i - r_j).
+    """
+    ratios = cov_rad_sums / rs
+    # Integer powers by repeated multiplication are much faster than np.power.
+    if float(p).is_integer() and p > 0:
+        omegas = ratios.copy()
+        for _ in range(int(p) - 1):
+            omegas *= ratios
+    else:
+        omegas = ratios**p
+    omega_sum = omegas.sum()
+    mean = (omegas * rs).sum() / omega_sum
+    # d omega / dr = -p omega / r
+    dmean_dr = omegas * ((1 - p) + p * mean / rs) / omega_sum
+    return mean, dmean_dr / rs
+
+
+def switching_function(rs, cutoff, width):
+    """Quintic switching function and its derivative.
+
+    Goes from 1 at cutoff - width to 0 at cutoff with continuous first and
+    second derivatives.
+    """
+    x = np.clip((rs - (cutoff - width)) / width, 0., 1.)
+    switch = 1 - x**3 * (10 - 15*x + 6*x**2)
+    dswitch_dr = -30 * x**2 * (1 - x)**2 / width
+    return switch, dswitch_dr
+
+
+def switched_weighted_distance(rs, cov_rad_sums, p, cutoff, width, anchor_weight):
+    """Weighted mean distance of the atom pairs within a cutoff.
+
+    The weights are multiplied by a switching function, so pairs enter and
+    leave smoothly. An anchor at distance cutoff with constant weight keeps
+    the mean continuous when the last pair leaves; without any pair the mean
+    is cutoff.
+
+    Returns
+    -------
+    mean : float
+        Switched weighted mean distance.
+    weights : np.array
+        (d mean / d r) / r for all pairs, see weighted_distance().
+    """
+    switch, dswitch_dr = switching_function(rs, cutoff, width)
+    omegas = (cov_rad_sums / rs)**p
+    somegas = switch * omegas
+    denom = somegas.sum() + anchor_weight
+    mean = ((somegas * rs).sum() + anchor_weight * cutoff) / denom
+    # d (s omega) / dr = s' omega - p s omega / r
+    dsomegas_dr = dswitch_dr * omegas - p * somegas / rs
+    dmean_dr = (dsomegas_dr * (rs - mean) + somegas) / denom
+    return mean, dmean_dr / rs
+
+
+def analytic_afir_closure(fragment_indices, cov_radii, gamma, rho=1, p=6,
+                          cutoff=None, switch_width=2.):
+    """Closed-form AFIR energy and gradient.
+
+    For more than two fragments the weighted mean distances of all pairs of
+    fragments are summed, see Eq. (9) in
+    https://onlinelibrary.wiley.com/doi/full/10.1002/qua.24757
+
+    Parameters
+    ----------
+    fragment_indices : iterable of iterables of int
+        Atom indices of at least two disjoint fragments.
+    cov_radii : np.array
+        Covalent radii of all atoms in Bohr.
+    gamma : float
+        Collision energy parameter in Hartree.
+    rho : int, 1 or -1
+        1 pushes fragments together, -1 pulls fragments apart.
+    p : int
+        Exponent of the distance weights.
+    cutoff : float, optional
+        Only atom pairs closer than cutoff (in Bohr) contribute. Opt-in
+        approximation, that is not exact: the many distant pairs of large
+        fragments still shift the weighted mean distance noticeably. Pair
+        weights are switched off smoothly between cutoff - switch_width and
+        cutoff, and an anchor pair at distance cutoff with the weight of the
+        smallest covalent radius sum keeps energy and gradient continuous
+        when fragments separate. Fragments without any atom pair within
+        cutoff feel no artificial force. By default all atom pairs are
+        considered exactly.
+    switch_width : float
+        Width of the switching region in Bohr.
+
+    Returns
+    -------
+    afir_func : callable
+        Takes coords3d and returns the AFIR energy and its gradient
+        of shape (N, 3).
+    """
+    fragment_indices = [np.array(frag, dtype=int) for frag in fragment_indices]
+    assert len(fragment_indices) >= 2
+    frag_pairs = list(it.combinations(fragment_indices, 2))
+    cov_rad_sums = [
+        cov_radii[frag_a][:, None] + cov_radii[frag_b][None, :]
+        for frag_a, frag_b in frag_pairs
+    ]
+    if cutoff is not None:
+        assert 0 < switch_width <= cutoff
+        anchor_weights = [(crs.min() / cutoff)**p for crs in cov_rad_sums]
+    prefactor = get_alpha(gamma) * rho
+
+    def afir_func(coords3d):
+        energy = 0.
+        gradient = np.zeros_like(coords3d)
+        for i, ((frag_a, frag_b), cov_rad_sums_) in enumerate(
+            zip(frag_pairs, cov_rad_sums)
+        ):
+            c3d_a = coords3d[frag_a]
+            c3d_b = coords3d[frag_b]
+            if cutoff is not None:
+                pairs = cKDTree(c3d_a).sparse_distance_matrix(
+                    cKDTree(c3d_b), cutoff, output_type="ndarray"
+                )
+                inds_a, inds_b = pairs["i"], pairs["j"]
+                mean, weights = switched_weighted_distance(
+                    pairs["v"], cov_rad_sums_[inds_a, inds_b], p, cutoff,
+                    switch_width, anchor_weights[i]
+                )
+                grad = weights[:, None] * (c3d_a[inds_a] - c3d_b[inds_b])
+                np.add.at(gradient, frag_a[inds_a], grad)
+                np.add.at(gradient, frag_b[inds_b], -grad)
+            # All atom pairs. The (A, B, 3) array of distance vectors is never
+            # formed, as sum_j w_ij (r_i - r_j) = r_i sum_j w_ij - sum_j w_ij r_j.
+            else:
+                mean, weights = weighted_distance(cdist(c3d_a, c3d_b),
+                                                  cov_rad_sums_, p)
+                gradient[frag_a] += (weights.sum(axis=1)[:, None] * c3d_a
+                                     - weights @ c3d_b)
+                gradient[frag_b] += (weights.sum(axis=0)[:, None] * c3d_b
+                                     - weights.T @ c3d_a)
+            energy += mean
+        return prefactor * energy, prefactor * gradient
+    return afir_func
+
+
 class AFIR(Calculator):
 
     def __init__(self, calculator, fragment_indices, gamma, rho=1, p=6,
-                 dump=True, h5_fn="afir.h5", h5_group_name="afir", **kwargs):
+                 cutoff=None, dump=True, h5_fn="afir.h5", h5_group_name="afir",
+                 **kwargs):
+        """
+        fragment_indices: list of lists of int
+            Atom indices of the fragments. Atoms not belonging to any fragment
+            are gathered in an additional fragment. With more than two
+            fragments the artificial force acts between all pairs of them.
+        cutoff: float, optional
+            Only atom pairs closer than cutoff (in Bohr) contribute to the
+            artificial force. This is an approximation and fragments further
+            apart than cutoff feel no force. See analytic_afir_closure().
+        """
         super().__init__(**kwargs)
 
         self.calculator = calculator
         self.fragment_indices = fragment_indices
-        assert len(self.fragment_indices) in (1, 2)
+        assert len(self.fragment_indices) >= 1
         # gamma is expected to be given in kJ/mol. convert it to au.
         self.gamma = gamma / AU2KJPERMOL
         assert self.gamma > 0
         self.rho = int(rho)
         assert self.rho in (-1, 1)
         self.p = p
+        self.cutoff = cutoff
         self.dump = dump
         self.h5_fn = h5_fn
         self.h5_group_name = h5_group_name
-        # We can initialize the HDF5 group as we don't know the shape of
+        # We can't initialize the HDF5 group as we don't know the shape of
         # atoms/coords yet. So we wait until after the first calculation.
-        self.h5_group = None
-        self.h5_cycles = 50
+        self.h5_writer = None
 
         rho_verbose = { 1: ("pushing", "together"),
                        -1: ("pulling", "apart")
@@ -96,31 +272,22 @@ class AFIR(Calculator):
         self.atoms = None
         self.calc_counter = 0
 
-    def init_h5_group(self, atoms, max_cycles=None):
-        if max_cycles is None:
-            max_cycles = self.h5_cycles
-        self.data_model = get_data_model(atoms, max_cycles)
-        self.h5_group = get_h5_group(self.h5_fn, self.h5_group_name, self.data_model,
-                                     reset=True)
+    def init_h5_writer(self, atoms):
+        # Datasets grow as needed, so max_cycles is irrelevant
+        self.data_model = get_data_model(atoms, max_cycles=0)
+        self.h5_writer = H5Writer(self.h5_fn, self.h5_group_name, self.data_model,
+                                  reset=True)
 
     def dump_h5(self, atoms, coords, results):
         # Initialize if not done yet
-        if self.h5_group is None:
-            self.init_h5_group(atoms)
+        if self.h5_writer is None:
+            self.init_h5_writer(atoms)
             # Write atoms once
-            self.h5_group.attrs["atoms"] = atoms
-
-        # Check if HDF5 datasets have to be resized
-        cur_max_cycles = self.h5_group["cart_coords"].shape[0]
-        need_resize = self.calc_counter > cur_max_cycles - 5
-        if need_resize:
-            new_max_cycles = cur_max_cycles + self.h5_cycles
-            resize_h5_group(self.h5_group, max_cycles=new_max_cycles)
+            self.h5_writer.set_attrs(atoms=atoms)
 
-        for k, v in results.items():
-            self.h5_group[k][self.calc_counter] = v
-        self.h5_group["cart_coords"][self.calc_counter] = coords
-        self.h5_group.attrs["cur_cycle"] = self.calc_counter
+        row = {"cart_coords": coords, **results}
+        self.h5_writer.add_row(self.calc_counter, row)
+        self.h5_writer.set_attrs(cur_cycle=self.calc_counter)
 
     def log_fragments(self):
         self.log(f"Using {len(self.fragment_indices)} fragments")
@@ -162,20 +329,19 @@ class AFIR(Calculator):
         self.write_fragment_geoms(atoms, coords)
         self.cov_radii = np.array([COVALENT_RADII[atom.lower()] for atom in atoms]) 
         self.log("Set covalent radii")
-        self.afir_func = afir_closure(self.fragment_indices,
-                                      self.cov_radii,
-                                      self.gamma,
-                                      rho=self.rho,
-                                      p=self.p)
+        self.afir_func = analytic_afir_closure(self.fragment_indices,
+                                               self.cov_radii,
+                                               self.gamma,
+                                               rho=self.rho,
+                                               p=self.p,
+                                               cutoff=self.cutoff)
         self.log("Created and set AFIR function.")
-        self.afir_grad_func = autograd.grad(self.afir_func)
-        self.log("Created and set AFIR gradient function.")
 
     def get_energy(self, atoms, coords):
         self.set_atoms_and_funcs(atoms, coords)
 
         true_energy = self.calculator.get_energy(atoms, coords)["energy"]
-        afir_energy = self.afir_func(coords.reshape(-1, 3))
+        afir_energy, _ = self.afir_func(coords.reshape(-1, 3))
         self.log()
 
         results = {
@@ -195,8 +361,8 @@ class AFIR(Calculator):
         true_energy = results["energy"]
         true_forces = results["forces"]
 
-        afir_energy = self.afir_func(coords3d)
-        afir_forces = -self.afir_grad_func(coords3d).flatten()
+        afir_energy, afir_gradient = self.afir_func(coords3d)
+        afir_forces = -afir_gradient.flatten()
 
         true_norm = np.linalg.norm(true_forces)
         afir_norm = np.linalg.norm(afir_forces)
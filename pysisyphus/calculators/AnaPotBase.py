@@ -68,6 +68,37 @@ class AnaPotBase(Calculator):
         results["forces"] = forces
         return results
 
+    def get_forces_batch(self, atoms, coords, indices=None):
+        """Energies and forces at several points in one call.
+
+        Parameters
+        ----------
+        atoms : iterable
+            Atom descriptors.
+        coords : np.array, shape (K, 3)
+            Coordinates of K points.
+        indices : iterable of int, optional
+            Not used, as all points are evaluated on the same potential.
+
+        Returns
+        -------
+        results : list of dict
+            Energy and forces at every point.
+        """
+        coords = np.asarray(coords).reshape(-1, 3)
+        self.energy_calcs += len(coords)
+        self.forces_calcs += len(coords)
+        x, y, _ = coords.T
+        # Constant expressions are returned as scalars by the lambdified functions
+        energies = np.broadcast_to(self.V(x, y), x.shape)
+        forces = np.zeros_like(coords)
+        forces[:, 0] = -self.dVdx(x, y)
+        forces[:, 1] = -self.dVdy(x, y)
+        return [
+            {"energy": energy, "forces": forces_}
+            for energy, forces_ in zip(energies, forces)
+        ]
+
     def get_hessian(self, atoms, coords):
         self.hessian_calcs += 1
         x, y, z = coords
@@ -1,3 +1,4 @@
+from fnmatch import fnmatch
 import logging
 import os
 from pathlib import Path
@@ -9,8 +10,10 @@ import tempfile
 
 from natsort import natsorted
 
+from pysisyphus.calculators.ResultCache import get_result_cache
 from pysisyphus.config import Config
 from pysisyphus.constants import BOHR2ANG
+from pysisyphus.finite_diffs import finite_difference_hessian
 
 
 class Calculator:
@@ -19,7 +22,8 @@ class Calculator:
 
     def __init__(self, calc_number=0, charge=0, mult=1,
                  base_name="calculator", pal=1,
-                 last_calc_cycle=None, clean_after=True, out_dir="./"):
+                 last_calc_cycle=None, clean_after=True, out_dir="./",
+                 keep_scratch=False, cache=None, num_hess=None):
         """Base-class of all calculators.
 
         Meant to be extended.
@@ -45,6 +49,23 @@ class Calculator:
             Delete the temporary directory after calculations.
         out_dir : str
             Path that is prepended to generated filenames.
+        keep_scratch : bool
+            Run all calculations in one long-lived scratch directory instead
+            of creating a new temporary directory for every calculation.
+            Restart files (e.g. xtbrestart) of the previous calculation
+            are then still present and can be picked up. The directory is
+            only deleted by ``self.clean_scratch()``.
+        cache : bool or dict, optional
+            Reuse results of previous calculations at the same geometry. When
+            True, an in-memory LRU cache is used. A dict is passed as keyword
+            arguments to ``get_result_cache``, e.g. {"cache_dir": "cache"} to
+            also store results on disk, so they are available in later runs.
+            Calculators sharing a cache_dir share one cache.
+        num_hess : bool or dict, optional
+            Calculate Hessians by finite differences of gradients, even when
+            the calculator provides analytical Hessians. A dict is passed as
+            keyword arguments to ``finite_difference_hessian``, e.g.
+            {"executor": "process", "max_workers": 4, "skip_trans": True}.
         """
 
         self.calc_number = calc_number
@@ -61,6 +82,9 @@ class Calculator:
         # Extensions of the files to keep after running a calculation.
         # Usually overridden in derived classes.
         self.to_keep = ()
+        # Globs of restart files that are kept in a reused scratch directory.
+        # All other files are deleted before the next calculation.
+        self.scratch_restart = ()
         # How many calculations were already run
         self.calc_counter = 0
         # Handle restarts
@@ -69,6 +93,14 @@ class Calculator:
             self.reattach(int(last_calc_cycle))
             self.log(f"Set {self.calc_counter} for this calculation")
         self.clean_after = clean_after
+        self.keep_scratch = keep_scratch
+        self.scratch_path = None
+        if cache is True:
+            cache = dict()
+        self.result_cache = get_result_cache(**cache) if isinstance(cache, dict) else None
+        if num_hess is True:
+            num_hess = dict()
+        self.num_hess = num_hess if isinstance(num_hess, dict) else None
 
         self.inp_fn = "calc.inp"
         self.out_fn = "calc.out"
@@ -116,9 +148,29 @@ class Calculator:
         raise Exception("Not implemented!")
 
     def get_hessian(self, atoms, coords):
-        """Meant to be extended."""
+        """Meant to be extended.
+
+        Numerical Hessians are only calculated when num_hess is set, see
+        get_num_hessian()."""
         raise Exception("Not implemented!")
 
+    def get_num_hessian(self, atoms, coords):
+        """Hessian from central differences of gradients.
+
+        Displaced gradients are calculated concurrently and stored in
+        '[name]_num_hess.h5' in out_dir, so an interrupted calculation
+        continues where it stopped.
+        """
+        kwargs = {
+            "h5_fn": self.out_dir / f"{self.name}_num_hess.h5",
+        }
+        if isinstance(self.num_hess, dict):
+            kwargs.update(self.num_hess)
+        self.log("Calculating numerical Hessian")
+        results = finite_difference_hessian(self, atoms, coords, **kwargs)
+        self.calc_counter += 1
+        return results
+
     def make_fn(self, name, counter=None, return_str=False):
         """Make a full filename.
 
@@ -165,8 +217,14 @@ class Calculator:
                 Prepared directory.
         """
         
-        prefix = f"{self.name}_{self.calc_counter:03d}_"
-        path = Path(tempfile.mkdtemp(prefix=prefix))
+        if self.keep_scratch and self.scratch_path and self.scratch_path.exists():
+            path = self.scratch_path
+            self.clear_scratch(path)
+        else:
+            prefix = f"{self.name}_{self.calc_counter:03d}_"
+            path = Path(tempfile.mkdtemp(prefix=prefix))
+        if self.keep_scratch:
+            self.scratch_path = path
         if use_in_run:
             self.path_already_prepared = path
         return path
@@ -475,9 +533,35 @@ class Calculator:
         path : Path
             Directory to delete.
         """
+        if self.keep_scratch and (path == self.scratch_path):
+            self.log(f"Kept scratch directory {path}")
+            return
         shutil.rmtree(path)
         self.log(f"Cleaned {path}")
 
+    def clear_scratch(self, path):
+        """Delete everything but restart files from a reused scratch directory.
+
+        Parameters
+        ----------
+        path : Path
+            Scratch directory.
+        """
+        for fn in path.iterdir():
+            if any([fnmatch(fn.name, pat) for pat in self.scratch_restart]):
+                continue
+            if fn.is_dir():
+                shutil.rmtree(fn)
+            else:
+                fn.unlink()
+
+    def clean_scratch(self):
+        """Delete the long-lived scratch directory, if present."""
+        if self.scratch_path and self.scratch_path.exists():
+            shutil.rmtree(self.scratch_path)
+            self.log(f"Cleaned scratch directory {self.scratch_path}")
+        self.scratch_path = None
+
     def get_restart_info(self):
         """Return a dict containing chkfiles.
 
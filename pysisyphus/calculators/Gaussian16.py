@@ -16,6 +16,9 @@ from pysisyphus.constants import AU2EV, BOHR2ANG
 class Gaussian16(OverlapCalculator):
 
     conf_key = "gaussian16"
+    cache_ignore = OverlapCalculator.cache_ignore + (
+        "chk", "fchk", "dump_635r", "nmos", "roots",
+    )
 
     def __init__(self, route, mem=3500, gbs="", gen="",
                  keep_chk=False, stable="", fchk=None, **kwargs):
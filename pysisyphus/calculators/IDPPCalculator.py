@@ -1,49 +1,171 @@
+# [1] http://aip.scitation.org/doi/full/10.1063/1.4878664
+#     Smidstrup, 2014, Improved initial guess for minimum energy path calculations
+
+
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
+from scipy.sparse import csr_matrix
 
 from pysisyphus.calculators.Calculator import Calculator
 
 
-class IDPPCalculator(Calculator):
+def get_pair_inds(atom_num, pair_mask=None):
+    """Atom indices of all pairs, in the order used by scipy's pdist.
 
-    def __init__(self, target): 
-        self.target = squareform(target)
+    Parameters
+    ----------
+    atom_num : int
+        Number of atoms.
+    pair_mask : np.array of bool, shape (N*(N-1)/2, ), optional
+        Only keep pairs where pair_mask is True.
 
-        super().__init__(base_name="idpp")
+    Returns
+    -------
+    pair_inds : np.array of int, shape (2, P)
+        First and second atom of every pair.
+    """
+    pair_inds = np.array(np.triu_indices(atom_num, k=1))
+    if pair_mask is not None:
+        pair_inds = pair_inds[:, pair_mask]
+    return pair_inds
 
-    def get_forces(self, atoms, coords):
-        coords_reshaped = coords.reshape((-1, 3))
 
-        D = []
-        for c in coords_reshaped:
-            Di = coords_reshaped - c
-            D.append(Di)
-        D = np.array(D)
+def get_incidence(atom_num, pair_inds):
+    """Sparse (N, P) matrix with +1 (-1) for the first (second) atom of a pair.
+
+    Multiplying it with per-pair gradients accumulates them on the atoms.
+    """
+    pair_num = pair_inds.shape[1]
+    rows = pair_inds.flatten()
+    cols = np.tile(np.arange(pair_num), 2)
+    data = np.repeat((1.0, -1.0), pair_num)
+    return csr_matrix((data, (rows, cols)), shape=(atom_num, pair_num))
+
+
+def idpp_energy_and_forces(coords3d, target, pair_inds, incidence=None):
+    """IDPP energy and forces for one or several images.
+
+    E = Σ_p (r_p - t_p)² / r_p⁴, with the current and target distances
+    r_p and t_p of all pairs p.
+
+    Parameters
+    ----------
+    coords3d : np.array, shape (N, 3) or (K, N, 3)
+        Cartesian coordinates of one or K images.
+    target : np.array, shape (P, ) or (K, P)
+        Target distances of the pairs.
+    pair_inds : np.array of int, shape (2, P)
+        Atom indices of the pairs.
+    incidence : scipy.sparse matrix, shape (N, P), optional
+        See get_incidence(). Created if omitted.
+
+    Returns
+    -------
+    energy : float or np.array, shape (K, )
+        IDPP energies.
+    forces : np.array, shape (3N, ) or (K, 3N)
+        IDPP forces.
+    """
+    coords3d = np.asarray(coords3d)
+    batched = coords3d.ndim == 3
+    if not batched:
+        coords3d = coords3d[None, :]
+        target = np.asarray(target)[None, :]
+    image_num, atom_num, _ = coords3d.shape
+    if incidence is None:
+        incidence = get_incidence(atom_num, pair_inds)
 
-        curr_pdist = pdist(coords_reshaped)
-        curr_square = squareform(curr_pdist)
-        curr_diff = curr_square - self.target
+    first, second = pair_inds
+    # Pairs first, so the pair gradients can be summed up without copying,
+    # (N, K, 3) -> (P, K, 3)
+    coords_t = coords3d.transpose(1, 0, 2)
+    vecs = coords_t[first] - coords_t[second]
+    r = np.sqrt(np.einsum("pki,pki->pk", vecs, vecs))
+    inv_r = 1 / r
+    inv_r4 = np.square(np.square(inv_r))
+    dr = r - np.asarray(target).T
+    # The bigger the differences to the target distances, the bigger the
+    # energy. The smaller the current distances, the bigger the energy.
+    energy = (np.square(dr) * inv_r4).sum(axis=0)
+    # dE/dr divided by r, so multiplying with the pair vectors yields the
+    # gradient w.r.t. the first atom of each pair.
+    dE_dr_r = 2 * dr * (1 - 2 * dr * inv_r) * inv_r4 * inv_r
+    pair_grads = dE_dr_r[:, :, None] * vecs
+    # (P, K*3) -> (N, K*3)
+    grads = incidence.dot(pair_grads.reshape(len(r), -1))
+    forces = -grads.reshape(atom_num, image_num, 3).transpose(1, 0, 2)
+    forces = forces.reshape(image_num, -1)
+    if not batched:
+        return energy[0], forces[0]
+    return energy, forces
 
-        curr_square = curr_square + np.eye(curr_square.shape[0])
 
-        # The bigger the differences 'curr_diff', the bigger the energy.
-        # The smaller the current distances 'current_pdist', the bigger
-        # the energy.
-        energy = 0.5 * (curr_diff**2 / curr_square**4).sum()
+class IDPPCalculator(Calculator):
+    """Image dependent pair potential, see [1].
+
+    Only the condensed distances of the considered pairs are formed. With
+    a 2d target the calculator holds the targets of all images of a chain
+    of states and can calculate them at once via get_forces_batch().
+    """
+
+    def __init__(self, target, pair_inds=None):
+        """
+        Parameters
+        ----------
+        target : np.array, shape (P, ) or (K, P)
+            Condensed target distances of one or K images, as from pdist.
+        pair_inds : np.array of int, shape (2, P), optional
+            Atom indices of the pairs. All pairs, as from pdist, when omitted.
+        """
+        self.target = np.asarray(target)
+        self.pair_inds = pair_inds
+        self._incidence = None
 
-        # Adapted from ASE IDPP calculator
-        # https://gitlab.com/ase/ase/blob/master/ase/neb.py, GPL2
-        forces = -2 * ((curr_diff *
-                       (1 - 2 * curr_diff / curr_square) /
-                        curr_square**5)[...,np.newaxis] * D).sum(0)
+        super().__init__(base_name="idpp")
+
+    def prepare_pairs(self, atom_num):
+        if self.pair_inds is None:
+            self.pair_inds = get_pair_inds(atom_num)
+        if self._incidence is None:
+            self._incidence = get_incidence(atom_num, self.pair_inds)
 
+    def get_forces(self, atoms, coords):
+        assert self.target.ndim == 1, "Use get_forces_batch() with 2d targets!"
+        self.prepare_pairs(len(atoms))
+        energy, forces = idpp_energy_and_forces(
+            coords.reshape(-1, 3), self.target, self.pair_inds, self._incidence
+        )
         results = {
-            "energy" : energy,
-            "forces": forces.flatten()
+            "energy": energy,
+            "forces": forces,
         }
         return results
 
-    def __str__(self):
-        return "IDPP calculator"
+    def get_forces_batch(self, atoms, coords, indices):
+        """Energies and forces of several images in one call.
+
+        Parameters
+        ----------
+        atoms : iterable
+            Atom descriptors.
+        coords : np.array, shape (K, 3N)
+            Cartesian coordinates of K images.
+        indices : iterable of int
+            Image indices, selecting the rows of the 2d target.
 
+        Returns
+        -------
+        results : list of dict
+            Energy and forces of every image.
+        """
+        self.prepare_pairs(len(atoms))
+        coords3d = np.asarray(coords).reshape(len(indices), -1, 3)
+        energies, forces = idpp_energy_and_forces(
+            coords3d, self.target[list(indices)], self.pair_inds, self._incidence
+        )
+        return [
+            {"energy": energy, "forces": forces_}
+            for energy, forces_ in zip(energies, forces)
+        ]
 
+    def __str__(self):
+        return "IDPP calculator"
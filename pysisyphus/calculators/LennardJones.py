@@ -1,14 +1,18 @@
 import numpy as np
 
 from pysisyphus.calculators.Calculator import Calculator
+from pysisyphus.calculators.NeighborList import NeighborList, scatter_pair_gradient
 
 
 class LennardJones(Calculator):
 
+    # Runtime state, that doesn't change the results
+    cache_ignore = ("neighbors", )
+
     # Corresponds to σ = 1 Å, as the default value in ASE, but
     # pysisyphus uses au/Bohr.
-    def __init__(self, sigma=1.8897261251, epsilon=1, rc=None):
-        super().__init__()
+    def __init__(self, sigma=1.8897261251, epsilon=1, rc=None, skin=None, **kwargs):
+        super().__init__(**kwargs)
 
         self.sigma = sigma
         self.epsilon = epsilon
@@ -20,16 +24,25 @@ class LennardJones(Calculator):
         self.e0 = (4 * self.epsilon *
                    ((self.sigma/self.rc)**12 - (self.sigma/self.rc)**6)
         )
+        # Verlet neighbor list, only rebuilt after atoms moved more than skin/2
+        if skin is None:
+            skin = 0.1 * self.rc
+        self.skin = skin
+        self.neighbors = NeighborList(cutoff=self.rc, skin=self.skin)
 
     def calculate(self, coords3d):
-        # Index pairs
-        a, b = np.triu_indices(len(coords3d), 1)
+        # Candidate pairs from the neighbor list
+        a, b = self.neighbors.update(coords3d).T
 
         # Distances
-        diffs = coords3d[a] - coords3d[b]  # Shape: (N_atoms, 3)
+        diffs = coords3d[a] - coords3d[b]  # Shape: (N_pairs, 3)
         rs = np.linalg.norm(diffs, axis=1)
-        c6 = np.where(rs <= self.rc, (self.sigma/rs)**6, np.zeros_like(rs))
-        energy = -self.e0 * (c6 != 0.0).sum()
+        # Drop pairs in the skin, beyond the cutoff
+        within = rs <= self.rc
+        a, b, diffs, rs = a[within], b[within], diffs[within], rs[within]
+
+        c6 = (self.sigma/rs)**6
+        energy = -self.e0 * rs.size
         c12 = c6**2
         energy += np.sum(4*self.epsilon * (c12 - c6))
 
@@ -61,11 +74,8 @@ class LennardJones(Calculator):
         prefactors = 24*self.epsilon * (c6 - 2*c12) / rs**2
         products = prefactors[:,None] * diffs
 
-        gradient = np.zeros_like(coords3d)
         # Every pair (a, b) contributes to the total gradient of atoms a and b.
-        for i, prod in enumerate(products):
-            gradient[a[i]] += prod
-            gradient[b[i]] -= prod
+        gradient = scatter_pair_gradient(products, a, b, len(coords3d))
 
         return energy, -gradient
 
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def scatter_pair_gradient(products, a, b, atom_num):
+    """Accumulate pair contributions into a per-atom gradient.
+
+    Every pair (a[i], b[i]) contributes +products[i] to atom a[i] and
+    -products[i] to atom b[i].
+
+    Parameters
+    ----------
+    products : np.array, shape (M, 3)
+        Pair gradient contributions.
+    a, b : np.array, shape (M, )
+        Atom indices of the pairs.
+    atom_num : int
+        Number of atoms.
+
+    Returns
+    -------
+    gradient : np.array, shape (atom_num, 3)
+        Accumulated gradient.
+    """
+    gradient = np.zeros((atom_num, 3))
+    for k in range(3):
+        gradient[:, k] = np.bincount(
+            a, weights=products[:, k], minlength=atom_num
+        ) - np.bincount(b, weights=products[:, k], minlength=atom_num)
+    return gradient
+
+
+class NeighborList:
+    """Verlet neighbor list with a skin.
+
+    All pairs within (cutoff + skin) are stored. The list is only rebuilt when
+    an atom moved more than skin/2 since the last build, so no pair closer than
+    the cutoff can be missing. When cutoff is None all pairs are returned.
+    """
+
+    def __init__(self, cutoff=None, skin=0.0):
+        self.cutoff = cutoff
+        self.skin = skin
+
+        self.pairs = None
+        self.ref_coords3d = None
+        self.builds = 0
+
+    @property
+    def list_cutoff(self):
+        return self.cutoff + self.skin
+
+    def needs_rebuild(self, coords3d):
+        if (self.ref_coords3d is None) or (
+            self.ref_coords3d.shape != coords3d.shape
+        ):
+            return True
+        if self.cutoff is None:
+            return False
+        max_displacement = np.linalg.norm(coords3d - self.ref_coords3d, axis=1).max()
+        return max_displacement > self.skin / 2
+
+    def build(self, coords3d):
+        if self.cutoff is None:
+            pairs = np.stack(np.triu_indices(len(coords3d), 1), axis=1)
+        else:
+            tree = cKDTree(coords3d)
+            pairs = tree.query_pairs(self.list_cutoff, output_type="ndarray")
+            # Keep the order of np.triu_indices
+            pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        self.pairs = pairs.astype(int).reshape(-1, 2)
+        self.ref_coords3d = coords3d.copy()
+        self.builds += 1
+
+    def update(self, coords3d):
+        """Return pair indices, rebuilding the list only when required.
+
+        Parameters
+        ----------
+        coords3d : np.array, shape (N, 3)
+            Cartesian coordinates.
+
+        Returns
+        -------
+        pairs : np.array, shape (M, 2)
+            Candidate pairs (i, j) with i < j.
+        """
+        coords3d = np.reshape(coords3d, (-1, 3))
+        if self.needs_rebuild(coords3d):
+            self.build(coords3d)
+        return self.pairs
@@ -25,9 +25,11 @@ import logging
 from collections import namedtuple
 
 import numpy as np
+from scipy import sparse
 
 from pysisyphus.calculators import Gaussian16, OpenMolcas, ORCA, Psi4, Turbomole, XTB
 from pysisyphus.calculators.Calculator import Calculator
+from pysisyphus.executors import map_as_completed
 from pysisyphus.Geometry import Geometry
 from pysisyphus.elem_data import COVALENT_RADII as CR
 from pysisyphus.intcoords.setup import get_bond_sets
@@ -101,6 +103,17 @@ def cap_fragment(atoms, coords, fragment, link_atom="H", g=0.709):
     return atom_map, links
 
 
+def run_calc_task(task):
+    """Module level function, so it can be pickled for process pools.
+
+    The calculator is returned together with the results, as process pools
+    only update the state of a copy, e.g. calc_counter or chkfiles.
+    """
+    calc, method, args = task
+    results = getattr(calc, method)(*args)
+    return calc, results
+
+
 def atom_inds_to_cart_inds(atom_inds):
     stencil = np.array((0, 1, 2), dtype=int)
     size_ = len(atom_inds)
@@ -138,8 +151,15 @@ class Model():
     def create_links(self, atoms, coords, debug=False):
         self.capped = True
 
+        links = list()
         if self.use_link_atoms and self.parent_name is not None:
-            _, self.links = cap_fragment(atoms, coords, self.atom_inds)
+            _, links = cap_fragment(atoms, coords, self.atom_inds)
+        # The capping matrix and the Jacobian only depend on the links, so
+        # they are only rebuilt when the connectivity changed.
+        if (self.J is not None) and (links == self.links):
+            self.log("Links didn't change. Reusing capping matrix and jacobian.")
+            return
+        self.links = links
         self.capped_atom_num = len(self.atom_inds) + len(self.links)
         for i, link in enumerate(self.links):
             ind, parent_ind = link.ind, link.parent_ind
@@ -149,172 +169,169 @@ class Model():
         if len(self.links) == 0:
             self.log("Didn't create any link atoms!\n")
 
-        try:
-            self.J = self.get_jacobian()
-        except TypeError:
-            self.log("Skipping definition of jacobian shape")
+        self.capped_atoms = [atoms[i] for i in self.atom_inds] \
+                            + [link.atom for link in self.links]
+        self.C = self.get_capping_matrix(len(atoms))
+        self.J = self.get_jacobian()
 
         if debug:
             catoms, ccoords = self.capped_atoms_coords(atoms, coords)
             geom = Geometry(catoms, ccoords)
             geom.jmol()
 
+    def get_capping_matrix(self, atom_num):
+        """Sparse matrix C that yields the capped coordinates as C @ coords3d.
+
+        Rows of model atoms contain a single 1, rows of link atoms contain
+        (1 - g) and g at the columns of the linked atoms.
+        """
+        model_num = len(self.atom_inds)
+        link_rows = model_num + np.arange(len(self.links))
+        rows = np.concatenate((np.arange(model_num), link_rows, link_rows))
+        cols = np.concatenate((
+            self.atom_inds,
+            [link.ind for link in self.links],
+            [link.parent_ind for link in self.links],
+        )).astype(int)
+        gs = np.array([link.g for link in self.links], dtype=float)
+        data = np.concatenate((np.ones(model_num), 1 - gs, gs))
+        return sparse.csr_matrix((data, (rows, cols)),
+                                 shape=(self.capped_atom_num, atom_num))
+
     def capped_atoms_coords(self, all_atoms, all_coords):
         assert self.capped, "Did you forget to call create_links()?"
 
-        org_atom_num = len(self.atom_inds)
         c3d = all_coords.reshape(-1, 3)
-
-        capped_atoms = [all_atoms[i] for i in self.atom_inds]
-        # Initialize empty coordinate array
-        capped_coords = np.zeros((self.capped_atom_num, 3))
-        # Copy non-capped coordinates
-        capped_coords[:org_atom_num] = c3d[self.atom_inds]
-
-        for i, link in enumerate(self.links):
-            capped_atoms.append(link.atom)
-
-            r1 = c3d[link.ind]
-            r3 = c3d[link.parent_ind]
-            r2 = r1 + link.g*(r3-r1)
-            capped_coords[org_atom_num + i] = r2
-        return capped_atoms, capped_coords
+        capped_coords = self.C @ c3d
+        return list(self.capped_atoms), capped_coords
 
     # def coords(self, atoms, coords):
         # """Wrapper for self.capped_atoms_coords."""
         # return self.capped_atoms_coords(atoms, coords)
 
     def get_jacobian(self):
-        try:
-            # Shape of Jacobian is (model + link, real)
-            jac_shape = (len(self.atom_inds)*3 + len(self.links)*3,
-                         len(self.parent_atom_inds)*3)
-        except TypeError:
-            # Return array instead of 1, because the integer 1 can't be transposed
-            # as we have to do for the hessian calculation.
-            return np.array(1)
-
-        # assert self.parent_atom_inds == list(range(self.parent_atom_inds[0],
-                                                   # self.parent_atom_inds[-1]+1))
-
-        J = np.zeros(jac_shape)
-        # Stencil for diagonal elements of 3x3 submatrix
-        stencil = np.array((0, 1, 2), dtype=int)
-        size_ = len(self.atom_inds)
-
-        model_rows = np.arange(size_ * 3)
+        """Sparse Jacobian of the capped coordinates w.r.t. the parent layer.
+
+        Shape is (model + link, parent). The real model has no parent layer
+        and None is returned.
+        """
+        if self.parent_atom_inds is None:
+            return None
+
         # When more than two layers are present the inner layers aren't directly
         # embedded in the outermost layer. This means parent_inds does not begin
         # at 0, but with a higher index. So we need a map of the actual indices
         # (not starting at 0) to the indices in the Jacobian which start at 0.
-        atom_inds = [self.parent_atom_inds.index(ind) for ind in self.atom_inds]
-        ind_map = {k: v for k, v in zip(self.atom_inds, atom_inds)}
-        model_cols = atom_inds_to_cart_inds(atom_inds)
-        J[model_rows, model_cols] = 1
+        parent_map = {ind: i for i, ind in enumerate(self.parent_atom_inds)}
+        model_num = len(self.atom_inds)
+        rows = list(range(model_num))
+        cols = [parent_map[ind] for ind in self.atom_inds]
+        data = [1.] * model_num
 
         # Link atoms
-        link_start = model_rows.max() + 1
         for i, (ind, parent_ind, atom, g) in enumerate(self.links):
-            rows = link_start + i*3 + stencil
-            cols = ind_map[ind]*3 + stencil
-
-            J[rows, cols] = 1 - g
-            try:
-                parent_cols = self.parent_atom_inds.index(parent_ind)*3 + stencil
-                J[rows, parent_cols] = g
-            # Raised when link atom is not coupled to layer above, but
-            # to a layer higher above.
-            except ValueError:
-                pass
-
-        return J
-
-    def get_energy(self, atoms, coords, point_charges=None,
+            rows.append(model_num + i)
+            cols.append(parent_map[ind])
+            data.append(1 - g)
+            # parent_ind is missing when the link atom is not coupled to the
+            # layer above, but to a layer higher above.
+            if parent_ind in parent_map:
+                rows.append(model_num + i)
+                cols.append(parent_map[parent_ind])
+                data.append(g)
+
+        J = sparse.csr_matrix((data, (rows, cols)),
+                              shape=(self.capped_atom_num, len(self.parent_atom_inds)))
+        # Expand to Cartesian components
+        return sparse.kron(J, sparse.identity(3), format="csr")
+
+    def project_forces(self, forces):
+        """Forces of the capped model in the parent layer."""
+        if self.J is None:
+            return forces
+        return self.J.T @ forces
+
+    def project_hessian(self, hessian):
+        """Hessian of the capped model in the parent layer, J^T H J."""
+        if self.J is None:
+            return hessian
+        return self.J.T @ (self.J.T @ hessian.T).T
+
+    def calc_tasks(self, atoms, coords, method, point_charges=None,
                    parent_correction=True):
-        self.log("Energy calculation")
-        catoms, ccoords = self.capped_atoms_coords(atoms, coords)
+        """Calculations required by method, without running them.
 
-        prepare_kwargs = {
-            "point_charges": point_charges,
-        }
-
-        self.log("Calculation at layer level")
-        results = self.calc.get_energy(catoms, ccoords, prepare_kwargs)
-        energy = results["energy"]
+        Returns
+        -------
+        tasks : list of tuples
+            (calculator, method, args) of the model calculation and of the
+            parent correction, if requested. See run_calc_task().
+        """
+        catoms, ccoords = self.capped_atoms_coords(atoms, coords)
 
+        if method == "get_hessian":
+            if point_charges is not None:
+                raise Exception("point_charges & hessian is not yet implemented")
+            args = (catoms, ccoords)
+        else:
+            prepare_kwargs = {
+                "point_charges": point_charges,
+            }
+            args = (catoms, ccoords, prepare_kwargs)
+
+        tasks = [(self.calc, method, args)]
         # Calculate correction if parent layer is present and it is requested
         if (self.parent_calc is not None) and parent_correction:
-            self.log("Calculation at parent layer level")
-            parent_results= self.parent_calc.get_energy(catoms, ccoords, prepare_kwargs)
-            parent_energy = parent_results["energy"]
-            energy -= parent_energy
+            tasks.append((self.parent_calc, method, args))
         elif not parent_correction:
             self.log("No parent correction!")
+        return tasks
 
-        return energy
+    def combine_results(self, method, results):
+        """Energy, forces or Hessian from the results of calc_tasks()."""
+        energy = results[0]["energy"]
+        if len(results) > 1:
+            energy -= results[1]["energy"]
 
-    def get_forces(self, atoms, coords, point_charges=None,
-                   parent_correction=True):
-        self.log("Force calculation")
-        catoms, ccoords = self.capped_atoms_coords(atoms, coords)
+        if method == "get_energy":
+            return energy
 
-        prepare_kwargs = {
-            "point_charges": point_charges,
-        }
+        key = {"get_forces": "forces", "get_hessian": "hessian"}[method]
+        quantity = results[0][key]
+        if len(results) > 1:
+            quantity = quantity - results[1][key]
 
-        self.log("Calculation at layer level")
-        results = self.calc.get_forces(catoms, ccoords, prepare_kwargs)
-        forces = results["forces"]
-        energy = results["energy"]
-        forces = forces.dot(self.J)
+        if method == "get_forces":
+            return energy, self.project_forces(quantity)
+        return energy, self.project_hessian(quantity)
 
-        # Calculate correction if parent layer is present and it is requested
-        if (self.parent_calc is not None) and parent_correction:
-            self.log("Calculation at parent layer level")
-            parent_results = self.parent_calc.get_forces(catoms, ccoords, prepare_kwargs)
-            parent_forces = parent_results["forces"]
-            parent_energy = parent_results["energy"]
-
-            # Correct energy and forces
-            energy -= parent_energy
-            forces -= parent_forces.dot(self.J)
-        elif not parent_correction:
-            self.log("No parent correction!")
+    def run_method(self, atoms, coords, method, point_charges=None,
+                   parent_correction=True):
+        tasks = self.calc_tasks(atoms, coords, method, point_charges=point_charges,
+                                parent_correction=parent_correction)
+        for i, task in enumerate(tasks):
+            level = "layer" if i == 0 else "parent layer"
+            self.log(f"Calculation at {level} level")
+        results = [run_calc_task(task)[1] for task in tasks]
+        return self.combine_results(method, results)
+
+    def get_energy(self, atoms, coords, point_charges=None,
+                   parent_correction=True):
+        self.log("Energy calculation")
+        return self.run_method(atoms, coords, "get_energy", point_charges,
+                               parent_correction)
 
-        return energy, forces
+    def get_forces(self, atoms, coords, point_charges=None,
+                   parent_correction=True):
+        self.log("Force calculation")
+        return self.run_method(atoms, coords, "get_forces", point_charges,
+                               parent_correction)
 
     def get_hessian(self, atoms, coords, point_charges=None,
                     parent_correction=True):
         self.log("Hessian calculation")
-        catoms, ccoords = self.capped_atoms_coords(atoms, coords)
-
-        # prepare_kwargs = {
-            # "point_charges": point_charges,
-        # }
-        if point_charges is not None:
-            raise Exception("point_charges & hessian is not yet implemented")
-
-        self.log("Calculation at layer level")
-        # results = self.calc.get_hessian(catoms, ccoords, prepare_kwargs)
-        results = self.calc.get_hessian(catoms, ccoords)
-        hessian = results["hessian"]
-        energy = results["energy"]
-        hessian = self.J.T.dot(hessian.dot(self.J))
-
-        # Calculate correction if parent layer is present and it is requested
-        if (self.parent_calc is not None) and parent_correction:
-            self.log("Calculation at parent layer level")
-            parent_results = self.parent_calc.get_hessian(catoms, ccoords)
-            parent_hessian = parent_results["hessian"]
-            parent_energy = parent_results["energy"]
-
-            # Correct energy and hessian
-            energy -= parent_energy
-            hessian -= self.J.T.dot(parent_hessian.dot(self.J))
-        elif not parent_correction:
-            self.log("No parent correction!")
-
-        return energy, hessian
+        return self.run_method(atoms, coords, "get_hessian", point_charges,
+                               parent_correction)
 
     def parse_charges(self):
         charges = self.calc.parse_charges()
@@ -336,13 +353,20 @@ class Model():
 class ONIOM(Calculator):
 
     def __init__(self, calcs, models, geom=None, layers=None, embedding=None,
-                 real_key="real", use_link_atoms=True, *args, **kwargs):
+                 real_key="real", use_link_atoms=True, executor=None,
+                 max_workers=None, *args, **kwargs):
         """
         layer: list of models
             len(layer) == 1: normal ONIOM, len(layer) >= 1: multicenter ONIOM.
         model:
             (sub)set of all atoms that resides in a certain layer and has
             a certain calculator.
+        executor: 'thread' or 'process', optional
+            Run independent model calculations concurrently. Without
+            embedding all calculations are independent, with electronic
+            embedding only the calculations within one layer.
+        max_workers: int, optional
+            Number of concurrent calculations.
         """
 
         super().__init__(*args, **kwargs)
@@ -350,6 +374,13 @@ class ONIOM(Calculator):
         valid_embeddings = (None, "electronic")
         assert embedding in valid_embeddings, f"Valid embeddings are: {valid_embeddings}"
         self.embedding = embedding
+        # Calculators are pickled for process pools. The charges needed for
+        # electronic embedding may depend on in-memory state, e.g. the SCF
+        # object of PySCF, so the calculations have to stay in this process.
+        assert not (embedding == "electronic" and executor == "process"), \
+            "Electronic embedding requires executor='thread'!"
+        self.executor = executor
+        self.max_workers = max_workers
 
         assert real_key not in models, \
             f'"{real_key}" must not be defined in "models"!'
@@ -529,11 +560,16 @@ class ONIOM(Calculator):
 
         all_results = list()
         point_charges = None
+        # Models and their point charges, that are not yet calculated
+        pending = list()
         for i, layer in enumerate(self.layers):
             # Only consider charges that belong to atoms in the parent
             # layer. Otherwise this would result in additonal charges at
             # the same positions as the atoms we would like to calculate.
             if self.embedding == "electronic" and (i > 0):
+                # The charges of the parent layer have to be calculated first
+                all_results.extend(self.run_models(atoms, coords, method, pending))
+                pending = list()
                 parent_layer = self.layers[i-1]
                 assert len(parent_layer) == 1, \
                     "Multicenter ONIOM in intermediate layer is not supported!"
@@ -557,13 +593,54 @@ class ONIOM(Calculator):
                 )
                 self.log(f"sum(charges)={ee_charge_sum:.4f}")
 
-            results = [getattr(model, method)(atoms, coords, point_charges=point_charges)
-                       for model in layer]
-            all_results.extend(results)
+            pending.extend([(model, point_charges) for model in layer])
+        all_results.extend(self.run_models(atoms, coords, method, pending))
         self.calc_counter += 1
 
         return all_results
 
+    def run_models(self, atoms, coords, method, models_point_charges):
+        """Run the calculations of several models, concurrently if requested.
+
+        Parameters
+        ----------
+        models_point_charges : list of tuples
+            (Model, point_charges) pairs.
+
+        Returns
+        -------
+        results : list
+            Result of method for every model.
+        """
+        model_tasks = [
+            model.calc_tasks(atoms, coords, method, point_charges=point_charges)
+            for model, point_charges in models_point_charges
+        ]
+        tasks = list(it.chain(*model_tasks))
+        if self.executor is None:
+            calcs_results = [run_calc_task(task) for task in tasks]
+        else:
+            self.log(f"Running {len(tasks)} calculations of "
+                     f"{len(model_tasks)} models concurrently.")
+            calcs_results = [None] * len(tasks)
+            for i, calc_results in map_as_completed(run_calc_task, tasks,
+                                                    executor=self.executor,
+                                                    max_workers=self.max_workers):
+                calcs_results[i] = calc_results
+        calcs, results = zip(*calcs_results)
+
+        all_results = list()
+        start = 0
+        for (model, _), tasks_ in zip(models_point_charges, model_tasks):
+            end = start + len(tasks_)
+            # Keep the updated calculators, as process pools return copies
+            model.calc = calcs[start]
+            if len(tasks_) > 1:
+                model.parent_calc = calcs[start + 1]
+            all_results.append(model.combine_results(method, results[start:end]))
+            start = end
+        return all_results
+
     def run_calculation(self, atoms, coords):
         self.log("run_calculation() called. Doing simple energy calculation!")
         return self.get_energy(atoms, coords)
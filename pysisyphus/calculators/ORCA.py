@@ -27,6 +27,7 @@ def make_sym_mat(table_block):
 class ORCA(OverlapCalculator):
 
     conf_key = "orca"
+    cache_ignore = OverlapCalculator.cache_ignore + ("gbw", "out", "cis")
 
     def __init__(self, keywords, blocks="", gbw=None, mem=2000,
                  do_stable=False, numfreq=False, **kwargs):
@@ -47,6 +48,8 @@ class ORCA(OverlapCalculator):
 
         self.to_keep = ("inp", "out:orca.out", "gbw", "engrad", "hessian",
                         "cis", "molden:orca.molden", "hess", "pcgrad")
+        # ORCA picks up a present .gbw file of the same basename automatically
+        self.scratch_restart = ("*.gbw", )
         self.do_tddft = False
         if "tddft" in self.blocks:
             self.do_tddft = True
@@ -12,6 +12,8 @@ from pysisyphus.xyzloader import make_xyz_str
 class OpenMolcas(Calculator):
 
     conf_key = "openmolcas"
+    # Orbitals of the previous calculation, used as guess
+    cache_ignore = ("inporb", "jobiph")
 
     def __init__(self, basis, inporb, roots, mdrlxroot,
                  supsym=None, track=True, **kwargs):
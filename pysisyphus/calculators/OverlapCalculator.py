@@ -33,6 +33,15 @@ class OverlapCalculator(Calculator):
     }
     VALID_KEYS = [k for k in OVLP_TYPE_VERBOSE.keys()]  # lgtm [py/non-iterable-in-for-loop]
     VALID_CDDS = (None, "calc", "render")
+    # Restart files, wavefunctions and the history of root tracking are
+    # updated by every calculation and don't enter the result cache key.
+    cache_ignore = (
+        "mwfn_wf", "mo_coeffs", "ci_coeffs", "wfow", "mo_coeff_list",
+        "ci_coeff_list", "nto_list", "coords_list", "calculated_roots",
+        "roots_list", "reference_roots", "cdd_cubes", "cdd_imgs",
+        "all_energies_list", "root_flips", "first_root", "overlap_matrices",
+        "row_inds", "ref_cycle", "ref_cycles", "atoms", "dump_fn",
+    )
 
     def __init__(self, *args, track=False, ovlp_type="wf", double_mol=False,
                  ovlp_with="previous", adapt_args=(0.5, 0.3, 0.6),
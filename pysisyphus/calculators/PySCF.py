@@ -13,6 +13,7 @@ from pysisyphus.calculators.OverlapCalculator import OverlapCalculator
 class PySCF(OverlapCalculator):
 
     conf_key = "pyscf"
+    cache_ignore = OverlapCalculator.cache_ignore + ("mf", "chkfile")
     drivers = {
         # key: (method, unrestricted?)
         ("dft", False): pyscf.dft.RKS,
@@ -58,6 +59,13 @@ class PySCF(OverlapCalculator):
 
         lib.num_threads(self.pal)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The SCF object of the last calculation holds references to modules
+        # and can't be pickled, e.g. when returned from a process pool.
+        state.pop("mf", None)
+        return state
+
     def get_driver(self, step, mol=None, mf=None):
         if mol and (step == "dft"):
             driver = self.drivers[(step, self.unrestricted)]
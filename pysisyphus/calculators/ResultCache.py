@@ -0,0 +1,327 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path, PurePath
+import threading
+
+import numpy as np
+
+
+# Calculator attributes that don't influence the results of a calculation
+IGNORED_SETTINGS = set(
+    (
+        "calc_counter",
+        "calc_number",
+        "base_name",
+        "pal",
+        "mem",
+        "out_dir",
+        "inp_fn",
+        "out_fn",
+        "clean_after",
+        "keep_scratch",
+        "path_already_prepared",
+        "last_run_path",
+        "scratch_path",
+        "result_cache",
+        "logger",
+    )
+)
+SETTING_TYPES = (str, int, float, bool, type(None))
+# Cached results of these methods can serve a request for the key
+SUPERSETS = {
+    "get_energy": ("get_energy", "get_forces", "get_hessian"),
+    "get_forces": ("get_forces",),
+    "get_hessian": ("get_hessian",),
+}
+
+
+class UncacheableSetting(Exception):
+    """Raised for calculator settings that can't be serialized reliably."""
+
+
+def copy_results(results):
+    """Copy arrays, so cached results can't be modified in place."""
+    return {
+        k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in results.items()
+    }
+
+
+def serialize_setting(value, key):
+    """Deterministic, JSON-compatible representation of a setting."""
+    if isinstance(value, SETTING_TYPES):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, PurePath):
+        return str(value)
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {
+            "array": hashlib.sha1(array.tobytes()).hexdigest(),
+            "shape": array.shape,
+            "dtype": str(array.dtype),
+        }
+    if isinstance(value, dict):
+        items = [
+            [serialize_setting(k, key), serialize_setting(v, key)]
+            for k, v in value.items()
+        ]
+        return {"dict": sorted(items, key=json.dumps)}
+    if isinstance(value, (list, tuple)):
+        return [serialize_setting(v, key) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {"set": sorted([serialize_setting(v, key) for v in value], key=json.dumps)}
+    # Nested calculators, e.g. of wrapping calculators like AFIR or Dimer
+    if hasattr(value, "get_forces"):
+        return {
+            "calc": value.__class__.__name__,
+            "settings": get_calc_settings(value),
+        }
+    raise UncacheableSetting(
+        f"Setting '{key}' of type {type(value).__name__} can't be serialized!"
+    )
+
+
+def get_calc_settings(calc):
+    """Serialized attributes of a calculator that may change its results.
+
+    Attributes listed in cache_ignore of the calculator class are runtime
+    state, e.g. neighbor lists, and are skipped.
+    """
+    ignored = IGNORED_SETTINGS | set(getattr(calc, "cache_ignore", ()))
+    settings = dict()
+    for key, value in vars(calc).items():
+        if key.startswith("_") or (key in ignored):
+            continue
+        settings[key] = serialize_setting(value, key)
+    return settings
+
+
+def get_cache_key(calc, kind, atoms, coords, precision=8):
+    """Hash of atoms, rounded coordinates, charge, multiplicity and settings.
+
+    Parameters
+    ----------
+    calc : Calculator
+        Calculator that produces the results.
+    kind : str
+        Name of the calculator method, e.g. 'get_forces'.
+    atoms : iterable
+        Atom descriptors.
+    coords : np.array
+        Cartesian coordinates in Bohr.
+    precision : int
+        Number of decimals the coordinates are rounded to.
+
+    Returns
+    -------
+    key : str
+        Hex digest.
+    """
+    # Adding 0.0 turns -0.0 into 0.0
+    rounded = np.round(np.array(coords, dtype=float).flatten(), precision) + 0.0
+    data = {
+        "kind": kind,
+        "calc": calc.__class__.__name__,
+        "atoms": [atom.lower() for atom in atoms],
+        "charge": getattr(calc, "charge", None),
+        "mult": getattr(calc, "mult", None),
+    }
+    data["settings"] = get_calc_settings(calc)
+    sha = hashlib.sha1(json.dumps(data, sort_keys=True).encode())
+    sha.update(rounded.tobytes())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU cache of calculation results, optionally backed by disk.
+
+    Results are stored as .npz files in cache_dir, so they survive between runs.
+    When more than max_disk files are present the least recently used ones
+    are deleted.
+    """
+
+    def __init__(self, maxsize=512, cache_dir=None, max_disk=4096, precision=8):
+        self.maxsize = int(maxsize)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_disk = int(max_disk)
+        self.precision = int(precision)
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory = OrderedDict()
+        self.logger = logging.getLogger("calculator")
+        # Calculators may be run from several threads at once
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log(self, message):
+        self.logger.debug(f"ResultCache: {message}")
+
+    def log_stats(self):
+        self.log(
+            f"{self.hits} hits ({self.disk_hits} from disk), {self.misses} misses, "
+            f"hit rate {self.hit_rate:.1%}, {len(self.memory)} entries in memory, "
+            f"{self.evictions} evictions"
+        )
+
+    def disk_fn(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key):
+        with self.lock:
+            return self._load(key)
+
+    def _load(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if self.cache_dir is None:
+            return None
+        fn = self.disk_fn(key)
+        try:
+            with np.load(fn, allow_pickle=False) as npz:
+                results = {
+                    k: (v.item() if v.ndim == 0 else v) for k, v in npz.items()
+                }
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        # Mark as recently used
+        os.utime(fn)
+        self.disk_hits += 1
+        self.store_memory(key, results)
+        return results
+
+    def store_memory(self, key, results):
+        self.memory[key] = results
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def store_disk(self, key, results):
+        try:
+            np.savez(self.disk_fn(key), **results)
+        except (TypeError, ValueError):
+            self.log(f"Could not store results with keys {list(results.keys())}")
+            return
+        fns = list(self.cache_dir.glob("*.npz"))
+        if len(fns) > self.max_disk:
+            fns = sorted(fns, key=lambda fn: fn.stat().st_mtime)
+            for fn in fns[: len(fns) - self.max_disk]:
+                fn.unlink()
+                self.evictions += 1
+
+    def store(self, key, results):
+        with self.lock:
+            self.store_memory(key, results)
+            if self.cache_dir is not None:
+                self.store_disk(key, results)
+
+    def get(self, calc, kind, atoms, coords):
+        """Return cached results for kind or None."""
+        for kind_ in SUPERSETS.get(kind, (kind,)):
+            key = get_cache_key(calc, kind_, atoms, coords, self.precision)
+            results = self.load(key)
+            if results is None:
+                continue
+            if kind_ != kind:
+                results = {"energy": results["energy"]}
+            return copy_results(results)
+        return None
+
+    def get_or_calculate(self, calc, kind, atoms, coords):
+        """Look up results or run the calculation and store its results.
+
+        Parameters
+        ----------
+        calc : Calculator
+            Calculator that provides the method kind.
+        kind : str
+            Name of the calculator method, e.g. 'get_forces'.
+        atoms : iterable
+            Atom descriptors.
+        coords : np.array
+            Cartesian coordinates in Bohr.
+
+        Returns
+        -------
+        results : dict
+            Results of the calculation.
+        """
+        try:
+            results = self.get(calc, kind, atoms, coords)
+            # The key is determined before the calculation, as it may change
+            # attributes of the calculator.
+            key = get_cache_key(calc, kind, atoms, coords, self.precision)
+        except UncacheableSetting as err:
+            self.log(f"Not caching results of {calc.name}: {err}")
+            return getattr(calc, kind)(atoms, coords)
+
+        if results is not None:
+            with self.lock:
+                self.hits += 1
+                self.log(f"Hit for '{kind}' of {calc.name}")
+                self.log_stats()
+            return results
+
+        with self.lock:
+            self.misses += 1
+        results = getattr(calc, kind)(atoms, coords)
+        self.store(key, copy_results(results))
+        with self.lock:
+            self.log_stats()
+        return results
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.cache_dir is not None:
+                for fn in self.cache_dir.glob("*.npz"):
+                    fn.unlink()
+
+
+# Caches are shared by all calculators of one run that use the same cache_dir.
+# Results on disk outlive a run, the in-memory caches don't.
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+
+
+def reset_result_caches():
+    """Start a new scope, e.g. for a new run. Calculators created afterwards
+    don't share in-memory caches with calculators created before."""
+    with _CACHES_LOCK:
+        _CACHES.clear()
+
+
+def get_result_cache(cache_dir=None, **kwargs):
+    """Return the shared ResultCache for cache_dir, creating it if needed."""
+    key = str(Path(cache_dir).resolve()) if cache_dir is not None else None
+    with _CACHES_LOCK:
+        try:
+            return _CACHES[key]
+        except KeyError:
+            cache = ResultCache(cache_dir=cache_dir, **kwargs)
+            _CACHES[key] = cache
+            return cache
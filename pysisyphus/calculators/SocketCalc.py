@@ -1,87 +1,218 @@
+# Socket protocol
+#
+# pysisyphus listens on (host, port); external programs connect as clients
+# and keep their connection open. Several clients may connect, so requests
+# of different images/geometries can be answered concurrently. All messages
+# are binary frames
+#
+#   tag       8 bytes    ASCII message type, padded with spaces
+#   length    8 bytes    little-endian uint64, number of payload bytes
+#   payload   length bytes
+#
+# Server -> client
+#   ATOMS    JSON encoded list of atoms. Sent before the first request
+#            and whenever the atoms change.
+#   ENERGY, FORCES, HESSIAN
+#            Cartesian coordinates in Bohr as little-endian float64.
+#   EXIT     Empty payload. The client should close the connection.
+# Client -> server
+#   RESULT   little-endian float64: the energy, followed by the 3N forces
+#            for FORCES, or the (3N, 3N) Hessian for HESSIAN requests.
+#   ERROR    UTF-8 encoded error message.
+
 import json
+import queue
+import selectors
 import socket
+import struct
+import threading
 
 import numpy as np
 
 from pysisyphus.calculators.Calculator import Calculator
 
 
-class SocketCalc(Calculator):
+HEADER = struct.Struct("<8sQ")
+FLOAT = np.dtype("<f8")
 
-    valid_requests = ("energy", "forces", "hessian")
 
-    def __init__(self, *args, host="localhost", port=8080, **kwargs):
-        super().__init__(*args, **kwargs)
+def send_msg(sock, tag, payload=b""):
+    payload = memoryview(payload).cast("B")
+    sock.sendall(HEADER.pack(tag.ljust(8).encode("ascii"), payload.nbytes))
+    if payload.nbytes:
+        sock.sendall(payload)
 
-        self.port = port
-        self.host = host
 
-    def listen_for(self, atoms, coords, request):
-        request = request.lower()
-        assert request.lower() in self.valid_requests, \
-            f"Invalid request '{request}'! Valid requests are '{self.valid_requests}'."
+def recv_exactly(sock, size):
+    """Receive exactly size bytes into a preallocated buffer."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        nbytes = sock.recv_into(view[received:], size - received)
+        if nbytes == 0:
+            raise ConnectionError("Connection closed by peer!")
+        received += nbytes
+    return buffer
 
-        request_for = {
-            "atoms": atoms,
-            "coords": coords.tolist(),
-            "request": request,
-        }
-        request_for = json.dumps(request_for).encode("utf-8")
 
-        # Create socket
-        sock = socket.socket()
-        # Allow reuse
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind((self.host, self.port))
+def recv_msg(sock):
+    tag, length = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return tag.decode("ascii").strip(), recv_exactly(sock, length)
+
 
-        sock.listen(0)
-        while True:
-            client, address = sock.accept()
+class SocketServer:
+    """Listening socket, handing out persistent client connections.
 
-            with client:
-                self.log(f"Got connection from {address}")
+    New connections are accepted by a background thread. Idle connections
+    wait in a queue; every request checks out one connection, so as many
+    requests as there are clients can run concurrently, e.g. from a thread
+    executor.
+    """
 
-                # Send atom, coordinates and the request type
-                client.sendall(request_for)
+    def __init__(self, host="localhost", port=8080, timeout=None):
+        """
+        Parameters
+        ----------
+        host : str
+            Host to bind to.
+        port : int
+            Port to bind to. With 0 a free port is chosen, see self.port.
+        timeout : float, optional
+            Seconds to wait for a connected client. Wait forever by default.
+        """
+        self.host = host
+        self.timeout = timeout
 
-                to_json = b""
-                while True:
-                    data = client.recv(1024)
-                    to_json += data
+        self.sock = socket.socket()
+        # Allow reuse
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen()
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
 
-                    # Read until linebreak is found
-                    if b"\n" in data:
-                        self.log("Found linebreaking. Stop listening.")
-                        break
+        self.idle = queue.Queue()
+        # Atoms last sent to every connection
+        self.sent_atoms = dict()
+        self.closed = threading.Event()
+        self.acceptor = threading.Thread(target=self.accept_clients, daemon=True)
+        self.acceptor.start()
 
-                # Try to parse received data as JSON
-                results = dict()
+    def accept_clients(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_READ)
+            while not self.closed.is_set():
+                if not selector.select(timeout=0.1):
+                    continue
                 try:
-                    to_json.decode("utf-8")
-                    results = json.loads(to_json)
-                except json.JSONDecodeError:
-                    self.log("JSON decode error")
-
-                # Check if all required fields are present in the results. The
-                # energy has to be always present.
-                if ("energy" in results) and (request in results):
-                    self.log("All required fields are present in the received JSON. "
-                             "Breaking.")
-                    break
-                else:
-                    self.log("Could not parse received data as JSON!")
+                    client, _ = self.sock.accept()
+                except OSError:
+                    continue
+                client.setblocking(True)
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.idle.put(client)
 
-        sock.close()
+    def request(self, atoms, coords, request):
+        """Send one request to an idle client and wait for the results.
 
-        # energy has to be always present
-        results = {key: results[key] for key in ("energy", request)}
+        Returns
+        -------
+        results : np.array
+            Energy, followed by forces or Hessian.
+        """
+        try:
+            client = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise Exception(
+                f"No client connected to {self.host}:{self.port} within "
+                f"{self.timeout} s!"
+            )
+        exchanged = False
+        try:
+            atoms = list(atoms)
+            if self.sent_atoms.get(client) != atoms:
+                send_msg(client, "ATOMS", json.dumps(atoms).encode("utf-8"))
+                self.sent_atoms[client] = atoms
+            send_msg(client, request.upper(),
+                     np.ascontiguousarray(coords, dtype=FLOAT))
+            tag, payload = recv_msg(client)
+            exchanged = True
+        finally:
+            if exchanged:
+                self.idle.put(client)
+            # The state of a connection is unknown after an interrupted
+            # exchange, so it is dropped.
+            else:
+                self.sent_atoms.pop(client, None)
+                client.close()
+
+        if tag == "ERROR":
+            raise Exception(f"Client error: {payload.decode('utf-8')}")
+        assert tag == "RESULT", f"Unexpected message '{tag}'!"
+        return np.frombuffer(payload, dtype=FLOAT)
+
+    def close(self):
+        self.closed.set()
+        self.acceptor.join()
+        while not self.idle.empty():
+            client = self.idle.get()
+            try:
+                send_msg(client, "EXIT")
+            except OSError:
+                pass
+            client.close()
+        self.sent_atoms.clear()
+        self.sock.close()
+
+
+# Servers are shared by all SocketCalcs on the same host and port
+_SERVERS = dict()
+_SERVERS_LOCK = threading.Lock()
 
-        if "forces" in results:
-            results["forces"] = np.array(results["forces"], dtype=float)
 
-        if "hessian" in results:
-            results["hessian"] = np.array(results["hessian"],
-                                          dtype=float).reshape(-1, 3*len(atoms))
+def get_server(host, port, timeout=None):
+    with _SERVERS_LOCK:
+        key = (host, port)
+        if (key not in _SERVERS) or _SERVERS[key].closed.is_set():
+            server = SocketServer(host, port, timeout=timeout)
+            _SERVERS[(host, server.port)] = server
+            return server
+        return _SERVERS[key]
+
+
+class SocketCalc(Calculator):
+    """Calculator delegating to external programs connected via sockets.
+
+    See the top of this module for the protocol and SocketClient for a
+    reference implementation of a client.
+    """
+
+    valid_requests = ("energy", "forces", "hessian")
+
+    def __init__(self, *args, host="localhost", port=8080, timeout=None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.server = get_server(host, port, timeout=timeout)
+        self.host = host
+        # Actual port, when a free port was requested with 0.
+        self.port = self.server.port
+
+    def listen_for(self, atoms, coords, request):
+        request = request.lower()
+        assert request.lower() in self.valid_requests, \
+            f"Invalid request '{request}'! Valid requests are '{self.valid_requests}'."
+
+        data = self.server.request(atoms, coords, request)
+        # energy has to be always present
+        results = {
+            "energy": data[0],
+        }
+        if request == "forces":
+            results["forces"] = data[1:].copy()
+        elif request == "hessian":
+            results["hessian"] = data[1:].reshape(-1, 3*len(atoms)).copy()
         return results
 
     def get_energy(self, atoms, coords):
@@ -95,3 +226,59 @@ class SocketCalc(Calculator):
     def get_hessian(self, atoms, coords):
         result = self.listen_for(atoms, coords, "hessian")
         return result
+
+
+class SocketClient:
+    """Serves a pysisyphus calculator over a SocketCalc connection.
+
+    Stand-in for external programs, e.g. for testing and benchmarking.
+
+    Example:
+
+        client = SocketClient(XTB(), port=8080)
+        client.run()  # Until the server sends EXIT
+    """
+
+    def __init__(self, calc, host="localhost", port=8080):
+        self.calc = calc
+        self.host = host
+        self.port = port
+        self.funcs = {
+            "ENERGY": self.calc.get_energy,
+            "FORCES": self.calc.get_forces,
+            "HESSIAN": self.calc.get_hessian,
+        }
+        self.request_num = 0
+
+    def run(self):
+        atoms = None
+        with socket.create_connection((self.host, self.port)) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            while True:
+                try:
+                    tag, payload = recv_msg(sock)
+                except ConnectionError:
+                    break
+                if tag == "EXIT":
+                    break
+                elif tag == "ATOMS":
+                    atoms = json.loads(payload.decode("utf-8"))
+                    continue
+
+                try:
+                    coords = np.frombuffer(payload, dtype=FLOAT)
+                    results = self.funcs[tag](atoms, coords)
+                    key = tag.lower()
+                    data = [np.atleast_1d(results["energy"])]
+                    if key != "energy":
+                        data.append(np.ravel(results[key]))
+                    send_msg(sock, "RESULT",
+                             np.concatenate(data).astype(FLOAT, copy=False))
+                except Exception as err:
+                    send_msg(sock, "ERROR", str(err).encode("utf-8"))
+                self.request_num += 1
+
+    def run_in_thread(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
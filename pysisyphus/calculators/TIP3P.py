@@ -3,6 +3,7 @@ import numpy as np
 from pysisyphus.constants import ANG2BOHR, AU2KJPERMOL
 from pysisyphus.calculators.Calculator import Calculator
 from pysisyphus.calculators.LennardJones import LennardJones
+from pysisyphus.calculators.NeighborList import NeighborList, scatter_pair_gradient
 
 # [1] https://aip.scitation.org/doi/abs/10.1063/1.445869
 #     Jorgensen, 1983
@@ -14,6 +15,9 @@ from pysisyphus.calculators.LennardJones import LennardJones
 
 class TIP3P(Calculator):
     """Transferable Intermolecular Potential 3 Point"""
+    # Runtime state, that doesn't change the results
+    cache_ignore = ("water_neighbors", )
+
     rOH = 0.9572 * ANG2BOHR
     aHOH = 104.52  # deg
     # Charges
@@ -23,12 +27,21 @@ class TIP3P(Calculator):
     epsilon = 0.6364 / AU2KJPERMOL
 
     # rc = 5 Å in Bohr
-    def __init__(self, rc=9.44863062728914):
+    def __init__(self, rc=9.44863062728914, coulomb_rc=None, skin=None):
         super().__init__()
 
         # Cutoff distance
         self.rc = rc
-        self.lj = LennardJones(sigma=self.sigma, epsilon=self.epsilon, rc=self.rc)
+        self.lj = LennardJones(
+            sigma=self.sigma, epsilon=self.epsilon, rc=self.rc, skin=skin
+        )
+        # Optional, molecule based cutoff for the Coulomb interaction, determined
+        # from the oxygen-oxygen distance. All water pairs interact when it is None.
+        self.coulomb_rc = coulomb_rc
+        if skin is None:
+            skin = 0.1 * self.rc
+        coulomb_skin = skin if self.coulomb_rc is not None else 0.0
+        self.water_neighbors = NeighborList(cutoff=self.coulomb_rc, skin=coulomb_skin)
 
         self.charges = np.array((self.qO, self.qH, self.qH))
         """
@@ -51,7 +64,14 @@ class TIP3P(Calculator):
             return 0., np.zeros((3, 3))
         stencil = np.array((0, 1, 2))
         # Pair indices of the interacting water molecules
-        a, b = np.triu_indices(waters, 1)
+        o_coords3d = coords3d[::3]
+        a, b = self.water_neighbors.update(o_coords3d).T
+        if self.coulomb_rc is not None:
+            within = (
+                np.linalg.norm(o_coords3d[a] - o_coords3d[b], axis=1)
+                <= self.coulomb_rc
+            )
+            a, b = a[within], b[within]
 
         # Pair indices of the respective interacting atoms
         # a: 0, 1, 2, 0, 1, 2, 0, 1, 2, ...
@@ -75,11 +95,8 @@ class TIP3P(Calculator):
         # derivative of 1/r**n.
         products = (pair_energies / rs**2)[:, None] * diffs
 
-        gradient = np.zeros_like(coords3d)
         # Every pair (a, b) contributes to the total gradient of atoms a and b.
-        for i, prod in enumerate(products):
-            gradient[a[i]] -= prod
-            gradient[b[i]] += prod
+        gradient = -scatter_pair_gradient(products, a, b, len(coords3d))
 
         return energy, -gradient
 
@@ -90,9 +107,6 @@ class TIP3P(Calculator):
         o_coords3d = coords3d[::3]
         lj_energy, lj_forces = self.lj.calculate(o_coords3d)
 
-        forces = np.zeros_like(coords3d)
-        forces[::3] += lj_forces
-
         forces = coulomb_forces.copy()
         # Add LennardJones forces to oxygens
         forces[::3] += lj_forces
@@ -18,6 +18,9 @@ from pysisyphus.calculators.parser import (parse_turbo_gradient,
 class Turbomole(OverlapCalculator):
 
     conf_key = "turbomole"
+    cache_ignore = OverlapCalculator.cache_ignore + (
+        "out", "control", "mos", "alpha", "beta", "td_vec_fn", "ccres", "exstates",
+    )
 
     def __init__(self, control_path, root=None,
                  double_mol_path=None, mem=1000, **kwargs):
@@ -38,6 +38,8 @@ class XTB(Calculator):
         self.to_keep = ("out:xtb.out", "gradient", "xtbopt.xyz", "g98.out",
                         "xtb.trj",
         )
+        # Converged wavefunction, read by xtb when present
+        self.scratch_restart = ("xtbrestart", )
 
         self.parser_funcs = {
             "grad": self.parse_gradient,
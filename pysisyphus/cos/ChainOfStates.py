@@ -5,6 +5,12 @@ from distributed import Client
 import numpy as np
 from scipy.interpolate import interp1d, splprep, splev
 
+from pysisyphus.executors import (
+    calc_energy_and_forces,
+    get_executor,
+    map_as_completed,
+    set_pal,
+)
 from pysisyphus.helpers import align_coords, get_coords_diffs
 from pysisyphus.helpers_pure import hash_arr
 from pysisyphus.modefollow import geom_lanczos
@@ -18,7 +24,9 @@ class ChainOfStates:
     valid_coord_types = "cart dlc".split()
 
     def __init__(self, images, fix_ends=False, fix_first=True, fix_last=True,
-                 climb=False, climb_rms=5e-3, climb_lanczos=False, scheduler=None):
+                 climb=False, climb_rms=5e-3, climb_lanczos=False, scheduler=None,
+                 executor=None, max_workers=None, image_pal=None, worker_pool=None,
+                 batch_calc=None):
 
         assert(len(images) >= 2), "Need at least 2 images!"
         self.images = list(images)
@@ -29,6 +37,20 @@ class ChainOfStates:
         self.climb_rms = climb_rms
         self.climb_lanczos = climb_lanczos
         self.scheduler = scheduler
+        # Built-in alternative to dask; either 'thread' or 'process'
+        self.executor = executor
+        # Executor object, created on first use and kept for the whole run
+        self._executor = None
+        # Number of images calculated concurrently
+        self.max_workers = max_workers
+        # Number of cores for every image calculation
+        self.image_pal = image_pal
+        # WorkerPool with long-lived calculators. When given, the calculators
+        # of the images are not used.
+        self.worker_pool = worker_pool
+        # Calculator with a get_forces_batch(atoms, coords, indices) method,
+        # that calculates several images in one call, e.g. an IDPPCalculator.
+        self.batch_calc = batch_calc
 
         self._coords = None
         self._forces = None
@@ -208,6 +230,15 @@ class ChainOfStates:
             self.log(client)
             image_futures = client.map(self.par_image_calc, images_to_calculate)
             self.set_images(image_indices, client.gather(image_futures))
+        # All images at once
+        elif self.batch_calc is not None:
+            self.calculate_batched(images_to_calculate, image_indices)
+        # Calculation by long-lived workers
+        elif self.worker_pool is not None:
+            self.calculate_with_worker_pool(images_to_calculate, image_indices)
+        # Parallel calculation with a concurrent.futures executor
+        elif self.executor:
+            self.calculate_with_executor(images_to_calculate, image_indices)
         # Serial calculation
         else:
             [image.calc_energy_and_forces() for image in images_to_calculate]
@@ -219,6 +250,42 @@ class ChainOfStates:
         self.all_energies.append(energies)
         self.all_true_forces.append(forces)
 
+    def get_executor(self):
+        if self._executor is None:
+            self._executor = get_executor(self.executor, self.max_workers)
+        return self._executor
+
+    def shutdown_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def calculate_with_executor(self, images, image_indices):
+        set_pal(images, self.image_pal)
+        results = map_as_completed(
+            calc_energy_and_forces,
+            images,
+            executor=self.get_executor(),
+        )
+        # Images are set as soon as their calculation finished
+        for i, image in results:
+            ind = image_indices[i]
+            self.images[ind] = image
+            self.log(f"Calculation of image {ind} finished")
+
+    def calculate_batched(self, images, image_indices):
+        coords = np.array([image.cart_coords for image in images])
+        indices = [ind % len(self.images) for ind in image_indices]
+        all_results = self.batch_calc.get_forces_batch(self.image_atoms, coords, indices)
+        for image, results in zip(images, all_results):
+            image.set_results(results)
+
+    def calculate_with_worker_pool(self, images, image_indices):
+        # The image objects are kept, so every image always ends up on the
+        # same worker, even when images are added or removed.
+        for i, _ in self.worker_pool.calc_energy_and_forces(images):
+            self.log(f"Calculation of image {image_indices[i]} finished")
+
     @property
     def forces(self):
         self.set_zero_forces_for_fixed_images()
@@ -0,0 +1,195 @@
+import numpy as np
+
+from pysisyphus.constants import FORCE2ACC, VELO2E
+from pysisyphus.dynamics.helpers import temperature_for_kinetic_energy
+from pysisyphus.dynamics.velocity_verlet import MDResult
+from pysisyphus.executors import get_executor, map_as_completed
+from pysisyphus.helpers import check_for_stop_sign
+
+
+def get_forces_task(task):
+    """Module level function, so it can be pickled for process pools."""
+    calc, atoms, coords = task
+    return calc.get_forces(atoms, coords)
+
+
+def ensemble_energy_forces_getter_closure(geom, executor=None):
+    """Energies and forces of several replicas.
+
+    Calculators with a get_forces_batch(atoms, coords, indices) method, e.g.
+    the analytical potentials, evaluate all replicas in one call. Otherwise
+    the replicas are calculated one after another, or concurrently, when an
+    executor is given.
+    """
+    calc = geom.calculator
+    atoms = geom.atoms
+
+    def energy_forces_getter(coords, indices):
+        if hasattr(calc, "get_forces_batch"):
+            all_results = calc.get_forces_batch(atoms, coords, indices)
+        elif executor is not None:
+            tasks = [(calc, atoms, coords_) for coords_ in coords]
+            all_results = [None] * len(tasks)
+            for i, results in map_as_completed(get_forces_task, tasks,
+                                               executor=executor):
+                all_results[i] = results
+        else:
+            all_results = [calc.get_forces(atoms, coords_) for coords_ in coords]
+        energies = np.array([results["energy"] for results in all_results])
+        forces = np.array([results["forces"] for results in all_results])
+        return energies, forces
+    return energy_forces_getter
+
+
+def ensemble_md(geom, v0s, steps, dt, x0s=None, remove_com_v=True,
+                term_funcs=None, stride=1, executor=None, max_workers=None,
+                verbose=True):
+    """Velocity verlet integration of several replicas in lockstep.
+
+    Every replica follows the same integration scheme as md(), but
+    coordinates, velocities and forces of all replicas are kept in stacked
+    (replicas, 3N) arrays. A replica drops out as soon as one of the
+    termination functions evaluates to True for it, while the remaining
+    replicas continue.
+
+    Parameters
+    ----------
+    geom : Geometry
+        The system for which the dynamics are to be run. Its coordinates
+        are used as initial coordinates of all replicas when x0s is omitted.
+    v0s : np.array, floats, shape (replicas, 3N)
+        Initial velocities in Bohr/fs.
+    steps : float
+        Number of simulation steps.
+    dt : float
+        Timestep in fs.
+    x0s : np.array, floats, shape (replicas, 3N), optional
+        Initial coordinates in Bohr.
+    remove_com_v : bool, default=True
+        Remove center-of-mass velocity.
+    term_funcs : dict, optional
+        Functions that are called with the coordinates of every running
+        replica in every MD cycle. The replica is terminated, when one of
+        them evaluates to True.
+    stride : int, default=1
+        Only keep the coordinates of every stride-th step.
+    executor : str, optional
+        'process' or 'thread'. Calculate the replicas concurrently if the
+        calculator doesn't support batched calculations.
+    max_workers : int, optional
+        Number of concurrent calculations.
+    verbose : bool, default=True
+        Do additional printing when True.
+
+    Returns
+    -------
+    md_results : list of MDResult
+        One MDResult per replica.
+    """
+
+    assert geom.coord_type == "cart"
+
+    if term_funcs is None:
+        term_funcs = dict()
+
+    v = np.array(v0s, dtype=float)
+    replica_num, coords_size = v.shape
+    if x0s is None:
+        x0s = np.tile(geom.cart_coords, (replica_num, 1))
+    x = np.array(x0s, dtype=float)
+    assert x.shape == v.shape
+
+    if verbose:
+        t_ps = steps * dt * 1e-3  # Total simulation time
+        print(f"Doing {steps} steps of {dt:.4f} fs for a total of {t_ps:.2f} ps "
+              f"for {replica_num} replicas.")
+
+    # Fixed degrees of freedom
+    fixed_dof = 3 if remove_com_v else 0
+
+    # In amu
+    masses = geom.masses
+    masses_rep = geom.masses_rep
+    total_mass = masses.sum()
+    atom_num = len(masses)
+
+    # Preallocated trajectory arrays
+    xs = np.zeros((replica_num, -(-steps // stride), coords_size))
+    Ts = np.zeros((replica_num, steps))
+    E_tots = np.zeros((replica_num, steps))
+    step_nums = np.zeros(replica_num, dtype=int)
+    terminate_keys = [None] * replica_num
+
+    pool = None
+    if isinstance(executor, str):
+        pool = get_executor(executor, max_workers)
+        executor = pool
+    energy_forces_getter = ensemble_energy_forces_getter_closure(geom, executor)
+
+    active = np.arange(replica_num)
+    E_pot, forces = energy_forces_getter(x, active)
+    a_prev = np.zeros_like(x)
+    try:
+        for i in range(steps):
+            if active.size == 0:
+                break
+            step_nums[active] = i + 1
+
+            # Kinetic energies in Hartree, as in kinetic_energy_from_velocities()
+            E_kins = np.sum(masses_rep / 2 * v[active]**2, axis=1) * VELO2E
+            T = temperature_for_kinetic_energy(atom_num, E_kins,
+                                               fixed_dof=fixed_dof)
+            Ts[active, i] = T
+            E_tots[active, i] = E_pot + E_kins
+            if (i % stride) == 0:
+                xs[active, i // stride] = x[active]
+
+            if verbose and (i % 25) == 0:
+                print(f"Step {i:05d}  {i*dt*1e-3: >6.2f} ps  "
+                      f"{active.size} running replicas  <T>={T.mean(): >8.2f} K")
+
+            # The forces at the initial coordinates are already known
+            if i > 0:
+                E_pot, forces = energy_forces_getter(x[active], active)
+            # Acceleration, convert from Hartree / (Bohr * amu) to Bohr/fs²
+            a = forces / masses_rep * FORCE2ACC
+            v_active = v[active] + .5 * (a + a_prev[active]) * dt
+            if remove_com_v:
+                v_active -= v_active * masses_rep / total_mass
+            v[active] = v_active
+            # v*dt = Bohr/fs * fs -> Bohr
+            # a*dt**2 = Bohr/fs² * fs² -> Bohr
+            x[active] += v_active*dt + .5*a*dt**2
+            a_prev[active] = a
+
+            # Drop terminated replicas
+            running = np.ones(active.size, dtype=bool)
+            for j, replica in enumerate(active):
+                for name, func in term_funcs.items():
+                    if func(x[replica]):
+                        terminate_keys[replica] = name
+                        running[j] = False
+                        break
+            active = active[running]
+            E_pot = E_pot[running]
+
+            if check_for_stop_sign():
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    md_results = list()
+    for replica, step_num in enumerate(step_nums):
+        # Time is not advanced in the step that terminated the replica
+        t = step_num if terminate_keys[replica] is None else step_num - 1
+        md_results.append(
+            MDResult(
+                coords=xs[replica, :-(-step_num // stride)],
+                t=t*dt*1e-3,
+                terminated=terminate_keys[replica],
+                T=Ts[replica, :step_num],
+                E_tot=E_tots[replica, :step_num],
+            )
+        )
+    return md_results
@@ -1,17 +1,22 @@
 import numpy as np
 
-from pysisyphus.xyzloader import make_trj_str
+from pysisyphus.io.bintrj import write_bintrj
+from pysisyphus.xyzloader import TrjWriter
 from pysisyphus.Geometry import get_trans_rot_projector
 from pysisyphus.constants import BOHR2ANG, KBAU, VELO2E
 
 
 def dump_coords(atoms, coords, trj_fn):
-    coords = np.array(coords)
-    coords = coords.reshape(-1, len(atoms), 3) * BOHR2ANG
-    trj_str = make_trj_str(atoms, coords)
-
-    with open(trj_fn, "w") as handle:
-        handle.write(trj_str)
+    """Dump coordinates in Bohr. Written as binary trajectory, when
+    trj_fn ends with .btrj."""
+    coords = np.reshape(coords, (-1, len(atoms), 3))
+    if str(trj_fn).endswith(".btrj"):
+        write_bintrj(trj_fn, atoms, coords)
+        return
+
+    with TrjWriter(trj_fn, atoms) as writer:
+        for coords3d in coords:
+            writer.write(coords3d * BOHR2ANG)
 
 
 def kinetic_energy_from_velocities(masses, velocities):
@@ -7,6 +7,7 @@ from collections import namedtuple
 import numpy as np
 
 from pysisyphus.constants import AU2KJPERMOL
+from pysisyphus.dynamics.ensemble import ensemble_md
 from pysisyphus.dynamics.velocity_verlet import md, MDResult
 from pysisyphus.dynamics.helpers import dump_coords, \
                                         get_mb_velocities_for_geom, \
@@ -46,6 +47,26 @@ def run_md(geom, t, dt, v0=None, remove_com_v=True, term_funcs=None,
     return md_result
 
 
+def run_mds(geom, x0s, v0s, t, dt, remove_com_v=True, term_funcs=None,
+            external=False, executor=None, max_workers=None):
+    """Run several MDs, in lockstep when the internal implementation is used."""
+    if external:
+        md_results = list()
+        for x0, v0 in zip(x0s, v0s):
+            geom.coords = x0.copy()
+            md_results.append(
+                run_md(geom, t, dt, v0=v0.copy(), remove_com_v=remove_com_v,
+                       term_funcs=term_funcs, external=True)
+            )
+        return md_results
+
+    steps = int(t / dt)
+    print(f"Running {len(x0s)} MDs with internal implementation.")
+    return ensemble_md(geom, v0s, steps, dt, x0s=x0s, remove_com_v=remove_com_v,
+                       term_funcs=term_funcs, executor=executor,
+                       max_workers=max_workers, verbose=False)
+
+
 MDPResult = namedtuple("MDResult",
                        "ascent_xs md_init_plus md_init_minus "
                        "md_fin_plus md_fin_minus "
@@ -55,8 +76,15 @@ MDPResult = namedtuple("MDResult",
 
 def mdp(geom, t, dt, term_funcs, t_init=None, E_excess=0.,
         displ_length=.1, epsilon=5e-4, ascent_alpha=0.05,
-        max_ascent_steps=25, max_init_trajs=10, dump=True,
-        seed=None, external_md=False):
+        max_ascent_steps=25, max_init_trajs=10, init_batch=1, dump=True,
+        seed=None, external_md=False, executor=None, max_workers=None):
+    """Minimum dynamic path calculation.
+
+    Trajectories starting in opposite directions are run together, see
+    ensemble_md(). With init_batch > 1, init_batch pairs of initialization
+    trajectories are run at once, which pays off for calculators supporting
+    batched calculations or when an executor is given.
+    """
     # Sanity checks and forcing some types
     dt = float(dt)
     assert dt > 0.
@@ -104,19 +132,19 @@ def mdp(geom, t, dt, term_funcs, t_init=None, E_excess=0.,
 
         v0_zero = np.zeros_like(geom.coords)
         md_kwargs = {
-            "v0": v0_zero.copy(),
             "t": t,
             "dt": dt,
             "term_funcs": term_funcs,
             "external": external_md,
             "remove_com_v": remove_com,
+            "executor": executor,
+            "max_workers": max_workers,
         }
 
-        geom.coords = x0_plus
-        md_fin_plus = run_md(geom, **md_kwargs)
-
-        geom.coords = x0_minus
-        md_fin_minus = run_md(geom, **md_kwargs)
+        md_fin_plus, md_fin_minus = run_mds(
+            geom, np.array((x0_plus, x0_minus)), np.array((v0_zero, v0_zero)),
+            **md_kwargs
+        )
 
         if dump:
             dump_coords(geom.atoms, md_fin_plus.coords, "mdp_plus.trj")
@@ -128,6 +156,8 @@ def mdp(geom, t, dt, term_funcs, t_init=None, E_excess=0.,
                         md_init_minus=None,
                         md_fin_plus=md_fin_plus,
                         md_fin_minus=md_fin_minus,
+                        md_fin_plus_term=md_fin_plus.terminated,
+                        md_fin_minus_term=md_fin_minus.terminated,
         )
         return mdp_result
 
@@ -184,54 +214,63 @@ def mdp(geom, t, dt, term_funcs, t_init=None, E_excess=0.,
     x0 = geom.coords.copy()
 
     print(highlight_text("Runninig initialization trajectories", level=1))
-    for i in range(max_init_trajs):
-        # Determine random momentum vector for the given kinetic energy
-        E_kin = E_tot - E_pot
-        T = temperature_for_kinetic_energy(len(geom.atoms), E_kin)
-        v0 = get_mb_velocities_for_geom(geom, T,
-                                        remove_com=remove_com,
-                                        remove_rot=remove_rot).flatten()
-
-        # Zero last element if we have an analytical surface
-        if v0.size == 3:
-            v0[2] = 0
-
-        # Run initial MD to check if both trajectories run towards different
-        # basins of attraction.
-
-        # First MD with positive v0
-        md_init_kwargs = {
-            "v0": v0.copy(),
-            "t": t_init,
-            "dt": dt,
-            "external": external_md,
-            "remove_com_v": remove_com,
-        }
-        geom.coords = x0.copy()
-        md_init_plus = run_md(geom, **md_init_kwargs)
-        # Second MD with negative v0
-        geom.coords = x0.copy()
-        md_init_kwargs["v0"] = -v0.copy()
-        md_init_minus = run_md(geom, **md_init_kwargs)
-
-        dump_coords(geom.atoms, md_init_plus.coords, f"mdp_ee_init_plus_{i:02d}.trj")
-        dump_coords(geom.atoms, md_init_minus.coords, f"mdp_ee_init_minus_{i:02d}.trj")
-
-        # Check if both MDs run into different basins of attraction.
-        # We (try to) do this by calculating the overlap between the
-        # transition vector and the normalized vector defined by the
-        # difference between x0 and the endpoint of the respective 
-        # test trajectory. Both overlaps should have different sings.
-        end_plus = md_init_plus.coords[-1]
-        pls = end_plus - x0
-        pls /= np.linalg.norm(pls)
-        end_minus = md_init_minus.coords[-1]
-        minus = end_minus - x0
-        minus /= np.linalg.norm(minus)
-        p = trans_vec @ pls
-        m = trans_vec @ minus
-        init_trajs_converged = (np.sign(p) != np.sign(m))
-
+    md_init_kwargs = {
+        "t": t_init,
+        "dt": dt,
+        "external": external_md,
+        "remove_com_v": remove_com,
+        "executor": executor,
+        "max_workers": max_workers,
+    }
+    init_trajs_converged = False
+    for batch_start in range(0, max_init_trajs, init_batch):
+        batch = range(batch_start, min(batch_start + init_batch, max_init_trajs))
+        v0s = list()
+        for i in batch:
+            # Determine random momentum vector for the given kinetic energy
+            E_kin = E_tot - E_pot
+            T = temperature_for_kinetic_energy(len(geom.atoms), E_kin)
+            v0 = get_mb_velocities_for_geom(geom, T,
+                                            remove_com=remove_com,
+                                            remove_rot=remove_rot).flatten()
+
+            # Zero last element if we have an analytical surface
+            if v0.size == 3:
+                v0[2] = 0
+            v0s.append(v0)
+
+        # Run initial MDs to check if both trajectories run towards different
+        # basins of attraction. Every pair consists of a MD with positive
+        # and negative v0.
+        v0s = np.array(v0s)
+        md_inits = run_mds(geom, np.tile(x0, (2*len(v0s), 1)),
+                           np.concatenate((v0s, -v0s)), **md_init_kwargs)
+        md_inits_plus = md_inits[:len(v0s)]
+        md_inits_minus = md_inits[len(v0s):]
+
+        for i, v0, md_init_plus, md_init_minus in zip(
+            batch, v0s, md_inits_plus, md_inits_minus
+        ):
+            dump_coords(geom.atoms, md_init_plus.coords, f"mdp_ee_init_plus_{i:02d}.trj")
+            dump_coords(geom.atoms, md_init_minus.coords, f"mdp_ee_init_minus_{i:02d}.trj")
+
+            # Check if both MDs run into different basins of attraction.
+            # We (try to) do this by calculating the overlap between the
+            # transition vector and the normalized vector defined by the
+            # difference between x0 and the endpoint of the respective 
+            # test trajectory. Both overlaps should have different sings.
+            end_plus = md_init_plus.coords[-1]
+            pls = end_plus - x0
+            pls /= np.linalg.norm(pls)
+            end_minus = md_init_minus.coords[-1]
+            minus = end_minus - x0
+            minus /= np.linalg.norm(minus)
+            p = trans_vec @ pls
+            m = trans_vec @ minus
+            init_trajs_converged = (np.sign(p) != np.sign(m))
+
+            if init_trajs_converged:
+                break
         if init_trajs_converged:
             break
     if dump:
@@ -245,22 +284,19 @@ def mdp(geom, t, dt, term_funcs, t_init=None, E_excess=0.,
     # Run actual trajectories, using the supplied termination functions if possible.
     print(highlight_text("Running actual full trajectories.", level=1))
 
-    # MD with positive v0.
+    # MDs with positive and negative v0.
     md_fin_kwargs = {
-        "v0": v0.copy(),
         "t": t,
         "dt": dt,
         "term_funcs": term_funcs,
         "external": external_md,
         "remove_com_v": remove_com,
+        "executor": executor,
+        "max_workers": max_workers,
     }
-    geom.coords = x0.copy()
-    md_fin_plus = run_md(geom, **md_fin_kwargs)
-
-    geom.coords = x0.copy()
-    # MD with negative v0.
-    md_fin_kwargs["v0"] = -v0
-    md_fin_minus = run_md(geom, **md_fin_kwargs)
+    md_fin_plus, md_fin_minus = run_mds(
+        geom, np.array((x0, x0)), np.array((v0, -v0)), **md_fin_kwargs
+    )
 
     md_fin_plus_term = md_fin_plus.terminated
     md_fin_minus_term = md_fin_minus.terminated
@@ -4,6 +4,37 @@ from pysisyphus.constants import FORCE2ACC
 from pysisyphus.dynamics.helpers import energy_forces_getter_closure, remove_com_velocity
 
 
+def color_constraints(constraints):
+    """Split constraints into batches without common atoms.
+
+    Greedy graph coloring; every constraint gets the lowest color that isn't
+    used by another constraint involving one of its atoms. As no atom appears
+    twice in a batch, all constraints of a batch can be corrected at once.
+
+    Parameters
+    ----------
+    constraints : 2d iterable of int, shape (K, 2)
+        Atom indices of the constrained bonds.
+
+    Returns
+    -------
+    batches : list of np.array of int
+        Constraint indices of every batch, in ascending order.
+    """
+    atom_colors = dict()
+    colors = list()
+    for atom_1, atom_2 in constraints:
+        used = atom_colors.get(atom_1, set()) | atom_colors.get(atom_2, set())
+        color = 0
+        while color in used:
+            color += 1
+        atom_colors.setdefault(atom_1, set()).add(color)
+        atom_colors.setdefault(atom_2, set()).add(color)
+        colors.append(color)
+    colors = np.array(colors, dtype=int)
+    return [np.flatnonzero(colors == color) for color in range(colors.max() + 1)]
+
+
 def rattle_closure(geom, constraints, dt, tol=1e-3, max_cycles=25,
                    energy_forces_getter=None, remove_com_v=True):
     # Inverse atom masses
@@ -26,6 +57,17 @@ def rattle_closure(geom, constraints, dt, tol=1e-3, max_cycles=25,
     lengths = np.linalg.norm(get_bond_vecs(coords3d), axis=1)
     lengths_sq = lengths**2
 
+    # Constraints in one batch share no atoms and are corrected simultaneously.
+    # The batches are processed one after another, like the single constraints
+    # in SHAKE.
+    batches = list()
+    for inds in color_constraints(constraints):
+        atoms_1, atoms_2 = constraints[inds].T
+        batches.append((
+            inds, atoms_1, atoms_2,
+            inv_masses[atoms_1, None], inv_masses[atoms_2, None],
+        ))
+
     if energy_forces_getter is None:
         energy_forces_getter = energy_forces_getter_closure(geom)
         # def forces_getter(coords):
@@ -47,32 +89,39 @@ def rattle_closure(geom, constraints, dt, tol=1e-3, max_cycles=25,
         #   Yields updated positions for t+dt and half-updated velocities for t+dt/2
         for i in range(max_cycles):
             corrected = False
-            for j, (atom_1, atom_2) in enumerate(constraints):
-                bond_vec_updated = coords3d_updated[atom_1] - coords3d_updated[atom_2]
-                bond_length_sq = bond_vec_updated.dot(bond_vec_updated)
-                ref_length_sq = lengths_sq[j]
-                diff_sq = ref_length_sq - bond_length_sq
-
-                # We have to correct coordinates and velocities if the deviations is
-                # above the tolerance.
-                if abs(diff_sq) <= (ref_length_sq * tol_sq):
+            for inds, atoms_1, atoms_2, inv_masses_1, inv_masses_2 in batches:
+                bond_vecs_updated = (coords3d_updated[atoms_1]
+                                     - coords3d_updated[atoms_2])
+                bond_lengths_sq = np.einsum("ij,ij->i", bond_vecs_updated,
+                                            bond_vecs_updated)
+                ref_lengths_sq = lengths_sq[inds]
+                diffs_sq = ref_lengths_sq - bond_lengths_sq
+
+                # We have to correct coordinates and velocities if the deviations
+                # are above the tolerance.
+                to_correct = np.abs(diffs_sq) > (ref_lengths_sq * tol_sq)
+                if not to_correct.any():
                     continue
 
                 corrected = True
-                # Otherwise try to satisfy the constraint by calculating the
-                # approximate lagrange multiplier 'g'.
-                dot = bond_vec_updated.dot(bond_vecs[j])
+                # Otherwise try to satisfy the constraints by calculating the
+                # approximate lagrange multipliers 'g'.
+                bond_vecs_batch = bond_vecs[inds]
+                dots = np.einsum("ij,ij->i", bond_vecs_updated, bond_vecs_batch)
                 # TODO: test for constraint failure
-                g = diff_sq / (2 * inv_masses_sums[j] * dot)
-                
-                # Update positions to satify constraint
-                atom_1_factor = g * bond_vecs[j] * inv_masses[atom_1]
-                atom_2_factor = g * bond_vecs[j] * inv_masses[atom_2]
-                coords3d_updated[atom_1] += atom_1_factor
-                coords3d_updated[atom_2] -= atom_2_factor
-                # Update velocities to satify constraint
-                velocities3d_updated[atom_1] += atom_1_factor / dt
-                velocities3d_updated[atom_2] -= atom_2_factor / dt
+                g = np.where(
+                    to_correct, diffs_sq / (2 * inv_masses_sums[inds] * dots), 0.
+                )
+
+                # Update positions to satify constraints
+                g_bond_vecs = g[:, None] * bond_vecs_batch
+                atoms_1_factors = g_bond_vecs * inv_masses_1
+                atoms_2_factors = g_bond_vecs * inv_masses_2
+                coords3d_updated[atoms_1] += atoms_1_factors
+                coords3d_updated[atoms_2] -= atoms_2_factors
+                # Update velocities to satify constraints
+                velocities3d_updated[atoms_1] += atoms_1_factors / dt
+                velocities3d_updated[atoms_2] -= atoms_2_factors / dt
 
             # Stop macro-iterations when no correction was done
             if not corrected:
@@ -94,20 +143,23 @@ def rattle_closure(geom, constraints, dt, tol=1e-3, max_cycles=25,
         #   Update velocities to full time step t+dt
         for i in range(max_cycles):
             corrected = False
-            for j, (atom_1, atom_2) in enumerate(constraints):
-                velocity_diff = (velocities3d_updated[atom_1]
-                                 - velocities3d_updated[atom_2])
-                dot = bond_vecs[j].dot(velocity_diff)
-                # Approximate Lagrange multiplier
-                k = dot / (inv_masses_sums[j] * lengths_sq[j])
-
-                if abs(k) <= tol_sq:
+            for inds, atoms_1, atoms_2, inv_masses_1, inv_masses_2 in batches:
+                velocity_diffs = (velocities3d_updated[atoms_1]
+                                  - velocities3d_updated[atoms_2])
+                bond_vecs_batch = bond_vecs[inds]
+                dots = np.einsum("ij,ij->i", bond_vecs_batch, velocity_diffs)
+                # Approximate Lagrange multipliers
+                k = dots / (inv_masses_sums[inds] * lengths_sq[inds])
+
+                to_correct = np.abs(k) > tol_sq
+                if not to_correct.any():
                     continue
 
                 corrected = True
-                # Update velocities to satify constraint
-                velocities3d_updated[atom_1] -= k * bond_vecs[j] * inv_masses[atom_1]
-                velocities3d_updated[atom_2] += k * bond_vecs[j] * inv_masses[atom_2]
+                # Update velocities to satify constraints
+                k_bond_vecs = np.where(to_correct, k, 0.)[:, None] * bond_vecs_batch
+                velocities3d_updated[atoms_1] -= k_bond_vecs * inv_masses_1
+                velocities3d_updated[atoms_2] += k_bond_vecs * inv_masses_2
 
             # Stop macro-iterations when no correction was done
             if not corrected:
@@ -3,7 +3,7 @@ import logging
 
 import numpy as np
 
-from pysisyphus.constants import FORCE2ACC
+from pysisyphus.constants import BOHR2ANG, FORCE2ACC
 from pysisyphus.dynamics.helpers import kinetic_energy_from_velocities, \
                                         temperature_for_kinetic_energy, \
                                         energy_forces_getter_closure, \
@@ -11,6 +11,8 @@ from pysisyphus.dynamics.helpers import kinetic_energy_from_velocities, \
 from pysisyphus.dynamics.csvr import resample_kin
 from pysisyphus.dynamics.rattle import rattle_closure
 from pysisyphus.helpers import check_for_stop_sign
+from pysisyphus.io.bintrj import BinTrjWriter
+from pysisyphus.xyzloader import TrjWriter
 
 logger = logging.getLogger("dynamics")
 
@@ -24,7 +26,7 @@ THERMOSTATS = {
 
 def md(geom, v0, steps, dt, remove_com_v=True, thermostat=None, T=298.15,
        timecon=100, term_funcs=None, constraints=None, constraint_kwargs=None,
-       verbose=True):
+       stride=1, trj_fn=None, verbose=True):
     """Velocity verlet integrator.
 
     Parameters
@@ -54,6 +56,11 @@ def md(geom, v0, steps, dt, remove_com_v=True, thermostat=None, T=298.15,
         of the MD integration when they evaluate to true.
     constraint_kwargs : dict, optional
         Keyword arguments for the constraint algorithm.
+    stride : int, default=1
+        Only keep the coordinates of every stride-th step.
+    trj_fn : str, optional
+        Stream the kept coordinates to this file while the MD runs. A binary
+        trajectory with energies is written when it ends with '.btrj'.
     verbose : bool, default=True
         Do additional printing when True.
     """
@@ -101,76 +108,99 @@ def md(geom, v0, steps, dt, remove_com_v=True, thermostat=None, T=298.15,
     # v is given in Bohr/fs
     v = v0
     a_prev = np.zeros_like(x)
-    xs = list()
-    Ts = list()
-    E_tots = list()
-
-    E_pot, forces = energy_forces_getter(geom.coords)
-
-    t_cur = 0
-    terminate = False
-    terminate_key = None
-    T_avg = 0
-    for i in range(steps):
-        xs.append(x.copy())
-
-        E_kin = kinetic_energy_from_velocities(masses, v.reshape(-1, 3))
-        T = temperature_for_kinetic_energy(len(masses), E_kin, fixed_dof=fixed_dof)
-        T_avg += T
-        Ts.append(T)
-        E_tot = E_pot + E_kin
-        E_tots.append(E_tot)
-
-        if verbose and (i % 25) == 0:
-            print(f"Step {i:05d}  {t_cur*1e-3: >6.2f} ps  E={E_tot: >8.6f} E_h  "
-                  f"T={T: >8.2f} K <T>={T_avg/(i+1): >8.2f}"
-            )
-
-        if thermostat:
-            E_kin_new = thermo_func(E_kin, sigma, v.size-fixed_dof, tau_t)
-            scale = (E_kin_new / E_kin)**0.5
-            v *= scale
-
-        # RATTLE algorithm
-        if constrained_md:
-            x, v, E_pot, forces = rattle(x, v, forces)
-        # Simple Velocity-Verlet integration
+    # Preallocated trajectory arrays
+    xs = np.zeros((-(-steps // stride), x.size))
+    Ts = np.zeros(steps)
+    E_tots = np.zeros(steps)
+
+    writer = None
+    if trj_fn is not None:
+        if str(trj_fn).endswith(".btrj"):
+            writer = BinTrjWriter(trj_fn, geom.atoms, energies=True)
         else:
-            E_pot, forces = energy_forces_getter(geom.coords)
-            # Acceleration, convert from Hartree / (Bohr * amu) to Bohr/fs²
-            a = forces / masses_rep * FORCE2ACC
-            v += .5 * (a + a_prev) * dt
-            if remove_com_v:
-                v -= v * masses_rep / total_mass
-            # v*dt = Bohr/fs * fs -> Bohr
-            # a*dt**2 = Bohr/fs² * fs² -> Bohr
-            x += v*dt + .5*a*dt**2
-            a_prev = a
-
-        # Update coordinates
-        geom.coords = x
-
-        for name, func in term_funcs.items():
-            if func(x):
-                terminate = True
-                terminate_key = name
+            writer = TrjWriter(trj_fn, geom.atoms)
+
+    # Also close the writer when the calculation fails, so all written
+    # frames end up on disk.
+    try:
+        E_pot, forces = energy_forces_getter(geom.coords)
+
+        t_cur = 0
+        terminate = False
+        terminate_key = None
+        T_avg = 0
+        # Number of steps that were carried out
+        step_num = 0
+        for i in range(steps):
+            step_num = i + 1
+            E_kin = kinetic_energy_from_velocities(masses, v.reshape(-1, 3))
+            T = temperature_for_kinetic_energy(len(masses), E_kin, fixed_dof=fixed_dof)
+            T_avg += T
+            Ts[i] = T
+            E_tot = E_pot + E_kin
+            E_tots[i] = E_tot
+
+            if (i % stride) == 0:
+                xs[i // stride] = x
+                if isinstance(writer, BinTrjWriter):
+                    writer.write(x, energy=E_pot)
+                elif writer is not None:
+                    writer.write(x.reshape(-1, 3) * BOHR2ANG, str(E_pot))
+
+            if verbose and (i % 25) == 0:
+                print(f"Step {i:05d}  {t_cur*1e-3: >6.2f} ps  E={E_tot: >8.6f} E_h  "
+                      f"T={T: >8.2f} K <T>={T_avg/(i+1): >8.2f}"
+                )
+
+            if thermostat:
+                E_kin_new = thermo_func(E_kin, sigma, v.size-fixed_dof, tau_t)
+                scale = (E_kin_new / E_kin)**0.5
+                v *= scale
+
+            # RATTLE algorithm
+            if constrained_md:
+                x, v, E_pot, forces = rattle(x, v, forces)
+            # Simple Velocity-Verlet integration
+            else:
+                E_pot, forces = energy_forces_getter(geom.coords)
+                # Acceleration, convert from Hartree / (Bohr * amu) to Bohr/fs²
+                a = forces / masses_rep * FORCE2ACC
+                v += .5 * (a + a_prev) * dt
+                if remove_com_v:
+                    v -= v * masses_rep / total_mass
+                # v*dt = Bohr/fs * fs -> Bohr
+                # a*dt**2 = Bohr/fs² * fs² -> Bohr
+                x += v*dt + .5*a*dt**2
+                a_prev = a
+
+            # Update coordinates
+            geom.coords = x
+
+            for name, func in term_funcs.items():
+                if func(x):
+                    terminate = True
+                    terminate_key = name
+                    break
+            if terminate:
+                logger.debug(f"Termination function '{name}' evaluted to True. Breaking.")
                 break
-        if terminate:
-            logger.debug(f"Termination function '{name}' evaluted to True. Breaking.")
-            break
 
-        if check_for_stop_sign():
-            break
+            if check_for_stop_sign():
+                break
 
-        # Advance time
-        t_cur += dt
+            # Advance time
+            t_cur += dt
+    finally:
+        if writer is not None:
+            writer.close()
 
+    # Drop unused entries after early termination
     md_result = MDResult(
-                    coords=np.array(xs),
+                    coords=xs[:-(-step_num // stride)],
                     t=t_cur*1e-3,
                     terminated=terminate_key,
-                    T=np.array(Ts),
-                    E_tot=np.array(E_tots),
+                    T=Ts[:step_num],
+                    E_tot=E_tots[:step_num],
     )
 
     return md_result
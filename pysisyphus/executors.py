@@ -0,0 +1,208 @@
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+import weakref
+
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+def get_executor(kind, max_workers=None):
+    """Create a concurrent.futures executor.
+
+    Parameters
+    ----------
+    kind : str
+        Either 'thread' or 'process'. Threads are sufficient for calculators
+        that wrap external programs, as the GIL is released while waiting for
+        the child process. Calculators doing their work in Python (e.g. PySCF)
+        should use processes.
+    max_workers : int, optional
+        Number of concurrent calculations.
+
+    Returns
+    -------
+    executor : concurrent.futures.Executor
+    """
+    try:
+        executor_cls = EXECUTORS[kind]
+    except KeyError:
+        raise Exception(
+            f"Invalid executor '{kind}'! Valid executors are: {list(EXECUTORS.keys())}"
+        )
+    return executor_cls(max_workers=max_workers)
+
+
+def calc_energy_and_forces(geom):
+    """Module level function, so it can be pickled for process pools."""
+    geom.calc_energy_and_forces()
+    return geom
+
+
+def run_calculation(geom):
+    geom.calculator.run_calculation(geom.atoms, geom.cart_coords)
+    return geom
+
+
+def set_pal(geoms, pal):
+    """Set the number of cores each calculation may use."""
+    if pal is None:
+        return
+    for geom in geoms:
+        geom.calculator.pal = int(pal)
+
+
+def map_as_completed(func, items, executor="thread", max_workers=None):
+    """Apply func to all items and yield results as soon as they finish.
+
+    Parameters
+    ----------
+    func : callable
+        Function taking one item. Must be picklable for process pools.
+    items : iterable
+        Items to map over.
+    executor : str or concurrent.futures.Executor
+        Kind of executor, as understood by get_executor(), or an
+        already existing executor that is reused.
+    max_workers : int, optional
+        Number of concurrent evaluations, when a new executor is created.
+
+    Yields
+    ------
+    index : int
+        Index of the item in items.
+    result
+        Return value of func(items[index]).
+    """
+    own_executor = isinstance(executor, str)
+    if own_executor:
+        executor = get_executor(executor, max_workers)
+    try:
+        futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+
+
+class WorkerPool:
+    """Long-lived calculators that serve many geometries.
+
+    Every worker owns one calculator with a persistent scratch directory, so
+    restart files written in one calculation are available in the next one.
+    Every key, e.g. a geometry, is assigned to a worker the first time it is
+    seen and stays there. When the same geometries are calculated repeatedly,
+    e.g. the images of a COS, every worker keeps seeing the same geometry and
+    starts from a good guess. Calculations run in threads, which is
+    appropriate for calculators that wrap external programs.
+    """
+
+    def __init__(self, calc_getter, workers=2, pal=None):
+        """
+        Parameters
+        ----------
+        calc_getter : callable
+            Called with the worker index and returns a calculator.
+        workers : int
+            Number of workers.
+        pal : int, optional
+            Number of cores for every worker. Defaults to the value
+            of the calculators.
+        """
+        self.workers = int(workers)
+        self.calculators = list()
+        for i in range(self.workers):
+            calc = calc_getter(i)
+            calc.keep_scratch = True
+            if pal is not None:
+                calc.pal = int(pal)
+            self.calculators.append(calc)
+        self.locks = [threading.Lock() for _ in range(self.workers)]
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # Maps keys to workers
+        self.assignments = dict()
+        self.assign_lock = threading.Lock()
+        # Ids of collected geometries, whose assignments are dropped
+        self.released = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def get_worker(self, key, geom=None):
+        """Worker of key. New keys go to the worker with the fewest keys.
+
+        When geom is given, the assignment is dropped as soon as geom is
+        garbage collected, so key may be id(geom), which can be reused
+        for another object afterwards.
+        """
+        with self.assign_lock:
+            while self.released:
+                self.assignments.pop(self.released.pop(), None)
+            if key not in self.assignments:
+                loads = [0] * self.workers
+                for worker in self.assignments.values():
+                    loads[worker] += 1
+                self.assignments[key] = loads.index(min(loads))
+                if geom is not None:
+                    # Only a list append, as it may run during garbage
+                    # collection while the lock is held.
+                    weakref.finalize(geom, self.released.append, key)
+            return self.assignments[key]
+
+    def run(self, worker, func_name, atoms, coords):
+        # A calculator must not run two calculations at the same time
+        with self.locks[worker]:
+            calc = self.calculators[worker]
+            return getattr(calc, func_name)(atoms, coords)
+
+    def map_as_completed(self, geoms, func_name="get_forces", keys=None):
+        """Calculate geometries and yield results as soon as they finish.
+
+        Parameters
+        ----------
+        geoms : iterable of Geometry
+            Geometries to calculate.
+        func_name : str
+            Calculator method to call, e.g. 'get_forces' or 'run_calculation'.
+        keys : iterable of hashables, optional
+            Stable keys that determine the worker of every geometry, see
+            get_worker(). By default every geometry object keeps its worker
+            as long as it is alive.
+
+        Yields
+        ------
+        index : int
+            Index of the geometry in geoms.
+        results : dict
+            Results of the calculation.
+        """
+        if keys is None:
+            workers = [self.get_worker(id(geom), geom) for geom in geoms]
+        else:
+            workers = [self.get_worker(key) for key in keys]
+        futures = {
+            self.executor.submit(
+                self.run, worker, func_name, geom.atoms, geom.cart_coords
+            ): i
+            for i, (worker, geom) in enumerate(zip(workers, geoms))
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def calc_energy_and_forces(self, geoms, keys=None):
+        """Calculate energies and forces and set them on the geometries."""
+        for i, results in self.map_as_completed(geoms, "get_forces", keys):
+            geoms[i].set_results(results)
+            yield i, geoms[i]
+
+    def shutdown(self, clean=True):
+        self.executor.shutdown(wait=True)
+        if clean:
+            for calc in self.calculators:
+                calc.clean_scratch()
@@ -0,0 +1,252 @@
+import copy
+from functools import partial
+import logging
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from pysisyphus.executors import map_as_completed
+
+
+logger = logging.getLogger("calculator")
+
+
+def get_displacements(atom_num, step_size, skip_trans=False):
+    """Central-difference displacements of all Cartesian coordinates.
+
+    Parameters
+    ----------
+    atom_num : int
+        Number of atoms.
+    step_size : float
+        Displacement in Bohr.
+    skip_trans : bool
+        Don't displace the last atom. Its Hessian columns are later
+        reconstructed from translational invariance.
+
+    Returns
+    -------
+    displ_inds : np.array, shape (M, )
+        Indices of the displaced coordinates.
+    displacements : np.array, shape (2M, 3N)
+        Displacements; the first M rows are the positive steps, the last
+        M rows the negative ones.
+    """
+    coord_num = 3 * atom_num
+    displ_num = coord_num - 3 if (skip_trans and atom_num > 1) else coord_num
+    displ_inds = np.arange(displ_num)
+    steps = np.zeros((displ_num, coord_num))
+    steps[displ_inds, displ_inds] = step_size
+    displacements = np.concatenate((steps, -steps), axis=0)
+    return displ_inds, displacements
+
+
+def calc_displaced_gradient(calc, atoms, task):
+    """Gradient at displaced coordinates, run in a worker.
+
+    Every displacement runs in its own copy of the calculator with its own
+    out_dir and scratch directory, so concurrent calculations don't share
+    files. Empty output directories are removed afterwards.
+    """
+    coords, index = task
+    calc = copy.copy(calc)
+    calc.base_name = f"{calc.base_name}_numhess"
+    calc.calc_counter = index
+    calc.out_dir = calc.out_dir / f"{calc.base_name}_{index:03d}"
+    calc.out_dir.mkdir(parents=True, exist_ok=True)
+    calc.keep_scratch = False
+    calc.scratch_path = None
+    calc.path_already_prepared = None
+    results = calc.get_forces(atoms, coords)
+    try:
+        calc.out_dir.rmdir()
+    except OSError:
+        # Kept files
+        pass
+    return results["energy"], -results["forces"]
+
+
+def get_fingerprint(calc, atoms, coords):
+    """Hash of calculator, settings, atoms and coordinates, or None."""
+    # Imported here, as the calculators package imports this module
+    from pysisyphus.calculators.ResultCache import get_cache_key, UncacheableSetting
+
+    try:
+        return get_cache_key(calc, "get_forces", atoms, coords)
+    except UncacheableSetting as err:
+        logger.warning(f"Can't fingerprint calculator for restarts: {err}")
+        return None
+
+
+class DisplacementStore:
+    """HDF5 file that records finished displacements for restarts.
+
+    Stored displacements are only reused when atoms, coordinates, step size
+    and the fingerprint of the calculator settings all match. Without a
+    fingerprint nothing is reused.
+    """
+
+    def __init__(self, h5_fn, atoms, coords, step_size, displ_num, fingerprint):
+        self.h5_fn = Path(h5_fn)
+        self.atoms = [atom.lower() for atom in atoms]
+        self.coords = coords
+        self.step_size = step_size
+        self.displ_num = displ_num
+        self.fingerprint = fingerprint
+
+        self.done = np.zeros(displ_num, dtype=bool)
+        self.energies = np.zeros(displ_num)
+        self.gradients = np.zeros((displ_num, coords.size))
+        if self.h5_fn.exists():
+            self.load()
+
+    def load(self):
+        with h5py.File(self.h5_fn, "r") as handle:
+            coords = handle["coords"][:]
+            step_size = handle["step_size"][()]
+            atoms = handle.attrs.get("atoms", "").split()
+            fingerprint = handle.attrs.get("fingerprint", "")
+            compatible = (
+                (self.fingerprint is not None)
+                and (fingerprint == self.fingerprint)
+                and (atoms == self.atoms)
+                and (coords.shape == self.coords.shape)
+                and np.allclose(coords, self.coords, atol=1e-10)
+                and (step_size == self.step_size)
+                and (handle["done"].size == self.displ_num)
+            )
+            if not compatible:
+                logger.warning(
+                    f"Ignoring incompatible displacements in {self.h5_fn}"
+                )
+                return
+            self.done = handle["done"][:].astype(bool)
+            self.energies = handle["energies"][:]
+            self.gradients = handle["gradients"][:]
+        logger.debug(
+            f"Restarting from {self.done.sum()} finished displacements in {self.h5_fn}"
+        )
+
+    def create(self):
+        with h5py.File(self.h5_fn, "w") as handle:
+            handle.attrs["atoms"] = " ".join(self.atoms)
+            handle.attrs["fingerprint"] = (
+                "" if self.fingerprint is None else self.fingerprint
+            )
+            handle.create_dataset("coords", data=self.coords)
+            handle.create_dataset("step_size", data=self.step_size)
+            handle.create_dataset("done", data=self.done)
+            handle.create_dataset("energies", data=self.energies)
+            handle.create_dataset("gradients", data=self.gradients)
+
+    def store(self, index, energy, gradient):
+        self.done[index] = True
+        self.energies[index] = energy
+        self.gradients[index] = gradient
+        with h5py.File(self.h5_fn, "r+") as handle:
+            handle["done"][index] = True
+            handle["energies"][index] = energy
+            handle["gradients"][index] = gradient
+
+    def delete(self):
+        self.h5_fn.unlink(missing_ok=True)
+        logger.debug(f"Deleted displacement store {self.h5_fn}")
+
+
+def finite_difference_hessian(
+    calc,
+    atoms,
+    coords,
+    step_size=0.005,
+    skip_trans=False,
+    h5_fn=None,
+    executor="thread",
+    max_workers=None,
+):
+    """Cartesian Hessian from central differences of analytical gradients.
+
+    All 6N displaced gradients (plus the undisplaced one for the energy) are
+    independent and dispatched concurrently. Finished gradients are stored in
+    an HDF5 file, so an interrupted calculation can be restarted.
+
+    Parameters
+    ----------
+    calc : Calculator
+        Calculator providing get_forces.
+    atoms : iterable
+        Atom descriptors.
+    coords : np.array
+        Cartesian coordinates in Bohr.
+    step_size : float
+        Displacement in Bohr.
+    skip_trans : bool
+        Skip the displacements of the last atom and obtain its columns from
+        translational invariance of the energy, saving 6 gradients. Not valid
+        when the energy depends on the absolute position, e.g. with an
+        external potential.
+    h5_fn : str or Path, optional
+        HDF5 file used for restarts. No restart file is written if omitted.
+        The file is deleted once the Hessian is complete.
+    executor : str
+        'process' or 'thread', see pysisyphus.executors.get_executor.
+    max_workers : int, optional
+        Number of concurrent gradient calculations.
+
+    Returns
+    -------
+    results : dict
+        Energy at the undisplaced coordinates and the Cartesian Hessian.
+    """
+    coords = np.array(coords, dtype=float).flatten()
+    atom_num = len(atoms)
+    displ_inds, displacements = get_displacements(atom_num, step_size, skip_trans)
+    # The last entry holds the undisplaced gradient
+    all_coords = np.concatenate((coords + displacements, coords[None, :]), axis=0)
+    displ_num = len(all_coords)
+
+    store = None
+    if h5_fn is not None:
+        fingerprint = get_fingerprint(calc, atoms, coords)
+        store = DisplacementStore(
+            h5_fn, atoms, coords, step_size, displ_num, fingerprint
+        )
+        store.create()
+        todo = np.flatnonzero(~store.done)
+        energies, gradients = store.energies, store.gradients
+    else:
+        todo = np.arange(displ_num)
+        energies = np.zeros(displ_num)
+        gradients = np.zeros((displ_num, coords.size))
+    logger.debug(
+        f"Numerical Hessian: {displ_num} gradients, {displ_num - len(todo)} "
+        "already finished"
+    )
+
+    func = partial(calc_displaced_gradient, calc, atoms)
+    tasks = [(all_coords[i], i) for i in todo]
+    results = map_as_completed(func, tasks, executor, max_workers)
+    for j, (energy, gradient) in results:
+        i = todo[j]
+        energies[i] = energy
+        gradients[i] = gradient
+        if store is not None:
+            store.store(i, energy, gradient)
+
+    plus = gradients[: len(displ_inds)]
+    minus = gradients[len(displ_inds) : 2 * len(displ_inds)]
+    hessian = np.zeros((coords.size, coords.size))
+    hessian[:, displ_inds] = ((plus - minus) / (2 * step_size)).T
+    if len(displ_inds) < coords.size:
+        # Columns of the last atom from translational invariance
+        for k in range(3):
+            hessian[:, -3 + k] = -hessian[:, k:-3:3].sum(axis=1)
+    hessian = (hessian + hessian.T) / 2
+    if store is not None:
+        store.delete()
+
+    return {
+        "energy": energies[-1],
+        "hessian": hessian,
+    }
+
@@ -14,7 +14,12 @@ from scipy.spatial.distance import cdist
 from pysisyphus.constants import ANG2BOHR, AU2KJPERMOL
 from pysisyphus.Geometry import Geometry
 from pysisyphus.helpers_pure import eigval_to_wavenumber
-from pysisyphus.io import geom_from_pdb, geom_from_cjson, save_hessian as save_h5_hessian
+from pysisyphus.io import (
+    geom_from_pdb,
+    geom_from_cjson,
+    geoms_from_bintrj,
+    save_hessian as save_h5_hessian,
+)
 from pysisyphus.xyzloader import parse_xyz_file, parse_trj_file, make_trj_str
 
 
@@ -48,7 +53,7 @@ def geoms_from_trj(trj_fn, first=None, coord_type="cart", **coord_kwargs):
     if trj_fn.startswith("lib:"):
         # Drop lib: part
         return geom_from_library(trj_fn[4:], **kwargs)[:first]
-    atoms_coords_comments = parse_trj_file(trj_fn, with_comments=True)[:first]
+    atoms_coords_comments = parse_trj_file(trj_fn, with_comments=True, first=first)
     geoms = [Geometry(atoms, coords.flatten()*ANG2BOHR,
                       comment=comment,
                       **kwargs
@@ -76,6 +81,8 @@ def geom_loader(fn, coord_type="cart", **coord_kwargs):
         return geom_from_pdb(fn, **kwargs)
     elif fn.endswith(".cjson"):
         return geom_from_cjson(fn, **kwargs)
+    elif fn.endswith(".btrj"):
+        return geoms_from_bintrj(fn, **kwargs)
     else:
         raise Exception("Unknown filetype!")
 
@@ -230,100 +237,94 @@ def get_baker_opt_ts_geoms(**kwargs):
     return geoms, meta_data
 
 
-def align_geoms(geoms):
+def kabsch_rotations(coords3d, ref_coords3d):
+    """Batched Kabsch algorithm.
+
+    Parameters
+    ----------
+    coords3d : np.array, shape (K, N, 3)
+        Centered coordinates of K images.
+    ref_coords3d : np.array, shape (K, N, 3)
+        Centered reference coordinates.
+
+    Returns
+    -------
+    rot_mats : np.array, shape (K, 3, 3)
+        Rotation matrices, so that coords3d[k].dot(rot_mats[k]) is aligned
+        onto ref_coords3d[k].
+    """
     # http://nghiaho.com/?page_id=671#comment-559906
-    first_geom = geoms[0]
-    coords3d = first_geom.coords3d
-    centroid = coords3d.mean(axis=0)
-    last_centered = coords3d - centroid
-    first_geom.coords3d = last_centered
-    atoms_per_image = len(first_geom.atoms)
-
-    # Don't rotate the first image, so just add identitiy matrices
-    # for every atom.
-    rot_mats = [np.eye(3)]*atoms_per_image
-    for i, geom in enumerate(geoms[1:], 1):
-        coords3d = geom.coords3d
-        centroid = coords3d.mean(axis=0)
-        # Center next image
-        centered = coords3d - centroid
-        tmp_mat = centered.T.dot(last_centered)
-        U, W, Vt = np.linalg.svd(tmp_mat)
-        rot_mat = U.dot(Vt)
-        # Avoid reflections
-        if np.linalg.det(rot_mat) < 0:
-            U[:, -1] *= -1
-            rot_mat = U.dot(Vt)
-        # Rotate the coords
-        rotated3d = centered.dot(rot_mat)
-        geom.coords3d = rotated3d
-        last_centered = rotated3d
-        # Append one rotation matrix per atom
-        rot_mats.extend([rot_mat]*atoms_per_image)
+    # All covariance matrices and their SVDs at once
+    tmp_mats = coords3d.transpose(0, 2, 1) @ ref_coords3d
+    U, W, Vt = np.linalg.svd(tmp_mats)
+    # Avoid reflections
+    reflections = np.linalg.det(U @ Vt) < 0
+    U[reflections, :, -1] *= -1
+    return U @ Vt
+
+
+def align_consecutive(coords):
+    """Center all images and align every image onto its aligned predecessor.
+
+    The rotation that aligns an image onto its rotated predecessor is the
+    product of the rotation onto the unrotated predecessor and the rotation
+    of the predecessor. So all SVDs can be done at once and only the
+    3x3 rotation matrices have to be chained, which is done as a prefix
+    product in log2(K) batched steps.
+
+    Parameters
+    ----------
+    coords : array-like, shape (K, 3N) or (K, N, 3)
+        Cartesian coordinates of K images.
+
+    Returns
+    -------
+    aligned : np.array, shape (K, N, 3)
+        Centered and aligned coordinates.
+    rot_mats : np.array, shape (K, 3, 3)
+        Rotation matrix of every image. The first one is the identity.
+    """
+    coords3d = np.array(coords, dtype=float).reshape(len(coords), -1, 3)
+    centered = coords3d - coords3d.mean(axis=1)[:, None, :]
+    pair_rot_mats = kabsch_rotations(centered[1:], centered[:-1])
+    rot_mats = np.concatenate((np.eye(3)[None, :, :], pair_rot_mats))
+    # After the step with a given shift, rot_mats[i] is the product of the
+    # (up to) 2*shift pair rotations ending at image i.
+    shift = 1
+    while shift < len(rot_mats):
+        rot_mats[shift:] = rot_mats[shift:] @ rot_mats[:-shift]
+        shift *= 2
+    aligned = centered @ rot_mats
+    return aligned, rot_mats
+
+
+def align_geoms(geoms):
+    """Align geometries in place, see align_consecutive().
+
+    Returns the rotation matrices of shape (K, 3, 3).
+    """
+    aligned, rot_mats = align_consecutive([geom.coords3d for geom in geoms])
+    for geom, coords3d in zip(geoms, aligned):
+        geom.coords3d = coords3d
     return rot_mats
 
 
 def procrustes(geometry):
-    # http://nghiaho.com/?page_id=671#comment-559906
-    image0 = geometry.images[0]
-    coords3d = image0.coords3d
-    centroid = coords3d.mean(axis=0)
-    last_centered = coords3d - centroid
-    geometry.set_coords_at(0, last_centered.flatten())
-    atoms_per_image = len(image0.atoms)
-
-    # Don't rotate the first image, so just add identitiy matrices
-    # for every atom.
-    rot_mats = [np.eye(3)]*atoms_per_image
-    for i, image in enumerate(geometry.images[1:], 1):
-        coords3d = image.coords3d
-        centroid = coords3d.mean(axis=0)
-        # Center next image
-        centered = coords3d - centroid
-        tmp_mat = centered.T.dot(last_centered)
-        U, W, Vt = np.linalg.svd(tmp_mat)
-        rot_mat = U.dot(Vt)
-        # Avoid reflections
-        if np.linalg.det(rot_mat) < 0:
-            U[:, -1] *= -1
-            rot_mat = U.dot(Vt)
-        # Rotate the coords
-        rotated3d = centered.dot(rot_mat)
-        geometry.set_coords_at(i, rotated3d.flatten())
-        last_centered = rotated3d
-        # Append one rotation matrix per atom
-        rot_mats.extend([rot_mat]*atoms_per_image)
+    """Align the images of a ChainOfStates, see align_consecutive().
+
+    Returns the rotation matrices of shape (K, 3, 3).
+    """
+    aligned, rot_mats = align_consecutive(
+        [image.coords3d for image in geometry.images]
+    )
+    for i, coords3d in enumerate(aligned):
+        geometry.set_coords_at(i, coords3d.flatten())
     return rot_mats
 
 
 def align_coords(coords_list):
-    coords_list = np.array(coords_list)
-    coord_num = len(coords_list)
-    aligned_coords = np.empty_like(coords_list).reshape(coord_num, -1, 3)
-
-    coords0 = coords_list[0]
-    coords0_3d = coords0.reshape(-1, 3)
-    centroid = coords0_3d.mean(axis=0)
-    prev_centered = coords0_3d - centroid
-    aligned_coords[0] = prev_centered
-
-    for i, coords in enumerate(coords_list[1:], 1):
-        coords3d = coords.reshape(-1, 3)
-        centroid = coords3d.mean(axis=0)
-        # Center next image
-        centered = coords3d - centroid
-        tmp_mat = centered.T.dot(prev_centered)
-        U, W, Vt = np.linalg.svd(tmp_mat)
-        rot_mat = U.dot(Vt)
-        # Avoid reflections
-        if np.linalg.det(rot_mat) < 0:
-            U[:, -1] *= -1
-            rot_mat = U.dot(Vt)
-        # Rotate the coords
-        rotated3d = centered.dot(rot_mat)
-        aligned_coords[i] = rotated3d
-        prev_centered = rotated3d
-    aligned_coords.reshape(coord_num, -1)
+    """Aligned coordinates of shape (K, N, 3), see align_consecutive()."""
+    aligned_coords, _ = align_consecutive(coords_list)
     return aligned_coords
 
 
@@ -338,13 +339,19 @@ def fit_rigid(geometry, vectors=(), vector_lists=(), hessian=None):
     rotated_hessian = None
 
     rot_mats = procrustes(geometry)
-    G = sp.linalg.block_diag(*rot_mats)
-    rotated_vectors = [vec.dot(G) for vec in vectors]
+
+    def rotate(vec):
+        vec3d = np.reshape(vec, (len(rot_mats), -1, 3))
+        return (vec3d @ rot_mats).flatten()
+
+    rotated_vectors = [rotate(vec) for vec in vectors]
     for vl in vector_lists:
-        rvl = [vec.dot(G) for vec in vl]
+        rvl = [rotate(vec) for vec in vl]
         rotated_vector_lists.append(rvl)
 
     if hessian is not None:
+        atoms_per_image = len(geometry.images[0].atoms)
+        G = sp.linalg.block_diag(*np.repeat(rot_mats, atoms_per_image, axis=0))
         # rotated_hessian = G.dot(hessian).dot(G.T)
         # rotated_hessian = G.T.dot(hessian).dot(G)
         rotated_hessian = G*hessian*G.T
@@ -22,6 +22,8 @@ class DLC(RedundantCoords):
     @U.setter
     def U(self, U):
         self._U = U
+        # Quantities derived from B depend on U
+        self.clear_cache()
         # Needed for back-transformation to primitive internals
         # For now we use a pseudo-inverse instead of a regular inverse,
         # as some columns of U may be zero from constraints (resulting in
@@ -65,7 +67,12 @@ class DLC(RedundantCoords):
     @property
     def B(self):
         """Wilson B-Matrix in the non-redundant subspace."""
-        return self.U.T.dot(self.B_prim)
+        return self.get_cached("B", lambda: self.U.T @ self.B_prim)
+
+    @property
+    def Bt_inv(self):
+        """Transposed generalized inverse of the Wilson B-Matrix."""
+        return self.get_cached("Bt_inv", lambda: self.get_Bt_inv(self.B))
 
     def project_hessian(self, H):
         """As we already work in the non-redundant subspace we don't have
@@ -93,6 +100,7 @@ class DLC(RedundantCoords):
     def get_active_set(self, B, thresh=1e-6):
         """See [5] between Eq. (7) and Eq. (8) for advice regarding
         the threshold."""
+        B = self.dense(B)
         if self.weighted:
             weights = np.array(
                 [prim.weight(self.atoms, self.coords3d) for prim in self.primitives]
@@ -10,15 +10,19 @@ import itertools as it
 import logging
 
 import numpy as np
+import scipy.sparse as sp
 
-from pysisyphus.intcoords import Stretch, Torsion
+from pysisyphus.intcoords import Stretch
 from pysisyphus.intcoords.update import transform_int_step
 from pysisyphus.intcoords.eval import (
+    eval_B,
+    eval_K,
     eval_primitives,
     check_primitives,
 )
 from pysisyphus.intcoords.setup import setup_redundant, get_primitives, PrimTypes
 from pysisyphus.intcoords.valid import check_typed_prims
+from pysisyphus.linalg import lstsq_min_norm
 
 
 class RedundantCoords:
@@ -38,8 +42,14 @@ class RedundantCoords:
         weighted=False,
         min_weight=0.3,
         rcond=1e-8,
+        sparse=False,
     ):
         self.atoms = atoms
+        # Hits and misses of the cache that holds quantities derived from
+        # the B-matrix, e.g., its generalized inverse. The cache is cleared
+        # whenever the coordinates change.
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.coords3d = np.reshape(coords3d, (-1, 3)).copy()
         self.bond_factor = bond_factor
         self.define_prims = define_prims
@@ -53,6 +63,9 @@ class RedundantCoords:
         self.min_weight = float(min_weight)
         assert self.min_weight > 0.0, "min_weight must be a positive rational!"
         self.rcond = rcond
+        # Keep a sparse B-matrix and use iterative least-squares solvers
+        # for the force- and the back-transformation.
+        self.sparse = sparse
 
         self._B_prim = None
         # Lists for the other types of primitives will be created afterwards.
@@ -141,6 +154,21 @@ class RedundantCoords:
         self._B_prim = None
         self._prim_coords = None
         self._prim_internals = None
+        self.clear_cache()
+
+    def clear_cache(self):
+        self._cache = dict()
+
+    def get_cached(self, key, func):
+        """Return the cached value for key or store the result of func()."""
+        try:
+            value = self._cache[key]
+            self.cache_hits += 1
+        except KeyError:
+            value = func()
+            self._cache[key] = value
+            self.cache_misses += 1
+        return value
 
     @property
     def primitives(self):
@@ -208,7 +236,12 @@ class RedundantCoords:
     def B_prim(self):
         """Wilson B-Matrix"""
         if self._B_prim is None:
-            self._B_prim = np.array([prim_int.grad for prim_int in self.prim_internals])
+            if self.sparse:
+                self._B_prim = eval_B(self.coords3d, self.primitives, sparse=True)
+            else:
+                self._B_prim = np.array(
+                    [prim_int.grad for prim_int in self.prim_internals]
+                )
 
         return self._B_prim
 
@@ -217,90 +250,73 @@ class RedundantCoords:
         """Wilson B-Matrix"""
         return self.B_prim
 
+    @staticmethod
+    def dense(array):
+        """Dense version of a possibly sparse matrix."""
+        return array.toarray() if sp.issparse(array) else array
+
     def pinv(self, array, rcond=None):
         if rcond is None:
             rcond = self.rcond
         return np.linalg.pinv(array, rcond=rcond)
 
+    def get_Bt_inv(self, B):
+        B = self.dense(B)
+        return self.pinv(B.dot(B.T)).dot(B)
+
     @property
     def Bt_inv_prim(self):
         """Transposed generalized inverse of the primitive Wilson B-Matrix."""
-        B = self.B_prim
-        return self.pinv(B.dot(B.T)).dot(B)
+        return self.get_cached(
+            "Bt_inv_prim", lambda: self.get_Bt_inv(self.B_prim)
+        )
 
     @property
     def Bt_inv(self):
         """Transposed generalized inverse of the Wilson B-Matrix."""
-        B = self.B
-        return self.pinv(B.dot(B.T)).dot(B)
+        # B and B_prim are identical for redundant internals.
+        return self.Bt_inv_prim
 
     @property
     def B_inv_prim(self):
         """Generalized inverse of the primitive Wilson B-Matrix."""
-        B = self.B_prim
-        return B.T.dot(self.pinv(B.dot(B.T)))
+        return self.Bt_inv_prim.T
 
     @property
     def B_inv(self):
         """Generalized inverse of the Wilson B-Matrix."""
-        B = self.B
-        return B.T.dot(self.pinv(B.dot(B.T)))
+        return self.Bt_inv.T
 
     @property
     def P(self):
         """Projection matrix onto B. See [1] Eq. (4)."""
-        return self.B.dot(self.B_inv)
+        return self.get_cached("P", lambda: self.B @ self.B_inv)
 
     def transform_forces(self, cart_forces):
-        """Combination of Eq. (9) and (11) in [1]."""
+        """Combination of Eq. (9) and (11) in [1].
+
+        With a sparse B-matrix the internal forces are obtained as minimum
+        norm least-squares solution of Bᵀ·f_int = f_cart."""
+        if self.sparse:
+            return lstsq_min_norm(self.B.T, cart_forces)
         return self.Bt_inv.dot(cart_forces)
 
-    def get_K_matrix(self, int_gradient=None):
+    def get_K_matrix(self, int_gradient=None, sparse=False):
         if int_gradient is not None:
             assert len(int_gradient) == len(self._primitives)
 
         size_ = self.coords3d.size
         if int_gradient is None:
-            return np.zeros((size_, size_))
-
-        K_flat = np.zeros(size_ * size_)
-        coords3d = self.coords3d
-        for primitive, int_grad_item in zip(self.primitives, int_gradient):
-            # Contract with gradient
-            val = np.rad2deg(primitive.calculate(coords3d))
-            self.log(f"K, {primitive}={val:.2f}°")
-            # The generated code (d2q_d) seems unstable for these values...
-            if isinstance(primitive, Torsion) and ((abs(val) < 1) or (abs(val) > 179)):
-                self.log(f"Skipped 2nd derivative of {primitive} with val={val:.2f}°")
-                continue
-            # 2nd derivative of normal, but linear, bends is undefined.
-            try:
-                dg = int_grad_item * primitive.jacobian(coords3d)
-            except (ValueError, ZeroDivisionError) as err:
-                self.log(
-                    "Error in calculation of 2nd derivative of primitive "
-                    f"internal {primitive.indices}."
-                )
-                continue
-            # Depending on the type of internal coordinate dg is a flat array
-            # of size 36 (stretch), 81 (bend) or 144 (torsion).
-            #
-            # An internal coordinate contributes to an element K[j, k] of the
-            # K matrix if the cartesian coordinate indices j and k belong to an
-            # atom that contributes to the respective internal coordinate.
-            #
-            # As for now we build up the K matrix as flat array. To add the dg
-            # entries at the appropriate places in K_flat we have to calculate
-            # the corresponding flat indices of dg in K_flat.
-            cart_inds = list(
-                it.chain(*[range(3 * i, 3 * i + 3) for i in primitive.indices])
-            )
-            flat_inds = [
-                row * size_ + col for row, col in it.product(cart_inds, cart_inds)
-            ]
-            K_flat[flat_inds] += dg
-        K = K_flat.reshape(size_, size_)
-        return K
+            K = np.zeros((size_, size_))
+            return sp.csr_matrix(K) if sparse else K
+
+        return eval_K(
+            self.coords3d,
+            self.primitives,
+            np.asarray(int_gradient),
+            sparse=sparse,
+            logger=self.logger,
+        )
 
     def log_int_grad_msg(self, int_gradient):
         if int_gradient is None:
@@ -320,11 +336,14 @@ class RedundantCoords:
         """Transform Hessian in internal coordinates to Cartesians."""
         self.log_int_grad_msg(int_gradient)
         K = self.get_K_matrix(int_gradient)
-        return self.B.T.dot(redund_hessian).dot(self.B) + K
+        return self.B.T @ redund_hessian @ self.B + K
 
     def project_hessian(self, H, shift=1000):
         """Expects a hessian in internal coordinates. See Eq. (11) in [1]."""
         P = self.P
+        # Hessian operators, e.g. a LowRankHessian, are projected lazily
+        if hasattr(H, "project"):
+            return H.project(P, shift)
         return P.dot(H).dot(P) + shift * (np.eye(P.shape[0]) - P)
 
     def project_vector(self, vector):
@@ -382,7 +401,11 @@ class RedundantCoords:
         self.fragments = coord_info.fragments
 
     def eval(self, coords3d, attr=None):
-        prim_internals = eval_primitives(coords3d, self.primitives)
+        # In sparse mode the B-matrix is not assembled from the dense
+        # gradients of the primitives.
+        prim_internals = eval_primitives(
+            coords3d, self.primitives, gradient=not self.sparse
+        )
 
         if attr is not None:
             return np.array(
@@ -399,6 +422,7 @@ class RedundantCoords:
             self.prim_coords,
             self.B_prim,
             self.primitives,
+            Bt_inv_prim=None if self.sparse else self.Bt_inv_prim,
             check_dihedrals=self.rebuild,
             rcond=self.rcond,
             logger=self.logger,
@@ -408,6 +432,10 @@ class RedundantCoords:
             self.coords3d += cart_step.reshape(-1, 3)
             self.prim_internals = new_prim_internals
             self.backtransform_counter += 1
+            self.log(
+                f"B-matrix cache: {self.cache_hits} hit(s), "
+                f"{self.cache_misses} miss(es) in total."
+            )
         return cart_step
 
     def __str__(self):
@@ -1,7 +1,15 @@
 import logging
 import random
+import types
 
 import numpy as np
+import scipy.sparse as sp
+
+from pysisyphus.helpers_pure import log
+from pysisyphus.intcoords.Bend import Bend
+from pysisyphus.intcoords.Stretch import Stretch
+from pysisyphus.intcoords.Torsion import Torsion
+from pysisyphus.intcoords.derivatives import d2q_b, d2q_a, d2q_d
 
 
 class PrimInternal:
@@ -20,7 +28,310 @@ class PrimInternal:
     # return (1 - abs(dot)) < thresh
 
 
-def eval_primitives(coords3d, primitives):
+def eval_stretches(coords3d, indices, gradient=False):
+    """Batched version of Stretch._calculate.
+
+    indices is an integer array of shape (N, 2). The gradients are returned
+    as array of shape (N, 2, 3), holding the derivatives w.r.t. the atoms
+    in the order they appear in indices."""
+    n, m = indices.T
+    bonds = coords3d[m] - coords3d[n]
+    bond_lengths = np.linalg.norm(bonds, axis=1)
+    if gradient:
+        bonds_normed = bonds / bond_lengths[:, None]
+        grads = np.stack((-bonds_normed, bonds_normed), axis=1)
+        return bond_lengths, grads
+    return bond_lengths
+
+
+def _are_parallel(u, v, thresh=1e-6):
+    """Row-wise version of Primitive.parallel."""
+    dot = np.einsum("ij,ij->i", u, v) / (
+        np.linalg.norm(u, axis=1) * np.linalg.norm(v, axis=1)
+    )
+    return (1 - np.abs(dot)) < thresh
+
+
+def eval_bends(coords3d, indices, gradient=False):
+    """Batched version of Bend._calculate. See eval_stretches."""
+    m, o, n = indices.T
+    u_dash = coords3d[m] - coords3d[o]
+    v_dash = coords3d[n] - coords3d[o]
+    u_norm = np.linalg.norm(u_dash, axis=1)
+    v_norm = np.linalg.norm(v_dash, axis=1)
+    u = u_dash / u_norm[:, None]
+    v = v_dash / v_norm[:, None]
+
+    angles_rad = np.arccos(np.einsum("ij,ij->i", u, v))
+
+    if gradient:
+        # Second vector for the cross product, see Bend._calculate.
+        cross_vec1 = np.full_like(u, (1, -1, 1))
+        cross_vec2 = np.full_like(u, (-1, 1, 1))
+        uv_parallel = _are_parallel(u, v)
+        u_cv1_parallel = _are_parallel(u, cross_vec1)
+        cross_vecs = np.where(
+            uv_parallel[:, None],
+            np.where(u_cv1_parallel[:, None], cross_vec2, cross_vec1),
+            v,
+        )
+        w_dash = np.cross(u, cross_vecs)
+        w = w_dash / np.linalg.norm(w_dash, axis=1)[:, None]
+
+        first_term = np.cross(u, w) / u_norm[:, None]
+        second_term = np.cross(w, v) / v_norm[:, None]
+        grads = np.stack(
+            (first_term, -first_term - second_term, second_term), axis=1
+        )
+        return angles_rad, grads
+    return angles_rad
+
+
+def eval_torsions(coords3d, indices, gradient=False):
+    """Batched version of Torsion._calculate. See eval_stretches."""
+    m, o, p, n = indices.T
+    u_dash = coords3d[m] - coords3d[o]
+    v_dash = coords3d[n] - coords3d[p]
+    w_dash = coords3d[p] - coords3d[o]
+    u_norm = np.linalg.norm(u_dash, axis=1)
+    v_norm = np.linalg.norm(v_dash, axis=1)
+    w_norm = np.linalg.norm(w_dash, axis=1)
+    u = u_dash / u_norm[:, None]
+    v = v_dash / v_norm[:, None]
+    w = w_dash / w_norm[:, None]
+    phi_u = np.arccos(np.einsum("ij,ij->i", u, w))
+    phi_v = np.arccos(-np.einsum("ij,ij->i", w, v))
+    uxw = np.cross(u, w)
+    vxw = np.cross(v, w)
+    sin_u = np.sin(phi_u)
+    sin_v = np.sin(phi_v)
+    cos_diheds = np.einsum("ij,ij->i", uxw, vxw) / (sin_u * sin_v)
+    cos_diheds = np.clip(cos_diheds, -1, 1)
+
+    diheds_rad = np.arccos(cos_diheds)
+    # Correct the sign of the dihedrals, see Torsion._calculate.
+    negative = (diheds_rad != np.pi) & (np.einsum("ij,ij->i", vxw, u) < 0)
+    diheds_rad[negative] *= -1
+
+    if gradient:
+        sin2_u = sin_u[:, None] ** 2
+        sin2_v = sin_v[:, None] ** 2
+        first_term = uxw / (u_norm[:, None] * sin2_u)
+        second_term = vxw / (v_norm[:, None] * sin2_v)
+        third_term = uxw * np.cos(phi_u)[:, None] / (w_norm[:, None] * sin2_u)
+        fourth_term = -vxw * np.cos(phi_v)[:, None] / (w_norm[:, None] * sin2_v)
+        grads = np.stack(
+            (
+                first_term,
+                -first_term + third_term - fourth_term,
+                second_term - third_term + fourth_term,
+                -second_term,
+            ),
+            axis=1,
+        )
+        return diheds_rad, grads
+    return diheds_rad
+
+
+# Primitive types that can be evaluated in one NumPy pass. Subclasses
+# are not included, as they may alter the definition of the primitive.
+BATCHED_EVALUATORS = {
+    Stretch: eval_stretches,
+    Bend: eval_bends,
+    Torsion: eval_torsions,
+}
+
+
+def group_primitives(primitives):
+    """Group primitives by their type.
+
+    Returns a list of (evaluator, positions, indices) tuples for all types
+    supported by batched evaluation. 'positions' are the positions of the
+    primitives in the supplied list, 'indices' is a 2d integer array holding
+    the atom indices of the primitives. The positions of all remaining primitives
+    are returned separately."""
+    positions = dict()
+    remaining = list()
+    for i, primitive in enumerate(primitives):
+        type_ = type(primitive)
+        if type_ in BATCHED_EVALUATORS:
+            positions.setdefault(type_, list()).append(i)
+        else:
+            remaining.append(i)
+
+    groups = list()
+    for type_, type_positions in positions.items():
+        indices = np.array(
+            [primitives[i].indices for i in type_positions], dtype=int
+        )
+        groups.append((BATCHED_EVALUATORS[type_], np.array(type_positions), indices))
+    return groups, remaining
+
+
+def eval_prim_vals_and_B(coords3d, primitives, gradient=True, sparse=False):
+    """Values of all primitives and the Wilson B-matrix.
+
+    Primitives of the same type are evaluated together in one batch. Primitives
+    without a batched implementation are evaluated one after another.
+    With sparse=True the B-matrix is returned as scipy.sparse CSR matrix."""
+    coords3d = np.reshape(coords3d, (-1, 3))
+    prim_num = len(primitives)
+    vals = np.zeros(prim_num)
+    if gradient and sparse:
+        rows, cols, data = list(), list(), list()
+
+        def set_grads(positions, indices, grads):
+            atom_num = indices.shape[1]
+            rows.append(np.repeat(positions, 3 * atom_num))
+            cols.append((3 * indices[:, :, None] + np.arange(3)).flatten())
+            data.append(grads.flatten())
+
+    elif gradient:
+        B = np.zeros((prim_num, *coords3d.shape))
+
+        def set_grads(positions, indices, grads):
+            B[positions[:, None], indices] = grads
+
+    groups, remaining = group_primitives(primitives)
+    for evaluator, positions, indices in groups:
+        if gradient:
+            vals[positions], grads = evaluator(coords3d, indices, gradient=True)
+            set_grads(positions, indices, grads)
+        else:
+            vals[positions] = evaluator(coords3d, indices)
+
+    for i in remaining:
+        result = primitives[i].calculate(coords3d, gradient=gradient)
+        if gradient:
+            vals[i] = result[0]
+            indices = np.array([primitives[i].indices])
+            grads = result[1].reshape(-1, 3)[indices]
+            set_grads(np.array([i]), indices, grads)
+        else:
+            vals[i] = result
+
+    if not gradient:
+        B = None
+    elif sparse:
+        B = sp.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(prim_num, coords3d.size),
+        )
+    else:
+        B = B.reshape(prim_num, -1)
+    return vals, B
+
+
+def batch_derivative(func):
+    """Create a batched version of a code generated derivative.
+
+    The functions in derivatives.py only use math.sqrt, math.acos and np.array.
+    By rebinding 'math' to numpy and replacing np.array, the same code accepts
+    1d arrays as arguments. The result then has shape (N, derivative size)."""
+    def array(items, dtype=None):
+        # Constant entries are broadcasted to the shape of the array entries.
+        return np.stack(np.broadcast_arrays(*items), axis=-1).astype(dtype)
+
+    np_ns = types.SimpleNamespace(array=array, float64=np.float64)
+    globals_ = dict(func.__globals__, math=np, np=np_ns)
+    return types.FunctionType(func.__code__, globals_, func.__name__)
+
+
+# Scalar and batched 2nd derivatives, see batch_derivative.
+SECOND_DERIVATIVES = {
+    Stretch: (d2q_b, batch_derivative(d2q_b)),
+    Bend: (d2q_a, batch_derivative(d2q_a)),
+    Torsion: (d2q_d, batch_derivative(d2q_d)),
+}
+# Below this number of primitives the overhead of the batched derivatives
+# outweighs their benefit.
+MIN_BATCH_SIZE = 16
+
+
+def eval_2nd_derivatives(d2q, d2q_batched, args):
+    """Evaluate 2nd derivatives for args of shape (3 * atoms, N).
+
+    Rows of primitives whose derivatives can't be calculated contain NaN."""
+    if args.shape[1] >= MIN_BATCH_SIZE:
+        with np.errstate(all="ignore"):
+            return d2q_batched(*args)
+
+    dgs = list()
+    for prim_args in args.T:
+        try:
+            dg = d2q(*prim_args)
+        except (ValueError, ZeroDivisionError):
+            dg = np.full(args.shape[0] ** 2, np.nan)
+        dgs.append(dg)
+    return np.array(dgs).reshape(args.shape[1], -1)
+
+
+def eval_K(coords3d, primitives, int_gradient, sparse=False, logger=None):
+    """K-matrix; 2nd derivatives of the primitives contracted with int_gradient.
+
+    2nd derivatives of stretches, bends and torsions are calculated for all
+    primitives of one type at once, if there are enough of them. All contributions are assembled into a
+    COO matrix, summing up duplicate entries. With sparse=True a CSR matrix
+    is returned, otherwise a dense array."""
+
+    def log_(msg):
+        log(logger, msg)
+
+    coords3d = np.reshape(coords3d, (-1, 3))
+    size_ = coords3d.size
+    rows, cols, data = list(), list(), list()
+
+    def add_contribs(indices, dgs):
+        # indices has shape (N, atoms per primitive), dgs is contracted 2nd
+        # derivative with shape (N, (3 * atoms per primitive)**2).
+        prim_num, atom_num = indices.shape
+        cart_inds = (3 * indices[:, :, None] + np.arange(3)).reshape(prim_num, 3 * atom_num)
+        cart_num = cart_inds.shape[1]
+        rows.append(np.repeat(cart_inds, cart_num, axis=1).flatten())
+        cols.append(np.tile(cart_inds, (1, cart_num)).flatten())
+        data.append(dgs.flatten())
+
+    groups, remaining = group_primitives(primitives)
+    for evaluator, positions, indices in groups:
+        type_ = type(primitives[positions[0]])
+        args = coords3d[indices].reshape(len(indices), -1).T
+        dgs = eval_2nd_derivatives(*SECOND_DERIVATIVES[type_], args)
+        if type_ == Torsion:
+            vals_deg = np.rad2deg(evaluator(coords3d, indices))
+            dgs *= np.sign(vals_deg)[:, None]
+            # The generated code (d2q_d) seems unstable for these values...
+            unstable = (np.abs(vals_deg) < 1) | (np.abs(vals_deg) > 179)
+        else:
+            unstable = np.zeros(len(indices), dtype=bool)
+        # 2nd derivative of normal, but linear, bends is undefined.
+        invalid = ~np.isfinite(dgs).all(axis=1)
+        skip = unstable | invalid
+        for ind in indices[skip]:
+            log_(f"Skipped 2nd derivative of {type_.__name__}({list(ind)})")
+        keep = ~skip
+        dgs = int_gradient[positions[keep], None] * dgs[keep]
+        add_contribs(indices[keep], dgs)
+
+    for i in remaining:
+        primitive = primitives[i]
+        try:
+            dg = int_gradient[i] * primitive.jacobian(coords3d)
+        except (ValueError, ZeroDivisionError):
+            log_(
+                "Error in calculation of 2nd derivative of primitive "
+                f"internal {primitive.indices}."
+            )
+            continue
+        add_contribs(np.array([primitive.indices]), dg[None, :])
+
+    if data:
+        rows, cols, data = [np.concatenate(arr) for arr in (rows, cols, data)]
+    K = sp.coo_matrix((data, (rows, cols)), shape=(size_, size_))
+    return K.tocsr() if sparse else K.toarray()
+
+
+def eval_primitives_loop(coords3d, primitives):
+    """Unbatched evaluation, one primitive after another."""
     prim_internals = list()
     for primitive in primitives:
         value, gradient = primitive.calculate(coords3d, gradient=True)
@@ -29,9 +340,22 @@ def eval_primitives(coords3d, primitives):
     return prim_internals
 
 
-def eval_B(coords3d, primitives):
-    prim_internals = eval_primitives(coords3d, primitives)
-    return np.array([prim_int.grad for prim_int in prim_internals])
+def eval_primitives(coords3d, primitives, gradient=True):
+    """When gradient is False the 'grad' attribute of the returned
+    PrimInternal objects will be None."""
+    vals, B = eval_prim_vals_and_B(coords3d, primitives, gradient=gradient)
+    if B is None:
+        B = [None] * len(primitives)
+    prim_internals = [
+        PrimInternal(primitive.indices, val, row)
+        for primitive, val, row in zip(primitives, vals, B)
+    ]
+    return prim_internals
+
+
+def eval_B(coords3d, primitives, sparse=False):
+    _, B = eval_prim_vals_and_B(coords3d, primitives, sparse=sparse)
+    return B
 
 
 def check_primitives(coords3d, primitives, thresh=1e-6, logger=None):
@@ -2,10 +2,13 @@ from collections import namedtuple
 import itertools as it
 
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist, pdist
 
 from pysisyphus.constants import BOHR2ANG
-from pysisyphus.helpers_pure import log, sort_by_central, merge_sets
+from pysisyphus.helpers_pure import log, sort_by_central
 from pysisyphus.elem_data import VDW_RADII, COVALENT_RADII as CR
 from pysisyphus.intcoords import Stretch, Bend, LinearBend, Torsion
 from pysisyphus.intcoords.PrimTypes import PrimTypes, PrimMap
@@ -15,61 +18,125 @@ from pysisyphus.intcoords.valid import bend_valid, dihedral_valid
 def get_pair_covalent_radii(atoms):
     atoms = [a.lower() for a in atoms]
     cov_radii = np.array([CR[a] for a in atoms])
-    pair_cov_radii = np.array([r1 + r2 for r1, r2 in it.combinations(cov_radii, 2)])
+    # Same order as it.combinations(range(len(atoms)), 2)
+    i, j = np.triu_indices(len(atoms), k=1)
+    pair_cov_radii = cov_radii[i] + cov_radii[j]
     return pair_cov_radii
 
 
+def get_pairs(coords3d, max_dist):
+    """Atom pairs within a cutoff distance.
+
+    Candidate pairs are determined from a KD-tree, so the full distance matrix
+    is never formed. Pairs (i, j) with i < j are returned in the same order as
+    they appear in a condensed distance matrix.
+
+    Parameters
+    ----------
+    coords3d : np.array, shape (N, 3)
+        Cartesian coordinates.
+    max_dist : float
+        Cutoff distance.
+
+    Returns
+    -------
+    pairs : np.array, shape (M, 2)
+        Integer array of atom pairs.
+    distances : np.array, shape (M, )
+        Distances of the atom pairs.
+    """
+    coords3d = np.reshape(coords3d, (-1, 3))
+    tree = cKDTree(coords3d)
+    pairs = tree.query_pairs(max_dist, output_type="ndarray")
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    distances = np.linalg.norm(coords3d[pairs[:, 0]] - coords3d[pairs[:, 1]], axis=1)
+    return pairs, distances
+
+
+def get_covalent_pairs(atoms, coords3d, factor=1.0):
+    """Atom pairs with distances below factor times the sum of covalent radii."""
+    cov_radii = np.array([CR[a.lower()] for a in atoms])
+    max_dist = factor * 2 * cov_radii.max() if len(atoms) else 0.0
+    pairs, distances = get_pairs(coords3d, max_dist)
+    below = distances <= factor * cov_radii[pairs].sum(axis=1)
+    return pairs[below], distances[below]
+
+
 def get_bond_mat(geom, bond_factor=1.3):
-    cdm = pdist(geom.coords3d)
-    pair_cov_radii = get_pair_covalent_radii(geom.atoms)
-    bond_mat = squareform(cdm <= (pair_cov_radii * bond_factor))
+    bond_inds = get_bond_sets(geom.atoms, geom.coords3d, bond_factor=bond_factor)
+    atom_num = len(geom.atoms)
+    bond_mat = np.zeros((atom_num, atom_num), dtype=bool)
+    bond_mat[bond_inds[:, 0], bond_inds[:, 1]] = True
+    bond_mat[bond_inds[:, 1], bond_inds[:, 0]] = True
     return bond_mat
 
 
 def get_bond_sets(atoms, coords3d, bond_factor=1.3, return_cdm=False, return_cbm=False):
-    cdm = pdist(coords3d)
-    # Generate indices corresponding to the atom pairs in the
-    # condensed distance matrix cdm.
-    atom_inds = list(it.combinations(range(len(coords3d)), 2))
-    atom_inds = np.array(atom_inds, dtype=int)
-    scaled_cr_sums = bond_factor * get_pair_covalent_radii(atoms)
-    # condensed bond matrix
-    cbm = cdm <= scaled_cr_sums
-    bond_inds = atom_inds[cbm]
+    coords3d = np.reshape(coords3d, (-1, 3))
+    bond_inds, _ = get_covalent_pairs(atoms, coords3d, factor=bond_factor)
     if not return_cbm and not return_cdm:
         return bond_inds
+
+    # The full condensed distance and bond matrices are only formed on request.
+    cdm = pdist(coords3d)
+    atom_num = len(coords3d)
+    i, j = bond_inds.T
+    # Position of pair (i, j) in the condensed distance matrix
+    cbm = np.zeros_like(cdm, dtype=bool)
+    cbm[atom_num * i - i * (i + 1) // 2 + (j - i - 1)] = True
     add_returns = tuple(
         [mat for flag, mat in ((return_cdm, cdm), (return_cbm, cbm)) if flag]
     )
     return (bond_inds,) + add_returns
 
 
+def get_fragments_from_bonds(bonds, atom_num):
+    """Connected components of the bond graph, as list of frozensets.
+
+    Unbonded atoms form their own fragments. Fragments are ordered
+    by their lowest atom index."""
+    bonds = np.array(bonds, dtype=int).reshape(-1, 2)
+    graph = sp.coo_matrix(
+        (np.ones(len(bonds)), (bonds[:, 0], bonds[:, 1])), shape=(atom_num, atom_num)
+    )
+    _, labels = connected_components(graph, directed=False)
+    fragments = dict()
+    for atom, label in enumerate(labels):
+        fragments.setdefault(label, list()).append(atom)
+    return [frozenset(frag) for frag in fragments.values()]
+
+
 def get_fragments(atoms, coords):
     coords3d = coords.reshape(-1, 3)
     # Bond indices without interfragment bonds and/or hydrogen bonds
     bond_inds = get_bond_sets(atoms, coords3d)
 
-    bond_ind_sets = [frozenset(bi) for bi in bond_inds]
-    fragments = merge_sets(bond_ind_sets)
+    fragments = get_fragments_from_bonds(bond_inds, len(coords3d))
+    # Only keep fragments that contain bonds
+    fragments = [frag for frag in fragments if len(frag) > 1]
 
     return fragments
 
 
-def connect_fragments(cdm, fragments, max_aux=3.78, aux_factor=1.3, logger=None):
+def connect_fragments(coords3d, fragments, max_aux=3.78, aux_factor=1.3, logger=None):
     """Determine the smallest interfragment bond for a list
-    of fragments and a condensed distance matrix."""
+    of fragments and Cartesian coordinates."""
     if len(fragments) > 1:
         log(
             logger,
             f"Detected {len(fragments)} fragments. Generating interfragment bonds.",
         )
-    dist_mat = squareform(cdm)
+    coords3d = np.reshape(coords3d, (-1, 3))
     interfrag_inds = list()
     aux_interfrag_inds = list()
     for frag1, frag2 in it.combinations(fragments, 2):
         log(logger, f"\tConnecting {len(frag1)} atom and {len(frag2)} atom fragment")
-        inds = [(i1, i2) for i1, i2 in it.product(frag1, frag2)]
-        distances = np.array([dist_mat[ind] for ind in inds])
+        frag1 = list(frag1)
+        frag2 = list(frag2)
+        # Only distances between the two fragments are calculated. Rows and
+        # columns correspond to it.product(frag1, frag2).
+        distances = cdist(coords3d[frag1], coords3d[frag2]).flatten()
+        inds = list(it.product(frag1, frag2))
 
         # Determine minimum distance bond
         min_ind = distances.argmin()
@@ -79,33 +146,34 @@ def connect_fragments(cdm, fragments, max_aux=3.78, aux_factor=1.3, logger=None)
         log(logger, f"\tMinimum distance bond: {interfrag_bond}, {min_dist:.4f} au")
 
         # Determine auxiliary interfragment bonds that are either below max_aux
-        # (default 2 Å, ≈ 3.78 au), or less than aux_factor (default 1.3) times the
+        # (default 2 Å, ≈ 3.78 au), or less than aux_factor (default 1.3) times the
         # minimum interfragment distance.
-        below_max_aux = [
-            ind for ind in inds if (dist_mat[ind] < max_aux) and (ind != interfrag_bond)
-        ]
+        not_min = np.arange(len(distances)) != min_ind
+        below_max_aux_mask = (distances < max_aux) & not_min
+        below_max_aux = [inds[i] for i in np.flatnonzero(below_max_aux_mask)]
         if below_max_aux:
             log(
                 logger,
-                f"\tAux. interfrag bonds below {max_aux*BOHR2ANG:.2f} Å:\n"
+                f"\tAux. interfrag bonds below {max_aux*BOHR2ANG:.2f} Å:\n"
                 + "\n".join(
-                    [f"\t\t{ind}: {dist_mat[ind]:.4f} au" for ind in below_max_aux]
+                    [
+                        f"\t\t{inds[i]}: {distances[i]:.4f} au"
+                        for i in np.flatnonzero(below_max_aux_mask)
+                    ]
                 ),
             )
         scaled_min_dist = aux_factor * min_dist
-        above_min_dist = [
-            ind
-            for ind in inds
-            if (dist_mat[ind] < scaled_min_dist)
-            and (ind != interfrag_bond)
-            and (ind not in below_max_aux)
-        ]
+        above_min_dist_mask = (distances < scaled_min_dist) & not_min & ~below_max_aux_mask
+        above_min_dist = [inds[i] for i in np.flatnonzero(above_min_dist_mask)]
         if above_min_dist:
             log(
                 logger,
                 f"\tAux. interfrag bonds below {aux_factor:.2f} * min_dist:\n"
                 + "\n".join(
-                    [f"\t\t{ind}: {dist_mat[ind]:.4f} au" for ind in above_min_dist]
+                    [
+                        f"\t\t{inds[i]}: {distances[i]:.4f} au"
+                        for i in np.flatnonzero(above_min_dist_mask)
+                    ]
                 ),
             )
         aux_interfrag_inds.extend(below_max_aux)
@@ -117,24 +185,39 @@ def connect_fragments(cdm, fragments, max_aux=3.78, aux_factor=1.3, logger=None)
 
 
 def get_hydrogen_bond_inds(atoms, coords3d, bond_inds, logger=None):
-    tmp_sets = [frozenset(bi) for bi in bond_inds]
     # Check for hydrogen bonds as described in [1] A.1 .
     # Find hydrogens bonded to small electronegative atoms X = (N, O
     # F, P, S, Cl).
-    hydrogen_inds = [i for i, a in enumerate(atoms) if a.lower() == "h"]
-    x_inds = [i for i, a in enumerate(atoms) if a.lower() in "n o f p s cl".split()]
+    atoms = [a.lower() for a in atoms]
+    coords3d = np.reshape(coords3d, (-1, 3))
+    x_atoms = "n o f p s cl".split()
+    x_inds = [i for i, a in enumerate(atoms) if a in x_atoms]
     hydrogen_bond_inds = list()
-    for h_ind, x_ind in it.product(hydrogen_inds, x_inds):
-        as_set = set((h_ind, x_ind))
-        if as_set not in tmp_sets:
-            continue
+    if not x_inds:
+        return hydrogen_bond_inds
+
+    h_x_bonds = set()
+    for bond in bond_inds:
+        bond = tuple(bond)
+        for h_ind, x_ind in (bond, bond[::-1]):
+            if (atoms[h_ind] == "h") and (atoms[x_ind] in x_atoms):
+                h_x_bonds.add((h_ind, x_ind))
+
+    # Spatial index of all electronegative atoms
+    x_tree = cKDTree(coords3d[x_inds])
+    max_vdw = 0.9 * (VDW_RADII["h"] + max([VDW_RADII[atoms[i]] for i in x_inds]))
+    for h_ind, x_ind in sorted(h_x_bonds):
         # Check if distance of H to another electronegative atom Y is
         # greater than the sum of their covalent radii but smaller than
         # the 0.9 times the sum of their van der Waals radii. If the
         # angle X-H-Y is greater than 90° a hydrogen bond is asigned.
-        y_inds = set(x_inds) - set((x_ind,))
+        y_inds = sorted(
+            x_inds[i] for i in x_tree.query_ball_point(coords3d[h_ind], max_vdw)
+        )
         for y_ind in y_inds:
-            y_atom = atoms[y_ind].lower()
+            if y_ind == x_ind:
+                continue
+            y_atom = atoms[y_ind]
             cov_rad_sum = CR["h"] + CR[y_atom]
             distance = Stretch._calculate(coords3d, (h_ind, y_ind))
             vdw = 0.9 * (VDW_RADII["h"] + VDW_RADII[y_atom])
@@ -166,17 +249,22 @@ def get_bend_inds(coords3d, bond_inds, min_deg, max_deg, logger=None):
     return bend_inds
 
 
-def get_linear_bend_inds(coords3d, cbm, bends, min_deg=175, max_bonds=4, logger=None):
+def get_linear_bend_inds(
+    coords3d, bond_inds, bends, min_deg=175, max_bonds=4, logger=None
+):
     linear_bends = list()
     complements = list()
 
     if min_deg is None:
         return linear_bends, complements
 
-    bm = squareform(cbm)
+    # Number of bonds per atom
+    bond_nums = np.bincount(
+        np.ravel(bond_inds).astype(int), minlength=len(coords3d)
+    )
     for bend in bends:
         deg = np.rad2deg(Bend._calculate(coords3d, bend))
-        bonds = sum(bm[bend[1]])
+        bonds = bond_nums[bend[1]]
         if (deg >= min_deg) and (bonds <= max_bonds):
             log(
                 logger,
@@ -342,28 +430,18 @@ def setup_redundant(
         return [prim for prim in prims if keep_coord(prim_cls, prim)]
 
     # Bonds
-    bonds, cdm, cbm = get_bond_sets(
-        atoms,
-        coords3d,
-        bond_factor=factor,
-        return_cdm=True,
-        return_cbm=True,
-    )
-    bonds = [tuple(bond) for bond in bonds]
+    covalent_bonds = get_bond_sets(atoms, coords3d, bond_factor=factor)
+    bonds = [tuple(bond) for bond in covalent_bonds]
     bonds += def_bonds
     bonds = keep_coords(bonds, Stretch)
 
-    # Fragments
-    fragments = merge_sets(bonds)
-    # Check for unbonded single atoms and create fragments for them.
-    bonded_set = set(tuple(np.ravel(bonds)))
-    unbonded_set = set(range(len(atoms))) - bonded_set
-    fragments.extend([frozenset((atom,)) for atom in unbonded_set])
+    # Fragments, including unbonded single atoms.
+    fragments = get_fragments_from_bonds(bonds, len(atoms))
 
     # Check for disconnected fragments. If they are present, create interfragment
     # bonds between them.
     interfrag_bonds, aux_interfrag_bonds = connect_fragments(
-        cdm, fragments, logger=logger
+        coords3d, fragments, logger=logger
     )
 
     # Hydrogen bonds
@@ -399,7 +477,7 @@ def setup_redundant(
     # Linear Bends and orthogonal complements
     linear_bends, linear_bend_complements = get_linear_bend_inds(
         coords3d,
-        cbm,
+        covalent_bonds,
         bends,
         min_deg=lb_min_deg,
         max_bonds=lb_max_bonds,
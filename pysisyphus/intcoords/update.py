@@ -1,10 +1,12 @@
 import numpy as np
+import scipy.sparse as sp
 
 from pysisyphus.helpers_pure import log
 from pysisyphus.intcoords.eval import eval_primitives
 from pysisyphus.intcoords import Torsion
 from pysisyphus.intcoords.exceptions import NeedNewInternalsException
 from pysisyphus.intcoords.valid import dihedrals_are_valid
+from pysisyphus.linalg import lstsq_min_norm
 
 
 def correct_dihedrals(new_dihedrals, old_dihedrals):
@@ -39,8 +41,8 @@ def correct_dihedrals(new_dihedrals, old_dihedrals):
 
 
 def update_internals(new_coords3d, old_internals, primitives, dihedral_inds,
-                     check_dihedrals=False, logger=None):
-    prim_internals = eval_primitives(new_coords3d, primitives)
+                     check_dihedrals=False, gradient=True, logger=None):
+    prim_internals = eval_primitives(new_coords3d, primitives, gradient=gradient)
     new_internals = [prim_int.val for prim_int in prim_internals]
     internal_diffs = np.array(new_internals) - old_internals
 
@@ -73,19 +75,38 @@ def transform_int_step(
     cur_internals,
     B_prim,
     primitives,
+    Bt_inv_prim=None,
     check_dihedrals=False,
     cart_rms_thresh=1e-6,
     rcond=1e-8,
     logger=None,
 ):
     """Transformation is done in primitive internals, so int_step must be given
-    in primitive internals and not in DLC!"""
+    in primitive internals and not in DLC!
+
+    When B_prim is a scipy.sparse matrix the Cartesian steps are obtained
+    iteratively as minimum norm least-squares solutions of B·Δx = Δq, instead of
+    forming the pseudo-inverse of B·Bᵀ. In this case the returned PrimInternal
+    objects don't carry gradients.
+
+    An already available generalized inverse Bt_inv_prim can be supplied to
+    avoid its recalculation."""
 
     new_cart_coords = old_cart_coords.copy()
     remaining_int_step = int_step
     target_internals = cur_internals + int_step
 
-    Bt_inv_prim = np.linalg.pinv(B_prim.dot(B_prim.T), rcond=rcond).dot(B_prim)
+    sparse = sp.issparse(B_prim)
+    if sparse:
+        def get_cart_step(int_step):
+            return lstsq_min_norm(B_prim, int_step)
+    else:
+        if Bt_inv_prim is None:
+            Bt_inv_prim = np.linalg.pinv(B_prim.dot(B_prim.T), rcond=rcond).dot(B_prim)
+
+        def get_cart_step(int_step):
+            return Bt_inv_prim.T.dot(int_step)
+
     dihedral_inds = np.array(
         [i for i, primitive in enumerate(primitives) if isinstance(primitive, Torsion)]
     )
@@ -94,14 +115,14 @@ def transform_int_step(
     old_internals = cur_internals
     backtransform_failed = True
     for i in range(25):
-        cart_step = Bt_inv_prim.T.dot(remaining_int_step)
+        cart_step = get_cart_step(remaining_int_step)
         cart_rms = np.sqrt(np.mean(cart_step ** 2))
         # Update cartesian coordinates
         new_cart_coords += cart_step
         # Determine new internal coordinates
         new_prim_ints = update_internals(
             new_cart_coords.reshape(-1, 3), old_internals, primitives, dihedral_inds,
-            check_dihedrals=check_dihedrals, logger=logger,
+            check_dihedrals=check_dihedrals, gradient=not sparse, logger=logger,
         )
         new_internals = [prim.val for prim in new_prim_ints]
         remaining_int_step = target_internals - new_internals
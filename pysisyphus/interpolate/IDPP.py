@@ -1,7 +1,8 @@
+import numpy as np
 from scipy.spatial.distance import pdist
 
 # from pysisyphus.constants import BOHR2ANG, ANG2BOHR
-from pysisyphus.calculators.IDPPCalculator import IDPPCalculator
+from pysisyphus.calculators.IDPPCalculator import IDPPCalculator, get_pair_inds
 from pysisyphus.constants import BOHR2ANG, ANG2BOHR
 from pysisyphus.cos.NEB import NEB
 from pysisyphus.helpers import align_geoms
@@ -15,6 +16,19 @@ from pysisyphus.interpolate.Interpolator import Interpolator
 
 class IDPP(Interpolator):
 
+    def __init__(self, *args, cutoff=None, **kwargs):
+        """
+        Parameters
+        ----------
+        cutoff : float, optional
+            Only consider atom pairs that are closer than cutoff Å in the
+            initial or final geometry. Distant pairs hardly contribute to
+            the IDPP energy, as it is weighted by 1/r⁴. All pairs are
+            considered when omitted.
+        """
+        super().__init__(*args, **kwargs)
+        self.cutoff = cutoff
+
     def interpolate(self, initial_geom, final_geom):
         # Do an initial linear interpolation to generate all geometries/images
         # that will be refined later by IDPP interpolation.
@@ -30,13 +44,23 @@ class IDPP(Interpolator):
         # We want to interpolate between these two condensed distance matrices
         initial_pd = pdist(initial_geom.coords3d)
         final_pd = pdist(final_geom.coords3d)
+        pair_mask = None
+        if self.cutoff is not None:
+            pair_mask = (initial_pd < self.cutoff) | (final_pd < self.cutoff)
+            initial_pd = initial_pd[pair_mask]
+            final_pd = final_pd[pair_mask]
+        pair_inds = get_pair_inds(len(initial_geom.atoms), pair_mask)
         steps = 1 + self.between
         pd_diff = (final_pd - initial_pd) / steps
+        # Target distances of all images
+        targets = initial_pd + np.arange(len(idpp_geoms))[:, None] * pd_diff
 
-        for i, geom in enumerate(idpp_geoms):
-            geom.set_calculator(IDPPCalculator(initial_pd + i * pd_diff))
+        for geom, target in zip(idpp_geoms, targets):
+            geom.set_calculator(IDPPCalculator(target, pair_inds))
+        # All images are calculated at once
+        batch_calc = IDPPCalculator(targets, pair_inds)
 
-        neb = NEB(idpp_geoms, fix_ends=True)
+        neb = NEB(idpp_geoms, fix_ends=True, batch_calc=batch_calc)
         opt_kwargs = {
             "max_cycles": 1000,
             "rms_force": 1e-2,
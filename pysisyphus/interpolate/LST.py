@@ -1,7 +1,11 @@
+import os
+
 import numpy as np
 from scipy.spatial.distance import pdist
 from scipy.optimize import minimize
 
+from pysisyphus.calculators.IDPPCalculator import get_incidence, get_pair_inds
+from pysisyphus.executors import map_as_completed
 from pysisyphus.Geometry import Geometry
 from pysisyphus.interpolate.Interpolator import Interpolator
 
@@ -10,62 +14,151 @@ from pysisyphus.interpolate.Interpolator import Interpolator
 # [2] https://pubs.acs.org/doi/pdf/10.1021/ct200654u
 
 
+def lst_cost(wa_c, rab_i, wa_i, pair_inds, incidence):
+    """Value and analytical gradient of the LST cost function.
+
+    Parameters
+    ----------
+    wa_c : np.array, shape (3N, )
+        Current Cartesian coordinates.
+    rab_i : np.array, shape (P, )
+        Interpolated internuclear distances.
+    wa_i : np.array, shape (3N, )
+        Interpolated Cartesian coordinates.
+    pair_inds : np.array of int, shape (2, P)
+        Atom indices of the pairs, as from pdist.
+    incidence : scipy.sparse matrix, shape (N, P)
+        Accumulates pair gradients on the atoms.
+
+    Returns
+    -------
+    cost : float
+        Value of the cost function.
+    grad : np.array, shape (3N, )
+        Gradient of the cost function.
+    """
+    wa_c3d = wa_c.reshape(-1, 3)
+    first, second = pair_inds
+    vecs = wa_c3d[first] - wa_c3d[second]
+    rab_c = np.sqrt(np.einsum("ij,ij->i", vecs, vecs))
+
+    diff = rab_i - rab_c
+    inv_rab_i4 = 1 / rab_i ** 4
+    wa_diff = wa_i - wa_c
+    first_term = np.sum(diff ** 2 * inv_rab_i4)
+    second_term = 1e-6 * np.sum(wa_diff ** 2)
+
+    # d(rab_c)/d(wa_c) of the first atom of each pair is vecs / rab_c
+    pair_grads = (-2 * diff * inv_rab_i4 / rab_c)[:, None] * vecs
+    grad = incidence.dot(pair_grads).flatten() - 2e-6 * wa_diff
+    return first_term + second_term, grad
+
+
+def lst_minimize(task):
+    """Minimize the LST cost function for consecutive images.
+
+    Module level function, so it can be used with process pools. With
+    warm_start every image may be started from the solution of its
+    predecessor, shifted by the difference of the linearly interpolated
+    coordinates.
+    """
+    fs, pdists, coords3d, gtol, warm_start = task
+    atom_num = coords3d.shape[1]
+    pair_inds = get_pair_inds(atom_num)
+    incidence = get_incidence(atom_num, pair_inds)
+    minimize_kwargs = {
+        "method": "L-BFGS-B",
+        "jac": True,
+        "options": {
+           "gtol": gtol,
+        }
+    }
+
+    results = list()
+    prev_wa_i = None
+    prev_x = None
+    for f in fs:
+        rab_i = (1-f)*pdists[0] + f*pdists[1]
+        wa_i = ((1-f)*coords3d[0] + f*coords3d[1]).flatten()
+        args = (rab_i, wa_i, pair_inds, incidence)
+        x0 = wa_i
+        if warm_start and (prev_x is not None):
+            warm_x0 = prev_x + (wa_i - prev_wa_i)
+            # The distances are invariant under reflections, so the
+            # predecessor may lie on a different branch than the linear guess.
+            # Start from whichever guess is better.
+            if lst_cost(warm_x0, *args)[0] < lst_cost(x0, *args)[0]:
+                x0 = warm_x0
+        res = minimize(lst_cost, x0=x0, args=args, **minimize_kwargs)
+        results.append((res.x, res.success))
+        prev_wa_i = wa_i
+        prev_x = res.x
+    return results
+
+
 class LST(Interpolator):
 
-    def __init__(self, geoms, between, align=True, gtol=1e-4, silent=False):
+    def __init__(self, geoms, between, align=True, gtol=1e-4, silent=False,
+                 warm_start=False, executor=None, max_workers=None):
+        """Linear synchronous transit.
+
+        Parameters
+        ----------
+        warm_start : bool
+            Start the minimization of every image from the solution of the
+            previous image, if it is a better guess than the linear
+            interpolation. Faster, but the images may end up in different
+            minima of the cost function than without warm start.
+        executor : str, optional
+            'process' or 'thread'. The images are split in max_workers blocks
+            of consecutive images that are minimized concurrently, with warm
+            starts inside every block. Serial minimization when omitted.
+        max_workers : int, optional
+            Number of concurrent blocks. Defaults to the number of CPUs.
+        """
         super().__init__(geoms, between, align)
 
         self.gtol = float(gtol)
         self.silent = silent
-
-    def cost_function(self, wa_c, f, rab, wab):
-        wa_c = wa_c.reshape(-1, 3)
-        rab_c = pdist(wa_c)
-
-        rab_i = rab(f)
-        wa_i = wab(f)
-
-        first_term = np.sum(
-            ((rab_i - rab_c)**2) / (rab_i**4)
-        )
-        second_term = 1e-6 * np.sum(
-            (wa_i - wa_c)**2
-        )
-        return first_term + second_term
+        self.warm_start = bool(warm_start)
+        self.executor = executor
+        self.max_workers = max_workers
 
     def interpolate(self, initial_geom, final_geom):
         coords3d = np.array((initial_geom.coords3d, final_geom.coords3d))
         # Calculate the condensed distances matrices
-        pdists = [pdist(c3d) for c3d in coords3d]
-
-        def rab_(f, pdist_r, pdist_p):
-            """Difference in internuclear distances."""
-            return (1-f)*pdist_r + f*pdist_p
-        rab = lambda f: rab_(f, pdists[0], pdists[1])
-
-        def wab_(f, coords_r, coords_p):
-            """Difference in actual cartesian coordinates."""
-            return (1-f)*coords_r + f*coords_p
-        wab = lambda f: wab_(f, coords3d[0], coords3d[1])
+        pdists = np.array([pdist(c3d) for c3d in coords3d])
 
-        interpolated_geoms = list()
-        minimize_kwargs = {
-            "method": "L-BFGS-B",
-            "options": {
-               "gtol": self.gtol,
-            }
-        }
         # We only have to interpolate between the two provided geometries.
         # So we consider the total number of geometries (self.between + 2)
         # to get the correct spacing, but we neglect the first and the last
         # number (0 and 1), as they correspond to the two already known geometries.
-        for i, f in enumerate(np.linspace(0, 1, self.between+2)[1:-1], 1):
-            x0_flat = wab(f)
-            res = minimize(self.cost_function, x0=x0_flat, args=(f, rab, wab),
-                           **minimize_kwargs)
+        fs = np.linspace(0, 1, self.between+2)[1:-1]
+        if self.executor is None:
+            blocks = [fs]
+        else:
+            block_num = self.max_workers
+            if block_num is None:
+                block_num = os.cpu_count()
+            blocks = np.array_split(fs, min(block_num, len(fs)))
+        tasks = [(block, pdists, coords3d, self.gtol, self.warm_start)
+                 for block in blocks]
+
+        if self.executor is None:
+            block_results = [lst_minimize(task) for task in tasks]
+        else:
+            block_results = [None] * len(tasks)
+            for i, results in map_as_completed(lst_minimize, tasks,
+                                               executor=self.executor,
+                                               max_workers=self.max_workers):
+                block_results[i] = results
+
+        interpolated_geoms = list()
+        results = [res for block in block_results for res in block]
+        for i, (f, (x, success)) in enumerate(zip(fs, results), 1):
             if not self.silent:
-                print(f"{i:03d}/{self.between:03d}: f={f:.04f}, success: {res.success}")
+                print(f"{i:03d}/{self.between:03d}: f={f:.04f}, success: {success}")
             interpolated_geoms.append(
-                Geometry(self.atoms, res.x)
+                Geometry(self.atoms, x)
             )
         return interpolated_geoms
@@ -2,6 +2,7 @@ __all__ = [
     "geom_from_cjson",
     "geom_from_pdb",
     "geom_from_zmat",
+    "geoms_from_bintrj",
     "save_hessian",
 ]
 
@@ -9,4 +10,5 @@ __all__ = [
 from pysisyphus.io.cjson import geom_from_cjson
 from pysisyphus.io.pdb import geom_from_pdb
 from pysisyphus.io.zmat import geom_from_zmat
+from pysisyphus.io.bintrj import geoms_from_bintrj
 from pysisyphus.io.hessian import save_hessian
@@ -0,0 +1,271 @@
+# Binary trajectory (.btrj) format
+#
+#   magic     8 bytes    b"PYSBTRJ\0"
+#   header   16 bytes    version, atom number, coordinate itemsize (4 or 8),
+#                        flags (1: energies, 2: forces), length of the atoms
+#                        JSON; all as little-endian uint32, except flags and
+#                        itemsize, that are uint16.
+#   atoms                JSON encoded list of atoms, padded with spaces, so
+#                        the frames start at a multiple of 64 bytes.
+#   frames               One record per frame: coords (N, 3) in Bohr,
+#                        [energy (float64)], [forces (N, 3), same dtype as coords]
+#
+# The number of frames follows from the file size, so frames can be appended
+# and a partially written last frame is ignored.
+
+import json
+import struct
+
+import numpy as np
+
+from pysisyphus.constants import ANG2BOHR, BOHR2ANG
+from pysisyphus.Geometry import Geometry
+from pysisyphus.xyzloader import iter_trj_file, TrjWriter
+
+
+MAGIC = b"PYSBTRJ\0"
+VERSION = 1
+HEADER_FMT = "<IIHHI"
+ENERGIES_FLAG = 1
+FORCES_FLAG = 2
+ALIGN = 64
+
+
+def get_frame_dtype(atom_num, itemsize=8, energies=False, forces=False):
+    """Structured dtype of one frame record."""
+    float_ = f"<f{itemsize}"
+    fields = [("coords", float_, (atom_num, 3))]
+    if energies:
+        fields.append(("energy", "<f8"))
+    if forces:
+        fields.append(("forces", float_, (atom_num, 3)))
+    return np.dtype(fields)
+
+
+def make_bintrj_header(atoms, itemsize=8, energies=False, forces=False):
+    atoms_bytes = json.dumps(list(atoms)).encode()
+    header_size = len(MAGIC) + struct.calcsize(HEADER_FMT)
+    pad = -(header_size + len(atoms_bytes)) % ALIGN
+    atoms_bytes += b" " * pad
+    flags = ENERGIES_FLAG * bool(energies) + FORCES_FLAG * bool(forces)
+    header = struct.pack(
+        HEADER_FMT, VERSION, len(atoms), itemsize, flags, len(atoms_bytes)
+    )
+    return MAGIC + header + atoms_bytes
+
+
+def read_bintrj_header(bintrj_fn):
+    """Atoms, frame dtype and data offset of a .btrj file."""
+    header_size = len(MAGIC) + struct.calcsize(HEADER_FMT)
+    with open(bintrj_fn, "rb") as handle:
+        header = handle.read(header_size)
+        assert header[:len(MAGIC)] == MAGIC, \
+            f"'{bintrj_fn}' is not a binary trajectory!"
+        version, atom_num, itemsize, flags, atoms_len = struct.unpack(
+            HEADER_FMT, header[len(MAGIC):]
+        )
+        assert version == VERSION, f"Unsupported .btrj version {version}!"
+        atoms = json.loads(handle.read(atoms_len).decode())
+    assert len(atoms) == atom_num
+    frame_dtype = get_frame_dtype(
+        atom_num,
+        itemsize,
+        energies=bool(flags & ENERGIES_FLAG),
+        forces=bool(flags & FORCES_FLAG),
+    )
+    return atoms, frame_dtype, header_size + atoms_len
+
+
+class BinTrjWriter:
+    """Buffered writer for binary trajectories.
+
+    Example:
+
+        with BinTrjWriter("md.btrj", atoms, energies=True) as writer:
+            writer.write(coords, energy=energy)
+    """
+
+    def __init__(self, bintrj_fn, atoms, dtype=np.float64, energies=False,
+                 forces=False, buffer_size=256):
+        """
+        Parameters
+        ----------
+        bintrj_fn : str or Path
+            Filename of the trajectory. Existing files are overwritten.
+        atoms : iterable
+            Atom descriptors.
+        dtype : np.float32 or np.float64
+            Precision of coordinates and forces.
+        energies : bool
+            Store one energy per frame.
+        forces : bool
+            Store forces for every frame.
+        buffer_size : int
+            Number of frames that are collected before they are written.
+        """
+        self.bintrj_fn = bintrj_fn
+        self.atoms = list(atoms)
+        self.energies = energies
+        self.forces = forces
+        self.buffer_size = int(buffer_size)
+
+        itemsize = np.dtype(dtype).itemsize
+        assert itemsize in (4, 8), "Only float32 and float64 are supported!"
+        self.frame_dtype = get_frame_dtype(
+            len(self.atoms), itemsize, energies=energies, forces=forces
+        )
+        self.buffer = np.zeros(self.buffer_size, dtype=self.frame_dtype)
+        self.buffered = 0
+        self.frames_written = 0
+
+        self.handle = open(self.bintrj_fn, "wb")
+        self.handle.write(
+            make_bintrj_header(self.atoms, itemsize, energies, forces)
+        )
+
+    def write(self, coords, energy=None, forces=None):
+        """Add one frame. Coordinates and forces in atomic units."""
+        frame = self.buffer[self.buffered]
+        frame["coords"] = np.reshape(coords, (-1, 3))
+        if self.energies:
+            frame["energy"] = energy
+        if self.forces:
+            frame["forces"] = np.reshape(forces, (-1, 3))
+        self.buffered += 1
+        if self.buffered == self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.handle.write(self.buffer[:self.buffered].tobytes())
+        self.handle.flush()
+        self.frames_written += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        if self.handle.closed:
+            return
+        self.flush()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BinTrj:
+    """Memory-mapped binary trajectory.
+
+    Only the accessed frames are read from disk. coords, energies and forces
+    are views into the memory map, so slicing them doesn't copy.
+
+    Example:
+
+        trj = BinTrj("md.btrj")
+        last_coords3d = trj.coords[-1]
+        every_10th = trj.coords[::10]
+    """
+
+    def __init__(self, bintrj_fn):
+        self.bintrj_fn = bintrj_fn
+        self.atoms, self.frame_dtype, self.offset = read_bintrj_header(bintrj_fn)
+
+        with open(self.bintrj_fn, "rb") as handle:
+            handle.seek(0, 2)
+            data_size = handle.tell() - self.offset
+        self.frame_num = data_size // self.frame_dtype.itemsize
+        # np.memmap can't map zero frames
+        if self.frame_num:
+            self.frames = np.memmap(
+                self.bintrj_fn,
+                dtype=self.frame_dtype,
+                mode="r",
+                offset=self.offset,
+                shape=(self.frame_num, ),
+            )
+        else:
+            self.frames = np.zeros(0, dtype=self.frame_dtype)
+
+    def __len__(self):
+        return self.frame_num
+
+    @property
+    def coords(self):
+        """Coordinates in Bohr, shape (frames, N, 3)."""
+        return self.frames["coords"]
+
+    @property
+    def energies(self):
+        return self.frames["energy"] if "energy" in self.frame_dtype.names else None
+
+    @property
+    def forces(self):
+        return self.frames["forces"] if "forces" in self.frame_dtype.names else None
+
+    def __getitem__(self, index):
+        return self.coords[index]
+
+    def __iter__(self):
+        return iter(self.coords)
+
+
+def write_bintrj(bintrj_fn, atoms, coords, energies=None, forces=None,
+                 dtype=np.float64):
+    """Write all frames at once. Coordinates and forces in atomic units."""
+    coords = np.reshape(coords, (-1, len(atoms), 3))
+    itemsize = np.dtype(dtype).itemsize
+    has_energies = energies is not None
+    has_forces = forces is not None
+    frames = np.zeros(
+        len(coords),
+        dtype=get_frame_dtype(len(atoms), itemsize, has_energies, has_forces),
+    )
+    frames["coords"] = coords
+    if has_energies:
+        frames["energy"] = energies
+    if has_forces:
+        frames["forces"] = np.reshape(forces, coords.shape)
+    with open(bintrj_fn, "wb") as handle:
+        handle.write(
+            make_bintrj_header(atoms, itemsize, has_energies, has_forces)
+        )
+        handle.write(frames.tobytes())
+    return bintrj_fn
+
+
+def geoms_from_bintrj(bintrj_fn, first=None, coord_type="cart", **coord_kwargs):
+    trj = BinTrj(bintrj_fn)
+    return [
+        Geometry(trj.atoms, coords3d.flatten(), coord_type=coord_type,
+                 **coord_kwargs)
+        for coords3d in trj.coords[:first]
+    ]
+
+
+def trj_to_bintrj(trj_fn, bintrj_fn, dtype=np.float64):
+    """Convert a .trj file frame by frame into a binary trajectory."""
+    frames = iter_trj_file(trj_fn)
+    atoms, coords = next(frames)
+    with BinTrjWriter(bintrj_fn, atoms, dtype=dtype) as writer:
+        writer.write(coords * ANG2BOHR)
+        for _, coords in frames:
+            writer.write(coords * ANG2BOHR)
+    return writer.frames_written
+
+
+def bintrj_to_trj(bintrj_fn, trj_fn, chunk_size=1024):
+    """Convert a binary trajectory into a .trj file.
+
+    Energies are written into the comment lines, when present.
+    """
+    trj = BinTrj(bintrj_fn)
+    energies = trj.energies
+    with TrjWriter(trj_fn, trj.atoms, buffer_size=chunk_size) as writer:
+        for start in range(0, len(trj), chunk_size):
+            # Read and convert a whole chunk at once
+            coords = trj.coords[start:start+chunk_size] * BOHR2ANG
+            for i, coords3d in enumerate(coords, start):
+                comment = "" if energies is None else str(energies[i])
+                writer.write(coords3d, comment)
+    return len(trj)
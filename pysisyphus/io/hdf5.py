@@ -1,4 +1,7 @@
+import atexit
+
 import h5py
+import numpy as np
 
 
 def init_h5_group(f, group_name, data_model):
@@ -45,3 +48,188 @@ def resize_h5_group(group, max_cycles):
         new_shape = list(dataset.shape).copy()
         new_shape[0] = max_cycles
         dataset.resize(new_shape)
+
+
+class H5Writer:
+    """Buffered writer that keeps an HDF5 file open.
+
+    Rows are collected in memory and written every buffer_size rows into
+    chunked, compressed datasets that grow along their first dimension.
+    Attributes are also buffered and written together with the rows, so a
+    reader never sees a 'cur_cycle' attribute that points beyond the
+    written data. The file is flushed and closed by close(), when the
+    writer is used as context manager or at interpreter exit.
+    """
+
+    def __init__(self, fn, group_name=None, data_model=None, reset=False,
+                 buffer_size=10, chunk_rows=32, compression="gzip",
+                 compression_opts=4, dtype="f4"):
+        """
+        Parameters
+        ----------
+        fn : str or Path
+            HDF5 filename.
+        group_name : str, optional
+            Group the datasets are created in. Defaults to the root group.
+        data_model : dict, optional
+            Maps dataset names to shapes. Only the shape after the first
+            dimension is used, as the datasets grow as needed.
+        reset : bool
+            Delete an already present group.
+        buffer_size : int
+            Number of rows kept in memory before they are written.
+        chunk_rows : int
+            Number of rows per HDF5 chunk.
+        compression : str, optional
+            HDF5 compression filter. Disabled with None.
+        compression_opts : int, optional
+            Options for the compression filter, e.g. the gzip level.
+        dtype : str or type
+            dtype of the datasets.
+        """
+        self.fn = fn
+        self.group_name = group_name
+        self.data_model = dict() if data_model is None else data_model
+        self.reset = reset
+        self.buffer_size = max(1, int(buffer_size))
+        self.chunk_rows = int(chunk_rows)
+        self.compression = compression
+        self.compression_opts = compression_opts if compression else None
+        self.dtype = dtype
+
+        self.handle = None
+        self.group = None
+        self.rows = dict()
+        self.attrs = dict()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        # Copies get their own handle, that is opened on the first write.
+        self.flush()
+        state = self.__dict__.copy()
+        state.update({
+            "handle": None,
+            "group": None,
+            "rows": dict(),
+            "attrs": dict(),
+        })
+        return state
+
+    @property
+    def is_open(self):
+        return self.handle is not None
+
+    def create_dataset(self, key, shape):
+        row_shape = tuple(shape[1:])
+        self.group.create_dataset(
+            key,
+            shape=(0, *row_shape),
+            maxshape=(None, *row_shape),
+            chunks=(self.chunk_rows, *row_shape),
+            dtype=self.dtype,
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+        )
+
+    def open(self):
+        if self.is_open:
+            return
+        self.handle = h5py.File(self.fn, mode="a")
+        group_name = "/" if self.group_name is None else self.group_name
+        if self.reset and (group_name in self.handle) and (group_name != "/"):
+            del self.handle[group_name]
+        self.group = self.handle.require_group(group_name)
+        if self.reset and (group_name == "/"):
+            for key in list(self.group.keys()):
+                del self.group[key]
+        # Only reset once; reopening after pickling appends.
+        self.reset = False
+
+        for key, shape in self.data_model.items():
+            if key in self.group:
+                dataset = self.group[key]
+                compatible = (dataset.maxshape[0] is None) and (
+                    dataset.shape[1:] == tuple(shape[1:])
+                )
+                if compatible:
+                    continue
+                del self.group[key]
+            self.create_dataset(key, shape)
+        atexit.register(self.close)
+
+    def add_row(self, row, data):
+        """Buffer a row of data.
+
+        Parameters
+        ----------
+        row : int
+            Row index along the first dimension.
+        data : dict
+            Maps dataset names to values. Values of 2d datasets that are
+            shorter than a row are written to its beginning.
+        """
+        buffered = self.rows.setdefault(row, dict())
+        for key, value in data.items():
+            buffered[key] = np.array(value, dtype=float)
+        if len(self.rows) >= self.buffer_size:
+            self.flush()
+
+    def set_attrs(self, **attrs):
+        self.attrs.update(attrs)
+
+    def write_dataset(self, key, data, **kwargs):
+        """Write a complete dataset at once, replacing a present one."""
+        self.open()
+        if key in self.group:
+            del self.group[key]
+        self.group.create_dataset(key, data=data, **kwargs)
+
+    def read_row(self, key, row):
+        """Read a row, including rows that are still buffered."""
+        was_open = self.is_open
+        self.flush()
+        self.open()
+        value = self.group[key][row]
+        if not was_open:
+            self.close()
+        return value
+
+    def flush(self):
+        if not (self.rows or self.attrs):
+            return
+        self.open()
+        if self.rows:
+            rows = sorted(self.rows.keys())
+            # All datasets of the data model share the first dimension
+            new_len = rows[-1] + 1
+            for key in self.data_model.keys():
+                dataset = self.group[key]
+                if dataset.shape[0] < new_len:
+                    dataset.resize(new_len, axis=0)
+            for row in rows:
+                for key, value in self.rows[row].items():
+                    dataset = self.group[key]
+                    if (value.ndim > 0) and (len(dataset.shape) > 1):
+                        dataset[row, : value.size] = value
+                    else:
+                        dataset[row] = value
+            self.rows = dict()
+        for key, value in self.attrs.items():
+            self.group.attrs[key] = value
+        self.attrs = dict()
+        self.handle.flush()
+
+    def close(self):
+        if not self.is_open and not (self.rows or self.attrs):
+            return
+        self.flush()
+        self.handle.close()
+        self.handle = None
+        self.group = None
+        atexit.unregister(self.close)
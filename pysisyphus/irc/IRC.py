@@ -6,12 +6,12 @@ from math import ceil, log
 import pathlib
 import sys
 
-import h5py
 import numpy as np
 
 from pysisyphus.constants import BOHR2ANG
 from pysisyphus.helpers import check_for_stop_sign, highlight_text, rms
 from pysisyphus.helpers_pure import eigval_to_wavenumber
+from pysisyphus.io.hdf5 import H5Writer
 from pysisyphus.optimizers.guess_hessians import get_guess_hessian
 from pysisyphus.TablePrinter import TablePrinter
 from pysisyphus.xyzloader import make_trj_str, make_xyz_str
@@ -248,6 +248,11 @@ class IRC:
         self.irc_mw_coords.append(self.mw_coords)
         self.irc_mw_gradients.append(self.mw_gradient)
 
+        # New cycles are appended to the file every dump_every cycles
+        dump_fn = f"{direction}_{self.dump_fn}"
+        h5_writer = self.get_h5_writer(dump_fn)
+        self.dump_cycle(h5_writer)
+
         self.table.print_header()
         while True:
             self.log(highlight_text(f"IRC step {self.cur_cycle:03d}") + "\n")
@@ -268,6 +273,7 @@ class IRC:
             # Mass-weighted
             self.irc_mw_coords.append(self.mw_coords)
             self.irc_mw_gradients.append(self.mw_gradient)
+            self.dump_cycle(h5_writer)
 
             rms_grad = rms(self.gradient)
 
@@ -305,11 +311,6 @@ class IRC:
                 break_msg = "Energy converged!"
                 self.converged = True
 
-            dumped = (self.cur_cycle % self.dump_every) == 0
-            if dumped:
-                dump_fn = f"{direction}_{self.dump_fn}"
-                self.dump_data(dump_fn)
-
             if break_msg:
                 self.table.print(break_msg)
                 break
@@ -327,7 +328,9 @@ class IRC:
             self.irc_mw_coords.reverse()
             self.irc_mw_gradients.reverse()
 
-        if not dumped:
+        h5_writer.close()
+        # The forward IRC is stored in reversed order
+        if direction == "forward":
             self.dump_data(dump_fn)
 
         self.cur_direction = None
@@ -483,6 +486,31 @@ class IRC:
         }
         return data_dict
 
+    def get_h5_writer(self, dump_fn):
+        coord_size = self.coords.size
+        data_model = {
+            "energies": (0, ),
+            "coords": (0, coord_size),
+            "gradients": (0, coord_size),
+            "mw_coords": (0, coord_size),
+            "mw_gradients": (0, coord_size),
+        }
+        h5_writer = H5Writer(dump_fn, data_model=data_model, reset=True,
+                             buffer_size=self.dump_every, dtype=float)
+        h5_writer.write_dataset("atoms", np.array(self.geometry.atoms, dtype="S"))
+        h5_writer.write_dataset("rms_grad_thresh", np.array(self.rms_grad_thresh))
+        return h5_writer
+
+    def dump_cycle(self, h5_writer):
+        row = {
+            "energies": self.irc_energies[-1],
+            "coords": self.irc_coords[-1],
+            "gradients": self.irc_gradients[-1],
+            "mw_coords": self.irc_mw_coords[-1],
+            "mw_gradients": self.irc_mw_gradients[-1],
+        }
+        h5_writer.add_row(len(self.irc_energies) - 1, row)
+
     def dump_data(self, dump_fn=None, full=False):
         get_data = self.get_full_irc_data if full else self.get_irc_data
         data_dict = get_data()
@@ -495,6 +523,6 @@ class IRC:
         if dump_fn is None:
             dump_fn = self.dump_fn
 
-        with h5py.File(dump_fn, "w") as handle:
+        with H5Writer(dump_fn, reset=True) as h5_writer:
             for key, val in data_dict.items():
-                handle.create_dataset(name=key, dtype=val.dtype, data=val)
+                h5_writer.write_dataset(key, val, dtype=val.dtype)
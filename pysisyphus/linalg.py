@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.sparse.linalg import lsqr
 
 
 def gram_schmidt(vecs, thresh=1e-8):
@@ -28,3 +29,12 @@ def make_unit_vec(vec1, vec2):
     """Return unit vector pointing from vec2 to vec1."""
     diff = vec1 - vec2
     return diff / np.linalg.norm(diff)
+
+
+def lstsq_min_norm(A, b, atol=1e-12, btol=1e-12, iter_lim=None):
+    """Minimum norm least-squares solution of A·x = b using LSQR.
+
+    A may be a dense array or a scipy.sparse matrix. Started from x = 0,
+    LSQR converges to the same solution as pinv(A).dot(b), without forming
+    the pseudo-inverse."""
+    return lsqr(A, b, atol=atol, btol=btol, iter_lim=iter_lim)[0]
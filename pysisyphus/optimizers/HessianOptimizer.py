@@ -7,7 +7,12 @@ from pysisyphus.optimizers.hessian_updates import (
     flowchart_update,
     damped_bfgs_update,
     bofill_update,
+    bfgs_factors,
+    flowchart_factors,
+    damped_bfgs_factors,
+    bofill_factors,
 )
+from pysisyphus.optimizers.low_rank_hessian import LowRankHessian
 from pysisyphus.optimizers import poly_fit
 from pysisyphus.optimizers.Optimizer import Optimizer
 
@@ -19,6 +24,15 @@ class HessianOptimizer(Optimizer):
         "flowchart": flowchart_update,
         "bofill": bofill_update,
     }
+    # Updates as outer products V·C·Vᵀ, used with hessian_low_rank
+    hessian_factor_funcs = {
+        "bfgs": bfgs_factors,
+        "damped_bfgs": damped_bfgs_factors,
+        "flowchart": flowchart_factors,
+        "bofill": bofill_factors,
+    }
+    # Optimizers that only need a few of the lowest Hessian eigenpairs
+    supports_low_rank = False
 
     rfo_dict = {
         "min": (0, "min"),
@@ -43,8 +57,25 @@ class HessianOptimizer(Optimizer):
         alpha0=1.0,
         max_micro_cycles=25,
         rfo_overlaps=False,
+        hessian_low_rank=False,
+        hessian_max_rank=None,
+        hessian_eig_num=8,
+        hessian_eigensolver="lanczos",
         **kwargs,
     ):
+        # Keep the Hessian as initial Hessian plus low-rank updates and only
+        # determine the hessian_eig_num lowest eigenpairs iteratively. Set
+        # before calling the parent, as it may already restore a Hessian from
+        # restart_info.
+        self.hessian_low_rank = bool(hessian_low_rank)
+        self.hessian_max_rank = hessian_max_rank
+        self.hessian_eig_num = int(hessian_eig_num)
+        self.hessian_eigensolver = hessian_eigensolver
+        # Lowest eigenvector from the previous partial eigensolve
+        self.lowest_eigvec = None
+        assert (not self.hessian_low_rank) or self.supports_low_rank, \
+            f"{self.__class__.__name__} does not support hessian_low_rank!"
+
         super().__init__(geometry, **kwargs)
 
         self.trust_update = bool(trust_update)
@@ -129,6 +160,34 @@ class HessianOptimizer(Optimizer):
         )
         self.log(f"Wrote calculated cartesian Hessian to '{h5_fn}'")
 
+    def wrap_hessian(self, H):
+        """Return a LowRankHessian with initial Hessian H if requested."""
+        if self.hessian_low_rank:
+            H = LowRankHessian(
+                H, max_rank=self.hessian_max_rank, solver=self.hessian_eigensolver
+            )
+        return H
+
+    def get_eigh_guess(self):
+        """Vectors that have to stay in the subspace of a partial eigensolve."""
+        return [self.lowest_eigvec]
+
+    def eigh(self, H):
+        """Eigenvalues and -vectors of H. Only the hessian_eig_num lowest
+        ones are determined when a low-rank Hessian is used. The subspace
+        always contains the vectors from get_eigh_guess()."""
+        if not self.hessian_low_rank:
+            return np.linalg.eigh(H)
+
+        guess = [
+            vec for vec in self.get_eigh_guess()
+            if (vec is not None) and (vec.size == H.size)
+        ]
+        guess = np.stack(guess, axis=1) if guess else None
+        eigvals, eigvecs = H.eigh(self.hessian_eig_num, guess=guess)
+        self.lowest_eigvec = eigvecs[:, 0]
+        return eigvals, eigvecs
+
     def prepare_opt(self, hessian_init=None):
         if hessian_init is None:
             hessian_init = self.hessian_init
@@ -148,6 +207,7 @@ class HessianOptimizer(Optimizer):
         ):
             U = self.geometry.internal.U
             self.H = U.T.dot(self.H).dot(U)
+        self.H = self.wrap_hessian(self.H)
 
         if self.hessian_recalc_adapt:
             self.adapt_norm = np.linalg.norm(self.geometry.forces)
@@ -160,7 +220,7 @@ class HessianOptimizer(Optimizer):
     def _get_opt_restart_info(self):
         opt_restart_info = {
             "adapt_norm": self.adapt_norm,
-            "H": self.H.tolist(),
+            "H": np.array(self.H).tolist(),
             "hessian_recalc_in": self.hessian_recalc_in,
             "predicted_energy_changes": self.predicted_energy_changes,
         }
@@ -168,7 +228,7 @@ class HessianOptimizer(Optimizer):
 
     def _set_opt_restart_info(self, opt_restart_info):
         self.adapt_norm = opt_restart_info["adapt_norm"]
-        self.H = np.array(opt_restart_info["H"])
+        self.H = self.wrap_hessian(np.array(opt_restart_info["H"]))
         self.hessian_recalc_in = opt_restart_info["hessian_recalc_in"]
         self.predicted_energy_changes = opt_restart_info["predicted_energy_changes"]
 
@@ -176,7 +236,7 @@ class HessianOptimizer(Optimizer):
         # The predicted change should be calculated at the end of optimize
         # of the previous cycle.
         assert (
-            len(self.predicted_energy_changes) == len(self.forces) - 1
+            len(self.predicted_energy_changes) == self.forces.total - 1
         ), "Did you forget to append to self.predicted_energy_changes?"
         self.log("Trust radius update")
         self.log(f"\tCurrent trust radius: {self.trust_radius:.6f}")
@@ -259,11 +319,11 @@ class HessianOptimizer(Optimizer):
             # Use xtb hessian
             self.log("Requested Hessian recalculation.")
             if self.hessian_xtb:
-                self.H = xtb_hessian(self.geometry)
+                self.H = self.wrap_hessian(xtb_hessian(self.geometry))
                 key = "xtb"
             # Calculated hessian at actual level of theory
             else:
-                self.H = self.geometry.hessian
+                self.H = self.wrap_hessian(self.geometry.hessian)
                 key = "exact"
                 self.save_hessian()
             if not (self.cur_cycle == 0):
@@ -275,8 +335,14 @@ class HessianOptimizer(Optimizer):
         else:
             dx = self.steps[-1]
             dg = -(self.forces[-1] - self.forces[-2])
-            dH, key = self.hessian_update_func(self.H, dx, dg)
-            self.H = self.H + dH
+            if self.hessian_low_rank:
+                V, C, key = self.hessian_factor_funcs[self.hessian_update](
+                    self.H, dx, dg
+                )
+                self.H.update(V, C)
+            else:
+                dH, key = self.hessian_update_func(self.H, dx, dg)
+                self.H = self.H + dH
             self.log(f"Did {key} Hessian update.")
 
     def poly_line_search(self):
@@ -414,7 +480,7 @@ class HessianOptimizer(Optimizer):
             and (self.forces[-2].shape == gradient.shape)
             # Allows coordinat differences
             and len(self.coords) > 1
-            and (self.coords[-2].shape == self.coords[1].shape)
+            and (self.coords[-2].shape == self.coords[-1].shape)
             and len(self.energies) > 1
         )
         if can_update:
@@ -427,9 +493,10 @@ class HessianOptimizer(Optimizer):
             # don't contribute to the actual step.
             H_proj = self.geometry.internal.project_hessian(self.H)
             # Symmetrize hessian, as the projection may break it?!
-            H = (H_proj + H_proj.T) / 2
+            # Projected low-rank Hessians are symmetric by construction.
+            H = H_proj if self.hessian_low_rank else (H_proj + H_proj.T) / 2
 
-        eigvals, eigvecs = np.linalg.eigh(H)
+        eigvals, eigvecs = self.eigh(H)
         # Neglect small eigenvalues
         eigvals, eigvecs = self.filter_small_eigvals(eigvals, eigvecs)
 
@@ -447,18 +514,16 @@ class HessianOptimizer(Optimizer):
 
         return H_aug
 
-    def get_alpha_step(self, cur_alpha, rfo_eigval, step_norm, eigvals, gradient):
+    def get_alpha_step(
+        self, cur_alpha, rfo_eigval, step_norm, eigvals, gradient, quot=None
+    ):
         # Derivative of the squared step w.r.t. alpha
-        numer = gradient ** 2
-        denom = (eigvals - rfo_eigval * cur_alpha) ** 3
-        quot = np.sum(numer / denom)
+        if quot is None:
+            numer = gradient ** 2
+            denom = (eigvals - rfo_eigval * cur_alpha) ** 3
+            quot = np.sum(numer / denom)
         self.log(f"quot={quot:.6f}")
-        dstep2_dalpha = (
-            2
-            * rfo_eigval
-            / (1 + step_norm ** 2 * cur_alpha)
-            * np.sum(gradient ** 2 / ((eigvals - rfo_eigval * cur_alpha) ** 3))
-        )
+        dstep2_dalpha = 2 * rfo_eigval / (1 + step_norm ** 2 * cur_alpha) * quot
         self.log(f"analytic deriv.={dstep2_dalpha:.6f}")
         # Update alpha
         alpha_step = (
@@ -468,7 +533,48 @@ class HessianOptimizer(Optimizer):
         assert (cur_alpha + alpha_step) > 0, "alpha must not be negative!"
         return alpha_step
 
-    def get_rs_step(self, eigvals, eigvecs, gradient, name="RS"):
+    def get_low_rank_rs_step(self, H, gradient, name="RS"):
+        """RS-RFO step from matrix-vector products with H only."""
+        alpha = self.alpha0
+        for mu in range(self.max_micro_cycles):
+            self.log(f"{name} micro cycle {mu:02d}, alpha={alpha:.6f}")
+            step, eigval_min, nu = H.rfo(gradient, alpha)
+            self.log(f"\tnu_min={nu:.8e}")
+            self.log(f"\teigenvalue_min={eigval_min:.8e}")
+            step_norm = np.linalg.norm(step)
+            self.log(f"norm(rfo step)={step_norm:.6f}")
+
+            if (step_norm < self.trust_radius) or abs(
+                step_norm - self.trust_radius
+            ) <= 1e-3:
+                break
+
+            # Sum over g_i²/(e_i - λα)³ in the eigensystem of H, obtained from
+            # two linear solves: rᵀ(H - λα)⁻¹r with r = (H - λα)⁻¹g.
+            shift = eigval_min * alpha
+            r = H.solve(gradient, shift)
+            quot = r.dot(H.solve(r, shift))
+            alpha_step = self.get_alpha_step(
+                alpha, eigval_min, step_norm, None, None, quot=quot
+            )
+            alpha += alpha_step
+            self.log("")
+        else:
+            self.log(
+                "RS algorithm did not produce a desired step length "
+                f"after {self.max_micro_cycles} micro cycles. Using "
+                "simple downscaled step with alpha=1."
+            )
+            step, _, _ = H.rfo(gradient, alpha=1.0)
+            step_norm = np.linalg.norm(step)
+            if step_norm > self.trust_radius:
+                step = step / step_norm * self.trust_radius
+        return step
+
+    def get_rs_step(self, eigvals, eigvecs, gradient, name="RS", H=None):
+        if self.hessian_low_rank:
+            return self.get_low_rank_rs_step(H, gradient, name=name)
+
         # Transform gradient to basis of eigenvectors
         gradient_ = eigvecs.T.dot(gradient)
 
@@ -1,8 +1,8 @@
 import numpy as np
 
 from pysisyphus.helpers import fit_rigid
-from pysisyphus.optimizers.closures import bfgs_multiply
 from pysisyphus.optimizers.hessian_updates import double_damp
+from pysisyphus.optimizers.history import LBFGSHistory
 from pysisyphus.optimizers.Optimizer import Optimizer
 from pysisyphus.optimizers.restrict_step import scale_by_max_step
 
@@ -19,19 +19,17 @@ class LBFGS(Optimizer):
         self.double_damp = double_damp
         self.gamma_mult = gamma_mult
 
-        self.coord_diffs = list()
-        self.grad_diffs = list()
+        self.lbfgs_history = LBFGSHistory(self.keep_last)
 
         super().__init__(geometry, max_step=max_step, **kwargs)
 
     def reset(self):
-        self.coord_diffs = list()
-        self.grad_diffs = list()
+        self.lbfgs_history.clear()
 
     def _get_opt_restart_info(self):
         opt_restart_info = {
-            "coord_diffs": np.array(self.coord_diffs).tolist(),
-            "grad_diffs": np.array(self.grad_diffs).tolist(),
+            "coord_diffs": np.array(self.lbfgs_history.s_list).tolist(),
+            "grad_diffs": np.array(self.lbfgs_history.y_list).tolist(),
             "double_damp": self.double_damp,
             "gamma_mult": self.gamma_mult,
             "keep_last": self.keep_last,
@@ -39,22 +37,29 @@ class LBFGS(Optimizer):
         return opt_restart_info
 
     def _set_opt_restart_info(self, opt_restart_info):
-        self.coord_diffs = [np.array(cd) for cd in opt_restart_info["coord_diffs"]]
-        self.grad_diffs = [np.array(gd) for gd in opt_restart_info["grad_diffs"]]
         for attr in ("double_damp", "gamma_mult", "keep_last"):
             setattr(self, attr, opt_restart_info[attr])
+        self.lbfgs_history = LBFGSHistory(self.keep_last)
+        self.lbfgs_history.extend(
+            [np.array(cd) for cd in opt_restart_info["coord_diffs"]],
+            [np.array(gd) for gd in opt_restart_info["grad_diffs"]],
+        )
 
     def optimize(self):
         if self.is_cos and self.align:
             rot_vecs, rot_vec_lists, _ = fit_rigid(
                 self.geometry,
-                vector_lists=(self.steps, self.forces, self.coord_diffs, self.grad_diffs)
+                vector_lists=(
+                    self.steps,
+                    self.forces,
+                    self.lbfgs_history.s_list,
+                    self.lbfgs_history.y_list,
+                ),
             )
             rot_steps, rot_forces, rot_coord_diffs, rot_grad_diffs = rot_vec_lists
             self.steps = rot_steps
             self.forces = rot_forces
-            self.coord_diffs = rot_coord_diffs
-            self.grad_diffs = rot_grad_diffs
+            self.lbfgs_history.set_lists(rot_coord_diffs, rot_grad_diffs)
 
         forces = self.geometry.forces
         self.forces.append(forces)
@@ -67,16 +72,12 @@ class LBFGS(Optimizer):
             y = self.forces[-2] - forces
             s = self.steps[-1]
             if self.double_damp:
-                s, y = double_damp(s, y, s_list=self.coord_diffs, y_list=self.grad_diffs)
-            self.grad_diffs.append(y)
-            self.coord_diffs.append(s)
+                s, y = double_damp(s, y, s_list=self.lbfgs_history)
+            # Drops the oldest pair, when keep_last pairs are present
+            self.lbfgs_history.append(s, y)
 
-            # Drop superfluous oldest vectors
-            self.coord_diffs = self.coord_diffs[-self.keep_last:]
-            self.grad_diffs = self.grad_diffs[-self.keep_last:]
-
-        step = bfgs_multiply(self.coord_diffs, self.grad_diffs, forces, beta=self.beta,
-                             gamma_mult=self.gamma_mult, logger=self.logger)
+        step = self.lbfgs_history.multiply(forces, beta=self.beta,
+                                           gamma_mult=self.gamma_mult, logger=self.logger)
         step = scale_by_max_step(step, self.max_step)
 
         return step
@@ -1,4 +1,5 @@
 import abc
+from functools import partial
 import logging
 import os
 from pathlib import Path
@@ -12,7 +13,8 @@ import yaml
 from pysisyphus.cos.ChainOfStates import ChainOfStates
 from pysisyphus.helpers import check_for_end_sign, highlight_text, get_coords_diffs
 from pysisyphus.intcoords.exceptions import RebuiltInternalsException
-from pysisyphus.io.hdf5 import get_h5_group, resize_h5_group
+from pysisyphus.io.hdf5 import H5Writer
+from pysisyphus.optimizers.history import History, HistoryAttribute
 
 
 def get_data_model(geometry, is_cos, max_cycles):
@@ -70,11 +72,29 @@ class Optimizer(metaclass=abc.ABCMeta):
         "baker":      (3.0e-4,    2.0e-4,    3.0e-4,   2.0e-4),
     }
 
+    # Per-cycle quantities, see get_data_model(). Assigned lists are
+    # converted to History objects.
+    image_nums = HistoryAttribute()
+    image_inds = HistoryAttribute()
+    cart_coords = HistoryAttribute()
+    coords = HistoryAttribute()
+    energies = HistoryAttribute()
+    forces = HistoryAttribute()
+    steps = HistoryAttribute()
+    max_forces = HistoryAttribute()
+    rms_forces = HistoryAttribute()
+    max_steps = HistoryAttribute()
+    rms_steps = HistoryAttribute()
+    cycle_times = HistoryAttribute()
+    modified_forces = HistoryAttribute()
+    tangents = HistoryAttribute()
+
     def __init__(self, geometry, thresh="gau_loose", max_step=0.04, max_cycles=50,
                  rms_force=None, rms_force_only=False, align=False, dump=False,
                  dump_restart=None, prefix="", reparam_thresh=1e-3, overachieve_factor=0.,
                  restart_info=None, check_coord_diffs=True, coord_diff_thresh=0.01,
-                 h5_fn="optimization.h5", h5_group_name="opt"):
+                 h5_fn="optimization.h5", h5_group_name="opt", h5_buffer_size=10,
+                 history_window=None):
         assert thresh in self.CONV_THRESHS.keys()
 
         self.geometry = geometry
@@ -89,6 +109,9 @@ class Optimizer(metaclass=abc.ABCMeta):
         self.overachieve_factor = float(overachieve_factor)
         self.check_coord_diffs = check_coord_diffs
         self.coord_diff_thresh = float(coord_diff_thresh)
+        # Number of cycles kept in memory. Older cycles are only present in
+        # the HDF5 dump.
+        self.history_window = history_window
 
         self.is_cos = issubclass(type(self.geometry), ChainOfStates)
         self.convergence = self.make_conv_dict(thresh, rms_force)
@@ -117,7 +140,7 @@ class Optimizer(metaclass=abc.ABCMeta):
 
         self.logger = logging.getLogger("optimizer")
 
-        # Setting some empty lists as default. The actual shape of the respective
+        # Setting some empty histories as default. The actual shape of the respective
         # entries is not considered, which gives us some flexibility.
         self.data_model = get_data_model(self.geometry, self.is_cos, self.max_cycles)
         for la in self.data_model.keys():
@@ -131,9 +154,11 @@ class Optimizer(metaclass=abc.ABCMeta):
             # cycles and a second restarted optimization with 20 cycles the last 10 cycles
             # of the previous optimization would still be present.
             reset = (restart_info is None)
-            h5_group = get_h5_group(self.h5_fn, self.h5_group_name, self.data_model,
-                                    reset=reset)
-            h5_group.file.close()
+            # The file is opened on the first write and stays open until the
+            # end of run(). Cycles are buffered and written every h5_buffer_size
+            # cycles.
+            self.h5_writer = H5Writer(self.h5_fn, self.h5_group_name, self.data_model,
+                                      reset=reset, buffer_size=h5_buffer_size)
         if self.prefix:
             self.log(f"Created optimizer with prefix {self.prefix}")
 
@@ -146,6 +171,20 @@ class Optimizer(metaclass=abc.ABCMeta):
             self.set_restart_info(restart_info)
             self.restarted = True
 
+    def make_history(self, key, items=(), first=0):
+        """History for a per-cycle quantity, keeping history_window items.
+
+        With dump=True dropped items can be read back from the HDF5 dump with
+        History.load(i), assuming item i belongs to cycle i. They then have
+        the full width of the data model. first is the cycle of the first
+        item, when the items don't start at cycle 0, e.g. in restarts.
+        """
+        loader = partial(self.load_history_item, key) if self.dump else None
+        return History(items, maxlen=self.history_window, loader=loader, first=first)
+
+    def load_history_item(self, key, index):
+        return self.h5_writer.read_row(key, index)
+
     def get_path_for_fn(self, fn):
         return self.out_dir / (self.prefix + fn)
 
@@ -309,37 +348,35 @@ class Optimizer(metaclass=abc.ABCMeta):
 
     def write_results(self):
         # Save results from the Optimizer to HDF5 file if requested
-        h5_group = get_h5_group(self.h5_fn, self.h5_group_name)
+        h5_writer = self.h5_writer
 
         # Some attributes never change and are only set in the first cycle
         if self.cur_cycle == 0:
-            h5_group.attrs["is_cos"] = self.is_cos
             try:
                 atoms = self.geometry.images[0].atoms
                 coord_size = self.geometry.images[0].coords.size
             except AttributeError:
                 atoms = self.geometry.atoms
                 coord_size = self.geometry.coords.size
-            h5_group.attrs["atoms"] = atoms
-            h5_group.attrs["coord_type"] = self.geometry.coord_type
-            h5_group.attrs["coord_size"] = coord_size
+            h5_writer.set_attrs(
+                is_cos=self.is_cos,
+                atoms=atoms,
+                coord_type=self.geometry.coord_type,
+                coord_size=coord_size,
+            )
 
         # Update changing attributes
-        h5_group.attrs["cur_cycle"] = self.cur_cycle
-        h5_group.attrs["is_converged"] = self.is_converged
+        h5_writer.set_attrs(cur_cycle=self.cur_cycle, is_converged=self.is_converged)
 
-        for key, shape in self.data_model.items():
+        row = dict()
+        for key in self.data_model.keys():
             value = getattr(self, key)
             # Don't try to set empty values, e.g. 'tangents' are only present
             # for COS methods. 'modified_forces' are only present for NCOptimizer.
             if not value:
                 continue
-            if len(shape) > 1:
-                h5_group[key][self.cur_cycle, :len(value[-1])] = value[-1]
-            else:
-                h5_group[key][self.cur_cycle] = value[-1]
-
-        h5_group.file.close()
+            row[key] = value[-1]
+        h5_writer.add_row(self.cur_cycle, row)
 
     def write_cycle_to_file(self):
         as_xyz_str = self.geometry.as_xyz()
@@ -523,6 +560,10 @@ class Optimizer(metaclass=abc.ABCMeta):
         # Outside loop
         if self.dump:
             self.out_trj_handle.close()
+            self.h5_writer.close()
+
+        if self.is_cos:
+            self.geometry.shutdown_executor()
 
         if (not self.is_cos) and (not self.stopped):
             print(self.final_summary())
@@ -549,10 +590,15 @@ class Optimizer(metaclass=abc.ABCMeta):
             "geom_info": self.geometry.get_restart_info(),
             "last_cycle": self.cur_cycle,
             "max_cycles": self.max_cycles,
-            "energies": self.energies,
-            "coords": self.coords,
+            "energies": list(self.energies),
+            "coords": list(self.coords),
             "forces": [forces.tolist() for forces in self.forces],
             "steps": [step.tolist() for step in self.steps],
+            # Absolute index of the first item that is kept with history_window
+            "history_first": {
+                key: getattr(self, key).first
+                for key in ("coords", "energies", "forces", "steps")
+            },
         }
         restart_info.update(self._get_opt_restart_info())
         return restart_info
@@ -564,16 +610,18 @@ class Optimizer(metaclass=abc.ABCMeta):
         must_resize = self.last_cycle >= self.max_cycles
         if must_resize:
             self.max_cycles += restart_info["max_cycles"]
-            # Resize HDF5
-            if self.dump:
-                h5_group = get_h5_group(self.h5_fn, self.h5_group_name)
-                resize_h5_group(h5_group, self.max_cycles)
-                h5_group.file.close()
-
-        self.coords = [np.array(coords) for coords in restart_info["coords"]]
-        self.energies = restart_info["energies"]
-        self.forces = [np.array(forces) for forces in restart_info["forces"]]
-        self.steps = [np.array(step) for step in restart_info["steps"]]
+
+        # Restart information of older versions always holds all items
+        history_first = restart_info.get("history_first", dict())
+        histories = {
+            "coords": [np.array(coords) for coords in restart_info["coords"]],
+            "energies": restart_info["energies"],
+            "forces": [np.array(forces) for forces in restart_info["forces"]],
+            "steps": [np.array(step) for step in restart_info["steps"]],
+        }
+        for key, items in histories.items():
+            history = self.make_history(key, items, first=history_first.get(key, 0))
+            setattr(self, key, history)
 
         # Set subclass specific information
         self._set_opt_restart_info(restart_info)
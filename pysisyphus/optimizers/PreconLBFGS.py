@@ -1,11 +1,9 @@
-from collections import deque
-
 import numpy as np
 from scipy.sparse.linalg import spsolve
 
 from pysisyphus.calculators import Dimer
 from pysisyphus.line_searches import *
-from pysisyphus.optimizers.closures import bfgs_multiply
+from pysisyphus.optimizers.history import LBFGSHistory
 from pysisyphus.optimizers.Optimizer import Optimizer
 from pysisyphus.optimizers.precon import precon_getter
 
@@ -73,8 +71,7 @@ class PreconLBFGS(Optimizer):
         self.line_search_cls = ls_cls[self.line_search]
 
         if not self.restarted:
-            self.grad_diffs = deque(maxlen=self.history)
-            self.steps_ = deque(maxlen=self.history)
+            self.lbfgs_history = LBFGSHistory(self.history)
 
     def prepare_opt(self):
         if self.precon:
@@ -83,17 +80,16 @@ class PreconLBFGS(Optimizer):
     def _get_opt_restart_info(self):
         opt_restart_info = {
             "c_stab": self.c_stab,
-            "grad_diffs": np.array(self.grad_diffs).tolist(),
-            "steps_": np.array(self.steps_).tolist(),
+            "grad_diffs": np.array(self.lbfgs_history.y_list).tolist(),
+            "steps_": np.array(self.lbfgs_history.s_list).tolist(),
         }
         return opt_restart_info
 
     def _set_opt_restart_info(self, opt_restart_info):
-        self.grad_diffs = deque(
-            [np.array(gd) for gd in opt_restart_info["grad_diffs"]], maxlen=self.history
-        )
-        self.steps_ = deque(
-            [np.array(cd) for cd in opt_restart_info["steps_"]], maxlen=self.history
+        self.lbfgs_history = LBFGSHistory(self.history)
+        self.lbfgs_history.extend(
+            [np.array(cd) for cd in opt_restart_info["steps_"]],
+            [np.array(gd) for gd in opt_restart_info["grad_diffs"]],
         )
 
         c_stab = opt_restart_info["c_stab"]
@@ -130,9 +126,8 @@ class PreconLBFGS(Optimizer):
             step = spsolve(P, forces)
 
         if self.cur_cycle > 0:
-            self.grad_diffs.append(-forces - -self.forces[-2])
-            self.steps_.append(self.steps[-1])
-            step = bfgs_multiply(self.steps_, self.grad_diffs, forces, P=P)
+            self.lbfgs_history.append(self.steps[-1], -forces - -self.forces[-2])
+            step = self.lbfgs_history.multiply(forces, P=P)
 
         step_dir = step / np.linalg.norm(step)
 
@@ -12,6 +12,7 @@ from pysisyphus.optimizers.gdiis import gdiis, gediis
 
 
 class RFOptimizer(HessianOptimizer):
+    supports_low_rank = True
 
     def __init__(self, geom, line_search=True, gediis=False, gdiis=True,
                  gdiis_thresh=2.5e-3, gediis_thresh=1e-2, max_micro_cycles=1,
@@ -29,7 +30,8 @@ class RFOptimizer(HessianOptimizer):
 
         # Reference RFO step, used for judging the proposed GDIIS step
         ref_gradient = gradient.copy()
-        ref_rfo_step = self.get_rs_step(big_eigvals, big_eigvecs, gradient, name="RS-RFO")
+        ref_rfo_step = self.get_rs_step(big_eigvals, big_eigvecs, gradient,
+                                        name="RS-RFO", H=H)
 
         # Right everything is in place to check for convergence.  If all values are below
         # the thresholds, there is no need to do additional inter/extrapolations.
@@ -84,7 +86,8 @@ class RFOptimizer(HessianOptimizer):
             ip_step = np.zeros_like(gradient)
 
         # RFO step (from intermediate geometry) with (interpolated) gradient
-        rfo_step = self.get_rs_step(big_eigvals, big_eigvecs, gradient, name="RS-RFO")
+        rfo_step = self.get_rs_step(big_eigvals, big_eigvecs, gradient,
+                                    name="RS-RFO", H=H)
         # Form full step. If we did not interpolate or it failed ip_step will be zero.
         step = rfo_step + ip_step
 
@@ -8,7 +8,7 @@ import numpy as np
 
 from pysisyphus.helpers import procrustes
 from pysisyphus.optimizers.hessian_updates import double_damp
-from pysisyphus.optimizers.closures import bfgs_multiply
+from pysisyphus.optimizers.history import LBFGSHistory
 from pysisyphus.optimizers.Optimizer import Optimizer
 from pysisyphus.optimizers.restrict_step import scale_by_max_step
 
@@ -37,9 +37,7 @@ class StringOptimizer(Optimizer):
         # Add one as we later subtract 1 before we check if this value is 0.
         self.stop_in = self.stop_in_when_full + 1
         self.is_cart_opt = self.geometry.coord_type == "cart"
-        self.s_list = list()
-        self.y_list = list()
-        self.inds = list()
+        self.lbfgs_history = LBFGSHistory(self.keep_last)
 
     def prepare_opt(self):
         if self.align and self.is_cart_opt:
@@ -93,40 +91,38 @@ class StringOptimizer(Optimizer):
                                              # but grew fully in this cycle.
             )
         )
+        # Components of the present images in the current, possibly grown, string
+        present_inds = np.delete(np.arange(forces.size).reshape(cur_size, -1),
+                                 new_image_inds, axis=0).flatten()
+        # Embed previous pairs, with zeros for the new images
+        if self.lbfgs_history.size not in (None, forces.size):
+            self.lbfgs_history.grow(forces.size, present_inds)
+
         if add_to_list:
-            inds = list(range(cur_size))
             try:
                 y = self.forces[-2] - forces
                 s = self.coords[-1] - self.coords[-2]
             # Will be raised when the string grew in the previous cycle.
             except ValueError:
-                cur_forces = np.delete(forces.reshape(cur_size, -1),
-                                       new_image_inds, axis=0).flatten()
-                y = self.forces[-2] - cur_forces
-                cur_coords = np.delete(self.coords[-1].reshape(cur_size, -1),
-                                       new_image_inds, axis=0).flatten()
-                s = self.coords[-2] - cur_coords
-                inds = np.delete(inds, new_image_inds)
+                y = np.zeros_like(forces)
+                y[present_inds] = self.forces[-2] - forces[present_inds]
+                s = np.zeros_like(forces)
+                s[present_inds] = self.coords[-2] - self.coords[-1][present_inds]
 
             if self.double_damp:
-                s, y = double_damp(s, y, s_list=self.s_list, y_list=self.y_list)
+                s, y = double_damp(s, y, s_list=self.lbfgs_history)
 
-            self.s_list.append(s)
-            self.y_list.append(y)
-            self.inds.append(inds)
-            # Drop oldest vectors
-            self.s_list = self.s_list[-self.keep_last:]
-            self.y_list = self.y_list[-self.keep_last:]
-            self.inds = self.inds[-self.keep_last:]
+            # Drops the oldest pair, when keep_last pairs are present
+            self.lbfgs_history.append(s, y)
 
-        # Results in steepest descent step for empty s_list & y_list
-        step = bfgs_multiply(self.s_list, self.y_list, forces, gamma_mult=self.gamma_mult,
-                             inds=self.inds, cur_size=cur_size, logger=self.logger)
+        # Results in steepest descent step for an empty history
+        step = self.lbfgs_history.multiply(forces, gamma_mult=self.gamma_mult,
+                                           logger=self.logger)
 
-        # When keep_last == 0 or LBFGS is not yet enabled then s_list and y_list will
+        # When keep_last == 0 or LBFGS is not yet enabled then the history will
         # be empty and step will be a simple SD step. We try to improve it via CG.
         if ((self.keep_last == 0 and self.cur_cycle > 0 and not string_size_changed)
-            and (len(self.s_list) == 0 and len(self.y_list) == 0)):
+            and (len(self.lbfgs_history) == 0)):
             prev_forces = self.forces[-2]
             # Fletcher-Reeves
             beta = forces.dot(forces) / prev_forces.dot(prev_forces)
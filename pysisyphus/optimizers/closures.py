@@ -1,7 +1,8 @@
 from collections import deque
 
 import numpy as np
-from scipy.sparse.linalg import spsolve
+
+from pysisyphus.optimizers.history import LBFGSHistory
 
 
 def bfgs_multiply(s_list, y_list, vector, beta=1, P=None, logger=None,
@@ -10,76 +11,39 @@ def bfgs_multiply(s_list, y_list, vector, beta=1, P=None, logger=None,
 
     Multiplies given vector with inverse Hessian, obtained
     from repeated BFGS updates calculated from steps in 's_list'
-    and gradient differences in 'y_list'.
-    
+    and gradient differences in 'y_list'. 's_list' may also be
+    an LBFGSHistory; 'y_list' is then ignored.
+
+    Vectors that are shorter than the given vector, e.g. from a growing
+    string before new images were added, are embedded at the image
+    indices 'inds' of a string with 'cur_size' images.
+
     Based on algorithm 7.4 Nocedal, Num. Opt., p. 178."""
 
-    assert len(s_list) == len(y_list), \
-        "lengths of step list 's_list' and gradient list 'y_list' differ!"
-
-    q = vector.copy()
-    cycles = len(s_list)
-    alphas = list()
-    rhos = list()
-    # Store rho and alphas as they are also needed in the second loop
-    for i in reversed(range(cycles)):
-        s = s_list[i]
-        y = y_list[i]
-        rho = 1/y.dot(s)
-        rhos.append(rho)
-        try:
-            alpha = rho * s.dot(q)
-            q -= alpha*y
-        except ValueError:
-            inds_i = inds[i]
-            q_ = q.reshape(cur_size, -1)
-            alpha = rho * s.dot(q_[inds_i].flatten())
-            # This also modifies q!
-            q_[inds_i] -= alpha*y.reshape(len(inds_i), -1)
-        alphas.append(alpha)
-
-    # Restore original order, so that rho[i] = 1/s_list[i].dot(y_list[i]) etc.
-    alphas = alphas[::-1]
-    rhos = rhos[::-1]
-
-    if P is not None:
-        r = spsolve(P, q)
-        msg = "preconditioner."
-    elif gamma_mult and (cycles > 0):
-        s = s_list[-1]
-        y = y_list[-1]
-        gamma = s.dot(y) / y.dot(y)
-        r = gamma * q
-        msg = f"gamma={gamma:.4f}"
+    if isinstance(s_list, LBFGSHistory):
+        history = s_list
     else:
-        r = beta * q
-        msg = f"beta={beta:.4f}"
-
-    if logger is not None:
-        msg = f"BFGS multiply using {cycles} previous cycles with {msg}."
-        if len(s_list) == 0:
-            msg += " Produced simple SD step."
-        logger.debug(msg)
-
-    for i in range(cycles):
-        s = s_list[i]
-        y = y_list[i]
-        try:
-            beta = rhos[i] * y.dot(r)
-            r += s*(alphas[i] - beta)
-        except ValueError:
-            inds_i = inds[i]
-            r_ = r.reshape(cur_size, -1)
-            beta = rhos[i] * y.dot(r_[inds_i].flatten())
-            # This also modifies r!
-            r_[inds_i] += s.reshape(len(inds_i), -1) *(alphas[i] - beta)
-
-    return r
+        assert len(s_list) == len(y_list), \
+            "lengths of step list 's_list' and gradient list 'y_list' differ!"
+        if inds is not None:
+            s_list = [embed(s, inds_i, vector.size, cur_size) for s, inds_i in zip(s_list, inds)]
+            y_list = [embed(y, inds_i, vector.size, cur_size) for y, inds_i in zip(y_list, inds)]
+        history = LBFGSHistory.from_lists(s_list, y_list)
+    return history.multiply(vector, beta=beta, P=P, logger=logger, gamma_mult=gamma_mult)
+
+
+def embed(vec, image_inds, size, image_num):
+    """Embed a vector at the given image indices of a bigger vector."""
+    if vec.size == size:
+        return vec
+    embedded = np.zeros((image_num, size // image_num))
+    embedded[image_inds] = vec.reshape(len(image_inds), -1)
+    return embedded.flatten()
 
 
 def lbfgs_closure(first_force, force_getter, m=10, restrict_step=None):
-    s_list = list()
-    y_list = list()
+    # Only keeps last m cycles
+    history = LBFGSHistory(m)
     forces = [first_force, ]
     cur_cycle = 0
 
@@ -88,22 +52,16 @@ def lbfgs_closure(first_force, force_getter, m=10, restrict_step=None):
 
     def lbfgs(x, *getter_args):
         nonlocal cur_cycle
-        nonlocal s_list
-        nonlocal y_list
 
         prev_forces = forces[-1]
-        step = bfgs_multiply(s_list, y_list, prev_forces)
+        step = history.multiply(prev_forces)
         step = restrict_step(x, step)
         new_x = x + step
         new_forces = force_getter(new_x, *getter_args)
         s = new_x - x
-        s_list.append(s)
         y = prev_forces - new_forces
-        y_list.append(y)
+        history.append(s, y)
         forces.append(new_forces)
-        # Only keep last m cycles
-        s_list = s_list[-m:]
-        y_list = y_list[-m:]
         cur_cycle += 1
         return new_x, step, new_forces
     return lbfgs
@@ -111,8 +69,9 @@ def lbfgs_closure(first_force, force_getter, m=10, restrict_step=None):
 
 def lbfgs_closure_(force_getter, M=10, beta=1, restrict_step=None):
     x_list = list()
-    s_list = list()
-    y_list = list()
+    # The newest pair is added before the step is calculated, so up to
+    # M+1 pairs are used.
+    history = LBFGSHistory(M + 1)
     force_list = list()
     cur_cycle = 0
 
@@ -122,25 +81,19 @@ def lbfgs_closure_(force_getter, M=10, beta=1, restrict_step=None):
     def lbfgs(x, *getter_args):
         nonlocal x_list
         nonlocal cur_cycle
-        nonlocal s_list
-        nonlocal y_list
 
         force = force_getter(x, *getter_args)
         if cur_cycle > 0:
             prev_x = x_list[-1]
             s = x - prev_x
-            s_list.append(s)
             prev_force = force_list[-1]
             y = prev_force - force
-            y_list.append(y)
+            history.append(s, y)
         x_list.append(x)
         force_list.append(force)
 
-        step = bfgs_multiply(s_list, y_list, force, beta=beta)
+        step = history.multiply(force, beta=beta)
         step = restrict_step(x, step)
-        # Only keep last m cycles
-        s_list = s_list[-M:]
-        y_list = y_list[-M:]
         cur_cycle += 1
         return step, force
     return lbfgs
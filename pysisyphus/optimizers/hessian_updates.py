@@ -19,6 +19,20 @@ import numpy as np
 from pysisyphus.optimizers.closures import bfgs_multiply
 
 
+# The *_factors functions return the updates as a symmetric outer product
+# V·C·Vᵀ of a few vectors in the columns of V, so they can be applied to a
+# LowRankHessian without ever forming a dense (N, N) matrix. The *_update
+# functions return the same updates as dense matrices, evaluated with the
+# explicit formulas, which are exactly symmetric.
+
+
+def bfgs_factors(H, dx, dg):
+    Hdx = H.dot(dx)
+    V = np.stack((dg, Hdx), axis=1)
+    C = np.diag((1 / dg.dot(dx), -1 / dx.dot(Hdx)))
+    return V, C, "BFGS"
+
+
 def bfgs_update(H, dx, dg):
     first_term = np.outer(dg, dg) / dg.dot(dx)
     second_term = (H.dot(np.outer(dx, dx)).dot(H)
@@ -27,6 +41,21 @@ def bfgs_update(H, dx, dg):
     return first_term - second_term, "BFGS"
 
 
+def damped_bfgs_factors(H, dx, dg):
+    """See [5]"""
+    Hdx = H.dot(dx)
+    dxdg = dx.dot(dg)
+    dxHdx = dx.dot(Hdx)
+    theta = 1
+    if dxdg < 0.2*dxHdx:
+        theta = 0.8*dxHdx / (dxHdx - dxdg)
+    r = theta*dg + (1-theta)*Hdx
+
+    V = np.stack((r, Hdx), axis=1)
+    C = np.diag((1 / r.dot(dx), -1 / dxHdx))
+    return V, C, "damped BFGS"
+
+
 def damped_bfgs_update(H, dx, dg):
     """See [5]"""
     dxdg = dx.dot(dg)
@@ -59,10 +88,11 @@ def double_damp(s, y, H=None, s_list=None, y_list=None,
         Gradient differences
     H : np.array, shape (N, N), floats, optional
         Inverse Hessian.
-    s_list : list of nd.array, shape (K, N), optional
+    s_list : list of nd.array, shape (K, N), or LBFGSHistory, optional
         List of K previous steps. If no H is supplied and prev_ys is given
         the matrix-vector product Hy will be calculated through the
-        two-loop LBFGS-recursion.
+        two-loop LBFGS-recursion. When an LBFGSHistory is given, y_list
+        is not needed.
     y_list : list of nd.array, shape (K, N), optional
         List of K previous gradient differences. See s_list.
     mu_1 : float, optional
@@ -116,16 +146,43 @@ def double_damp(s, y, H=None, s_list=None, y_list=None,
     return s, y
 
 
+def sr1_factors(z, dx):
+    return z[:, None], np.array(((1 / z.dot(dx), ), )), "SR1"
+
+
 def sr1_update(z, dx):
     return np.outer(z, z) / z.dot(dx), "SR1"
 
 
+def psb_factors(z, dx):
+    dxdx = dx.dot(dx)
+    V = np.stack((dx, z), axis=1)
+    C = np.array((
+        (-dx.dot(z) / dxdx**2, 1 / dxdx),
+        (1 / dxdx, 0.),
+    ))
+    return V, C, "PSB"
+
+
 def psb_update(z, dx):
     first_term = (np.outer(dx, z) + np.outer(z, dx)) / dx.dot(dx)
     sec_term = dx.dot(z) * np.outer(dx, dx) / dx.dot(dx)**2
     return first_term - sec_term, "PSB"
 
 
+def flowchart_factors(H, dx, dg):
+    # See [1], Sec. 2, equations 1 to 3
+    z = dg - H.dot(dx)
+    sr1_quot = z.dot(dx) / (np.linalg.norm(z) * np.linalg.norm(dx))
+    bfgs_quot = dg.dot(dx) / (np.linalg.norm(dg) * np.linalg.norm(dx))
+    if sr1_quot < -0.1:
+        return sr1_factors(z, dx)
+    elif bfgs_quot > 0.1:
+        return bfgs_factors(H, dx, dg)
+    else:
+        return psb_factors(z, dx)
+
+
 def flowchart_update(H, dx, dg):
     # See [1], Sec. 2, equations 1 to 3
     z = dg - H.dot(dx)
@@ -154,6 +211,21 @@ def mod_flowchart_update(H, dx, dg):
     return update, key
 
 
+def bofill_factors(H, dx, dg):
+    z = dg - H.dot(dx)
+
+    # Bofill mixing-factor
+    mix = z.dot(dx)**2 / (z.dot(z) * dx.dot(dx))
+
+    # Mixing of the symmetric, rank-one (SR1) update and the Powell (PSB)
+    # update. Both are built from dx and z.
+    _, sr1_C, _ = sr1_factors(z, dx)
+    V, psb_C, _ = psb_factors(z, dx)
+    C = (1 - mix) * psb_C
+    C[1, 1] += mix * sr1_C[0, 0]
+    return V, C, "Bofill"
+
+
 def bofill_update(H, dx, dg):
     z = dg - H.dot(dx)
 
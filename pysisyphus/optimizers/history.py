@@ -0,0 +1,396 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from scipy.sparse.linalg import spsolve
+
+
+class History:
+    """List-like store that only keeps the last maxlen items in memory.
+
+    Items are kept in a preallocated ring of maxlen slots, so appending
+    never grows the store beyond maxlen items. As for a deque with maxlen,
+    len(), indices, slices, iteration and conversion to an array all refer
+    to the items kept in memory, from the oldest to the newest one, so
+    ``history[-2]``, ``history[::-1][:5]`` or ``np.array(history)`` work as
+    expected for the recent items.
+
+    The total number of appended items is available as ``total`` and the
+    absolute index of the oldest kept item as ``first``. Dropped items can be
+    looked up by their absolute index with load(), when a loader is given,
+    e.g. one reading from the HDF5 dump of an optimization.
+    """
+
+    def __init__(self, items=(), maxlen=None, loader=None, first=0):
+        """
+        Parameters
+        ----------
+        items : iterable
+            Initial items.
+        maxlen : int, optional
+            Number of items kept in memory. All items are kept when omitted.
+        loader : callable, optional
+            Called with the absolute index of a dropped item and returns it.
+        first : int, optional
+            Absolute index of the first of the given items, e.g. when the
+            kept items of a previous History are restored in a restart.
+        """
+        if maxlen is not None:
+            maxlen = int(maxlen)
+            assert maxlen > 0, "maxlen must be a positive integer!"
+        self.maxlen = maxlen
+        self.loader = loader
+
+        self._slots = list() if maxlen is None else [None] * maxlen
+        # Number of items ever appended and absolute index of the first kept item
+        self._count = int(first)
+        self._first = int(first)
+        for item in items:
+            self.append(item)
+
+    @property
+    def first(self):
+        """Absolute index of the oldest item that is still kept in memory."""
+        return self._first
+
+    @property
+    def total(self):
+        """Number of items ever appended."""
+        return self._count
+
+    def _slot(self, abs_index):
+        if self.maxlen is None:
+            return abs_index - self._first
+        return abs_index % self.maxlen
+
+    def _abs_index(self, index):
+        """Absolute index of the kept item at position index."""
+        kept_num = len(self)
+        if index < 0:
+            index += kept_num
+        if not (0 <= index < kept_num):
+            raise IndexError("History index out of range")
+        return self._first + index
+
+    def append(self, item):
+        if self.maxlen is None:
+            self._slots.append(item)
+        else:
+            if len(self) == self.maxlen:
+                self._first += 1
+            self._slots[self._slot(self._count)] = item
+        self._count += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def pop(self, index=-1):
+        """Only the last item can be removed."""
+        assert self._abs_index(index) == self._count - 1, \
+            "Only the last item can be popped from a History!"
+        self._count -= 1
+        slot = self._slot(self._count)
+        item = self._slots[slot]
+        if self.maxlen is None:
+            self._slots.pop()
+        else:
+            self._slots[slot] = None
+        return item
+
+    def clear(self):
+        self._slots = list() if self.maxlen is None else [None] * self.maxlen
+        self._count = 0
+        self._first = 0
+
+    def load(self, abs_index):
+        """Item with the given absolute index, also when it was dropped."""
+        if not (0 <= abs_index < self._count):
+            raise IndexError("History index out of range")
+        if abs_index >= self._first:
+            return self._slots[self._slot(abs_index)]
+        if self.loader is None:
+            raise IndexError(
+                f"Item {abs_index} was dropped from the History, only the "
+                f"last {self.maxlen} items are kept."
+            )
+        return self.loader(abs_index)
+
+    def __len__(self):
+        return self._count - self._first
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(len(self))[key]]
+        return self._slots[self._slot(self._abs_index(key))]
+
+    def __setitem__(self, key, item):
+        self._slots[self._slot(self._abs_index(key))] = item
+
+    def __iter__(self):
+        for abs_index in range(self._first, self._count):
+            yield self._slots[self._slot(abs_index)]
+
+    def __array__(self, dtype=None):
+        return np.array(list(self), dtype=dtype)
+
+    def __repr__(self):
+        return f"History({len(self)} kept, {self.total} total, maxlen={self.maxlen})"
+
+
+class HistoryAttribute:
+    """Descriptor that stores assigned iterables as History.
+
+    The History is created by the owner's make_history(name, items) method,
+    so plain lists assigned in restarts or by derived classes keep the
+    configured window.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, obj, value):
+        if not isinstance(value, History):
+            value = obj.make_history(self.name, value)
+        obj.__dict__[self.name] = value
+
+
+class LBFGSHistory:
+    """Steps and gradient differences of the last m L-BFGS cycles.
+
+    Vectors are stored in two contiguous (m, n) ring-buffer arrays. As for
+    History, len(), indices and iteration refer to the kept (s, y) pairs,
+    from the oldest to the newest one. The
+    inner products S·Yᵀ and Y·Yᵀ are updated when a pair is added, so
+    multiplying with the inverse Hessian does not recompute them. Without
+    preconditioner the compact representation of Byrd, Nocedal and Schnabel
+    is used, which only needs a few matrix products.
+
+    [1] https://doi.org/10.1007/BF01582063
+        Byrd, 1994, Representations of quasi-Newton matrices and their
+        use in limited memory methods
+    """
+
+    def __init__(self, m, size=None):
+        """
+        Parameters
+        ----------
+        m : int
+            Number of kept pairs. With m = 0 no pairs are kept, as for a
+            deque with maxlen=0.
+        size : int, optional
+            Length of the vectors. Determined by the first pair when omitted.
+        """
+        self.m = int(m)
+        assert self.m >= 0, "m must be a non-negative integer!"
+        self.size = None
+        # Inner products between all slots; SY[i, j] = s_i·y_j
+        self.SY = np.zeros((self.m, self.m))
+        self.YY = np.zeros((self.m, self.m))
+        self.clear()
+        if size is not None:
+            self.allocate(size)
+
+    @staticmethod
+    def from_lists(s_list, y_list, m=None):
+        assert len(s_list) == len(y_list), \
+            "lengths of step list 's_list' and gradient list 'y_list' differ!"
+        if m is None:
+            m = max(len(s_list), 1)
+        history = LBFGSHistory(m)
+        history.extend(s_list, y_list)
+        return history
+
+    def allocate(self, size):
+        self.size = int(size)
+        self.S = np.zeros((self.m, self.size))
+        self.Y = np.zeros((self.m, self.size))
+
+    def clear(self):
+        self.count = 0
+        # Slot the next pair is stored in
+        self.head = 0
+        self.S = None
+        self.Y = None
+        self.size = None
+
+    def __len__(self):
+        """Number of kept pairs, as for History."""
+        return self.count
+
+    def __getitem__(self, index):
+        """Kept (s, y) pair; index 0 is the oldest one."""
+        if index < 0:
+            index += self.count
+        if not (0 <= index < self.count):
+            raise IndexError("LBFGSHistory index out of range")
+        slot = self.order[index]
+        return self.S[slot], self.Y[slot]
+
+    def __iter__(self):
+        for slot in self.order:
+            yield self.S[slot], self.Y[slot]
+
+    @property
+    def order(self):
+        """Slots, from the oldest to the newest pair."""
+        return (self.head - self.count + np.arange(self.count)) % self.m
+
+    @property
+    def s_list(self):
+        return [s for s in self.S[self.order]] if self.count else list()
+
+    @property
+    def y_list(self):
+        return [y for y in self.Y[self.order]] if self.count else list()
+
+    @property
+    def rhos(self):
+        order = self.order
+        return 1 / self.SY[order, order]
+
+    def append(self, s, y):
+        if self.m == 0:
+            return
+        if self.size is None:
+            self.allocate(s.size)
+        assert s.size == y.size == self.size, \
+            f"Expected vectors of size {self.size}, got {s.size} and {y.size}!"
+        slot = self.head
+        self.S[slot] = s
+        self.Y[slot] = y
+        # Only the row and column of the new slot change. Products with
+        # unused, zero slots are never used.
+        self.SY[slot] = self.Y.dot(s)
+        self.SY[:, slot] = self.S.dot(y)
+        self.YY[slot] = self.YY[:, slot] = self.Y.dot(y)
+        self.head = (self.head + 1) % self.m
+        self.count = min(self.count + 1, self.m)
+
+    def extend(self, s_list, y_list):
+        for s, y in zip(s_list, y_list):
+            self.append(s, y)
+
+    def set_lists(self, s_list, y_list):
+        """Replace all pairs, e.g. after rotating them."""
+        self.clear()
+        self.extend(s_list, y_list)
+
+    def grow(self, size, keep_inds):
+        """Embed the stored vectors in a bigger space.
+
+        Used for growing strings, when new images are added. Components of
+        the new coordinates are zero, so all inner products are unchanged.
+
+        Parameters
+        ----------
+        size : int
+            New length of the vectors.
+        keep_inds : array-like of int
+            Positions of the present components in the new vectors.
+        """
+        if self.count == 0:
+            self.clear()
+            return
+        S, Y = self.S, self.Y
+        self.allocate(size)
+        self.S[:, keep_inds] = S
+        self.Y[:, keep_inds] = Y
+
+    def get_gamma(self, beta=1, gamma_mult=True):
+        """Scaling of the initial inverse Hessian, H0 = gamma·I."""
+        if gamma_mult and (self.count > 0):
+            last = (self.head - 1) % self.m
+            return self.SY[last, last] / self.YY[last, last]
+        return beta
+
+    def two_loop(self, vector, H0_mult):
+        """Two-loop recursion, Algorithm 7.4 in Nocedal, Num. Opt., p. 178.
+
+        H0_mult is a callable returning the product of the initial inverse
+        Hessian with a vector.
+        """
+        order = self.order
+        rhos = self.rhos
+        S = self.S
+        Y = self.Y
+        q = vector.copy()
+        alphas = np.zeros(self.count)
+        for i in reversed(range(self.count)):
+            alphas[i] = rhos[i] * S[order[i]].dot(q)
+            q -= alphas[i] * Y[order[i]]
+        r = H0_mult(q)
+        for i in range(self.count):
+            beta = rhos[i] * Y[order[i]].dot(r)
+            r += S[order[i]] * (alphas[i] - beta)
+        return r
+
+    def compact(self, vector, gamma):
+        """Product of the compact inverse Hessian with vector(s).
+
+        H = γI + [S γY] [[R⁻ᵀ(D + γYᵀY)R⁻¹, -R⁻ᵀ], [-R⁻¹, 0]] [Sᵀ; γYᵀ]
+
+        with R being the upper triangle of SᵀY and D its diagonal.
+        vector may be of shape (n, ) or (n, k).
+        """
+        order = self.order
+        S = self.S[order]
+        Y = self.Y[order]
+        SY = self.SY[np.ix_(order, order)]
+        YY = self.YY[np.ix_(order, order)]
+        R = np.triu(SY)
+        D = np.diag(np.diag(SY))
+
+        u = S.dot(vector)
+        w = gamma * Y.dot(vector)
+        r1 = solve_triangular(R, u)
+        top = solve_triangular(R, (D + gamma * YY).dot(r1) - w, trans="T")
+        return gamma * vector + S.T.dot(top) - gamma * Y.T.dot(r1)
+
+    def multiply(self, vector, beta=1, P=None, logger=None, gamma_mult=True):
+        """Matrix-vector product H·v with the L-BFGS inverse Hessian.
+
+        Parameters
+        ----------
+        vector : np.array, shape (n, ) or (n, k)
+            Vector(s) to multiply.
+        beta : float
+            Initial inverse Hessian H0 = beta·I, if gamma_mult is False.
+        P : sparse matrix, optional
+            Preconditioner. H0 = P⁻¹ is used when given.
+        logger : logging.Logger, optional
+            Logger to be used.
+        gamma_mult : bool
+            Scale H0 by γ = sᵀy/yᵀy of the latest pair.
+
+        Returns
+        -------
+        Hv : np.array
+            Product with the inverse Hessian.
+        """
+        if P is not None:
+            H0_mult = lambda q: spsolve(P, q)
+            msg = "preconditioner."
+        else:
+            gamma = self.get_gamma(beta, gamma_mult)
+            H0_mult = lambda q: gamma * q
+            name = "gamma" if (gamma_mult and self.count > 0) else "beta"
+            msg = f"{name}={gamma:.4f}"
+
+        if logger is not None:
+            msg = f"BFGS multiply using {self.count} previous cycles with {msg}."
+            if self.count == 0:
+                msg += " Produced simple SD step."
+            logger.debug(msg)
+
+        if self.count == 0:
+            return H0_mult(vector.copy())
+        if P is not None:
+            return self.two_loop(vector, H0_mult)
+        return self.compact(vector, gamma)
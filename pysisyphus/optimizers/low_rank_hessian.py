@@ -0,0 +1,313 @@
+# [1] https://doi.org/10.1063/1.450914
+#     Trust region method
+# [2] https://doi.org/10.1137/S1064827500366124
+#     Knyazev, 2001, LOBPCG
+
+
+import numpy as np
+from scipy.sparse.linalg import (
+    ArpackNoConvergence,
+    eigsh,
+    lobpcg,
+    LinearOperator,
+    minres,
+)
+
+
+class HessianOperator:
+    """Symmetric Hessian that is only accessed through matrix-vector products.
+
+    Derived classes implement dot() and provide size. Eigenpairs are
+    determined iteratively, so for N coordinates no O(N³) diagonalization
+    of the full Hessian is needed.
+    """
+
+    # Keeps numpy from converting operators to arrays in binary operations,
+    # so 'step @ H' calls __rmatmul__.
+    __array_ufunc__ = None
+
+    solver = "lanczos"
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def dot(self, vector):
+        raise NotImplementedError
+
+    def __matmul__(self, vector):
+        return self.dot(vector)
+
+    def __rmatmul__(self, vector):
+        # H is symmetric
+        return self.dot(vector)
+
+    def to_dense(self):
+        return self.dot(np.eye(self.size))
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.to_dense(), dtype=dtype)
+
+    def as_linear_operator(self):
+        return LinearOperator(
+            self.shape, matvec=self.dot, matmat=self.dot, dtype=float
+        )
+
+    def project(self, P, shift=1000.0):
+        """Hessian projected with projector P, see project_hessian()
+        of RedundantCoords."""
+        return ProjectedHessian(self, P=P, shift=shift)
+
+    def deflate(self, vecs, shift=1000.0):
+        """Hessian in the orthogonal complement of the orthonormal
+        columns of vecs."""
+        return ProjectedHessian(self, vecs=vecs, shift=shift)
+
+    def eigh(self, k=None, solver=None, guess=None):
+        """k lowest eigenvalues and eigenvectors.
+
+        Parameters
+        ----------
+        k : int, optional
+            Number of requested eigenpairs. All eigenpairs are determined
+            by a dense diagonalization when omitted.
+        solver : str, optional
+            'lanczos' (ARPACK) or 'lobpcg'. Defaults to self.solver.
+        guess : np.array, shape (N, j), optional
+            Vectors that must stay in the returned subspace, e.g. the
+            lowest eigenvector or the followed TS mode of the previous cycle.
+            They enter the Lanczos start vector and are added by a final
+            Rayleigh-Ritz step when they are not already spanned by the k
+            eigenvectors, so up to k + j eigenpairs are returned.
+
+        Returns
+        -------
+        eigvals : np.array, shape (k, )
+            Eigenvalues in ascending order.
+        eigvecs : np.array, shape (N, k)
+            Eigenvectors in the columns.
+        """
+        if solver is None:
+            solver = self.solver
+        size = self.size
+        if guess is not None:
+            guess = np.asarray(guess, dtype=float).reshape(size, -1)
+        # Iterative solvers need some room beyond the requested eigenpairs
+        # and are not worth it for small matrices.
+        if (k is None) or (size <= max(5 * k, 20)):
+            eigvals, eigvecs = np.linalg.eigh(self.to_dense())
+            eigvals, eigvecs = eigvals[:k], eigvecs[:, :k]
+        elif solver == "lanczos":
+            # Fixed, but unstructured, start vector, so results are reproducible
+            # and no symmetric modes are missed.
+            v0 = np.random.default_rng(20201018).random(size) - 0.5
+            if guess is not None:
+                v0 += guess.sum(axis=1)
+            ncv = min(size, max(4 * k, 20))
+            try:
+                eigvals, eigvecs = eigsh(
+                    self.as_linear_operator(), k=k, which="SA", v0=v0, ncv=ncv,
+                    tol=1e-10
+                )
+            # Happens for (nearly) degenerate eigenvalues, e.g. from a unit
+            # guess Hessian that was only updated a few times.
+            except ArpackNoConvergence:
+                eigvals, eigvecs = np.linalg.eigh(self.to_dense())
+                eigvals, eigvecs = eigvals[:k], eigvecs[:, :k]
+        elif solver == "lobpcg":
+            X = np.random.default_rng(20201018).random((size, k))
+            eigvals, eigvecs = lobpcg(
+                self.as_linear_operator(), X, largest=False, tol=1e-8, maxiter=500
+            )
+        else:
+            raise Exception(f"Invalid solver '{solver}'! Use 'lanczos' or 'lobpcg'.")
+
+        if guess is not None:
+            eigvals, eigvecs = self.rayleigh_ritz(eigvecs, guess)
+        sort_inds = np.argsort(eigvals)
+        return eigvals[sort_inds], eigvecs[:, sort_inds]
+
+    def rayleigh_ritz(self, eigvecs, guess, thresh=1e-6):
+        """Ritz pairs of H in the span of eigvecs and guess.
+
+        Exact eigenvectors are reproduced, while guess vectors outside the
+        span of eigvecs add further Ritz pairs.
+        """
+        rest = guess - eigvecs.dot(eigvecs.T.dot(guess))
+        Q, R = np.linalg.qr(rest)
+        add = np.abs(np.diag(R)) > thresh
+        V = np.concatenate((eigvecs, Q[:, add]), axis=1)
+        HV = self.dot(V)
+        H_sub = V.T.dot(HV)
+        ritz_vals, X = np.linalg.eigh((H_sub + H_sub.T) / 2)
+        return ritz_vals, V.dot(X)
+
+    def rfo(self, gradient, alpha=1.0):
+        """Lowest eigenpair of the (scaled) augmented Hessian.
+
+        The scaled augmented Hessian of the RS-RFO method, see [1],
+
+            (H/alpha  g/alpha)
+            (g+             0)
+
+        is not symmetric but similar to the symmetric matrix
+
+            (H/alpha        g/sqrt(alpha))
+            (g+/sqrt(alpha)              0)
+
+        whose lowest eigenpair is determined by Lanczos.
+
+        Returns
+        -------
+        step : np.array, shape (N, )
+            RFO step.
+        eigval : float
+            Lowest eigenvalue of the augmented Hessian.
+        nu : float
+            Last component of the eigenvector.
+        """
+        size = self.size
+        sqrt_alpha = alpha ** 0.5
+
+        def matvec(vec):
+            vec = np.asarray(vec).flatten()
+            x, nu = vec[:-1], vec[-1]
+            return np.concatenate((
+                self.dot(x) / alpha + gradient * nu / sqrt_alpha,
+                (gradient.dot(x) / sqrt_alpha, ),
+            ))
+
+        # The steepest descent step is a sensible start vector
+        v0 = np.append(-gradient, 1.0)
+        v0 /= np.linalg.norm(v0)
+        if size < 3:
+            aug = np.array([matvec(col) for col in np.eye(size + 1)])
+            eigvals, eigvecs = np.linalg.eigh(aug)
+        else:
+            op = LinearOperator((size + 1, size + 1), matvec=matvec, dtype=float)
+            eigvals, eigvecs = eigsh(op, k=1, which="SA", v0=v0)
+        eigval = eigvals[0]
+        eigvec = eigvecs[:, 0]
+        nu = eigvec[-1]
+        step = eigvec[:-1] / (sqrt_alpha * nu)
+        return step, eigval, nu
+
+    def solve(self, vector, shift=0.0):
+        """Solution x of (H - shift·I) x = vector."""
+        x, _ = minres(self.as_linear_operator(), vector, shift=shift)
+        return x
+
+
+class LowRankHessian(HessianOperator):
+    """Hessian H = H0 + Q·diag(m)·Qᵀ from an initial Hessian and updates.
+
+    Quasi-Newton updates are symmetric outer products of a few vectors
+    (see the *_factors functions in hessian_updates.py) and are collected in
+    the orthonormal columns of Q, so a matrix-vector product costs O(N·k)
+    for a rank-k update and a diagonal H0. The update space can be limited to
+    max_rank directions, keeping the ones with the biggest contributions.
+    """
+
+    def __init__(self, H0, max_rank=None, solver="lanczos"):
+        """
+        Parameters
+        ----------
+        H0 : np.array, shape (N, ) or (N, N)
+            Initial Hessian. Diagonal matrices are stored as vector.
+        max_rank : int, optional
+            Maximum rank of the accumulated updates. Unlimited when omitted.
+        solver : str
+            Default solver for eigh(), 'lanczos' or 'lobpcg'.
+        """
+        H0 = np.array(H0, dtype=float)
+        if (H0.ndim == 2) and (np.count_nonzero(H0 - np.diag(np.diag(H0))) == 0):
+            H0 = np.diag(H0).copy()
+        self.H0 = H0
+        self.size = H0.shape[0]
+        self.max_rank = max_rank
+        self.solver = solver
+
+        self.Q = np.zeros((self.size, 0))
+        self.m = np.zeros(0)
+
+    @property
+    def rank(self):
+        return self.m.size
+
+    def dot(self, vector):
+        # Transposing allows vectors of shape (N, ) and (N, k)
+        if self.H0.ndim == 1:
+            H0v = (self.H0 * vector.T).T
+        else:
+            H0v = self.H0.dot(vector)
+        return H0v + self.Q.dot((self.m * self.Q.T.dot(vector).T).T)
+
+    def update(self, V, C):
+        """Add the update V·C·Vᵀ.
+
+        Parameters
+        ----------
+        V : np.array, shape (N, j)
+            Update vectors in the columns.
+        C : np.array, shape (j, j)
+            Symmetric coefficient matrix.
+        """
+        Q, R = np.linalg.qr(np.concatenate((self.Q, V), axis=1))
+        k = self.rank
+        M = np.zeros((R.shape[1], R.shape[1]))
+        M[:k, :k] = np.diag(self.m)
+        M[k:, k:] = C
+        M = R.dot(M).dot(R.T)
+        m, X = np.linalg.eigh(M)
+        # Drop directions without contribution, e.g. when an update vector
+        # already lies in the span of Q.
+        abs_m = np.abs(m)
+        keep = abs_m > 1e-12 * max(abs_m.max(initial=0.0), 1.0)
+        keep_inds = np.flatnonzero(keep)
+        if (self.max_rank is not None) and (keep_inds.size > self.max_rank):
+            # The most negative direction is always kept, so a negative
+            # eigenvalue, e.g. of a TS Hessian, can't be truncated away.
+            lowest = keep_inds[m[keep_inds].argmin()]
+            if m[lowest] < 0.0:
+                rest = keep_inds[keep_inds != lowest]
+                rest = rest[np.argsort(abs_m[rest])[len(rest) - self.max_rank + 1:]]
+                keep_inds = np.sort(np.append(rest, lowest))
+            else:
+                keep_inds = keep_inds[np.argsort(abs_m[keep_inds])[-self.max_rank:]]
+        self.Q = Q.dot(X[:, keep_inds])
+        self.m = m[keep_inds]
+
+    def to_dense(self):
+        H0 = np.diag(self.H0) if self.H0.ndim == 1 else self.H0
+        return H0 + (self.Q * self.m).dot(self.Q.T)
+
+
+class ProjectedHessian(HessianOperator):
+    """Hessian restricted to a subspace.
+
+    The subspace is the range of the projector P and the orthogonal
+    complement of vecs. All directions outside of it get the eigenvalue
+    shift, so they don't contribute to a step.
+    """
+
+    def __init__(self, hessian, P=None, vecs=None, shift=1000.0):
+        self.hessian = hessian
+        self.P = P
+        self.vecs = vecs
+        self.shift = shift
+        self.size = hessian.size
+        self.solver = hessian.solver
+
+    def project_vector(self, vector):
+        if self.P is not None:
+            vector = self.P.dot(vector)
+        if self.vecs is not None:
+            vector = vector - self.vecs.dot(self.vecs.T.dot(vector))
+        return vector
+
+    def dot(self, vector):
+        projected = self.project_vector(vector)
+        return (
+            self.project_vector(self.hessian.dot(projected))
+            + self.shift * (vector - projected)
+        )
@@ -1,10 +1,9 @@
 import itertools as it
 
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
 from scipy.sparse import csc_matrix
 
-from pysisyphus.intcoords.setup import get_pair_covalent_radii
+from pysisyphus.elem_data import COVALENT_RADII as CR
 from pysisyphus.intcoords.derivatives import dq_b, dq_a, dq_d
 from pysisyphus.intcoords import RedundantCoords
 
@@ -33,11 +32,22 @@ def get_lindh_k(atoms, coords3d, bonds=None, angles=None, torsions=None):
         torsions = list()
 
     atoms = [a.lower() for a in atoms]
-
-    alphas = [get_lindh_alpha(a1, a2) for a1, a2 in it.combinations(atoms, 2)]
-    pair_cov_radii = get_pair_covalent_radii(atoms)
-    cdm = pdist(coords3d)
-    rhos = squareform(np.exp(alphas*(pair_cov_radii**2-cdm**2)))
+    coords3d = np.reshape(coords3d, (-1, 3))
+
+    # Only the rhos of atom pairs that appear in the primitives are needed.
+    rhos = dict()
+
+    def get_rho(i1, i2):
+        key = (min(i1, i2), max(i1, i2))
+        try:
+            return rhos[key]
+        except KeyError:
+            alpha = get_lindh_alpha(atoms[i1], atoms[i2])
+            r_ref = CR[atoms[i1]] + CR[atoms[i2]]
+            r = np.linalg.norm(coords3d[i1] - coords3d[i2])
+            rho = np.exp(alpha*(r_ref**2 - r**2))
+            rhos[key] = rho
+            return rho
 
     k_dict = {
         2: 0.45,  # Stretches/bonds
@@ -49,7 +59,7 @@ def get_lindh_k(atoms, coords3d, bonds=None, angles=None, torsions=None):
         rho_product = 1
         for i in range(len(inds)-1):
             i1, i2 = inds[i:i+2]
-            rho_product *= rhos[i1, i2]
+            rho_product *= get_rho(i1, i2)
         ks.append(k_dict[len(inds)] * rho_product)
     return ks
 
@@ -26,6 +26,8 @@ from pysisyphus.calculators import *
 from pysisyphus.cos import *
 from pysisyphus.cos.GrowingChainOfStates import GrowingChainOfStates
 from pysisyphus.color import bool_color
+from pysisyphus.calculators.ResultCache import reset_result_caches
+from pysisyphus.executors import map_as_completed, run_calculation, set_pal, WorkerPool
 # from pysisyphus.overlaps.Overlapper import Overlapper
 # from pysisyphus.overlaps.couplings import couplings
 # from pysisyphus.overlaps.sorter import sort_by_overlaps
@@ -422,7 +424,8 @@ def run_tsopt_from_cos(cos, tsopt_key, tsopt_kwargs, calc_getter=None,
 
 
 def run_calculations(geoms, calc_getter, path, calc_key, calc_kwargs,
-                     scheduler=None, assert_track=False):
+                     scheduler=None, assert_track=False, executor=None,
+                     worker_pool=None):
     print("Running calculations")
     def par_calc(geom):
         geom.calculator.run_calculation(geom.atoms, geom.coords)
@@ -438,6 +441,31 @@ def run_calculations(geoms, calc_getter, path, calc_key, calc_kwargs,
         client =  Client(scheduler, pure=False, silence_logs=False)
         geom_futures = client.map(par_calc, geoms)
         geoms = client.gather(geom_futures)
+    elif worker_pool is not None:
+        # The long-lived calculators of the workers run the calculations, so
+        # restart files in their scratch directories are picked up.
+        start = time.time()
+        geoms = list(geoms)
+        results = worker_pool.map_as_completed(geoms, "run_calculation")
+        for finished, (i, _) in enumerate(results, 1):
+            diff = time.time() - start
+            print(f"Finished calculation {i+1:02d} ({finished:02d}/{len(geoms):02d}) "
+                  f"after {diff:.1f} s.")
+            sys.stdout.flush()
+    elif executor:
+        executor = executor.copy()
+        kind = executor.pop("type", "thread")
+        set_pal(geoms, executor.pop("pal", None))
+        geoms = list(geoms)
+        start = time.time()
+        results = map_as_completed(run_calculation, geoms, executor=kind, **executor)
+        # Report calculations in the order they finish
+        for finished, (i, geom) in enumerate(results, 1):
+            geoms[i] = geom
+            diff = time.time() - start
+            print(f"Finished calculation {i+1:02d} ({finished:02d}/{len(geoms):02d}) "
+                  f"after {diff:.1f} s.")
+            sys.stdout.flush()
     else:
         for i, geom in enumerate(geoms):
             start = time.time()
@@ -885,6 +913,7 @@ def get_defaults(conf_dict):
         "define_prims": None,
         "assert": None,
         "geom": None,
+        "executor": None,
     }
 
     mol_opt_defaults = {
@@ -970,6 +999,13 @@ def get_defaults(conf_dict):
             "rms_grad_thresh": 1e-3,
         }
 
+    if "executor" in conf_dict:
+        dd["executor"] = {
+            "type": "thread",
+            "max_workers": None,
+            "pal": None,
+        }
+
     if "assert" in conf_dict:
         dd["assert"] = {}
 
@@ -1012,7 +1048,8 @@ def setup_run_dict(run_dict):
     key_set = set(org_dict.keys())
     for key in (key_set & set(("cos", "opt", "interpol", "overlaps",
                               "stocastic", "tsopt", "shake", "irc",
-                              "preopt", "endopt", "assert", "geom"))):
+                              "preopt", "endopt", "assert", "geom",
+                              "executor"))):
         try:
             run_dict[key].update(org_dict[key])
         except TypeError:
@@ -1153,119 +1190,143 @@ def main(run_dict, restart=False, yaml_dir="./", scheduler=None,
         dry_run(calc, geoms[0])
         return
 
-    # Create COS objects and supply a function that yields new Calculators,
-    # as needed for growing COS classes, where images are added over time.
-    if run_dict["cos"]:
-        cos_cls = COS_DICT[cos_key]
-        if (issubclass(cos_cls, GrowingChainOfStates)
-            or isinstance(cos_cls, type(FreezingString))):
-            cos_kwargs["calc_getter"] = get_calc_closure("image", calc_key, calc_kwargs)
-        geom = COS_DICT[cos_key](geoms, **cos_kwargs)
-    else:
-        assert len(geoms) == 1
-        geom = geoms[0]
-
-    if run_dict["stocastic"]:
-        stoc_kwargs["calc_kwargs"] = calc_kwargs
-        stocastic = STOCASTIC_DICT[stoc_key](geom, **stoc_kwargs)
-        stocastic = run_stocastic(stocastic)
-    # This case will handle most pysisyphus runs. A full run encompasses
-    # the following steps:
-    #
-    #    (0. Preoptimization, already handled)
-    #     1. (COS)-Optimization
-    #     2. TS-Optimization by TSHessianOptimizer or Dimer method
-    #     3. IRC integration
-    #     4. Optimization of IRC endpoints
-    #
-    # Everything can be chained. All functions operate on the 'geom' object,
-    # which is propagated along through all functions calls.
-    #
-    # All keys are present in 'run_dict', but most of the corresponding values will
-    # be set to zero.
-    elif any([run_dict[key] is not None for key in ("opt", "tsopt", "irc", "endopt")]):
-
-        #######
-        # OPT #
-        #######
-
-        if run_dict["opt"]:
-            if run_dict["shake"]:
-                shaked_coords = shake_coords(geom.coords, **run_dict["shake"])
-                geom.coords = shaked_coords
-            opt_geom, opt = run_opt(geom, calc_getter, opt_key, opt_kwargs)
-            # Keep a backup of the optimized geometry
-            if isinstance(opt_geom, ChainOfStates.ChainOfStates):
-                # Set some variables that are later collected into RunResult
-                cos = opt_geom
-                cos_opt = opt
-                # copy() is not present for ChainOfState objects, so we just keep
-                # using the COS object with a different name.
-                geom = opt_geom
-            else:
-                geom = opt_geom.copy()
-
-        #########
-        # TSOPT #
-        #########
-
-        if run_dict["tsopt"]:
-            # Use a separate implementation for TS-Optimizations started from
-            # COS-optimizations.
-            if isinstance(geom, ChainOfStates.ChainOfStates):
-                ts_calc_getter = get_calc_closure(tsopt_key, calc_key, calc_kwargs)
-                ts_geom, ts_opt = run_tsopt_from_cos(geom, tsopt_key, tsopt_kwargs,
-                                                     ts_calc_getter
-                )
-            else:
-                ts_geom, ts_opt = run_opt(geom, calc_getter, tsopt_key, tsopt_kwargs,
-                                          title="TS-Optimization",
-                                          copy_final_geom="ts_opt.xyz"
-                )
-            geom = ts_geom.copy()
-            # Try to transfer Hessian to new geometry, to avaoid recalculation.
-            if (ts_geom._hessian is not None):
-                geom._hessian = ts_geom._hessian
-
-        #######
-        # IRC #
-        #######
-
-        ran_irc = False
-        if run_dict["irc"]:
-            # After a Dimer run we continue with the actual calculator
-            # and not the Dimer calculator.
-            if calc_key == "dimer":
-                calc_getter = act_calc_getter
-            irc_geom = geom.copy()
-            irc = run_irc(geom, irc_key, irc_kwargs, calc_getter)
-            ran_irc = True
-
-        ##########
-        # ENDOPT #
-        ##########
-
-        # Only run 'endopt' when a previous IRC calculation was done
-        if ran_irc and run_dict["endopt"]:
-            end_geoms, end_fns = run_endopt(geom, irc, endopt_key, endopt_kwargs, calc_getter)
-
-            if run_dict["cos"] and (len(end_geoms) == 2):
-                do_rmsds(xyz, geoms, end_fns, end_geoms)
+    # Long-lived workers, that calculate all geometries in persistent
+    # scratch directories.
+    worker_pool = None
+    if run_dict["cos"] and (cos_kwargs.get("executor", None) == "workers"):
+        cos_kwargs.pop("executor")
+        workers = cos_kwargs.pop("max_workers", None) or len(geoms)
+        pal = cos_kwargs.pop("image_pal", None)
+        worker_pool = WorkerPool(calc_getter, workers, pal)
+        cos_kwargs["worker_pool"] = worker_pool
+    elif run_dict["executor"] and (run_dict["executor"]["type"] == "workers"):
+        workers = run_dict["executor"]["max_workers"] or len(geoms)
+        worker_pool = WorkerPool(calc_getter, workers, run_dict["executor"]["pal"])
+
+    cos_geom = None
+    try:
+        # Create COS objects and supply a function that yields new Calculators,
+        # as needed for growing COS classes, where images are added over time.
+        if run_dict["cos"]:
+            cos_cls = COS_DICT[cos_key]
+            if (issubclass(cos_cls, GrowingChainOfStates)
+                or isinstance(cos_cls, type(FreezingString))):
+                cos_kwargs["calc_getter"] = get_calc_closure("image", calc_key, calc_kwargs)
+            cos_geom = geom = COS_DICT[cos_key](geoms, **cos_kwargs)
+        else:
+            assert len(geoms) == 1
+            geom = geoms[0]
+
+        if run_dict["stocastic"]:
+            stoc_kwargs["calc_kwargs"] = calc_kwargs
+            stocastic = STOCASTIC_DICT[stoc_key](geom, **stoc_kwargs)
+            stocastic = run_stocastic(stocastic)
+        # This case will handle most pysisyphus runs. A full run encompasses
+        # the following steps:
+        #
+        #    (0. Preoptimization, already handled)
+        #     1. (COS)-Optimization
+        #     2. TS-Optimization by TSHessianOptimizer or Dimer method
+        #     3. IRC integration
+        #     4. Optimization of IRC endpoints
+        #
+        # Everything can be chained. All functions operate on the 'geom' object,
+        # which is propagated along through all functions calls.
+        #
+        # All keys are present in 'run_dict', but most of the corresponding values will
+        # be set to zero.
+        elif any([run_dict[key] is not None for key in ("opt", "tsopt", "irc", "endopt")]):
+
+            #######
+            # OPT #
+            #######
+
+            if run_dict["opt"]:
+                if run_dict["shake"]:
+                    shaked_coords = shake_coords(geom.coords, **run_dict["shake"])
+                    geom.coords = shaked_coords
+                opt_geom, opt = run_opt(geom, calc_getter, opt_key, opt_kwargs)
+                # Keep a backup of the optimized geometry
+                if isinstance(opt_geom, ChainOfStates.ChainOfStates):
+                    # Set some variables that are later collected into RunResult
+                    cos = opt_geom
+                    cos_opt = opt
+                    # copy() is not present for ChainOfState objects, so we just keep
+                    # using the COS object with a different name.
+                    geom = opt_geom
+                else:
+                    geom = opt_geom.copy()
+
+            #########
+            # TSOPT #
+            #########
 
             if run_dict["tsopt"]:
-                do_endopt_ts_barriers(end_geoms, end_fns, ts_geom)
-
-            # Dump TS and endopt geoms into trj file
-            if len(end_geoms) == 2:
-                trj_fn = "end_geoms_and_ts.trj"
-                forward_end_geom, backward_end_geom = end_geoms
-                write_geoms_to_trj((forward_end_geom, irc_geom, backward_end_geom),
-                                   trj_fn, comments=("Forward end", "TS", "Backward end"))
-                print(f"Wrote optimized end-geometries and TS to '{trj_fn}'")
-    # Fallback when no specific job type was specified
-    else:
-        calced_geoms = run_calculations(geoms, calc_getter, yaml_dir,
-                                        calc_key, calc_kwargs, scheduler)
+                # Use a separate implementation for TS-Optimizations started from
+                # COS-optimizations.
+                if isinstance(geom, ChainOfStates.ChainOfStates):
+                    ts_calc_getter = get_calc_closure(tsopt_key, calc_key, calc_kwargs)
+                    ts_geom, ts_opt = run_tsopt_from_cos(geom, tsopt_key, tsopt_kwargs,
+                                                         ts_calc_getter
+                    )
+                else:
+                    ts_geom, ts_opt = run_opt(geom, calc_getter, tsopt_key, tsopt_kwargs,
+                                              title="TS-Optimization",
+                                              copy_final_geom="ts_opt.xyz"
+                    )
+                geom = ts_geom.copy()
+                # Try to transfer Hessian to new geometry, to avaoid recalculation.
+                if (ts_geom._hessian is not None):
+                    geom._hessian = ts_geom._hessian
+
+            #######
+            # IRC #
+            #######
+
+            ran_irc = False
+            if run_dict["irc"]:
+                # After a Dimer run we continue with the actual calculator
+                # and not the Dimer calculator.
+                if calc_key == "dimer":
+                    calc_getter = act_calc_getter
+                irc_geom = geom.copy()
+                irc = run_irc(geom, irc_key, irc_kwargs, calc_getter)
+                ran_irc = True
+
+            ##########
+            # ENDOPT #
+            ##########
+
+            # Only run 'endopt' when a previous IRC calculation was done
+            if ran_irc and run_dict["endopt"]:
+                end_geoms, end_fns = run_endopt(geom, irc, endopt_key, endopt_kwargs, calc_getter)
+
+                if run_dict["cos"] and (len(end_geoms) == 2):
+                    do_rmsds(xyz, geoms, end_fns, end_geoms)
+
+                if run_dict["tsopt"]:
+                    do_endopt_ts_barriers(end_geoms, end_fns, ts_geom)
+
+                # Dump TS and endopt geoms into trj file
+                if len(end_geoms) == 2:
+                    trj_fn = "end_geoms_and_ts.trj"
+                    forward_end_geom, backward_end_geom = end_geoms
+                    write_geoms_to_trj((forward_end_geom, irc_geom, backward_end_geom),
+                                       trj_fn, comments=("Forward end", "TS", "Backward end"))
+                    print(f"Wrote optimized end-geometries and TS to '{trj_fn}'")
+        # Fallback when no specific job type was specified
+        else:
+            calced_geoms = run_calculations(geoms, calc_getter, yaml_dir,
+                                            calc_key, calc_kwargs, scheduler,
+                                            executor=run_dict["executor"],
+                                            worker_pool=worker_pool)
+    finally:
+        # Also release the workers when an exception is raised
+        if worker_pool is not None:
+            worker_pool.shutdown()
+        # Release the executor of the COS, if it was not already released
+        if isinstance(cos_geom, ChainOfStates.ChainOfStates):
+            cos_geom.shutdown_executor()
 
     # We can't use locals() in the dict comprehension, as it runs in its own
     # local scope.
@@ -1480,6 +1541,8 @@ def run_from_dict(run_dict, cwd=None, set_defaults=True, yaml_fn=None, cp=None,
     print(citation)
 
     init_logging(cwd, scheduler)
+    # In-memory result caches are not shared with previous runs
+    reset_result_caches()
     # Load defaults etc.
     if set_defaults:
         run_dict = setup_run_dict(run_dict)
@@ -5,13 +5,13 @@ import time
 
 import numpy as np
 import rmsd
-from scipy.spatial.distance import pdist
 
 from pysisyphus.calculators.XTB import XTB
 from pysisyphus.helpers import check_for_stop_sign, highlight_text
-from pysisyphus.intcoords.setup import get_pair_covalent_radii
+from pysisyphus.intcoords.setup import get_covalent_pairs
 from pysisyphus.optimizers.RFOptimizer import RFOptimizer
 from pysisyphus.stocastic.align import matched_rmsd
+from pysisyphus.stocastic.dedup import GeometryIndex
 from pysisyphus.xyzloader import make_trj_str_from_geoms
 
 
@@ -54,12 +54,22 @@ class Pipeline:
         # Indicates if the next cycle is the last one
         self.break_in = self.break_after
 
-        self.new_geoms = []
-        self.new_energies = []
+        # Energy sorted store of the unique geometries found so far
+        self.index = GeometryIndex(rmsd_thresh=self.rmsd_thresh,
+                                   energy_range=self.energy_range,
+                                   compare_num=self.compare_num)
 
         self.initial_coords3d = self.initial_geom.coords3d
         self.atoms = self.initial_geom.atoms
 
+    @property
+    def new_geoms(self):
+        return self.index.geoms
+
+    @property
+    def new_energies(self):
+        return self.index.energies
+
     def __str__(self):
         return f"{self.__class__.__name__}(seed={self.seed})"
 
@@ -81,10 +91,8 @@ class Pipeline:
 
     def atoms_are_too_close(self, geom, factor=.7):
         """Determine if atoms are too close."""
-        dist_mat = pdist(geom.coords3d)
-        cov_rad_mat = get_pair_covalent_radii(geom.atoms)
-        too_close = dist_mat < factor*cov_rad_mat
-        return any(too_close)
+        too_close, _ = get_covalent_pairs(geom.atoms, geom.coords3d, factor=factor)
+        return len(too_close) > 0
 
     def geom_is_close_in_energy(self, geom):
         energy = geom.energy
@@ -99,33 +107,7 @@ class Pipeline:
 
     def geom_is_new(self, geom):
         """Determine if geometry is not already known."""
-        if len(self.new_geoms) == 0:
-            self.log("Found first geometry!")
-            return True
-
-        i = bisect.bisect_left(self.new_energies, geom.energy)
-        to_intersect = range(i-self.compare_num, i+self.compare_num)
-        valid_inds = np.array(list(self.get_valid_index_set(to_intersect)))
-        new_energies = np.array(self.new_energies)[valid_inds]
-        # Restrict geometries for RMSD comparison to an energy range
-        # around the energy of the geometry to check.
-        in_range = np.abs(new_energies - geom.energy) < self.energy_range
-        valid_inds = valid_inds[in_range]
-        # If this evalutes to True the energy of the current in geometry is
-        # quite different and we add the geometry.
-        if valid_inds.size == 0:
-            # print("Energy of geometry is very different from the remaining "
-                  # "ones. Adding geometry!")
-            reason = "different energy."
-            is_new = True
-        # Otherwise check the RMSD values for the remaining geometries that
-        # are close in energy.
-        else:
-            rmsds = [matched_rmsd(geom, self.new_geoms[i])[0] for i in valid_inds]
-            rmsds = np.array(rmsds)
-            is_new = rmsds.min() > self.rmsd_thresh
-            reason = f"different RMSD (min(RMSD) = {rmsds.min():.3f})"
-
+        is_new, reason = self.index.query(geom)
         if is_new:
             self.log(f"Found new geometry based on {reason}")
         return is_new
@@ -238,9 +220,7 @@ class Pipeline:
                     continue
 
                 energy = geom.energy
-                i = bisect.bisect_left(self.new_energies, energy)
-                self.new_energies.insert(i, energy)
-                self.new_geoms.insert(i, geom)
+                i = self.index.add(geom, energy)
                 kept_geoms.append(geom)
                 if i == 0 and len(self.new_energies) > 1:
                     last_minimum = self.new_energies[1]
@@ -290,8 +270,8 @@ class Pipeline:
             return self.new_geoms
 
         matched_geoms = [first_geom, ]
-        for geom, energy in zip(self.new_geoms[1:], self.new_energies):
-            rmsd, (_, matched_geom) = matched_rmsd(first_geom, geom)
+        for geom, energy in zip(self.index.oriented_geoms[1:], self.new_energies):
+            rmsd, (_, matched_geom) = matched_rmsd(first_geom, geom, oriented=True)
             matched_geom.energy = energy
             matched_geoms.append(matched_geom)
         fn_matched = "final_matched.trj"
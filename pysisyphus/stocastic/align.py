@@ -60,9 +60,48 @@ def apply_transform(coords3d, swap, reflection):
     return coords3d
 
 
-def matched_rmsd(geom1, geom2, thresh=5e-2):
+def standard_oriented(geom):
+    """Copy of the geometry in standard orientation."""
+    geom_copy = geom.copy()
+    geom_copy.standard_orientation()
+    return geom_copy
+
+
+def match_coords3d(ref_coords3d, coords3d, atom_inds):
+    """Array version of match_geom_atoms.
+
+    Parameters
+    ----------
+    ref_coords3d : np.array, shape (N, 3)
+        Reference coordinates.
+    coords3d : np.array, shape (N, 3)
+        Coordinates to reorder.
+    atom_inds : iterable of np.array
+        Indices of the atoms of one type per item, e.g. the values of the
+        second dict returned by Geometry.coords_by_type.
+
+    Returns
+    -------
+    matched_coords3d : np.array, shape (N, 3)
+        Copy of coords3d, reordered by the Hungarian method.
+    """
+    matched_coords3d = coords3d.copy()
+    for inds in atom_inds:
+        cd = cdist(ref_coords3d[inds], coords3d[inds])
+        _, col_inds = linear_sum_assignment(cd)
+        matched_coords3d[inds] = coords3d[inds][col_inds]
+    return matched_coords3d
+
+
+def matched_rmsd(geom1, geom2, thresh=5e-2, oriented=False):
     """RMSD for optimally aligned and matched geometries.
 
+    Parameters
+    ----------
+    oriented : bool
+        Both geometries are already in standard orientation, e.g. when taken
+        from a GeometryIndex, so they are not reoriented again.
+
     Returns
     -------
     matched_rmsd : float
@@ -73,12 +112,16 @@ def matched_rmsd(geom1, geom2, thresh=5e-2):
 
     # Work on copies of the Geometries, as calling standard_orientation
     # moves their coordinates.
-    geom1_copy = geom1.copy()
-    geom1_copy.standard_orientation()
+    if oriented:
+        geom1_copy = geom1.copy()
+        geom2_copy = geom2.copy()
+    else:
+        geom1_copy = standard_oriented(geom1)
+        geom2_copy = standard_oriented(geom2)
     coords3d_1 = geom1_copy.coords3d
-    geom2_copy = geom2.copy()
-    geom2_copy.standard_orientation()
     coords3d_2 = geom2_copy.coords3d.copy()
+    _, atom_inds = geom2_copy.coords_by_type
+    atom_inds = list(atom_inds.values())
 
     # After bringing the Geometries into standard orientation we may
     # still have to consider additional axis swaps and reflections to
@@ -106,13 +149,11 @@ def matched_rmsd(geom1, geom2, thresh=5e-2):
     for i, transform in enumerate(transforms):
         # Apply swap and reflection
         c3d_trans = apply_transform(coords3d_2.copy(), *transform)
-        geom2_to_match = geom2.copy()
-        geom2_to_match.coords3d = c3d_trans
-        # Apply Hungarian method to the transformed Geometry
-        geom2_matched = match_geom_atoms(geom1_copy, geom2_to_match)
-        mrmsd = rmsd.kabsch_rmsd(coords3d_1, geom2_matched.coords3d)
+        # Apply Hungarian method to the transformed coordinates
+        c3d_matched = match_coords3d(coords3d_1, c3d_trans, atom_inds)
+        mrmsd = rmsd.kabsch_rmsd(coords3d_1, c3d_matched)
         matched_rmsds.append(mrmsd)
-        matched_coords.append(geom2_matched.coords)
+        matched_coords.append(c3d_matched.flatten())
 
         # Break when the two geometries are similar. Then we don't have to
         # apply the remaining transformations.
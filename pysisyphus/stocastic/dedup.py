@@ -0,0 +1,179 @@
+import bisect
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from pysisyphus.stocastic.align import matched_rmsd, standard_oriented
+
+
+def radial_fingerprint(geom):
+    """Distances of the atoms to the center of mass, sorted per element.
+
+    Invariant under rotations, reflections and permutations of atoms of
+    the same element.
+    """
+    radii = np.linalg.norm(geom.coords3d - geom.center_of_mass, axis=1)
+    atoms = np.array(geom.atoms)
+    return np.concatenate(
+        [np.sort(radii[atoms == atom]) for atom in sorted(set(geom.atoms))]
+    )
+
+
+def distance_fingerprint(geom):
+    """Sorted interatomic distances.
+
+    Invariant under translations, rotations, reflections and permutations
+    of the atoms.
+    """
+    return np.sort(pdist(geom.coords3d))
+
+
+def rmsd_lower_bounds(fingerprints, known_fingerprints, atom_num):
+    """Lower bounds of the RMSDs between one and several geometries.
+
+    matched_rmsd superimposes geometries with their centers of mass in the
+    origin and only permutes atoms of the same element. When atom i is then
+    displaced by d_i, its distance to the center of mass changes by at most
+    |d_i|, so the difference of the radial fingerprints is bounded by
+    sqrt(N) RMSD. Every interatomic distance changes by at most |d_i| + |d_j|.
+    Summing the squares over all pairs gives
+
+        ||Δr||² <= 2 (N-1) Σ |d_i|² = 2 N (N-1) RMSD².
+
+    Sorting the fingerprints only makes the differences smaller, so both
+    bounds hold for any superposition, reflection and atom matching, i.e.
+    they never exceed the RMSD reported by matched_rmsd.
+
+    Parameters
+    ----------
+    fingerprints : tuple(np.array, np.array)
+        Radial and distance fingerprint of the geometry to compare.
+    known_fingerprints : tuple(np.array, np.array)
+        Radial and distance fingerprints of K known geometries, with
+        shapes (K, N) and (K, P).
+    atom_num : int
+        Number of atoms N.
+
+    Returns
+    -------
+    bounds : np.array, shape (K, )
+        Lower bounds of the RMSDs.
+    """
+    radial, dists = fingerprints
+    known_radial, known_dists = known_fingerprints
+    radial_bounds = np.linalg.norm(known_radial - radial, axis=1) / np.sqrt(atom_num)
+    # Single atoms have no distances and a bound of 0
+    dist_bounds = np.linalg.norm(known_dists - dists, axis=1) / np.sqrt(
+        2 * atom_num * max(atom_num - 1, 1)
+    )
+    return np.maximum(radial_bounds, dist_bounds)
+
+
+def get_fingerprints(geom):
+    return radial_fingerprint(geom), distance_fingerprint(geom)
+
+
+class GeometryIndex:
+    """Energy sorted store of known geometries for duplicate detection.
+
+    Besides every geometry a copy in standard orientation and its
+    fingerprints are kept. Candidates for a new geometry are first restricted
+    to an energy window and then filtered by a rigorous lower bound of their
+    RMSD, so matched_rmsd is only called for geometries that may actually
+    be duplicates.
+    """
+
+    def __init__(self, rmsd_thresh=.1, energy_range=.125, compare_num=25):
+        """
+        Parameters
+        ----------
+        rmsd_thresh : float
+            Geometries with a matched RMSD above this threshold to all
+            known geometries are new.
+        energy_range : float
+            Only known geometries within this energy range are compared.
+        compare_num : int
+            Only compare the compare_num next lower and higher known
+            geometries.
+        """
+        self.rmsd_thresh = rmsd_thresh
+        self.energy_range = energy_range
+        self.compare_num = compare_num
+
+        self.geoms = list()
+        self.energies = list()
+        self.oriented_geoms = list()
+        self.fingerprints = list()
+        # Number of full matched_rmsd calls, for bookkeeping
+        self.rmsd_calls = 0
+
+    def __len__(self):
+        return len(self.geoms)
+
+    def add(self, geom, energy=None):
+        """Insert a geometry and return its index in the energy sorted lists."""
+        if energy is None:
+            energy = geom.energy
+        i = bisect.bisect_left(self.energies, energy)
+        self.energies.insert(i, energy)
+        self.geoms.insert(i, geom)
+        self.oriented_geoms.insert(i, standard_oriented(geom))
+        self.fingerprints.insert(i, get_fingerprints(geom))
+        return i
+
+    def get_candidates(self, energy):
+        """Indices of known geometries in the comparison window."""
+        i = bisect.bisect_left(self.energies, energy)
+        inds = np.arange(
+            max(i - self.compare_num, 0), min(i + self.compare_num, len(self))
+        )
+        energies = np.array(self.energies)[inds]
+        return inds[np.abs(energies - energy) < self.energy_range]
+
+    def query(self, geom, energy=None):
+        """Determine if the geometry is not already known.
+
+        Returns
+        -------
+        is_new : bool
+            Whether the geometry is new.
+        reason : str
+            Why the geometry is new, or which geometry it duplicates.
+        """
+        if len(self) == 0:
+            return True, "being the first geometry."
+
+        if energy is None:
+            energy = geom.energy
+        inds = self.get_candidates(energy)
+        if inds.size == 0:
+            return True, "different energy."
+
+        known_fingerprints = [
+            np.array(fps) for fps in zip(*[self.fingerprints[i] for i in inds])
+        ]
+        bounds = rmsd_lower_bounds(
+            get_fingerprints(geom), known_fingerprints, len(geom.atoms)
+        )
+        below = bounds <= self.rmsd_thresh
+        if not below.any():
+            return True, (f"different fingerprints (min(RMSD) >= "
+                          f"{bounds.min():.3f})")
+
+        # Most similar candidates first, so duplicates are usually found
+        # with the first matched_rmsd call.
+        order = np.argsort(bounds[below])
+        oriented_geom = standard_oriented(geom)
+        rmsds = list()
+        for i in inds[below][order]:
+            rmsd, _ = matched_rmsd(oriented_geom, self.oriented_geoms[i],
+                                   oriented=True)
+            self.rmsd_calls += 1
+            if rmsd <= self.rmsd_thresh:
+                return False, f"similar to geometry {i} (RMSD = {rmsd:.3f})"
+            rmsds.append(rmsd)
+        return True, f"different RMSD (min(RMSD) = {min(rmsds):.3f})"
+
+    def is_new(self, geom, energy=None):
+        is_new, _ = self.query(geom, energy)
+        return is_new
@@ -1,8 +1,10 @@
 import argparse
+from collections.abc import Sequence
 import itertools as it
 from pathlib import Path
 import re
 import sys
+import types
 
 import matplotlib.pyplot as plt
 from natsort import natsorted
@@ -10,15 +12,22 @@ import numpy as np
 import rmsd as rmsd
 import yaml
 
-from pysisyphus.constants import BOHR2ANG, AU2KJPERMOL
+from pysisyphus.constants import ANG2BOHR, BOHR2ANG, AU2KJPERMOL
 from pysisyphus.cos import *
 from pysisyphus.Geometry import Geometry
 from pysisyphus.intcoords.setup import get_fragments
-from pysisyphus.helpers import geom_loader, procrustes, get_coords_diffs, shake_coords
+from pysisyphus.helpers import (
+    align_consecutive,
+    align_geoms,
+    geom_loader,
+    get_coords_diffs,
+    shake_coords,
+)
 from pysisyphus.interpolate import *
+from pysisyphus.io.bintrj import BinTrj, bintrj_to_trj, trj_to_bintrj
 from pysisyphus.intcoords.helpers import form_coordinate_union
 from pysisyphus.stocastic.align import match_geom_atoms
-from pysisyphus.xyzloader import split_xyz_str
+from pysisyphus.xyzloader import split_xyz_str, TrjFile, TrjWriter
 
 
 INTERPOLATE = {
@@ -103,6 +112,9 @@ def parse_args(args):
     action_group.add_argument("--fragsort", action="store_true",
         help="Resort atoms by fragments."
     )
+    action_group.add_argument("--convert", action="store_true",
+        help="Convert .trj files into binary .btrj files and vice versa."
+    )
 
     shake_group = parser.add_argument_group()
     shake_group.add_argument("--scale", type=float, default=0.1,
@@ -132,6 +144,9 @@ def parse_args(args):
     parser.add_argument("--noxyz", action="store_false",
         help="Disable dumping of single .xyz files."
     )
+    parser.add_argument("--float32", action="store_true",
+        help="Used with --convert. Store binary coordinates in single precision."
+    )
     parser.add_argument("--atoms", nargs="+", type=int, default=list(),
         help="Used with --internals. Only print primitives including the given atoms."
     )
@@ -168,7 +183,7 @@ def read_geoms(xyz_fns, in_bohr=False, coord_type="cart",
         # Simplify this to use geom_loader...
         elif fn.endswith(".xyz"):
             geom = [geom_loader(fn, **geom_kwargs), ]
-        elif fn.endswith(".trj"):
+        elif fn.endswith(".trj") or fn.endswith(".btrj"):
             geom = geom_loader(fn, **geom_kwargs)
         elif fn.endswith(".pdb"):
             geom = [geom_loader(fn, **geom_kwargs), ]
@@ -199,6 +214,36 @@ def read_geoms(xyz_fns, in_bohr=False, coord_type="cart",
     return geoms
 
 
+class TrjGeoms(Sequence):
+    """Geometries of a .trj or .btrj file that are only created on access.
+
+    Used for huge trajectories, where only a few frames are needed or
+    where the frames can be processed one after another.
+    """
+
+    def __init__(self, trj_fn):
+        self.binary = str(trj_fn).endswith(".btrj")
+        self.trj = BinTrj(trj_fn) if self.binary else TrjFile(trj_fn)
+
+    def frame_to_geom(self, frame):
+        if self.binary:
+            return Geometry(self.trj.atoms, frame.flatten())
+        atoms, coords, comment = frame
+        return Geometry(atoms, coords.flatten()*ANG2BOHR, comment=comment)
+
+    def __len__(self):
+        return len(self.trj)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.frame_to_geom(frame) for frame in self.trj[index]]
+        return self.frame_to_geom(self.trj[index])
+
+    def __iter__(self):
+        for frame in self.trj:
+            yield self.frame_to_geom(frame)
+
+
 def get_geoms(xyz_fns, interpolate=None, between=0, coord_type="cart",
               comments=False, in_bohr=False, define_prims=None, union=None,
               interpolate_align=True, same_prims=True, quiet=False):
@@ -284,27 +329,69 @@ def get_geoms(xyz_fns, interpolate=None, between=0, coord_type="cart",
 
 def dump_geoms(geoms, fn_base, trj_infix="", dump_trj=True, dump_xyz=True,
                ang=False):
-    xyz_per_geom = [geom.as_xyz() for geom in geoms]
-    if dump_trj:
-        trj_str = "\n".join(xyz_per_geom)
-        trj_fn = f"{fn_base}{trj_infix}.trj"
-        with open(trj_fn, "w") as handle:
-            handle.write(trj_str)
-        print(f"Wrote all geometries to {trj_fn}.")
-    if dump_xyz:
-        for i, xyz in enumerate(xyz_per_geom):
+    """Geometries are written one at a time, so geoms may also be a generator."""
+    trj_fn = f"{fn_base}{trj_infix}.trj"
+    writer = None
+    for i, geom in enumerate(geoms):
+        if dump_trj:
+            if writer is None:
+                writer = TrjWriter(trj_fn, geom.atoms)
+            writer.write(geom.coords3d*BOHR2ANG, comment=geom.comment)
+        if dump_xyz:
             geom_fn = f"{fn_base}.geom_{i:03d}.xyz"
             with open(geom_fn, "w") as handle:
-                handle.write(xyz)
+                handle.write(geom.as_xyz())
             print(f"Wrote geom {i:03d} to {geom_fn}.")
+    if writer is not None:
+        writer.close()
+        print(f"Wrote all geometries to {trj_fn}.")
     print()
 
 
 def align(geoms):
     """Align all geometries onto the first using partical procrustes."""
-    cos = ChainOfStates.ChainOfStates(geoms)
-    procrustes(cos)
-    return [geom for geom in cos.images]
+    align_geoms(geoms)
+    return geoms
+
+
+def align_iter(geoms, chunk_size=1024):
+    """Like align(), but geometries are aligned in chunks.
+
+    Every geometry is aligned onto its aligned predecessor, so huge
+    trajectories can be streamed.
+    """
+    geoms = iter(geoms)
+    last_aligned = None
+    while True:
+        chunk = list(it.islice(geoms, chunk_size))
+        if not chunk:
+            break
+        coords = [geom.coords3d for geom in chunk]
+        # Prepend the last aligned geometry of the previous chunk as reference
+        if last_aligned is not None:
+            coords = [last_aligned] + coords
+        aligned, _ = align_consecutive(coords)
+        aligned = aligned[-len(chunk):]
+        for geom, coords3d in zip(chunk, aligned):
+            geom.coords3d = coords3d
+            yield geom
+        last_aligned = aligned[-1]
+
+
+def convert(fns, float32=False):
+    """Convert .trj into .btrj files and vice versa, frame by frame."""
+    dtype = np.float32 if float32 else np.float64
+    for fn in fns:
+        path = Path(fn)
+        if path.suffix == ".trj":
+            out_fn = path.with_suffix(".btrj")
+            frame_num = trj_to_bintrj(path, out_fn, dtype=dtype)
+        elif path.suffix == ".btrj":
+            out_fn = path.with_suffix(".trj")
+            frame_num = bintrj_to_trj(path, out_fn)
+        else:
+            raise Exception(f"Can't convert '{fn}'! Expected a .trj or .btrj file.")
+        print(f"Converted {frame_num} frames from '{path}' to '{out_fn}'.")
 
 
 def spline_redistribute(geoms):
@@ -546,9 +633,25 @@ def run():
     else:
         interpolate = None
 
+    if args.convert:
+        convert(args.fns, args.float32)
+        return
+
+    # Frames of a single .trj file are only read when needed for these
+    # actions, so they also work for huge trajectories.
+    stream = (
+        (len(args.fns) == 1)
+        and args.fns[0].endswith((".trj", ".btrj"))
+        and not args.bohr
+        and (args.align or args.every or (args.get is not None))
+    )
     # Read supplied files and create Geometry objects
-    geoms = get_geoms(args.fns, interpolate, args.between, in_bohr=args.bohr,
-                      interpolate_align=args.noipalign)
+    if stream:
+        geoms = TrjGeoms(args.fns[0])
+        print(f"Found {len(geoms)} geometries.")
+    else:
+        geoms = get_geoms(args.fns, interpolate, args.between, in_bohr=args.bohr,
+                          interpolate_align=args.noipalign)
 
     to_dump = geoms
     dump_trj = True
@@ -557,7 +660,7 @@ def run():
     if args.between:
         fn_base = "interpolated"
     elif args.align:
-        to_dump = align(geoms)
+        to_dump = align_iter(geoms) if stream else align(geoms)
         fn_base = "aligned"
     elif args.split:
         fn_base = "split"
@@ -623,7 +726,11 @@ def run():
         fn_base = "origin"
 
     # Write transformed geometries
-    dump_trj = dump_trj and (len(to_dump) > 1)
+    if isinstance(to_dump, types.GeneratorType):
+        dump_num = len(geoms)
+    else:
+        dump_num = len(to_dump)
+    dump_trj = dump_trj and (dump_num > 1)
 
     dump_geoms(to_dump, fn_base, trj_infix=trj_infix, dump_trj=dump_trj,
                dump_xyz=dump_xyz)
@@ -14,10 +14,9 @@ from pysisyphus.tsoptimizers.TSHessianOptimizer import TSHessianOptimizer
 
 
 class RSPRFOptimizer(TSHessianOptimizer):
-    def optimize(self):
-        energy, gradient, H, eigvals, eigvecs, resetted = self.housekeeping()
-        self.update_ts_mode(eigvals, eigvecs)
+    supports_low_rank = True
 
+    def get_prfo_step(self, gradient, eigvals, eigvecs):
         # Transform gradient to eigensystem of hessian
         gradient_trans = eigvecs.T.dot(gradient)
 
@@ -134,7 +133,85 @@ class RSPRFOptimizer(TSHessianOptimizer):
 
         # Right now the step is still given in the Hessians eigensystem. We
         # transform it back now.
-        step = eigvecs.dot(step)
+        return eigvecs.dot(step)
+
+    def get_low_rank_prfo_step(self, H, gradient, eigvals):
+        """RS-PRFO step from matrix-vector products with H only.
+
+        Only the TS mode and its eigenvalue are needed explicitly. The
+        minimization is carried out in its orthogonal complement, as in
+        get_low_rank_rs_step().
+        """
+        ts_mode = self.ts_mode
+        ts_eigval = eigvals[self.root]
+        ts_grad = ts_mode.dot(gradient)
+        H_min = H.deflate(ts_mode[:, None])
+        grad_min = gradient - ts_grad * ts_mode
+
+        alpha = self.alpha0
+        for mu in range(self.max_micro_cycles):
+            self.log(f"RS-PRFO micro cycle {mu:02d}, alpha={alpha:.6f}")
+
+            # Maximize energy along the chosen TS mode
+            H_aug_max = self.get_augmented_hessian(
+                np.array((ts_eigval, )), np.array((ts_grad, )), alpha
+            )
+            step_max, eigval_max, nu_max, self.prev_eigvec_max = self.solve_rfo(
+                H_aug_max, "max", prev_eigvec=self.prev_eigvec_max
+            )
+            step_max = step_max[0]
+
+            # Minimize energy in the orthogonal complement of the TS mode
+            step_min, eigval_min, nu_min = H_min.rfo(grad_min, alpha)
+
+            min_norm = np.linalg.norm(step_min)
+            max_norm = abs(step_max)
+            self.log(f"norm(step_max)={max_norm:.6f}")
+            self.log(f"norm(step_min)={min_norm:.6f}")
+
+            step = step_max * ts_mode + step_min
+            step_norm = np.linalg.norm(step)
+            self.log(f"norm(step)={step_norm:.6f}")
+
+            if step_norm <= self.trust_radius:
+                self.log(
+                    f"Micro-cycles converged in cycle {mu:02d} with "
+                    f"alpha={alpha:.6f}!"
+                )
+                break
+
+            dstep2_dalpha_max = (
+                2
+                * eigval_max
+                / (1 + step_max ** 2 * alpha)
+                * ts_grad ** 2
+                / (ts_eigval - eigval_max * alpha) ** 3
+            )
+            # Sum over the min subspace from two linear solves, see
+            # get_low_rank_rs_step().
+            shift = eigval_min * alpha
+            r = H_min.solve(grad_min, shift)
+            dstep2_dalpha_min = (
+                2
+                * eigval_min
+                / (1 + step_min.dot(step_min) * alpha)
+                * r.dot(H_min.solve(r, shift))
+            )
+            dstep2_dalpha = dstep2_dalpha_max + dstep2_dalpha_min
+            alpha_step = (
+                2 * (self.trust_radius * step_norm - step_norm ** 2) / dstep2_dalpha
+            )
+            alpha += alpha_step
+        return step
+
+    def optimize(self):
+        energy, gradient, H, eigvals, eigvecs, resetted = self.housekeeping()
+        self.update_ts_mode(eigvals, eigvecs)
+
+        if self.hessian_low_rank:
+            step = self.get_low_rank_prfo_step(H, gradient, eigvals)
+        else:
+            step = self.get_prfo_step(gradient, eigvals, eigvecs)
         step_norm = np.linalg.norm(step)
 
         # With max_micro_cycles = 1 the RS part is disabled and the step
@@ -1,7 +1,7 @@
 import numpy as np
 
 from pysisyphus.intcoords.augment_bonds import augment_bonds
-from pysisyphus.optimizers.Optimizer import get_data_model, get_h5_group
+from pysisyphus.optimizers.Optimizer import get_data_model
 from pysisyphus.optimizers.HessianOptimizer import HessianOptimizer
 from pysisyphus.optimizers.guess_hessians import ts_hessian
 
@@ -55,8 +55,8 @@ class TSHessianOptimizer(HessianOptimizer):
             if self.dump:
                 self.data_model = get_data_model(self.geometry, self.is_cos,
                                                  self.max_cycles)
-                self.h5_group = get_h5_group(self.h5_fn, self.h5_group_name,
-                                             self.data_model)
+                self.h5_writer.close()
+                self.h5_writer.data_model = self.data_model
 
         # Calculate/set initial hessian
         super().prepare_opt(*args, **kwargs)
@@ -75,12 +75,14 @@ class TSHessianOptimizer(HessianOptimizer):
             assert len(missing_prim_inds) == 0, \
                  "Some of the requested reaction coordinates are not defined: " \
                 f"{missing_prim_inds}"
-            self.H = ts_hessian(self.H, coord_inds=prim_inds)
+            self.H = self.wrap_hessian(
+                ts_hessian(np.array(self.H), coord_inds=prim_inds)
+            )
 
         # Determiniation of initial mode either by using a provided
         # reference hessian, or by using a supplied root.
 
-        eigvals, eigvecs = np.linalg.eigh(self.H)
+        eigvals, eigvecs = self.eigh(self.H)
         neg_inds = eigvals < -self.small_eigval_thresh
 
         self.log_negative_eigenvalues(eigvals, "Initial ")
@@ -154,6 +156,11 @@ class TSHessianOptimizer(HessianOptimizer):
                  f"{eigvals[self.root]:.6f} as TS mode.")
         self.log("")
 
+    def get_eigh_guess(self):
+        # Keep the followed TS mode, even if it is not among the
+        # hessian_eig_num lowest eigenvectors.
+        return super().get_eigh_guess() + [getattr(self, "ts_mode", None)]
+
     def update_ts_mode(self, eigvals, eigvecs):
         neg_eigval_inds = eigvals < -self.small_eigval_thresh
         neg_num = neg_eigval_inds.sum()
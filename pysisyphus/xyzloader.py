@@ -1,28 +1,37 @@
-import re
+import itertools as it
 
 import numpy as np
 
 from pysisyphus.constants import BOHR2ANG
 
 
-def make_xyz_str(atoms, coords, comment=""):
+def get_xyz_body_fmt(atoms):
+    """%-format string for the coordinate block of the given atoms.
+
+    Formatting all coordinates of a frame at once is considerably faster
+    than formatting them line by line.
+    """
+    coord_fmt = "% 03.8f"
+    return "\n".join(
+        [f"{atom:>3s} " + " ".join([coord_fmt, ]*3) for atom in atoms]
+    )
+
+
+def make_xyz_str(atoms, coords, comment="", body_fmt=None):
     assert(len(atoms) == len(coords))
 
-    coord_fmt = "{: 03.8f}"
-    line_fmt = "{:>3s} " + " ".join([coord_fmt, ]*3)
+    if body_fmt is None:
+        body_fmt = get_xyz_body_fmt(atoms)
+    body = body_fmt % tuple(np.ravel(coords))
 
-    body = [line_fmt.format(a, *xyz)
-            for a, xyz
-            in zip(atoms, coords)]
-    body = "\n".join(body)
- 
     return f"{len(atoms)}\n{comment}\n{body}"
 
 
 def make_trj_str(atoms, coords_list, comments=None):
     if comments is None:
         comments = ["" for _ in coords_list]
-    xyz_strings = [make_xyz_str(atoms, coords, comment)
+    body_fmt = get_xyz_body_fmt(atoms)
+    xyz_strings = [make_xyz_str(atoms, coords, comment, body_fmt)
                    for coords, comment in zip(coords_list, comments)]
     return "\n".join(xyz_strings)
 
@@ -53,6 +62,70 @@ def write_geoms_to_trj(geoms, fn, comments=None):
         handle.write(trj_str)
 
 
+class TrjWriter:
+    """Buffered writer for .trj files.
+
+    Frames are formatted as with make_xyz_str() and written in chunks
+    of buffer_size frames, so long trajectories never have to be kept in
+    memory as one string.
+
+    Example:
+
+        with TrjWriter("md.trj", atoms) as writer:
+            for coords3d in frames:
+                writer.write(coords3d, comment="...")
+    """
+
+    def __init__(self, trj_fn, atoms, mode="w", buffer_size=256):
+        """
+        Parameters
+        ----------
+        trj_fn : str or Path
+            Filename of the trajectory.
+        atoms : iterable
+            Atom descriptors.
+        mode : str
+            'w' or 'a'.
+        buffer_size : int
+            Number of frames that are formatted before they are written.
+        """
+        self.trj_fn = trj_fn
+        self.atoms = atoms
+        self.buffer_size = int(buffer_size)
+
+        self.body_fmt = get_xyz_body_fmt(atoms)
+        self.buffer = list()
+        self.frames_written = 0
+        self.handle = open(self.trj_fn, mode)
+
+    def write(self, coords, comment=""):
+        """Add one frame, coordinates are expected in Angstrom."""
+        self.buffer.append(
+            make_xyz_str(self.atoms, np.reshape(coords, (-1, 3)), comment,
+                         self.body_fmt) + "\n"
+        )
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.handle.write("".join(self.buffer))
+        self.handle.flush()
+        self.frames_written += len(self.buffer)
+        self.buffer = list()
+
+    def close(self):
+        if self.handle.closed:
+            return
+        self.flush()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 def split_xyz_str(xyz_str):
     """Example:
 
@@ -65,34 +138,58 @@ def split_xyz_str(xyz_str):
          X 2.0 4.0 0.0
 
     """
-    float_ = "([\+\d\-\.]+)"
-    header_re = re.compile("(\d+)")
-    coord_re = re.compile(f"[a-zA-Z]+\s+{float_}\s+{float_}\s+{float_}")
-
     lines = [l.strip() for l in xyz_str.strip().split("\n")]
 
     lines_remaining = len(lines)
     cur_line = 0
-    valid_xyz_strs = list()
+    atoms_coords = list()
     while lines_remaining:
-        header_mobj = header_re.match(lines[cur_line])
-        expect_lines = int(header_mobj[1])
+        header = lines[cur_line].split()
+        assert header and header[0].isdigit()
+        expect_lines = int(header[0])
         slice_ = slice(cur_line+2, cur_line+2+expect_lines)  # lgtm [py/hash-unhashable-value]
         check_lines = lines[slice_]
         assert len(check_lines) == expect_lines
-        assert all([coord_re.match(line.strip()) for line in check_lines])
-
-        valid_xyz_strs.append(
-            str(expect_lines) + "\n\n" + "\n".join(check_lines)
-        )
+        try:
+            atoms, coords = parse_coord_lines(check_lines)
+        except ValueError:
+            raise AssertionError("Invalid coordinate lines!")
+        assert all([atom.isalpha() for atom in atoms])
+        atoms_coords.append((atoms, coords))
 
         lines_read = expect_lines + 2
         lines_remaining -= lines_read
         cur_line += lines_read
-    atoms_coords = [parse_xyz_str(_, with_comment=False) for _ in valid_xyz_strs]
     return atoms_coords
 
 
+def parse_coord_lines(lines):
+    """Parse the coordinate lines of a frame.
+
+    Lines with exactly four columns are parsed in bulk, otherwise only the
+    first four items on every line are considered.
+
+    Parameters
+    ----------
+    lines : list of str
+        Lines of the coordinate block, one per atom.
+
+    Returns
+    -------
+    atoms : tuple
+        Element symbols.
+    coords: np.array
+        An array of shape (N, 3) holding the xyz coordinates.
+    """
+    tokens = "\n".join(lines).split()
+    if len(tokens) != 4 * len(lines):
+        tokens = [token for line in lines for token in line.split()[:4]]
+    atoms = tuple(tokens[::4])
+    del tokens[::4]
+    coords = np.array(tokens, dtype=float).reshape(-1, 3)
+    return atoms, coords
+
+
 def parse_xyz_str(xyz_str, with_comment):
     """Parse a xyz string.
 
@@ -117,12 +214,7 @@ def parse_xyz_str(xyz_str, with_comment):
     xyz_lines = xyz_str.strip().split("\n")
     comment_line = xyz_lines[1]
 
-    # Only consider the first four items on a line
-    atoms_coords = [line.strip().split()[:4]
-                    for line in xyz_str.strip().split("\n")[2:]
-    ]
-    atoms, coords = zip(*[(a, c) for a, *c in atoms_coords])
-    coords = np.array(coords, dtype=np.float)
+    atoms, coords = parse_coord_lines(xyz_lines[2:])
     if with_comment:
         return atoms, coords, comment_line
     else:
@@ -136,11 +228,144 @@ def parse_xyz_file(xyz_fn, with_comment=False):
     return parse_xyz_str(xyz_str, with_comment)
 
 
-def parse_trj_file(trj_fn, with_comments=False):
+def read_frame(handle, with_comment=False):
+    """Read the next frame from a handle of a .xyz/.trj file.
+
+    Blank lines in front of the frame are skipped. Lines may be str or bytes.
+
+    Returns
+    -------
+    frame : tuple or None
+        (atoms, coords[, comment]) as from parse_xyz_str(), or None at the
+        end of the file.
+    """
+    for header in handle:
+        if header.strip():
+            break
+    else:
+        return None
+    atom_num = int(header)
+    lines = list(it.islice(handle, atom_num + 1))
+    if isinstance(header, bytes):
+        lines = [line.decode() for line in lines]
+    assert len(lines) == atom_num + 1, "Truncated frame!"
+    comment = lines[0].rstrip("\r\n")
+    atoms, coords = parse_coord_lines(lines[1:])
+    if with_comment:
+        return atoms, coords, comment
+    return atoms, coords
+
+
+def parse_frame_lines(lines, atom_num, with_comments=False):
+    """Parse the lines of several consecutive frames with atom_num atoms.
+
+    All coordinates are converted at once, which is much faster than
+    parsing the frames one by one.
+    """
+    frame_lines = atom_num + 2
+    frame_num = len(lines) // frame_lines
+    comments = [comment.rstrip("\r\n") for comment in lines[1::frame_lines]]
+    # Drop comment lines, then the headers
+    del lines[1::frame_lines]
+    del lines[::frame_lines-1]
+    atoms, coords = parse_coord_lines(lines)
+    coords = coords.reshape(frame_num, atom_num, 3)
+    frames = list()
+    for i in range(frame_num):
+        frame = (atoms[i*atom_num:(i+1)*atom_num], coords[i])
+        if with_comments:
+            frame = frame + (comments[i], )
+        frames.append(frame)
+    return frames
+
+
+def iter_trj_file(trj_fn, with_comments=False, chunk_size=1024):
+    """Generator yielding the frames of a .trj file one at a time.
+
+    The frames are read and parsed in chunks of chunk_size frames, as long
+    as they are all of the same size and are not separated by blank lines.
+    Otherwise the remaining frames are parsed one by one.
+    """
     with open(trj_fn) as handle:
-        trj_str = handle.read()
+        lines = handle
+        chunked = True
+        while True:
+            frame = read_frame(lines, with_comments)
+            if frame is None:
+                break
+            yield frame
+
+            if not chunked:
+                continue
+            atom_num = len(frame[0])
+            frame_lines = atom_num + 2
+            chunk = list(it.islice(lines, chunk_size * frame_lines))
+            header = str(atom_num)
+            if (
+                (len(chunk) % frame_lines == 0)
+                and all([line.strip() == header for line in chunk[::frame_lines]])
+            ):
+                yield from parse_frame_lines(chunk, atom_num, with_comments)
+            else:
+                lines = it.chain(chunk, handle)
+                chunked = False
+
+
+def index_trj_file(trj_fn):
+    """Byte offsets of all frames in a .trj file.
+
+    Only the headers are parsed, the coordinate lines are skipped.
+    """
+    offsets = list()
+    offset = 0
+    with open(trj_fn, "rb") as handle:
+        for header in handle:
+            if header.strip():
+                offsets.append(offset)
+                lines = it.islice(handle, int(header) + 1)
+                offset += sum(map(len, lines))
+            offset += len(header)
+    return np.array(offsets, dtype=np.int64)
+
+
+class TrjFile:
+    """Random access to the frames of a (huge) .trj file.
+
+    The frames are indexed by their byte offsets on creation and only
+    parsed on access.
+
+    Example:
+
+        trj = TrjFile("md.trj")
+        atoms, coords, comment = trj[-1]
+        for atoms, coords, comment in trj[::100]:
+            ...
+    """
+
+    def __init__(self, trj_fn):
+        self.trj_fn = trj_fn
+        self.offsets = index_trj_file(trj_fn)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read(self, index, with_comment=True):
+        offset = self.offsets[index]
+        with open(self.trj_fn, "rb") as handle:
+            handle.seek(offset)
+            return read_frame(handle, with_comment)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.read(i) for i in range(len(self))[index]]
+        return self.read(index)
+
+    def __iter__(self):
+        return iter_trj_file(self.trj_fn, with_comments=True)
+
 
-    return parse_trj_str(trj_str, with_comments)
+def parse_trj_file(trj_fn, with_comments=False, first=None):
+    return list(it.islice(iter_trj_file(trj_fn, with_comments), first))
 
 
 def parse_trj_str(trj_str, with_comments=False):
@@ -1,7 +1,12 @@
+import time
+
+import autograd
 import numpy as np
 import pytest
 
-from pysisyphus.calculators.AFIR import AFIR
+from pysisyphus.calculators.AFIR import AFIR, afir_closure, analytic_afir_closure
+from pysisyphus.constants import AU2KJPERMOL
+from pysisyphus.elem_data import COVALENT_RADII
 from pysisyphus.helpers import geom_loader
 from pysisyphus.optimizers.RFOptimizer import RFOptimizer
 from pysisyphus.calculators.PySCF import PySCF
@@ -35,3 +40,136 @@ def test_afir():
     assert np.linalg.norm(c3d[0]-c3d[4]) == pytest.approx(4.805665, abs=1e-4)
     # Formed O-C bond
     assert np.linalg.norm(c3d[0]-c3d[5]) == pytest.approx(2.674330, abs=1e-4)
+
+
+def get_afir_system(atom_num=40, frag_num=2, seed=20201017):
+    rng = np.random.default_rng(seed)
+    atoms = rng.choice(("H", "C", "N", "O"), size=atom_num)
+    cov_radii = np.array([COVALENT_RADII[atom.lower()] for atom in atoms])
+    frag_inds = np.array_split(np.arange(atom_num), frag_num)
+    # Cubic fragments with roughly one atom per 60 Bohr³, as in organic
+    # molecules, displaced along x.
+    length = (atom_num / frag_num * 60)**(1/3)
+    coords3d = rng.uniform(0, length, size=(atom_num, 3))
+    for i, inds in enumerate(frag_inds):
+        coords3d[inds, 0] += (length + 4) * i
+    fragment_indices = [inds.tolist() for inds in frag_inds]
+    return fragment_indices, cov_radii, coords3d
+
+
+@pytest.mark.parametrize(
+    "frag_num, rho", [
+        (2, 1),
+        (2, -1),
+        (3, 1),
+        (4, 1),
+])
+def test_analytic_afir(frag_num, rho):
+    fragment_indices, cov_radii, coords3d = get_afir_system(frag_num=frag_num)
+    gamma = 100 / AU2KJPERMOL
+    afir_func = afir_closure(fragment_indices, cov_radii, gamma, rho=rho)
+    ref_energy = afir_func(coords3d)
+    ref_gradient = autograd.grad(afir_func)(coords3d)
+
+    analytic_func = analytic_afir_closure(fragment_indices, cov_radii, gamma,
+                                          rho=rho)
+    energy, gradient = analytic_func(coords3d)
+    assert energy == pytest.approx(ref_energy)
+    np.testing.assert_allclose(gradient, ref_gradient, atol=1e-12)
+
+    # Cutoff containing all pairs
+    cutoff_func = analytic_afir_closure(fragment_indices, cov_radii, gamma,
+                                        rho=rho, cutoff=1e3)
+    cutoff_energy, cutoff_gradient = cutoff_func(coords3d)
+    assert cutoff_energy == pytest.approx(ref_energy)
+    np.testing.assert_allclose(cutoff_gradient, ref_gradient, atol=1e-12)
+
+
+def test_analytic_afir_cutoff():
+    fragment_indices, cov_radii, coords3d = get_afir_system(atom_num=100)
+    gamma = 100 / AU2KJPERMOL
+    afir_func = analytic_afir_closure(fragment_indices, cov_radii, gamma,
+                                      cutoff=10.)
+    energy, gradient = afir_func(coords3d)
+    full_energy, _ = analytic_afir_closure(fragment_indices, cov_radii,
+                                           gamma)(coords3d)
+    assert energy != pytest.approx(full_energy)
+
+    # Finite differences
+    step = 1e-5
+    num_gradient = np.zeros(coords3d.size)
+    for i in range(coords3d.size):
+        step_ = np.zeros(coords3d.size)
+        step_[i] = step
+        plus, _ = afir_func(coords3d + step_.reshape(-1, 3))
+        minus, _ = afir_func(coords3d - step_.reshape(-1, 3))
+        num_gradient[i] = (plus - minus) / (2 * step)
+    np.testing.assert_allclose(gradient.flatten(), num_gradient, atol=1e-8)
+
+
+def test_analytic_afir_cutoff_continuity():
+    cutoff = 10.
+    switch_width = 2.
+    fragment_indices = [[0, 1], [2]]
+    cov_radii = np.array([COVALENT_RADII[atom] for atom in ("c", "o", "h")])
+    gamma = 100 / AU2KJPERMOL
+    afir_func = analytic_afir_closure(fragment_indices, cov_radii, gamma,
+                                      cutoff=cutoff, switch_width=switch_width)
+
+    def coords3d_at(x):
+        return np.array(((0., 0., 0.), (-3., 0., 0.), (x, 0., 0.)))
+
+    # Atom 2 moves along x. The pairs with atom 0 and atom 1 enter the
+    # switching region and leave the cutoff; after x = 13 no pair is left.
+    delta = 1e-8
+    for x in (8., 10., 11., 13.):
+        energy_minus, grad_minus = afir_func(coords3d_at(x - delta))
+        energy_plus, grad_plus = afir_func(coords3d_at(x + delta))
+        assert energy_plus == pytest.approx(energy_minus, abs=1e-8)
+        np.testing.assert_allclose(grad_plus, grad_minus, atol=1e-6)
+
+    # No pair within cutoff
+    energy, gradient = afir_func(coords3d_at(14.))
+    np.testing.assert_allclose(gradient, 0.)
+
+    # Finite differences in the switching region
+    step = 1e-5
+    for x in (8.5, 10.5, 12.5):
+        _, gradient = afir_func(coords3d_at(x))
+        plus, _ = afir_func(coords3d_at(x + step))
+        minus, _ = afir_func(coords3d_at(x - step))
+        assert gradient[2, 0] == pytest.approx((plus - minus) / (2 * step), abs=1e-8)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "atom_num, frag_num", [
+        (100, 2),
+        (1000, 2),
+        (1000, 3),
+])
+def test_afir_benchmark(atom_num, frag_num):
+    fragment_indices, cov_radii, coords3d = get_afir_system(atom_num, frag_num)
+    gamma = 100 / AU2KJPERMOL
+    afir_func = afir_closure(fragment_indices, cov_radii, gamma)
+    grad_func = autograd.grad(afir_func)
+    funcs = {
+        "autograd": lambda c3d: (afir_func(c3d), grad_func(c3d)),
+        "analytic": analytic_afir_closure(fragment_indices, cov_radii, gamma),
+        "analytic, cutoff": analytic_afir_closure(fragment_indices, cov_radii,
+                                                  gamma, cutoff=12.),
+    }
+    calls = 10
+    durations = dict()
+    results = dict()
+    for key, func in funcs.items():
+        start = time.perf_counter()
+        for _ in range(calls):
+            results[key] = func(coords3d)
+        durations[key] = (time.perf_counter() - start) / calls
+    ref_energy, ref_gradient = results["autograd"]
+    energy, gradient = results["analytic"]
+    assert energy == pytest.approx(ref_energy)
+    np.testing.assert_allclose(gradient, ref_gradient, atol=1e-8)
+    assert durations["analytic"] < durations["autograd"]
+    assert durations["analytic, cutoff"] < durations["autograd"]
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+import pytest
+
+from pysisyphus.helpers import geom_loader
+import pysisyphus.intcoords.eval as eval_
+from pysisyphus.intcoords.eval import eval_primitives, eval_primitives_loop
+
+
+@pytest.mark.parametrize(
+    "xyz_fn",
+    [
+        "lib:h2o2_hf_321g_opt.xyz",
+        "lib:biaryl_bare_pm6_splined_hei.xyz",
+        "lib:c4_lb_test.xyz",
+        "lib:codein.xyz",
+    ],
+)
+def test_batched_eval(xyz_fn):
+    geom = geom_loader(xyz_fn, coord_type="redund")
+    coords3d = geom.coords3d
+    primitives = geom.internal.primitives
+
+    batched = eval_primitives(coords3d, primitives)
+    loop = eval_primitives_loop(coords3d, primitives)
+
+    np.testing.assert_allclose(
+        [pi.val for pi in batched], [pi.val for pi in loop], atol=1e-12
+    )
+    np.testing.assert_allclose(
+        [pi.grad for pi in batched], [pi.grad for pi in loop], atol=1e-10
+    )
+
+
+def get_stacked_primitives(repeat):
+    geom = geom_loader("lib:codein.xyz", coord_type="redund")
+    coords3d = geom.coords3d
+    # Enlarge the system by stacking displaced copies of the primitives
+    atom_num = len(coords3d)
+    coords3d = np.concatenate([coords3d + 25 * i for i in range(repeat)], axis=0)
+    primitives = list()
+    for i in range(repeat):
+        for prim in geom.internal.primitives:
+            primitives.append(
+                prim.__class__([ind + i * atom_num for ind in prim.indices])
+            )
+    return coords3d, primitives
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("repeat", (1, 4, 8))
+def test_batched_eval_benchmark(repeat):
+    coords3d, primitives = get_stacked_primitives(repeat)
+
+    def timeit(func):
+        start = time.perf_counter()
+        func(coords3d, primitives)
+        return time.perf_counter() - start
+
+    loop_time = timeit(eval_primitives_loop)
+    batched_time = timeit(eval_primitives)
+    assert batched_time < loop_time
+
+
+@pytest.mark.parametrize(
+    "xyz_fn",
+    [
+        "lib:h2o2_hf_321g_opt.xyz",
+        "lib:biaryl_bare_pm6_splined_hei.xyz",
+        "lib:c4_lb_test.xyz",
+    ],
+)
+def test_batched_K(xyz_fn, monkeypatch):
+    geom = geom_loader(xyz_fn, coord_type="redund")
+    int_ = geom.internal
+    int_gradient = np.random.default_rng(20201105).normal(size=len(int_.primitives))
+
+    # Evaluate all 2nd derivatives one by one
+    monkeypatch.setattr(eval_, "MIN_BATCH_SIZE", 10 ** 9)
+    K_ref = int_.get_K_matrix(int_gradient)
+    # Always use batched 2nd derivatives
+    monkeypatch.setattr(eval_, "MIN_BATCH_SIZE", 0)
+    K = int_.get_K_matrix(int_gradient)
+    K_sparse = int_.get_K_matrix(int_gradient, sparse=True)
+
+    np.testing.assert_allclose(K, K_ref, atol=1e-12)
+    np.testing.assert_allclose(K_sparse.toarray(), K_ref, atol=1e-12)
+    np.testing.assert_allclose(K, K.T, atol=1e-12)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("repeat", (1, 4, 8))
+def test_batched_K_benchmark(repeat, monkeypatch):
+    coords3d, primitives = get_stacked_primitives(repeat)
+    int_gradient = np.ones(len(primitives))
+
+    def timeit(min_batch_size):
+        monkeypatch.setattr(eval_, "MIN_BATCH_SIZE", min_batch_size)
+        start = time.perf_counter()
+        eval_.eval_K(coords3d, primitives, int_gradient)
+        return time.perf_counter() - start
+
+    loop_time = timeit(10 ** 9)
+    batched_time = timeit(0)
+    assert batched_time < loop_time
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from pysisyphus.dynamics.helpers import dump_coords
+from pysisyphus.helpers import geom_loader
+from pysisyphus.io.bintrj import (
+    BinTrj,
+    BinTrjWriter,
+    bintrj_to_trj,
+    trj_to_bintrj,
+    write_bintrj,
+)
+from pysisyphus.trj import TrjGeoms
+
+
+@pytest.fixture
+def frames():
+    geom = geom_loader("lib:h2o.xyz")
+    rng = np.random.default_rng(20201018)
+    shape = (30, *geom.coords3d.shape)
+    coords = geom.coords3d + rng.normal(scale=0.1, size=shape)
+    energies = rng.random(len(coords))
+    forces = rng.random(shape)
+    return geom.atoms, coords, energies, forces
+
+
+@pytest.mark.parametrize(
+    "dtype, atol", [
+        (np.float64, 0.0),
+        (np.float32, 1e-6),
+    ]
+)
+def test_bintrj_writer(frames, dtype, atol, tmp_path):
+    atoms, coords, energies, forces = frames
+    fn = tmp_path / "frames.btrj"
+    with BinTrjWriter(fn, atoms, dtype=dtype, energies=True, forces=True,
+                      buffer_size=7) as writer:
+        for args in zip(coords, energies, forces):
+            writer.write(*args)
+    assert writer.frames_written == len(coords)
+
+    trj = BinTrj(fn)
+    assert trj.atoms == list(atoms)
+    assert len(trj) == len(coords)
+    assert trj.coords.dtype == dtype
+    np.testing.assert_allclose(trj.coords, coords, atol=atol)
+    np.testing.assert_allclose(trj[::10], coords[::10], atol=atol)
+    np.testing.assert_allclose(trj.energies, energies)
+    np.testing.assert_allclose(trj.forces, forces, atol=atol)
+    # Zero-copy views into the memory map
+    assert isinstance(trj.coords[5:10], np.memmap)
+
+
+def test_write_bintrj(frames, tmp_path):
+    atoms, coords, _, _ = frames
+    fn = tmp_path / "frames.btrj"
+    write_bintrj(fn, atoms, coords)
+
+    trj = BinTrj(fn)
+    np.testing.assert_allclose(trj.coords, coords)
+    assert trj.energies is None
+    assert trj.forces is None
+
+    # Partially written frames are ignored
+    with open(fn, "ab") as handle:
+        handle.write(b"\0" * 10)
+    assert len(BinTrj(fn)) == len(coords)
+
+    geoms = geom_loader(fn)
+    assert len(geoms) == len(coords)
+    np.testing.assert_allclose(geoms[-1].coords3d, coords[-1])
+
+
+def test_bintrj_conversion(frames, tmp_path):
+    atoms, coords, _, _ = frames
+    trj_fn = tmp_path / "frames.trj"
+    dump_coords(atoms, coords, trj_fn)
+    bintrj_fn = tmp_path / "frames.btrj"
+    assert trj_to_bintrj(trj_fn, bintrj_fn) == len(coords)
+    np.testing.assert_allclose(BinTrj(bintrj_fn).coords, coords, atol=1e-8)
+
+    back_fn = tmp_path / "back.trj"
+    assert bintrj_to_trj(bintrj_fn, back_fn) == len(coords)
+    assert back_fn.read_text() == trj_fn.read_text()
+
+    geoms = TrjGeoms(bintrj_fn)
+    assert len(geoms) == len(coords)
+    np.testing.assert_allclose(geoms[3].coords3d, BinTrj(bintrj_fn).coords[3])
+    np.testing.assert_allclose([geom.coords3d for geom in geoms[::5]],
+                               BinTrj(bintrj_fn).coords[::5])
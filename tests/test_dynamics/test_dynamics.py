@@ -1,6 +1,10 @@
+import logging
+
 import numpy as np
 import pytest
 
+from pysisyphus.calculators.LennardJones import LennardJones
+from pysisyphus.calculators.MullerBrownSympyPot import MullerBrownPot
 from pysisyphus.calculators.PySCF import PySCF
 from pysisyphus.constants import VELO2E
 from pysisyphus.dynamics.helpers import kinetic_energy_from_velocities, \
@@ -10,9 +14,11 @@ from pysisyphus.dynamics.helpers import kinetic_energy_from_velocities, \
                                         scale_velocities_to_temperatue, \
                                         unscaled_velocity_distribution, \
                                         get_mb_velocities_for_geom
+from pysisyphus.dynamics.ensemble import ensemble_md
 from pysisyphus.dynamics.velocity_verlet import md
 from pysisyphus.optimizers.RFOptimizer import RFOptimizer
 from pysisyphus.helpers import geom_loader
+from pysisyphus.io.bintrj import geoms_from_bintrj
 from pysisyphus.testing import using
 
 
@@ -185,3 +191,101 @@ def test_thermostat():
     plt.show()
 
     fig.savefig("md.pdf")
+
+
+@pytest.fixture
+def tmp_dynamics_log(tmp_path, monkeypatch):
+    """Run in tmp_path and redirect the dynamics log file there.
+
+    The log file handler in pysisyphus.dynamics is created on import and
+    keeps the directory it was created in.
+    """
+    monkeypatch.chdir(tmp_path)
+    handler = logging.FileHandler(tmp_path / "dynamics.log", mode="w", delay=True)
+    monkeypatch.setattr(logging.getLogger("dynamics"), "handlers", [handler])
+    yield tmp_path
+    handler.close()
+
+
+def test_ensemble_md(tmp_dynamics_log):
+    x0 = np.array((-0.82200156, 0.6243128, 0.))
+    A = np.array((-0.5592, 1.443, 0))
+    B = np.array((0.605, 0.036, 0))
+    term_funcs = {
+        "nearA": lambda x: np.linalg.norm(x - A) < 0.05,
+        "nearB": lambda x: np.linalg.norm(x - B) < 0.05,
+    }
+    rng = np.random.default_rng(20201018)
+    v0s = rng.normal(scale=2, size=(8, 3))
+    v0s[:, 2] = 0.
+    md_kwargs = {
+        "steps": 2000,
+        "dt": 0.001,
+        "term_funcs": term_funcs,
+        "remove_com_v": False,
+        "verbose": False,
+    }
+
+    geom = MullerBrownPot.get_geom(x0)
+    md_results = ensemble_md(geom, v0s, **md_kwargs)
+    # Replicas drop out at different steps
+    assert len(set([len(md_result.coords) for md_result in md_results])) > 1
+
+    for v0, md_result in zip(v0s, md_results):
+        ref_result = md(MullerBrownPot.get_geom(x0), v0.copy(), **md_kwargs)
+        assert md_result.terminated == ref_result.terminated
+        assert md_result.t == pytest.approx(ref_result.t)
+        np.testing.assert_allclose(md_result.coords, ref_result.coords, atol=1e-8)
+        np.testing.assert_allclose(md_result.E_tot, ref_result.E_tot, atol=1e-8)
+
+
+@pytest.mark.parametrize(
+    "executor", (None, "thread", "process")
+)
+def test_ensemble_md_executor(executor, tmp_dynamics_log):
+    geom = geom_loader("lib:ar14cluster.xyz")
+    geom.set_calculator(LennardJones())
+    v0s = np.array([get_mb_velocities_for_geom(geom, 298.15, seed=seed).flatten()
+                    for seed in range(3)])
+    md_kwargs = {
+        "steps": 20,
+        "dt": 1.,
+        "verbose": False,
+    }
+
+    md_results = ensemble_md(geom, v0s, executor=executor, max_workers=2,
+                             **md_kwargs)
+    init_coords = geom.coords.copy()
+    for v0, md_result in zip(v0s, md_results):
+        geom.coords = init_coords
+        ref_result = md(geom, v0.copy(), **md_kwargs)
+        np.testing.assert_allclose(md_result.coords, ref_result.coords, atol=1e-10)
+
+
+class FailingLJ(LennardJones):
+    def __init__(self, *args, fail_after, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def get_forces(self, atoms, coords):
+        if self.calls == self.fail_after:
+            raise RuntimeError("Calculation failed")
+        self.calls += 1
+        return super().get_forces(atoms, coords)
+
+
+@pytest.mark.parametrize("trj_fn", ("md.trj", "md.btrj"))
+def test_md_writer_closed_on_error(trj_fn, tmp_dynamics_log):
+    geom = geom_loader("lib:ar14cluster.xyz")
+    geom.set_calculator(FailingLJ(fail_after=4))
+    v0 = get_mb_velocities_for_geom(geom, 298.15, seed=20201018).flatten()
+    with pytest.raises(RuntimeError):
+        md(geom, v0, steps=10, dt=1., trj_fn=trj_fn, verbose=False)
+
+    # Frames written before the failure were flushed to disk
+    if trj_fn.endswith(".btrj"):
+        frame_num = len(geoms_from_bintrj(trj_fn))
+    else:
+        frame_num = len(geom_loader(trj_fn))
+    assert frame_num == 4
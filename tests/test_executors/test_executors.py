@@ -0,0 +1,166 @@
+import gc
+
+import numpy as np
+import pytest
+
+from pysisyphus.calculators import LennardJones
+from pysisyphus.calculators.Calculator import Calculator
+from pysisyphus.cos.NEB import NEB
+from pysisyphus.executors import map_as_completed, WorkerPool
+from pysisyphus.helpers import geom_loader
+from pysisyphus.run import run_calculations
+
+
+def get_images(num=5, seed=20201107):
+    geom = geom_loader("lib:ar14cluster.xyz")
+    rng = np.random.default_rng(seed)
+    images = list()
+    for i in range(num):
+        image = geom.copy()
+        image.coords = geom.coords + rng.normal(scale=0.05, size=geom.coords.size)
+        image.set_calculator(LennardJones())
+        images.append(image)
+    return images
+
+
+def square(x):
+    return x ** 2
+
+
+@pytest.mark.parametrize("executor", ("thread", "process"))
+def test_map_as_completed(executor):
+    items = np.arange(10)
+    results = dict(map_as_completed(square, items, executor=executor, max_workers=3))
+    assert sorted(results.keys()) == list(range(10))
+    assert all([results[i] == i ** 2 for i in items])
+
+
+@pytest.mark.parametrize("executor", ("thread", "process"))
+def test_neb_executor(executor):
+    ref_neb = NEB(get_images())
+    ref_forces = ref_neb.forces
+
+    neb = NEB(get_images(), executor=executor, max_workers=2, image_pal=1)
+    forces = neb.forces
+
+    np.testing.assert_allclose(forces, ref_forces)
+    np.testing.assert_allclose(neb.energy, ref_neb.energy)
+    assert all([image.calculator.pal == 1 for image in neb.images])
+
+
+def test_neb_executor_reused():
+    neb = NEB(get_images(), executor="thread", max_workers=2)
+    executor = neb.get_executor()
+    for _ in range(3):
+        neb.coords = neb.coords + 1e-3
+        neb.forces
+        assert neb.get_executor() is executor
+    neb.shutdown_executor()
+    assert neb._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(square, 2)
+
+
+class CountingLJ(LennardJones):
+    """Records the geometries that every calculator instance saw."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seen = list()
+
+    def get_forces(self, atoms, coords):
+        self.seen.append(coords.copy())
+        return super().get_forces(atoms, coords)
+
+
+def test_worker_pool_neb():
+    ref_neb = NEB(get_images())
+    ref_forces = ref_neb.forces
+
+    pool = WorkerPool(lambda i: CountingLJ(), workers=5)
+    images = get_images()
+    neb = NEB(images, worker_pool=pool)
+    np.testing.assert_allclose(neb.forces, ref_forces)
+    np.testing.assert_allclose(neb.energy, ref_neb.energy)
+
+    # Second cycle; only the moving images are recalculated
+    neb.coords = neb.coords + 0.01
+    neb.forces
+    pool.shutdown()
+
+    # Every image stays on the same worker
+    for worker, calc in enumerate(pool.calculators):
+        first = calc.seen[0]
+        assert all([np.abs(coords - first).max() <= 0.01 + 1e-12 for coords in calc.seen])
+    assert [len(calc.seen) for calc in pool.calculators] == [1, 2, 2, 2, 1]
+
+
+def test_keep_scratch():
+    calc = Calculator(keep_scratch=True)
+    calc.scratch_restart = ("restart", )
+    path = calc.prepare("input")
+    (path / "restart").write_text("restart")
+    (path / "gradient").write_text("old gradient")
+    calc.clean(path)
+    assert path.exists()
+
+    # The next calculation runs in the same directory, but only the restart
+    # file survived.
+    next_path = calc.prepare("input")
+    assert next_path == path
+    assert sorted([fn.name for fn in path.iterdir()]) == ["calc.inp", "restart"]
+
+    calc.clean_scratch()
+    assert not path.exists()
+
+
+class NoParseCalc(Calculator):
+    """Like the calculators wrapping external programs, run_calculation()
+    returns nothing."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ran = 0
+
+    def run_calculation(self, atoms, coords):
+        self.ran += 1
+
+
+def test_worker_pool_run_calculations():
+    geoms = get_images(num=4)
+    for geom in geoms:
+        geom.set_calculator(NoParseCalc())
+
+    with WorkerPool(lambda i: NoParseCalc(), workers=2) as pool:
+        calced = run_calculations(geoms, lambda i: NoParseCalc(), ".", None, None,
+                                  worker_pool=pool)
+    assert len(calced) == 4
+    # Calculations ran with the long-lived calculators of the workers
+    assert [calc.ran for calc in pool.calculators] == [2, 2]
+    assert all([geom.calculator.ran == 0 for geom in calced])
+
+
+def test_worker_pool_assignment():
+    pool = WorkerPool(lambda i: LennardJones(), workers=3)
+    keys = ("a", "b", "c", "d")
+    workers = [pool.get_worker(key) for key in keys]
+    assert workers == [0, 1, 2, 0]
+    # Assignments are stable, independent of the order keys appear in
+    assert [pool.get_worker(key) for key in keys[::-1]] == workers[::-1]
+    pool.shutdown()
+
+
+def test_worker_pool_release():
+    pool = WorkerPool(lambda i: LennardJones(), workers=2)
+    geoms = get_images(num=3)
+    for _ in pool.calc_energy_and_forces(geoms):
+        pass
+    workers = [pool.assignments[id(geom)] for geom in geoms]
+    assert workers == [0, 1, 0]
+
+    # Assignments of collected geometries are dropped
+    del geoms[0]
+    gc.collect()
+    assert pool.get_worker("new") == 0
+    assert len(pool.assignments) == 3
+    pool.shutdown()
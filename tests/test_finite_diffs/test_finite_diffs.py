@@ -0,0 +1,130 @@
+import h5py
+import numpy as np
+import pytest
+
+from pysisyphus.calculators.AnaPot import AnaPot
+from pysisyphus.calculators.LennardJones import LennardJones
+from pysisyphus.finite_diffs import finite_difference_hessian
+from pysisyphus.helpers import geom_from_library
+
+
+class CountingLJ(LennardJones):
+    cache_ignore = LennardJones.cache_ignore + ("calls", "fail_after", "out_dirs")
+
+    def __init__(self, *args, fail_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Shared by the shallow copies made for every displacement
+        self.calls = list()
+        self.out_dirs = set()
+        self.fail_after = fail_after
+
+    def get_forces(self, atoms, coords):
+        if (self.fail_after is not None) and (len(self.calls) >= self.fail_after):
+            raise RuntimeError("Interrupted")
+        self.calls.append(coords)
+        self.out_dirs.add(self.out_dir)
+        return super().get_forces(atoms, coords)
+
+
+@pytest.fixture
+def ar_geom():
+    geom = geom_from_library("ar14cluster.xyz")
+    geom.set_calculator(LennardJones())
+    return geom
+
+
+def test_anapot_num_hess():
+    geom = AnaPot.get_geom((0.6, 1.2, 0.0))
+    ref_hessian = geom.hessian
+
+    calc = AnaPot(num_hess={"step_size": 1e-4})
+    geom.set_calculator(calc)
+    np.testing.assert_allclose(geom.hessian, ref_hessian, atol=1e-6)
+
+
+def test_num_hess_opt_in(ar_geom, tmp_path):
+    # Calculators without analytical Hessian don't silently fall back
+    with pytest.raises(Exception, match="Not implemented!"):
+        ar_geom.hessian
+
+    ar_geom.set_calculator(LennardJones(num_hess={"skip_trans": True}, out_dir=tmp_path))
+    hessian = ar_geom.hessian
+    assert hessian.shape == (42, 42)
+    np.testing.assert_allclose(hessian, hessian.T, atol=1e-8)
+
+
+@pytest.mark.parametrize("executor", ("thread", "process"))
+def test_lj_num_hess(ar_geom, executor):
+    calc = ar_geom.calculator
+    results = finite_difference_hessian(
+        calc, ar_geom.atoms, ar_geom.cart_coords, executor=executor, max_workers=2
+    )
+    hessian = results["hessian"]
+    assert results["energy"] == pytest.approx(ar_geom.energy)
+    np.testing.assert_allclose(hessian, hessian.T)
+    # Translational invariance
+    np.testing.assert_allclose(hessian.reshape(-1, 14, 3).sum(axis=1), 0.0, atol=1e-5)
+
+
+def test_skip_trans(ar_geom):
+    calc = CountingLJ()
+    atoms, coords = ar_geom.atoms, ar_geom.cart_coords
+    ref = finite_difference_hessian(calc, atoms, coords)["hessian"]
+    skipped = finite_difference_hessian(calc, atoms, coords, skip_trans=True)["hessian"]
+    assert len(calc.calls) == 2 * (2 * coords.size + 1) - 6
+    np.testing.assert_allclose(skipped, ref, atol=1e-5)
+
+
+def test_restart(ar_geom, tmp_path):
+    h5_fn = tmp_path / "num_hess.h5"
+    atoms, coords = ar_geom.atoms, ar_geom.cart_coords
+    ref = finite_difference_hessian(CountingLJ(), atoms, coords)["hessian"]
+    displ_num = 2 * coords.size + 1
+
+    # Interrupted after 30 gradients
+    calc = CountingLJ(fail_after=30)
+    with pytest.raises(RuntimeError):
+        finite_difference_hessian(
+            calc, atoms, coords, h5_fn=h5_fn, executor="thread", max_workers=1
+        )
+    with h5py.File(h5_fn, "r") as handle:
+        assert handle["done"][:].sum() == 30
+
+    calc = CountingLJ()
+    hessian = finite_difference_hessian(calc, atoms, coords, h5_fn=h5_fn)["hessian"]
+    assert len(calc.calls) == displ_num - 30
+    np.testing.assert_allclose(hessian, ref)
+    # Deleted once the Hessian is complete
+    assert not h5_fn.exists()
+
+
+@pytest.mark.parametrize(
+    "modify",
+    (
+        lambda atoms, coords, calc: (atoms, coords + 0.01, calc),
+        lambda atoms, coords, calc: (["Kr"] * len(atoms), coords, calc),
+        lambda atoms, coords, calc: (atoms, coords, CountingLJ(sigma=1.1)),
+    ),
+    ids=("coords", "atoms", "settings"),
+)
+def test_restart_incompatible(ar_geom, tmp_path, modify):
+    h5_fn = tmp_path / "num_hess.h5"
+    atoms, coords = ar_geom.atoms, ar_geom.cart_coords
+    with pytest.raises(RuntimeError):
+        finite_difference_hessian(
+            CountingLJ(fail_after=30), atoms, coords, h5_fn=h5_fn, max_workers=1
+        )
+
+    atoms, coords, calc = modify(atoms, coords, CountingLJ())
+    finite_difference_hessian(calc, atoms, coords, h5_fn=h5_fn)
+    assert len(calc.calls) == 2 * coords.size + 1
+
+
+def test_displacement_out_dirs(ar_geom, tmp_path):
+    calc = CountingLJ(out_dir=tmp_path)
+    atoms, coords = ar_geom.atoms, ar_geom.cart_coords
+    finite_difference_hessian(calc, atoms, coords)
+    # Every displacement runs in its own directory, that is removed when empty
+    assert len(calc.out_dirs) == len(calc.calls)
+    assert all([out_dir.parent == tmp_path for out_dir in calc.out_dirs])
+    assert list(tmp_path.iterdir()) == []
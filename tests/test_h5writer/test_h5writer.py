@@ -0,0 +1,91 @@
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+
+from pysisyphus.calculators.AnaPot import AnaPot
+from pysisyphus.io.hdf5 import H5Writer
+from pysisyphus.optimizers.RFOptimizer import RFOptimizer
+
+
+DATA_MODEL = {
+    "energies": (10, ),
+    "coords": (10, 6),
+}
+
+
+def test_buffered_rows(tmp_path):
+    fn = tmp_path / "test.h5"
+    writer = H5Writer(fn, "group", DATA_MODEL, buffer_size=3)
+    for i in range(2):
+        writer.add_row(i, {"energies": i, "coords": np.full(6, i)})
+    # Nothing is written yet
+    assert not fn.exists()
+
+    writer.add_row(2, {"energies": 2, "coords": np.full(3, 2)})
+    writer.set_attrs(cur_cycle=2)
+    writer.add_row(3, {"energies": 3})
+    writer.close()
+
+    with h5py.File(fn, "r") as handle:
+        group = handle["group"]
+        assert group.attrs["cur_cycle"] == 2
+        energies = group["energies"][:]
+        coords = group["coords"][:]
+        assert group["coords"].maxshape == (None, 6)
+        assert group["coords"].compression == "gzip"
+    np.testing.assert_allclose(energies, (0, 1, 2, 3))
+    np.testing.assert_allclose(coords[2], (2, 2, 2, 0, 0, 0))
+    np.testing.assert_allclose(coords[3], 0.0)
+
+
+def test_reset_and_append(tmp_path):
+    fn = tmp_path / "test.h5"
+    with H5Writer(fn, "group", DATA_MODEL) as writer:
+        for i in range(5):
+            writer.add_row(i, {"energies": i})
+    # Append to present datasets
+    with H5Writer(fn, "group", DATA_MODEL) as writer:
+        writer.add_row(5, {"energies": 5})
+    with h5py.File(fn, "r") as handle:
+        np.testing.assert_allclose(handle["group/energies"][:], range(6))
+
+    with H5Writer(fn, "group", DATA_MODEL, reset=True) as writer:
+        writer.add_row(0, {"energies": 10})
+    with h5py.File(fn, "r") as handle:
+        np.testing.assert_allclose(handle["group/energies"][:], (10, ))
+
+
+def test_pickle(tmp_path):
+    fn = tmp_path / "test.h5"
+    writer = H5Writer(fn, "group", DATA_MODEL)
+    writer.add_row(0, {"energies": 1.0})
+    writer.open()
+
+    # Pickling flushes the buffer; the copy opens its own handle
+    copy = pickle.loads(pickle.dumps(writer))
+    writer.close()
+    assert not copy.is_open
+    copy.add_row(1, {"energies": 2.0})
+    copy.close()
+    with h5py.File(fn, "r") as handle:
+        np.testing.assert_allclose(handle["group/energies"][:], (1.0, 2.0))
+
+
+@pytest.mark.parametrize("h5_buffer_size", (1, 4))
+def test_optimizer_dump(tmp_path, h5_buffer_size):
+    geom = AnaPot.get_geom((0.667, 1.609, 0.0))
+    opt = RFOptimizer(geom, dump=True, h5_buffer_size=h5_buffer_size,
+                      h5_fn=str(tmp_path / "optimization.h5"))
+    opt.run()
+
+    assert opt.is_converged
+    with h5py.File(tmp_path / "optimization.h5", "r") as handle:
+        group = handle["opt"]
+        cur_cycle = group.attrs["cur_cycle"]
+        assert group.attrs["is_converged"]
+        energies = group["energies"][:]
+    assert cur_cycle == opt.cur_cycle
+    assert len(energies) == cur_cycle + 1
+    np.testing.assert_allclose(energies, opt.energies, rtol=1e-6)
@@ -1,7 +1,7 @@
 import numpy as np
 from scipy.spatial.transform import Rotation
 
-from pysisyphus.helpers import align_coords, geom_loader
+from pysisyphus.helpers import align_consecutive, align_coords, geom_loader
 from pysisyphus.interpolate import interpolate
 
 
@@ -56,3 +56,30 @@ def test_align_coords_interpolate():
     # coords_to_trj("aligned.trj", atoms, aligned)
 
     np.testing.assert_allclose(aligned[0], aligned[-1], atol=1e-10)
+
+
+def test_align_consecutive():
+    rng = np.random.default_rng(20201018)
+    geom = geom_loader("lib:benzene.xyz")
+    rots = Rotation.random(8, random_state=20201018).as_matrix()
+    coords = np.array([
+        geom.coords3d.dot(rot) + rng.normal(scale=0.1, size=geom.coords3d.shape)
+        for rot in rots
+    ])
+
+    # Image after image
+    ref_aligned = list()
+    last = coords[0] - coords[0].mean(axis=0)
+    ref_aligned.append(last)
+    for coords3d in coords[1:]:
+        centered = coords3d - coords3d.mean(axis=0)
+        U, _, Vt = np.linalg.svd(centered.T.dot(last))
+        if np.linalg.det(U.dot(Vt)) < 0:
+            U[:, -1] *= -1
+        last = centered.dot(U.dot(Vt))
+        ref_aligned.append(last)
+
+    aligned, rot_mats = align_consecutive(coords)
+    assert rot_mats.shape == (len(coords), 3, 3)
+    np.testing.assert_allclose(aligned, ref_aligned, atol=1e-12)
+    np.testing.assert_allclose(np.linalg.det(rot_mats), 1.0)
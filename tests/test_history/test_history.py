@@ -0,0 +1,217 @@
+import numpy as np
+import pytest
+
+from pysisyphus.calculators.AnaPot import AnaPot
+from pysisyphus.calculators.Rosenbrock import Rosenbrock
+from pysisyphus.optimizers.history import History, LBFGSHistory
+from pysisyphus.optimizers.LBFGS import LBFGS
+from pysisyphus.optimizers.RFOptimizer import RFOptimizer
+
+
+def test_history():
+    history = History(maxlen=3)
+    for i in range(5):
+        history.append(i)
+
+    # The ring buffer has wrapped around
+    assert len(history) == 3
+    assert history.total == 5
+    assert history.first == 2
+    assert history[0] == 2
+    assert history[-1] == 4
+    assert list(history) == [2, 3, 4]
+    assert [history[i] for i in range(len(history))] == list(history)
+    assert history[::-1][:2] == [4, 3]
+    assert history[1:] == [3, 4]
+    np.testing.assert_allclose(np.array(history), (2, 3, 4))
+    with pytest.raises(IndexError):
+        history[3]
+    with pytest.raises(IndexError):
+        history[-4]
+    # Absolute indices
+    assert history.load(3) == 3
+    with pytest.raises(IndexError):
+        history.load(1)
+    with pytest.raises(IndexError):
+        history.load(5)
+
+    history[-1] = 10
+    assert history.pop(-1) == 10
+    assert len(history) == 2
+    assert list(history) == [2, 3]
+    history.append(5)
+    assert list(history) == [2, 3, 5]
+    history.extend((6, 7))
+    assert list(history) == [5, 6, 7]
+    assert history.total == 7
+
+
+def test_history_loader():
+    history = History(range(10), maxlen=2, loader=lambda i: -i)
+    assert list(history) == [8, 9]
+    assert history.load(0) == 0
+    assert history.load(3) == -3
+    assert history.load(9) == 9
+
+
+def test_unbounded_history():
+    history = History(range(100))
+    assert len(history) == history.total == 100
+    assert history[0] == 0
+    assert history[:3] == [0, 1, 2]
+    assert list(history) == list(range(100))
+
+
+@pytest.mark.parametrize("maxlen", (None, 3))
+def test_history_first(maxlen):
+    history = History((5, 6), maxlen=maxlen, first=5)
+    assert (history.first, history.total) == (5, 7)
+    assert list(history) == [5, 6]
+    assert history.load(6) == 6
+    history.append(7)
+    assert history.total == 8
+    assert history[-1] == 7
+
+
+@pytest.mark.parametrize(
+    "opt_cls, opt_kwargs",
+    [
+        (RFOptimizer, {"thresh": "gau_tight"}),
+        (LBFGS, {"thresh": "gau_tight", "keep_last": 5}),
+    ],
+)
+def test_history_window(opt_cls, opt_kwargs):
+    def run(**kwargs):
+        geom = Rosenbrock.get_geom((-1.2, 1.0, 0.0))
+        opt = opt_cls(geom, max_cycles=150, **opt_kwargs, **kwargs)
+        opt.run()
+        return opt
+
+    ref_opt = run()
+    opt = run(history_window=6)
+
+    assert opt.is_converged
+    assert opt.cur_cycle == ref_opt.cur_cycle
+    assert opt.coords.total == len(ref_opt.coords)
+    assert len(opt.coords) == len(list(opt.coords)) == 6
+    np.testing.assert_allclose(opt.geometry.coords, ref_opt.geometry.coords)
+
+
+def test_history_from_dump(tmp_path):
+    geom = AnaPot.get_geom((0.667, 1.609, 0.0))
+    opt = RFOptimizer(geom, dump=True, history_window=2, h5_fn=str(tmp_path / "opt.h5"))
+    opt.run()
+
+    assert opt.cur_cycle > 3
+    assert len(opt.energies) == 2
+    # Dropped cycles are read from the HDF5 dump
+    assert opt.energies.load(0) == pytest.approx(geom.calculator.get_energy(
+        geom.atoms, np.array((0.667, 1.609, 0.0)))["energy"])
+    np.testing.assert_allclose(opt.cart_coords.load(0), (0.667, 1.609, 0.0))
+
+
+def test_history_window_restart():
+    def get_opt(max_cycles, restart_info=None):
+        geom = AnaPot.get_geom((0.667, 1.609, 0.0))
+        return RFOptimizer(geom, thresh="gau_tight", max_cycles=max_cycles,
+                           history_window=2, restart_info=restart_info)
+
+    ref_opt = get_opt(50)
+    ref_opt.run()
+
+    opt = get_opt(4)
+    opt.run()
+    restart_info = opt.get_restart_info()
+    assert len(opt.forces) == 2
+
+    restarted = get_opt(50, restart_info)
+    assert restarted.forces.total == opt.forces.total
+    assert restarted.forces.first == opt.forces.first
+    restarted.run()
+    assert restarted.is_converged
+    assert restarted.cur_cycle == ref_opt.cur_cycle
+    np.testing.assert_allclose(restarted.geometry.coords, ref_opt.geometry.coords)
+
+
+def ref_multiply(s_list, y_list, vector):
+    """Plain two-loop recursion with gamma scaling."""
+    q = vector.copy()
+    alphas = list()
+    for s, y in reversed(list(zip(s_list, y_list))):
+        alpha = s.dot(q) / s.dot(y)
+        alphas.append(alpha)
+        q -= alpha * y
+    gamma = s_list[-1].dot(y_list[-1]) / y_list[-1].dot(y_list[-1])
+    r = gamma * q
+    for (s, y), alpha in zip(zip(s_list, y_list), reversed(alphas)):
+        beta = y.dot(r) / s.dot(y)
+        r += s * (alpha - beta)
+    return r
+
+
+def get_pairs(num, size=12, seed=20201018):
+    np.random.seed(seed)
+    A = np.random.rand(size, size)
+    A = A.dot(A.T) + size * np.eye(size)
+    s_list = np.random.rand(num, size) - 0.5
+    y_list = s_list.dot(A)
+    return s_list, y_list
+
+
+def test_lbfgs_history_multiply():
+    s_list, y_list = get_pairs(8)
+    history = LBFGSHistory(m=5)
+    history.extend(s_list, y_list)
+    assert len(history) == 5
+    # Only the last five pairs are kept, from oldest to newest
+    np.testing.assert_allclose(history.s_list, s_list[-5:])
+    # The ring buffer has wrapped around
+    assert history.head == 3
+    for i, (s, y) in enumerate(history):
+        np.testing.assert_allclose(s, s_list[3 + i])
+        np.testing.assert_allclose(y, y_list[3 + i])
+        np.testing.assert_allclose(history[i][0], s)
+    np.testing.assert_allclose(history[-1][1], y_list[-1])
+    with pytest.raises(IndexError):
+        history[5]
+    # Inner products of the kept pairs
+    order = history.order
+    np.testing.assert_allclose(history.SY[np.ix_(order, order)],
+                               s_list[-5:].dot(y_list[-5:].T))
+
+    vector = np.random.rand(12)
+    ref = ref_multiply(s_list[-5:], y_list[-5:], vector)
+    compact = history.multiply(vector)
+    gamma = history.get_gamma()
+    two_loop = history.two_loop(vector, lambda q: gamma * q)
+    np.testing.assert_allclose(compact, ref)
+    np.testing.assert_allclose(two_loop, ref)
+
+    # Several vectors at once
+    vectors = np.random.rand(12, 3)
+    np.testing.assert_allclose(
+        history.multiply(vectors)[:, 1], history.multiply(vectors[:, 1])
+    )
+
+
+def test_lbfgs_history_empty():
+    history = LBFGSHistory(m=3)
+    vector = np.arange(4.0)
+    np.testing.assert_allclose(history.multiply(vector, beta=0.5), 0.5 * vector)
+
+
+def test_lbfgs_history_grow():
+    s_list, y_list = get_pairs(3, size=6)
+    history = LBFGSHistory(m=3)
+    history.extend(s_list, y_list)
+    # Add a new image with three coordinates in the middle of the string
+    keep_inds = [0, 1, 2, 6, 7, 8]
+    history.grow(9, keep_inds)
+
+    embedded_s = np.zeros((3, 9))
+    embedded_s[:, keep_inds] = s_list
+    embedded_y = np.zeros((3, 9))
+    embedded_y[:, keep_inds] = y_list
+    vector = np.random.rand(9)
+    ref = ref_multiply(embedded_s, embedded_y, vector)
+    np.testing.assert_allclose(history.multiply(vector), ref)
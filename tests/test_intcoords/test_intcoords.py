@@ -218,3 +218,55 @@ def test_opt_linear_dihedrals():
     assert opt.is_converged
     assert opt.cur_cycle == 16
     assert geom.energy == pytest.approx(-10.48063133)
+
+
+@pytest.mark.parametrize("coord_type", ("redund", "dlc"))
+def test_sparse_B(coord_type):
+    dense_geom = geom_loader("lib:codein.xyz", coord_type=coord_type)
+    sparse_geom = geom_loader(
+        "lib:codein.xyz", coord_type=coord_type, coord_kwargs={"sparse": True}
+    )
+    dense = dense_geom.internal
+    sparse = sparse_geom.internal
+    np.testing.assert_allclose(sparse.B_prim.toarray(), dense.B_prim)
+
+    # Forces in the range of Bᵀ
+    B = dense.B
+    int_forces = np.random.default_rng(20201104).normal(size=len(dense.coords))
+    cart_forces = B.T.dot(int_forces)
+    sparse_int_forces = sparse.transform_forces(cart_forces)
+    # B·Bᵀ is nearly singular for codein, so the dense pseudo inverse with
+    # rcond=1e-15 is no sensible reference. The transformed forces must
+    # reproduce the Cartesian forces and agree with a well-conditioned
+    # minimum norm solution.
+    np.testing.assert_allclose(B.T.dot(sparse_int_forces), cart_forces, atol=1e-8)
+    ref_int_forces, *_ = np.linalg.lstsq(B.T, cart_forces, rcond=1e-10)
+    np.testing.assert_allclose(sparse_int_forces, ref_int_forces, atol=1e-6)
+
+    int_step = 0.05 * int_forces / np.linalg.norm(int_forces)
+    dense_cart_step = dense.transform_int_step(int_step)
+    sparse_cart_step = sparse.transform_int_step(int_step)
+    np.testing.assert_allclose(sparse_cart_step, dense_cart_step, atol=1e-10)
+    np.testing.assert_allclose(sparse.coords, dense.coords, atol=1e-10)
+
+
+@pytest.mark.parametrize("coord_type", ("redund", "dlc"))
+def test_B_cache(coord_type):
+    geom = geom_loader("lib:h2o2_hf_321g_opt.xyz", coord_type=coord_type)
+    int_ = geom.internal
+    int_.cache_hits = 0
+    int_.cache_misses = 0
+
+    cart_forces = np.random.default_rng(20201104).normal(size=geom.cart_coords.size)
+    int_forces = int_.transform_forces(cart_forces)
+    H = int_.transform_hessian(np.eye(cart_forces.size), -int_forces)
+    int_.project_hessian(H)
+    misses = int_.cache_misses
+    int_.transform_forces(cart_forces)
+    assert int_.cache_misses == misses
+    assert int_.cache_hits > 0
+
+    # Cache is invalidated when the coordinates change
+    geom.coords = geom.coords + 0.01 * int_.project_vector(int_forces)
+    int_.transform_forces(cart_forces)
+    assert int_.cache_misses > misses
@@ -0,0 +1,127 @@
+import itertools as it
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist, squareform
+
+from pysisyphus.elem_data import VDW_RADII, COVALENT_RADII as CR
+from pysisyphus.helpers import geom_loader
+from pysisyphus.helpers_pure import merge_sets
+from pysisyphus.intcoords import Bend
+from pysisyphus.intcoords.setup import (
+    connect_fragments,
+    get_bond_sets,
+    get_fragments_from_bonds,
+    get_hydrogen_bond_inds,
+    get_pair_covalent_radii,
+    get_pairs,
+)
+
+
+"""Compare the KD-tree based neighbor search against brute force
+references built from the full condensed distance matrix."""
+
+
+def ref_bond_sets(atoms, coords3d, bond_factor=1.3):
+    cdm = pdist(coords3d)
+    atom_inds = np.array(list(it.combinations(range(len(coords3d)), 2)), dtype=int)
+    cbm = cdm <= bond_factor * get_pair_covalent_radii(atoms)
+    return atom_inds[cbm], cdm, cbm
+
+
+def ref_hydrogen_bond_inds(atoms, coords3d, bond_inds):
+    atoms = [atom.lower() for atom in atoms]
+    bond_sets = [frozenset(bond) for bond in bond_inds]
+    h_inds = [i for i, atom in enumerate(atoms) if atom == "h"]
+    x_inds = [i for i, atom in enumerate(atoms) if atom in "n o f p s cl".split()]
+    hydrogen_bond_inds = list()
+    for h_ind, x_ind in it.product(h_inds, x_inds):
+        if frozenset((h_ind, x_ind)) not in bond_sets:
+            continue
+        for y_ind in sorted(set(x_inds) - {x_ind}):
+            distance = np.linalg.norm(coords3d[h_ind] - coords3d[y_ind])
+            cov_rad_sum = CR["h"] + CR[atoms[y_ind]]
+            vdw = 0.9 * (VDW_RADII["h"] + VDW_RADII[atoms[y_ind]])
+            angle = Bend._calculate(coords3d, (x_ind, h_ind, y_ind))
+            if (cov_rad_sum < distance < vdw) and (angle > np.pi / 2):
+                hydrogen_bond_inds.append((h_ind, y_ind))
+    return hydrogen_bond_inds
+
+
+@pytest.fixture(
+    params=(
+        "h2o_30_sphere.xyz",
+        "hydrogen_bond_fragments_test.xyz",
+        "single_atom_fragments.xyz",
+        "thr75_from_1bl8.xyz",
+    )
+)
+def geom(request):
+    return geom_loader(f"lib:{request.param}")
+
+
+@pytest.mark.parametrize("max_dist", (0.0, 3.0, 8.0, 1e3))
+def test_get_pairs(max_dist):
+    coords3d = np.random.default_rng(20201018).uniform(0, 10, size=(50, 3))
+    pairs, distances = get_pairs(coords3d, max_dist)
+
+    cdm = pdist(coords3d)
+    ref_pairs = np.array(list(it.combinations(range(len(coords3d)), 2)))
+    below = cdm <= max_dist
+    # Same order as in the condensed distance matrix
+    np.testing.assert_array_equal(pairs.reshape(-1, 2), ref_pairs[below])
+    np.testing.assert_allclose(distances, cdm[below])
+
+
+def test_get_bond_sets(geom):
+    atoms, coords3d = geom.atoms, geom.coords3d
+    ref_bonds, ref_cdm, ref_cbm = ref_bond_sets(atoms, coords3d)
+
+    bonds = get_bond_sets(atoms, coords3d)
+    np.testing.assert_array_equal(bonds, ref_bonds)
+
+    bonds, cdm, cbm = get_bond_sets(atoms, coords3d, return_cdm=True, return_cbm=True)
+    np.testing.assert_array_equal(bonds, ref_bonds)
+    np.testing.assert_allclose(cdm, ref_cdm)
+    np.testing.assert_array_equal(cbm, ref_cbm)
+
+
+def test_get_fragments_from_bonds(geom):
+    atom_num = len(geom.atoms)
+    bonds = get_bond_sets(geom.atoms, geom.coords3d)
+    fragments = get_fragments_from_bonds(bonds, atom_num)
+
+    ref_fragments = merge_sets(bonds)
+    unbonded = set(range(atom_num)) - set(np.ravel(bonds))
+    ref_fragments += [frozenset((atom,)) for atom in unbonded]
+    assert set(fragments) == set(ref_fragments)
+    # Ordered by the lowest atom index
+    assert [min(frag) for frag in fragments] == sorted(min(frag) for frag in fragments)
+
+
+def test_get_hydrogen_bond_inds(geom):
+    atoms, coords3d = geom.atoms, geom.coords3d
+    bonds = get_bond_sets(atoms, coords3d)
+    hydrogen_bonds = get_hydrogen_bond_inds(atoms, coords3d, bonds)
+    assert hydrogen_bonds == ref_hydrogen_bond_inds(atoms, coords3d, bonds)
+
+
+def test_water_cluster_hydrogen_bonds():
+    geom = geom_loader("lib:h2o_30_sphere.xyz")
+    bonds = get_bond_sets(geom.atoms, geom.coords3d)
+    assert len(get_fragments_from_bonds(bonds, len(geom.atoms))) == 30
+    assert len(get_hydrogen_bond_inds(geom.atoms, geom.coords3d, bonds)) > 0
+
+
+def test_connect_fragments(geom):
+    coords3d = geom.coords3d
+    bonds = get_bond_sets(geom.atoms, coords3d)
+    fragments = get_fragments_from_bonds(bonds, len(geom.atoms))
+    interfrag_inds, _ = connect_fragments(coords3d, fragments)
+
+    dist_mat = squareform(pdist(coords3d))
+    assert len(interfrag_inds) == len(fragments) * (len(fragments) - 1) // 2
+    for (frag1, frag2), bond in zip(it.combinations(fragments, 2), interfrag_inds):
+        inds = list(it.product(frag1, frag2))
+        min_dist = min([dist_mat[ind] for ind in inds])
+        assert dist_mat[tuple(bond)] == pytest.approx(min_dist)
@@ -1,9 +1,17 @@
+import numpy as np
 import pytest
+from scipy.spatial.distance import pdist
 
+from pysisyphus.calculators.IDPPCalculator import (
+    get_incidence,
+    get_pair_inds,
+    IDPPCalculator,
+)
 from pysisyphus.xyzloader import write_geoms_to_trj
 from pysisyphus.helpers import geom_from_library
 from pysisyphus.interpolate.Interpolator import Interpolator
-from pysisyphus.interpolate.LST import LST
+from pysisyphus.interpolate import LST as LST_module
+from pysisyphus.interpolate.LST import LST, lst_cost
 from pysisyphus.interpolate.IDPP import IDPP
 from pysisyphus.interpolate.Redund import Redund
 
@@ -39,3 +47,125 @@ def test_ala_dipeptide_interpol(interpol_cls):
     # interpolator.all_geoms_to_trj("interpolated.trj")
 
     assert len(geoms) == 30
+
+
+def test_idpp_calculator():
+    geom = geom_from_library("dipeptide_init.xyz")
+    atoms = geom.atoms
+    coords = geom.coords
+    rng = np.random.default_rng(20201018)
+    targets = np.array(
+        [pdist(geom.coords3d + rng.normal(scale=0.1, size=geom.coords3d.shape))
+         for _ in range(3)]
+    )
+
+    calc = IDPPCalculator(targets[1])
+    results = calc.get_forces(atoms, coords)
+
+    # Finite differences of the energy
+    dx = 1e-5
+    fd_forces = np.zeros_like(coords)
+    for i in range(coords.size):
+        step = np.zeros_like(coords)
+        step[i] = dx
+        plus = calc.get_forces(atoms, coords + step)["energy"]
+        minus = calc.get_forces(atoms, coords - step)["energy"]
+        fd_forces[i] = -(plus - minus) / (2 * dx)
+    np.testing.assert_allclose(results["forces"], fd_forces, atol=1e-6)
+
+    # All images at once
+    batch_calc = IDPPCalculator(targets)
+    batch_results = batch_calc.get_forces_batch(atoms, np.array([coords] * 3), [0, 1, 2])
+    assert batch_results[1]["energy"] == pytest.approx(results["energy"])
+    np.testing.assert_allclose(batch_results[1]["forces"], results["forces"])
+
+
+def test_idpp_cutoff():
+    initial = geom_from_library("dipeptide_init.xyz")
+    final = geom_from_library("dipeptide_fin.xyz")
+
+    idpp = IDPP((initial, final), 8, align=True, cutoff=5.0)
+    geoms = idpp.interpolate_all()
+
+    assert len(geoms) == 10
+
+
+def test_lst_gradient():
+    geom = geom_from_library("dipeptide_init.xyz")
+    atom_num = len(geom.atoms)
+    pair_inds = get_pair_inds(atom_num)
+    incidence = get_incidence(atom_num, pair_inds)
+    rng = np.random.default_rng(20201018)
+    wa_i = geom.coords + rng.normal(scale=0.1, size=geom.coords.size)
+    rab_i = pdist(wa_i.reshape(-1, 3))
+    args = (rab_i, wa_i, pair_inds, incidence)
+
+    _, grad = lst_cost(geom.coords, *args)
+    dx = 1e-6
+    fd_grad = np.zeros_like(grad)
+    for i in range(grad.size):
+        step = np.zeros_like(grad)
+        step[i] = dx
+        plus, _ = lst_cost(geom.coords + step, *args)
+        minus, _ = lst_cost(geom.coords - step, *args)
+        fd_grad[i] = (plus - minus) / (2 * dx)
+    np.testing.assert_allclose(grad, fd_grad, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "executor, warm_start, max_workers", [
+        ("thread", False, 3),
+        ("process", False, 3),
+        # One image per block, so there is nothing to warm start from
+        ("process", True, 8),
+    ]
+)
+def test_lst_executor(executor, warm_start, max_workers):
+    initial = geom_from_library("dipeptide_init.xyz")
+    final = geom_from_library("dipeptide_fin.xyz")
+
+    def interpolate(**kwargs):
+        lst = LST((initial.copy(), final.copy()), 8, align=True, silent=True,
+                  **kwargs)
+        return np.array([geom.coords for geom in lst.interpolate_all()])
+
+    ref_coords = interpolate()
+    coords = interpolate(executor=executor, warm_start=warm_start,
+                         max_workers=max_workers)
+    np.testing.assert_allclose(coords, ref_coords, atol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "executor, max_workers, warm_num", [
+        (None, None, 7),
+        # Two blocks of four images, the first image of every block starts cold
+        ("thread", 2, 6),
+    ]
+)
+def test_lst_warm_start(executor, max_workers, warm_num, monkeypatch):
+    initial = geom_from_library("hcn.xyz")
+    final = geom_from_library("hcn_iso_ts.xyz")
+
+    minimize = LST_module.minimize
+    warm_starts = list()
+
+    def recording_minimize(func, x0, args, **kwargs):
+        # args[1] is the linearly interpolated guess
+        warm_starts.append(not np.allclose(x0, args[1]))
+        return minimize(func, x0=x0, args=args, **kwargs)
+
+    monkeypatch.setattr(LST_module, "minimize", recording_minimize)
+
+    def interpolate(**kwargs):
+        lst = LST((initial.copy(), final.copy()), 8, align=True, silent=True,
+                  gtol=1e-8, **kwargs)
+        return np.array([geom.coords for geom in lst.interpolate_all()])
+
+    ref_coords = interpolate()
+    assert not any(warm_starts)
+
+    warm_starts.clear()
+    coords = interpolate(warm_start=True, executor=executor,
+                         max_workers=max_workers)
+    assert sum(warm_starts) == warm_num
+    np.testing.assert_allclose(coords, ref_coords, atol=1e-4)
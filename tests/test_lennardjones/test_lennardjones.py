@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import time
+
 from ase.cluster.icosahedron import Icosahedron
 from ase.calculators.lj import LennardJones as ase_LJ
 import numpy as np
@@ -43,3 +45,73 @@ def test_ar_cluster():
 
     assert opt.is_converged
     assert opt.cur_cycle == 93
+
+
+def random_cluster(atom_num, density=0.01, seed=20201106):
+    """Random Ar-like cluster with roughly constant density in atoms/Bohr³."""
+    radius = (3 * atom_num / (4 * np.pi * density)) ** (1 / 3)
+    rng = np.random.default_rng(seed)
+    coords3d = rng.uniform(-radius, radius, size=(atom_num, 3))
+    return coords3d
+
+
+def all_pairs_lj(calc, coords3d):
+    """Reference implementation without neighbor list."""
+    a, b = np.triu_indices(len(coords3d), 1)
+    diffs = coords3d[a] - coords3d[b]
+    rs = np.linalg.norm(diffs, axis=1)
+    within = rs <= calc.rc
+    c6 = (calc.sigma / rs[within]) ** 6
+    energy = np.sum(4 * calc.epsilon * (c6 ** 2 - c6)) - calc.e0 * within.sum()
+    prefactors = 24 * calc.epsilon * (c6 - 2 * c6 ** 2) / rs[within] ** 2
+    products = prefactors[:, None] * diffs[within]
+    gradient = np.zeros_like(coords3d)
+    np.add.at(gradient, a[within], products)
+    np.add.at(gradient, b[within], -products)
+    return energy, -gradient
+
+
+def test_lj_neighbor_list():
+    coords3d = random_cluster(500)
+    calc = LennardJones()
+
+    energy, forces = calc.calculate(coords3d)
+    ref_energy, ref_forces = all_pairs_lj(calc, coords3d)
+    assert energy == pytest.approx(ref_energy)
+    np.testing.assert_allclose(forces, ref_forces, atol=1e-12)
+    assert calc.neighbors.builds == 1
+
+    # Small displacements stay within the skin and reuse the list
+    rng = np.random.default_rng(20201107)
+    displaced = coords3d + rng.uniform(-1, 1, size=coords3d.shape) * calc.skin / 4
+    energy, forces = calc.calculate(displaced)
+    ref_energy, ref_forces = all_pairs_lj(calc, displaced)
+    assert energy == pytest.approx(ref_energy)
+    np.testing.assert_allclose(forces, ref_forces, atol=1e-12)
+    assert calc.neighbors.builds == 1
+
+    # Bigger displacements trigger a rebuild
+    displaced = coords3d + calc.skin
+    displaced[0] += calc.skin
+    calc.calculate(displaced)
+    assert calc.neighbors.builds == 2
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("atom_num", (100, 1000, 5000, 20000))
+def test_lj_benchmark(atom_num):
+    coords3d = random_cluster(atom_num)
+    calc = LennardJones()
+
+    start = time.perf_counter()
+    energy, forces = calc.calculate(coords3d)
+    build_time = time.perf_counter() - start
+
+    # Reuse of the neighbor list
+    start = time.perf_counter()
+    reuse_energy, reuse_forces = calc.calculate(coords3d)
+    reuse_time = time.perf_counter() - start
+    assert calc.neighbors.builds == 1
+    assert reuse_energy == pytest.approx(energy)
+    np.testing.assert_allclose(reuse_forces, forces)
+    assert reuse_time < build_time
@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+
+from pysisyphus.calculators.AnaPot import AnaPot
+from pysisyphus.calculators.LennardJones import LennardJones
+from pysisyphus.calculators.PySCF import PySCF
+from pysisyphus.helpers import geom_loader
+from pysisyphus.optimizers.HessianOptimizer import HessianOptimizer
+from pysisyphus.optimizers.low_rank_hessian import LowRankHessian
+from pysisyphus.optimizers.RFOptimizer import RFOptimizer
+from pysisyphus.testing import using
+from pysisyphus.tsoptimizers import RSPRFOptimizer
+
+
+def get_updates(size=40, num=10, seed=20201018):
+    rng = np.random.default_rng(seed)
+    H0 = np.diag(rng.random(size) + 0.5)
+    A = rng.random((size, size))
+    H_true = H0 + 0.1 * (A + A.T)
+    steps = rng.random((num, size)) - 0.5
+    return H0, [(dx, H_true.dot(dx)) for dx in steps]
+
+
+@pytest.mark.parametrize(
+    "hessian_update", ["bfgs", "damped_bfgs", "flowchart", "bofill"]
+)
+def test_low_rank_updates(hessian_update):
+    H, updates = get_updates()
+    low_rank = LowRankHessian(H)
+    update_func = HessianOptimizer.hessian_update_funcs[hessian_update]
+    factor_func = HessianOptimizer.hessian_factor_funcs[hessian_update]
+    for dx, dg in updates:
+        dH, _ = update_func(H, dx, dg)
+        H = H + dH
+        V, C, _ = factor_func(low_rank, dx, dg)
+        low_rank.update(V, C)
+
+    assert low_rank.rank <= 2 * len(updates)
+    np.testing.assert_allclose(low_rank.to_dense(), H, atol=1e-12)
+    vec = np.arange(H.shape[0], dtype=float)
+    np.testing.assert_allclose(low_rank @ vec, H @ vec)
+    assert vec @ low_rank @ vec == pytest.approx(vec @ H @ vec)
+
+
+def test_max_rank():
+    H, updates = get_updates()
+    low_rank = LowRankHessian(H, max_rank=6)
+    for dx, dg in updates:
+        V, C, _ = HessianOptimizer.hessian_factor_funcs["bfgs"](low_rank, dx, dg)
+        low_rank.update(V, C)
+    assert low_rank.rank == 6
+
+
+@pytest.mark.parametrize("solver", ["lanczos", "lobpcg"])
+def test_partial_eigh(solver):
+    H, updates = get_updates()
+    low_rank = LowRankHessian(H)
+    for dx, dg in updates:
+        V, C, _ = HessianOptimizer.hessian_factor_funcs["bofill"](low_rank, dx, dg)
+        low_rank.update(V, C)
+
+    w_ref, v_ref = np.linalg.eigh(low_rank.to_dense())
+    w, v = low_rank.eigh(k=4, solver=solver)
+    np.testing.assert_allclose(w, w_ref[:4], atol=1e-8)
+    np.testing.assert_allclose(np.abs(np.einsum("ij,ij->j", v, v_ref[:, :4])), 1.0)
+
+
+@pytest.mark.parametrize("solver", ["lanczos", "lobpcg"])
+def test_partial_eigh_guess(solver):
+    H, updates = get_updates()
+    low_rank = LowRankHessian(H)
+    for dx, dg in updates:
+        V, C, _ = HessianOptimizer.hessian_factor_funcs["bofill"](low_rank, dx, dg)
+        low_rank.update(V, C)
+
+    w_ref, v_ref = np.linalg.eigh(low_rank.to_dense())
+    # The 7th eigenvector is not among the 4 lowest ones, but must be kept.
+    w, v = low_rank.eigh(k=4, solver=solver, guess=v_ref[:, 6])
+    assert w.size == 5
+    np.testing.assert_allclose(w, np.append(w_ref[:4], w_ref[6]), atol=1e-8)
+    assert abs(v[:, -1].dot(v_ref[:, 6])) == pytest.approx(1.0)
+
+    # Guess vectors already in the subspace don't add eigenpairs
+    w, _ = low_rank.eigh(k=4, solver=solver, guess=v_ref[:, 0])
+    np.testing.assert_allclose(w, w_ref[:4], atol=1e-8)
+
+
+def test_max_rank_keeps_negative():
+    size = 20
+    low_rank = LowRankHessian(np.ones(size), max_rank=2)
+    vecs = np.eye(size)
+    # Small negative update, followed by bigger positive ones
+    low_rank.update(vecs[:, :1], np.array(((-1.5, ), )))
+    for i in range(1, 4):
+        low_rank.update(vecs[:, i:i+1], np.array(((i + 2.0, ), )))
+    assert low_rank.rank == 2
+    w, _ = low_rank.eigh(k=1)
+    assert w[0] == pytest.approx(-0.5)
+
+
+@pytest.mark.parametrize("alpha", [1.0, 2.5])
+def test_low_rank_rfo(alpha):
+    H, updates = get_updates()
+    low_rank = LowRankHessian(H)
+    for dx, dg in updates:
+        V, C, _ = HessianOptimizer.hessian_factor_funcs["bfgs"](low_rank, dx, dg)
+        low_rank.update(V, C)
+    gradient = np.linspace(-0.1, 0.1, H.shape[0])
+
+    # Reference from the dense scaled augmented Hessian
+    eigvals, eigvecs = np.linalg.eigh(low_rank.to_dense())
+    H_aug = HessianOptimizer.get_augmented_hessian(
+        None, eigvals, eigvecs.T.dot(gradient), alpha
+    )
+    w, v = np.linalg.eig(H_aug)
+    ind = w.real.argmin()
+    ref_step = eigvecs.dot(v[:-1, ind].real / v[-1, ind].real)
+
+    step, eigval, _ = low_rank.rfo(gradient, alpha)
+    assert eigval == pytest.approx(w[ind].real)
+    np.testing.assert_allclose(step, ref_step, atol=1e-10)
+
+
+def test_ar_cluster_low_rank():
+    energies = list()
+    cycles = list()
+    for hessian_low_rank in (False, True):
+        geom = geom_loader("lib:ar14cluster.xyz")
+        geom.set_calculator(LennardJones())
+        opt = RFOptimizer(
+            geom,
+            max_cycles=150,
+            thresh="gau_tight",
+            hessian_low_rank=hessian_low_rank,
+            dump=False,
+        )
+        opt.run()
+        assert opt.is_converged
+        energies.append(geom.energy)
+        cycles.append(opt.cur_cycle)
+    assert energies[1] == pytest.approx(energies[0])
+    assert cycles[1] == cycles[0]
+
+
+def test_anapot_low_rank_tsopt():
+    geom = AnaPot.get_geom((-0.6, 2.2, 0.0))
+    opt = RSPRFOptimizer(geom, trust_radius=0.2, hessian_low_rank=True, dump=False)
+    opt.run()
+
+    assert opt.is_converged
+    # Same as the dense RS-PRFO, see tests/test_tsopt
+    assert opt.cur_cycle == 11
+    assert geom.energy == pytest.approx(2.80910484)
+
+
+@using("pyscf")
+def test_hcn_iso_low_rank_tsopt():
+    geom = geom_loader("lib:hcn_iso_hf_sto3g_ts_opt.xyz", coord_type="redund")
+    geom.set_calculator(PySCF(basis="sto3g", pal=2))
+    opt = RSPRFOptimizer(
+        geom,
+        thresh="gau_tight",
+        hessian_low_rank=True,
+        hessian_eig_num=4,
+        dump=False,
+    )
+    opt.run()
+
+    assert opt.is_converged
+    assert geom.energy == pytest.approx(-91.56485102120064)
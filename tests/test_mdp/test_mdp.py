@@ -10,7 +10,10 @@ from pysisyphus.helpers import geom_loader
 from pysisyphus.testing import using
 
 
-def test_muller_brown_mdp():
+@pytest.mark.parametrize(
+    "init_batch", (1, 4)
+)
+def test_muller_brown_mdp(init_batch):
     coords = (-0.82200156,  0.6243128, 0)
     geom = MullerBrownPot.get_geom(coords)
 
@@ -35,6 +38,7 @@ def test_muller_brown_mdp():
         "t_init": 0.15,
         "t": 3,
         "dt": 0.001,
+        "init_batch": init_batch,
     }
     np.random.seed(25032018)
     res = mdp(geom, **mdp_kwargs)
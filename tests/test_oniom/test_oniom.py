@@ -132,6 +132,90 @@ def test_gradient(calcs, ref_energy, ref_force_norm):
     assert energy == pytest.approx(ref_energy)
 
 
+@using_pyscf
+def test_capping_and_jacobian():
+    geom = geom_loader("lib:alkyl17_sto3g_opt.xyz")
+
+    real = set(range(len(geom.atoms)))
+    medmin = set((0,1,2,3,4,5,6, 46,47,48,49,50,51,52))
+    calcs = {
+        key: {"type": "pyscf", "basis": "sto3g"}
+        for key in ("real", "medium", "high1", "high2")
+    }
+    models = {
+        "med": {"inds": list(real - medmin), "calc": "medium"},
+        "h1": {"inds": list(range(13, 22)), "calc": "high1"},
+        "h2": {"inds": list(range(31, 40)), "calc": "high2"},
+    }
+    oniom = ONIOM(calcs, models, geom, layers=["med", ["h1", "h2"]])
+
+    coords = geom.cart_coords + np.random.default_rng(20).normal(
+        scale=0.05, size=geom.cart_coords.size
+    )
+    c3d = coords.reshape(-1, 3)
+    for model in oniom.models[1:]:
+        atoms, capped_coords = model.capped_atoms_coords(geom.atoms, coords)
+        assert len(atoms) == len(capped_coords) == model.capped_atom_num
+
+        # Dense reference
+        ref_coords = list(c3d[model.atom_inds])
+        J_ref = np.zeros((model.capped_atom_num, len(model.parent_atom_inds)))
+        for i, ind in enumerate(model.atom_inds):
+            J_ref[i, model.parent_atom_inds.index(ind)] = 1
+        for i, (ind, parent_ind, _, g) in enumerate(model.links, len(model.atom_inds)):
+            ref_coords.append(c3d[ind] + g*(c3d[parent_ind] - c3d[ind]))
+            J_ref[i, model.parent_atom_inds.index(ind)] = 1 - g
+            J_ref[i, model.parent_atom_inds.index(parent_ind)] = g
+        np.testing.assert_allclose(capped_coords, ref_coords, atol=1e-12)
+        J_ref = np.kron(J_ref, np.eye(3))
+        np.testing.assert_allclose(model.J.toarray(), J_ref)
+
+        forces = np.random.rand(J_ref.shape[0])
+        np.testing.assert_allclose(model.project_forces(forces), forces @ J_ref)
+        hessian = np.random.rand(*J_ref.shape[:1]*2)
+        hessian += hessian.T
+        np.testing.assert_allclose(model.project_hessian(hessian),
+                                   J_ref.T @ hessian @ J_ref)
+
+        # Jacobian is reused as long as the links don't change
+        J = model.J
+        model.create_links(geom.atoms, geom.cart_coords)
+        assert model.J is J
+
+
+@using_pyscf
+@pytest.mark.parametrize("executor", ("thread", "process"))
+def test_oniom_executor(executor, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    geom = geom_loader("lib:acetaldehyd_oniom.xyz")
+    calcs = {
+        "real": {"type": "pyscf", "basis": "sto3g"},
+        "high": {"type": "pyscf", "xc": "b3lypg", "basis": "321g"},
+    }
+    models = {
+        "high": {
+            "inds": [4, 5, 6],
+            "calc": "high",
+        },
+    }
+
+    def get_oniom(**kwargs):
+        return ONIOM(calcs, models.copy(), geom, layers=None, **kwargs)
+
+    serial = get_oniom().get_forces(geom.atoms, geom.cart_coords)
+    oniom = get_oniom(executor=executor, max_workers=3)
+    concurrent = oniom.get_forces(geom.atoms, geom.cart_coords)
+    assert concurrent["energy"] == pytest.approx(serial["energy"])
+    np.testing.assert_allclose(concurrent["forces"], serial["forces"], atol=1e-8)
+
+    # The calculators of the models are updated, also with process pools,
+    # so the next cycle starts from the chkfiles of this one.
+    oniom.get_forces(geom.atoms, geom.cart_coords)
+    calcs_ = [oniom.models[0].calc, oniom.models[1].calc, oniom.models[1].parent_calc]
+    assert [calc.calc_counter for calc in calcs_] == [2, 2, 2]
+    assert all([calc.chkfile.endswith(".001.chkfile") for calc in calcs_])
+
+
 @pytest.mark.parametrize(
     "calc_key, embedding, ref_energy, ref_force_norm",
     [
@@ -1,12 +1,16 @@
 import itertools as it
 
+import numpy as np
 import pytest
 
 from pysisyphus.calculators import TIP3P, ExternalPotential
+from pysisyphus.calculators.LennardJones import LennardJones
 from pysisyphus.dynamics.helpers import get_mb_velocities_for_geom
 from pysisyphus.dynamics.velocity_verlet import md
 from pysisyphus.dynamics import rattle_closure
+from pysisyphus.dynamics.rattle import color_constraints
 from pysisyphus.helpers import geom_loader
+from pysisyphus.io.bintrj import BinTrj
 
 from pysisyphus.dynamics.lincs import lincs_closure
 
@@ -63,3 +67,102 @@ def test_rattle_tip3p(this_dir):
     trj_fn = "md.trj"
     atoms = geom.atoms
     coords_to_trj(trj_fn, atoms, coords)
+
+
+def get_water_md_kwargs(geom, T=298.15):
+    calc = TIP3P()
+    potentials = [
+        {
+            "type": "logfermi",
+            "beta": 6,
+            "T": T,
+            "radius": 10,
+        },
+    ]
+    geom.set_calculator(ExternalPotential(calc, potentials=potentials))
+    constraints = list(it.chain(*[get_water_constraints(i)
+                                  for i in range(len(geom.atoms) // 3)]))
+    v0 = get_mb_velocities_for_geom(geom, T, seed=20200626).flatten()
+    return {
+        "v0": v0,
+        "dt": 1.5,
+        "constraints": constraints,
+        "verbose": False,
+    }
+
+
+def test_color_constraints():
+    constraints = [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (0, 2)]
+    batches = color_constraints(constraints)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(constraints)))
+    for batch in batches:
+        atoms = np.array(constraints)[batch].flatten()
+        assert len(set(atoms)) == len(atoms)
+
+
+def test_rattle_constraints(this_dir):
+    geom = geom_loader(this_dir / "output_10.xyz")
+    md_kwargs = get_water_md_kwargs(geom)
+    constraints = np.array(md_kwargs["constraints"])
+
+    def bond_lengths(coords):
+        coords3d = coords.reshape(-1, 3)
+        return np.linalg.norm(
+            coords3d[constraints[:, 0]] - coords3d[constraints[:, 1]], axis=1
+        )
+
+    ref_lengths = bond_lengths(geom.coords)
+    md_result = md(geom, steps=50, **md_kwargs)
+    for coords in md_result.coords:
+        np.testing.assert_allclose(bond_lengths(coords), ref_lengths, rtol=1e-3)
+
+
+def test_md_stride_trj(this_dir, tmp_path):
+    geom = geom_loader(this_dir / "output_10.xyz")
+    init_coords = geom.coords.copy()
+    md_kwargs = get_water_md_kwargs(geom)
+    v0 = md_kwargs["v0"].copy()
+
+    ref_result = md(geom, steps=21, **md_kwargs)
+    assert ref_result.coords.shape == (21, geom.coords.size)
+
+    geom.coords = init_coords
+    md_kwargs["v0"] = v0
+    trj_fn = tmp_path / "md.btrj"
+    md_result = md(geom, steps=21, stride=5, trj_fn=str(trj_fn), **md_kwargs)
+    np.testing.assert_allclose(md_result.coords, ref_result.coords[::5])
+    np.testing.assert_allclose(md_result.E_tot, ref_result.E_tot)
+
+    trj = BinTrj(trj_fn)
+    assert len(trj) == 5
+    np.testing.assert_allclose(trj.coords.reshape(5, -1), md_result.coords)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "system", ("tip3p", "lj"),
+)
+def test_md_benchmark(system, this_dir):
+    if system == "tip3p":
+        geom = geom_loader(this_dir / "output_10.xyz")
+        md_kwargs = get_water_md_kwargs(geom)
+    else:
+        geom = geom_loader("lib:ar14cluster.xyz")
+        geom.set_calculator(LennardJones())
+        md_kwargs = {
+            "v0": get_mb_velocities_for_geom(geom, 298.15, seed=20200626).flatten(),
+            "dt": 1.5,
+            "verbose": False,
+        }
+    steps = 500
+
+    init_coords3d = geom.coords3d.copy()
+    md_result = md(geom, steps=steps, stride=10, **md_kwargs)
+    assert len(md_result.coords) == steps // 10
+    if system == "tip3p":
+        # Constrained bond lengths are kept
+        inds = np.array(md_kwargs["constraints"])
+        final_coords3d = md_result.coords[-1].reshape(-1, 3)
+        lengths = [np.linalg.norm(c3d[inds[:, 0]] - c3d[inds[:, 1]], axis=1)
+                   for c3d in (init_coords3d, final_coords3d)]
+        np.testing.assert_allclose(*lengths, atol=1e-2)
@@ -0,0 +1,159 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pysisyphus.calculators import LennardJones
+from pysisyphus.calculators.ResultCache import (
+    get_cache_key,
+    ResultCache,
+    reset_result_caches,
+    UncacheableSetting,
+)
+from pysisyphus.helpers import geom_loader
+from pysisyphus.testing import using
+
+
+class CountingLJ(LennardJones):
+    # Attributes starting with an underscore don't enter the cache key
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._calls = 0
+
+    def get_forces(self, atoms, coords):
+        self._calls += 1
+        return super().get_forces(atoms, coords)
+
+
+def get_geom(calc):
+    geom = geom_loader("lib:ar14cluster.xyz")
+    geom.set_calculator(calc)
+    return geom
+
+
+def test_result_cache():
+    calc = CountingLJ(cache=True)
+    cache = calc.result_cache
+    cache.clear()
+
+    geom = get_geom(calc)
+    forces = geom.forces
+    # The energy is taken from the cached forces calculation
+    energy = geom.get_energy_at(geom.cart_coords)
+    assert energy == pytest.approx(geom.energy)
+    assert calc._calls == 1
+
+    # Recalculation at the same geometry
+    geom.clear()
+    np.testing.assert_allclose(geom.forces, forces)
+    assert calc._calls == 1
+    assert cache.hits == 2
+
+    # Different settings give different keys
+    other_calc = CountingLJ(cache=True, sigma=2.0)
+    assert other_calc.result_cache is cache
+    get_geom(other_calc).forces
+    assert other_calc._calls == 1
+
+
+def test_result_cache_lru():
+    calc = CountingLJ()
+    cache = ResultCache(maxsize=2)
+    geom = get_geom(calc)
+    coords = [geom.cart_coords + i * 0.1 for i in range(3)]
+    for c in coords:
+        cache.get_or_calculate(calc, "get_forces", geom.atoms, c)
+    assert len(cache.memory) == 2
+    assert cache.evictions == 1
+    # The first geometry was evicted
+    cache.get_or_calculate(calc, "get_forces", geom.atoms, coords[0])
+    assert calc._calls == 4
+    cache.get_or_calculate(calc, "get_forces", geom.atoms, coords[2])
+    assert calc._calls == 4
+
+
+def test_result_cache_disk(tmp_path):
+    calc = CountingLJ()
+    geom = get_geom(calc)
+    cache = ResultCache(cache_dir=tmp_path, max_disk=2)
+    ref_results = cache.get_or_calculate(calc, "get_forces", geom.atoms, geom.cart_coords)
+
+    # A new cache, e.g. in a later run, picks up results from disk
+    cache = ResultCache(cache_dir=tmp_path)
+    results = cache.get_or_calculate(calc, "get_forces", geom.atoms, geom.cart_coords)
+    assert calc._calls == 1
+    assert cache.disk_hits == 1
+    assert results["energy"] == pytest.approx(ref_results["energy"])
+    np.testing.assert_allclose(results["forces"], ref_results["forces"])
+
+    # Disk size bound
+    cache = ResultCache(cache_dir=tmp_path, max_disk=2)
+    for i in range(1, 4):
+        cache.get_or_calculate(calc, "get_forces", geom.atoms, geom.cart_coords + i)
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
+def test_cache_key_settings():
+    atoms = ("H", "H")
+    coords = np.array((0.0, 0.0, 0.0, 0.0, 0.0, 1.4))
+
+    def key(**settings):
+        calc = CountingLJ()
+        for k, v in settings.items():
+            setattr(calc, k, v)
+        return get_cache_key(calc, "get_forces", atoms, coords)
+
+    # Settings that are no simple values still enter the key
+    assert key(basis={"H": "sto3g"}) != key(basis={"H": "321g"})
+    assert key(basis={"H": "sto3g", "C": "sto3g"}) == key(basis={"C": "sto3g", "H": "sto3g"})
+    assert key(params=Path("a.params")) != key(params=Path("b.params"))
+    assert key(weights=np.ones(3)) != key(weights=np.zeros(3))
+    assert key(inner=CountingLJ(sigma=1.0)) != key(inner=CountingLJ(sigma=2.0))
+
+    # The neighbor list is runtime state and is ignored
+    calc = CountingLJ()
+    ref_key = get_cache_key(calc, "get_forces", atoms, coords)
+    calc.get_forces(atoms, coords)
+    assert get_cache_key(calc, "get_forces", atoms, coords) == ref_key
+
+
+def test_uncacheable_setting():
+    calc = CountingLJ()
+    calc.unknown = object()
+    geom = get_geom(calc)
+    with pytest.raises(UncacheableSetting):
+        get_cache_key(calc, "get_forces", geom.atoms, geom.cart_coords)
+
+    # Calculations still run, but nothing is cached
+    cache = ResultCache()
+    for _ in range(2):
+        cache.get_or_calculate(calc, "get_forces", geom.atoms, geom.cart_coords)
+    assert calc._calls == 2
+    assert len(cache.memory) == 0
+
+
+def test_reset_result_caches():
+    cache = CountingLJ(cache=True).result_cache
+    assert CountingLJ(cache=True).result_cache is cache
+    reset_result_caches()
+    assert CountingLJ(cache=True).result_cache is not cache
+
+
+@using("pyscf")
+def test_result_cache_pyscf(tmp_path):
+    from pysisyphus.calculators.PySCF import PySCF
+
+    reset_result_caches()
+    calc = PySCF(basis="sto3g", pal=1, cache=True, out_dir=tmp_path)
+    cache = calc.result_cache
+    geom = geom_loader("lib:h2o.xyz")
+    geom.set_calculator(calc)
+    coords = geom.cart_coords
+
+    ref_results = geom.calculate("get_forces", coords)
+    geom.calculate("get_forces", coords + 0.05)
+    # The chkfile and the SCF object of the last calculation don't enter the key
+    results = geom.calculate("get_forces", coords)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert calc.calc_counter == 2
+    np.testing.assert_allclose(results["forces"], ref_results["forces"])
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import pytest
+
+from pysisyphus.calculators.AnaPot import AnaPot
+from pysisyphus.calculators.LennardJones import LennardJones
+from pysisyphus.calculators import SocketCalc as SocketCalc_module
+from pysisyphus.calculators.SocketCalc import SocketCalc, SocketClient
+from pysisyphus.executors import map_as_completed
+from pysisyphus.helpers import geom_loader
+
+
+def test_socketcalc_loopback():
+    calc = SocketCalc(port=0, timeout=10)
+    client = SocketClient(AnaPot(), port=calc.port)
+    client.run_in_thread()
+
+    ref_calc = AnaPot()
+    atoms = ("X", )
+    coords = np.array((0.6, 1.1, 0.))
+    for func in ("get_energy", "get_forces", "get_hessian"):
+        results = getattr(calc, func)(atoms, coords)
+        ref_results = getattr(ref_calc, func)(atoms, coords)
+        for key, val in results.items():
+            np.testing.assert_allclose(val, ref_results[key])
+    calc.server.close()
+    assert client.request_num == 3
+
+
+def test_socketcalc_concurrent():
+    geom = geom_loader("lib:ar14cluster.xyz")
+    atoms = geom.atoms
+    rng = np.random.default_rng(20201018)
+    coords = geom.coords + rng.normal(scale=0.05, size=(8, geom.coords.size))
+
+    calc = SocketCalc(port=0, timeout=10)
+    clients = [SocketClient(LennardJones(), port=calc.port) for _ in range(4)]
+    for client in clients:
+        client.run_in_thread()
+    # One calculator per image, all sharing the same server
+    calcs = [SocketCalc(port=calc.port) for _ in coords]
+    assert all([calc_.server is calc.server for calc_ in calcs])
+
+    def get_forces(i):
+        return calcs[i].get_forces(atoms, coords[i])
+
+    results = dict(map_as_completed(get_forces, range(len(coords)),
+                                    executor="thread", max_workers=4))
+    ref_calc = LennardJones()
+    for i, coords_ in enumerate(coords):
+        ref_results = ref_calc.get_forces(atoms, coords_)
+        assert results[i]["energy"] == pytest.approx(ref_results["energy"])
+        np.testing.assert_allclose(results[i]["forces"], ref_results["forces"])
+    calc.server.close()
+    assert sum([client.request_num for client in clients]) == len(coords)
+
+
+def test_socketcalc_failed_exchange(monkeypatch):
+    calc = SocketCalc(port=0, timeout=10)
+    clients = [SocketClient(AnaPot(), port=calc.port) for _ in range(2)]
+    for client in clients:
+        client.run_in_thread()
+    atoms = ("X", )
+    coords = np.array((0.6, 1.1, 0.))
+    server = calc.server
+
+    send_msg = SocketCalc_module.send_msg
+
+    def interrupted_send_msg(*args, **kwargs):
+        raise RuntimeError("Interrupted")
+
+    monkeypatch.setattr(SocketCalc_module, "send_msg", interrupted_send_msg)
+    with pytest.raises(RuntimeError):
+        calc.get_energy(atoms, coords)
+    monkeypatch.setattr(SocketCalc_module, "send_msg", send_msg)
+    # The interrupted connection was closed and not returned to the queue
+    assert not server.sent_atoms
+
+    results = calc.get_energy(atoms, coords)
+    assert results["energy"] == pytest.approx(AnaPot().get_energy(atoms, coords)["energy"])
+    assert server.idle.qsize() == 1
+    server.close()
+    assert sum([client.request_num for client in clients]) == 1
+
+
+@pytest.mark.benchmark
+def test_socketcalc_benchmark():
+    geom = geom_loader("lib:ar14cluster.xyz")
+    calc = SocketCalc(port=0, timeout=10)
+    SocketClient(LennardJones(), port=calc.port).run_in_thread()
+
+    calls = 2000
+    start = time.perf_counter()
+    for _ in range(calls):
+        results = calc.get_forces(geom.atoms, geom.coords)
+    duration = time.perf_counter() - start
+    calc.server.close()
+    ref_results = LennardJones().get_forces(geom.atoms, geom.coords)
+    np.testing.assert_allclose(results["forces"], ref_results["forces"])
+    # Round trips stay well below a millisecond
+    assert duration / calls < 1e-3
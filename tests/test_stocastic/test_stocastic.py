@@ -1,9 +1,12 @@
+import numpy as np
 import pytest
 
 from pysisyphus.calculators.Rastrigin import Rastrigin
 from pysisyphus.calculators.PySCF import PySCF
 from pysisyphus.helpers import geom_loader
 from pysisyphus.stocastic import *
+from pysisyphus.stocastic.align import matched_rmsd
+from pysisyphus.stocastic.dedup import GeometryIndex
 from pysisyphus.testing import using
 
 
@@ -169,3 +172,39 @@ def test_pyscf_stocastic():
     assert stoc.cur_cycle == 2
     assert len(stoc.new_geoms) == 4
     assert min(stoc.new_energies) == pytest.approx(-357.605594464)
+
+
+def test_geometry_index():
+    geom = geom_loader("lib:benzene_and_chlorine.xyz")
+    rng = np.random.default_rng(20201018)
+    rmsd_thresh = .2
+    index = GeometryIndex(rmsd_thresh=rmsd_thresh, energy_range=.5)
+
+    for i in range(30):
+        kicked = geom.copy()
+        coords3d = kicked.coords3d + rng.normal(scale=.05, size=(14, 3))
+        # Displace chlorine
+        coords3d[12:] += rng.normal(scale=2, size=3)
+        kicked.coords3d = coords3d
+        energy = rng.random()
+        # Rotated and permuted copies of known geometries
+        if i % 3 == 2:
+            j = rng.integers(len(index))
+            rot, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+            perm = np.concatenate((rng.permutation(6), 6 + rng.permutation(6),
+                                   (12, 13)))
+            kicked.coords3d = index.geoms[j].coords3d[perm] @ rot.T
+            energy = index.energies[j]
+
+        # Brute force reference
+        inds = index.get_candidates(energy)
+        rmsds = [matched_rmsd(kicked, index.geoms[j])[0] for j in inds]
+        ref_is_new = (len(rmsds) == 0) or (min(rmsds) > rmsd_thresh)
+
+        assert index.is_new(kicked, energy) == ref_is_new
+        if i % 3 == 2:
+            assert not ref_is_new
+        if ref_is_new:
+            index.add(kicked, energy)
+    # Most comparisons are skipped by the fingerprints
+    assert index.rmsd_calls < 15
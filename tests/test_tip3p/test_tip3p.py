@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pysisyphus.calculators import TIP3P
+from pysisyphus.helpers import geom_loader
+
+
+def get_water_grid(n=3, spacing=5.5):
+    """Waters on a slightly distorted cubic grid with n³ molecules."""
+    water = geom_loader("lib:tip3p_water.xyz").coords3d
+    rng = np.random.default_rng(20201106)
+    coords3d = list()
+    for x, y, z in np.ndindex(n, n, n):
+        shift = spacing * np.array((x, y, z)) + rng.uniform(-0.5, 0.5, size=3)
+        coords3d.append(water + shift)
+    return np.concatenate(coords3d)
+
+
+def test_tip3p_forces():
+    calc = TIP3P()
+    coords3d = get_water_grid()
+    energy, forces = calc.calculate(coords3d)
+
+    # Central finite differences for some coordinates
+    step = 1e-5
+    coords = coords3d.flatten()
+    for i in (0, 1, 5, 44, 80):
+        plus = coords.copy()
+        plus[i] += step
+        minus = coords.copy()
+        minus[i] -= step
+        e_plus, _ = TIP3P().calculate(plus.reshape(-1, 3))
+        e_minus, _ = TIP3P().calculate(minus.reshape(-1, 3))
+        assert -(e_plus - e_minus) / (2 * step) == pytest.approx(
+            forces.flatten()[i], abs=1e-7
+        )
+
+
+def test_tip3p_coulomb_cutoff():
+    coords3d = get_water_grid()
+    energy, forces = TIP3P().calculate(coords3d)
+
+    # A cutoff bigger than the system must reproduce the full Coulomb interaction
+    calc = TIP3P(coulomb_rc=1000)
+    energy_rc, forces_rc = calc.calculate(coords3d)
+    assert energy_rc == pytest.approx(energy)
+    np.testing.assert_allclose(forces_rc, forces, atol=1e-12)
+
+    # A short cutoff neglects some pairs
+    calc = TIP3P(coulomb_rc=10)
+    energy_rc, _ = calc.calculate(coords3d)
+    assert energy_rc != pytest.approx(energy)
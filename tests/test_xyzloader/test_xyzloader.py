@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from pysisyphus.dynamics.helpers import dump_coords
+from pysisyphus.helpers import geom_loader, geoms_from_trj
+from pysisyphus.trj import align, align_iter, TrjGeoms
+from pysisyphus.xyzloader import (
+    iter_trj_file,
+    make_trj_str,
+    parse_trj_file,
+    split_xyz_str,
+    TrjFile,
+    TrjWriter,
+)
+
+
+@pytest.fixture
+def frames():
+    geom = geom_loader("lib:h2o.xyz")
+    rng = np.random.default_rng(20201018)
+    coords = geom.coords3d + rng.normal(scale=0.1, size=(25, *geom.coords3d.shape))
+    comments = [f"frame {i}" for i in range(len(coords))]
+    return geom.atoms, coords, comments
+
+
+def test_trj_writer(frames, tmp_path):
+    atoms, coords, comments = frames
+    trj_fn = tmp_path / "frames.trj"
+    with TrjWriter(trj_fn, atoms, buffer_size=4) as writer:
+        for coords3d, comment in zip(coords, comments):
+            writer.write(coords3d, comment)
+    assert writer.frames_written == len(coords)
+
+    # Same format as the string based functions
+    ref_str = make_trj_str(atoms, coords, comments)
+    assert trj_fn.read_text() == ref_str + "\n"
+
+    parsed = parse_trj_file(trj_fn, with_comments=True)
+    assert len(parsed) == len(coords)
+    for (atoms_, coords_, comment), ref_coords, ref_comment in zip(
+        parsed, coords, comments
+    ):
+        assert atoms_ == tuple(atoms)
+        assert comment == ref_comment
+        np.testing.assert_allclose(coords_, ref_coords, atol=1e-8)
+
+
+def test_trj_file(frames, tmp_path):
+    atoms, coords, comments = frames
+    trj_fn = tmp_path / "frames.trj"
+    # Extra columns and blank lines between frames
+    frame_strs = [
+        f"{len(atoms)}\n{comment}\n"
+        + "\n".join(f"{a} {x} {y} {z} 0.0" for a, (x, y, z) in zip(atoms, c3d))
+        for c3d, comment in zip(coords, comments)
+    ]
+    trj_fn.write_text("\n\n".join(frame_strs))
+
+    trj = TrjFile(trj_fn)
+    assert len(trj) == len(coords)
+    for index in (0, 7, -1):
+        atoms_, coords_, comment = trj[index]
+        assert comment == comments[index]
+        np.testing.assert_allclose(coords_, coords[index])
+    every = trj[::10]
+    assert [comment for *_, comment in every] == comments[::10]
+    assert len(list(iter_trj_file(trj_fn))) == len(coords)
+
+
+def test_split_xyz_str():
+    xyz_str = """
+        1
+
+        X -1.2 1.4 0.0
+        1
+
+        X 2.0 4.0 0.0
+    """
+    (atoms0, coords0), (atoms1, coords1) = split_xyz_str(xyz_str)
+    assert atoms0 == atoms1 == ("X", )
+    np.testing.assert_allclose(coords1, ((2.0, 4.0, 0.0), ))
+
+    with pytest.raises(AssertionError):
+        split_xyz_str("h2o.xyz")
+
+
+def test_streamed_align(frames, tmp_path):
+    atoms, coords, comments = frames
+    trj_fn = tmp_path / "frames.trj"
+    dump_coords(atoms, coords, trj_fn)
+
+    ref_geoms = align(geoms_from_trj(trj_fn))
+    trj_geoms = TrjGeoms(trj_fn)
+    assert len(trj_geoms) == len(coords)
+    for geom, ref_geom in zip(align_iter(trj_geoms), ref_geoms):
+        np.testing.assert_allclose(geom.coords, ref_geom.coords, atol=1e-12)